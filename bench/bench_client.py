@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark ścieżki gorącej klienta (client/protocol_client.py) na sztucznych transportach.
+
+Uruchamia prawdziwe http_loop / mqtt_loop / coap_loop (MAX_SAMPLES = -n, FREQ = 0,
+log() do /dev/null, emit() do pliku CSV w katalogu tymczasowym), podmieniając tylko
+warstwę sieci - w tym samym procesie, bez serwerów:
+
+- http: requests.adapters.HTTPAdapter.send zwraca gotową odpowiedź 200 (Session,
+  przygotowanie żądania i hooki requests liczą się do kosztu, http.client/socket nie),
+- mqtt: paho.mqtt.client.Client zastąpiony klientem, którego publish() od razu
+  woła on_message z tym samym payloadem (echo brokera; bez wątku sieciowego paho),
+- coap: aiocoap.Context z natychmiastową odpowiedzią 2.04; żądanie jest kodowane
+  (Message.encode()), więc budowa wiadomości aiocoap jest w koszcie,
+- write_metric: sam zapis wiersza CSV (write_results.py).
+
+Na przypadek: -r powtórzeń po -n wiadomości (po rozgrzewce) mierzonych CPU procesu
+(time.process_time) i zegarem, oraz osobny przebieg z tracemalloc:
+
+  msgs_per_core_s   wiadomości na sekundę CPU (ile urządzeń przy FREQ --freq obsłuży rdzeń),
+  cpu_us_per_msg    pełny koszt iteracji pętli (z log/emit/stat STOP_FILE),
+  rtt_p50/p99_us    RTT zapisany przez klienta przy zerowym czasie sieci = narzut klienta w RTT,
+  alloc_b_per_msg   mediana szczytu alokacji (tracemalloc) w jednym cyklu wiadomości,
+  retained_blocks   przyrost sys.getallocatedblocks() na wiadomość (wyciek > 0),
+  spread            rozrzut IQR cpu_us_per_msg między powtórzeniami.
+
+--save zapisuje JSON (commit, CPU, python), --compare porównuje z wcześniejszym zapisem.
+
+Uruchom:
+  python bench/bench_client.py [--cases http mqtt coap write_metric] [-n 2000] [-r 5] [--cpu 0]
+  python bench/bench_client.py --save bench/results/client_$(git rev-parse --short HEAD).json
+  python bench/bench_client.py --compare bench/results/client_abc1234.json
+"""
+import argparse
+import asyncio
+import atexit
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import bench_common as bc
+
+CLIENT_DIR = bc.ROOT_DIR / "client"
+TMP = Path(tempfile.mkdtemp(prefix="bench_client_"))
+atexit.register(shutil.rmtree, TMP, True)
+
+# środowisko jak w kontenerze klienta, zanim protocol_client przeczyta je przy imporcie
+for k in ("PROF_PHASES", "PROF_MODE", "START_FILE", "READY_FILE"):
+    os.environ.pop(k, None)
+os.environ.update(OUT_DIR=str(TMP), RUN_ID="bench", ID="1", FREQ="0", STOP_FILE=str(TMP / ".stop_bench"))
+sys.path.insert(0, str(CLIENT_DIR))
+import protocol_client as pc  # noqa: E402
+from write_results import write_metric  # noqa: E402
+
+CASES = ["http", "http_auth", "mqtt", "mqtt_auth", "coap", "coap_auth", "write_metric"]
+METRICS = [("msgs_per_core_s", +1), ("cpu_us_per_msg", -1), ("rtt_p50_us", -1), ("rtt_p99_us", -1),
+           ("alloc_b_per_msg", -1)]
+
+
+class Probe:
+    """Wołany przez sztuczny transport przy każdym wysłaniu (pomiar alokacji na cykl)."""
+
+    def __init__(self):
+        self.trace = False
+        self.last: Optional[int] = None
+        self.peaks: List[int] = []
+
+    def on_send(self) -> None:
+        if not self.trace:
+            return
+        cur, peak = tracemalloc.get_traced_memory()
+        if self.last is not None:
+            self.peaks.append(peak - self.last)
+        tracemalloc.reset_peak()
+        self.last = cur
+
+
+PROBE = Probe()
+
+
+# ---------- sztuczne transporty ----------
+
+class _Patch:
+    """Podmiana atrybutów na czas przypadku (przywracane w __exit__)."""
+
+    def __init__(self, *items):
+        self.items = items
+        self.saved = []
+
+    def __enter__(self):
+        for obj, name, value in self.items:
+            self.saved.append((obj, name, getattr(obj, name, None)))
+            setattr(obj, name, value)
+        return self
+
+    def __exit__(self, *exc):
+        for obj, name, value in reversed(self.saved):
+            setattr(obj, name, value)
+
+
+def http_transport() -> _Patch:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+
+    def send(self, request, **kwargs):
+        PROBE.on_send()
+        r = requests.models.Response()
+        r.status_code = 200
+        r.reason = "OK"
+        r.headers = CaseInsensitiveDict({"Content-Type": "text/html; charset=utf-8", "Content-Length": "2"})
+        r._content = b"OK"
+        r._content_consumed = True
+        r.encoding = "utf-8"
+        r.url = request.url
+        r.request = request
+        r.connection = self
+        return r
+
+    return _Patch((HTTPAdapter, "send", send))
+
+
+class FakeMqttClient:
+    """Minimum API paho 1.6 używanego przez mqtt_loop; publish -> natychmiastowe echo."""
+
+    def __init__(self, *args, **kwargs):
+        self.on_connect = None
+        self.on_message = None
+
+    def username_pw_set(self, user, password=None):
+        pass
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect(self, host, port=1883, keepalive=60):
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        return 0, 1
+
+    def loop_start(self):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        PROBE.on_send()
+        msg = types.SimpleNamespace(topic=topic, payload=payload.encode("utf-8") if isinstance(payload, str) else payload)
+        self.on_message(self, None, msg)
+        return types.SimpleNamespace(rc=0, mid=1)
+
+
+def mqtt_transport() -> _Patch:
+    try:
+        import paho.mqtt.client as mqtt_mod
+    except ImportError:  # bez paho: moduł zastępczy z tym, czego używa mqtt_loop
+        mqtt_mod = types.ModuleType("paho.mqtt.client")
+        mqtt_mod.MQTT_ERR_SUCCESS = 0
+        paho = sys.modules.setdefault("paho", types.ModuleType("paho"))
+        paho.mqtt = sys.modules.setdefault("paho.mqtt", types.ModuleType("paho.mqtt"))
+        paho.mqtt.client = sys.modules.setdefault("paho.mqtt.client", mqtt_mod)
+    return _Patch((mqtt_mod, "Client", FakeMqttClient))
+
+
+def coap_transport() -> _Patch:
+    import aiocoap
+    from aiocoap import CON, Code, Message
+
+    class FakeRequest:
+        def __init__(self, msg):
+            PROBE.on_send()
+            msg.mid, msg.token = 1, b"\x01\x02"
+            if msg.mtype is None:
+                msg.mtype = CON
+            msg.encode()
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(Message(code=Code.CHANGED, payload=b"OK"))
+            self.response = fut
+
+    class FakeContext:
+        @classmethod
+        async def create_client_context(cls, *args, **kwargs):
+            return cls()
+
+        def request(self, msg):
+            return FakeRequest(msg)
+
+    return _Patch((aiocoap, "Context", FakeContext))
+
+
+# ---------- przypadki ----------
+
+def _configure(proto: str, auth: bool, n: int, tag: str) -> Path:
+    csv_path = TMP / f"metrics_{tag}_{proto}_id1.csv"
+    if csv_path.exists():
+        csv_path.unlink()
+    pc.PROTO, pc.CSV_PATH, pc.MAX_SAMPLES, pc.FREQ = proto, str(csv_path), n, 0.0
+    pc.AUTH_MODE = "auth" if auth else "open"
+    pc.API_TOKEN, pc.MQTT_USER, pc.MQTT_PASS = "supersekret123", "mqtt_user", "mqtt_password"
+    return csv_path
+
+
+def _loop_runner(case: str) -> Callable[[int, str], Path]:
+    proto, _, auth = case.partition("_")
+
+    def run(n: int, tag: str) -> Path:
+        csv_path = _configure(proto, auth == "auth", n, tag)
+        if proto == "http":
+            with http_transport():
+                pc.http_loop()
+        elif proto == "mqtt":
+            with mqtt_transport():
+                pc.mqtt_loop()
+        else:
+            with coap_transport():
+                asyncio.run(pc.coap_loop())
+        return csv_path
+
+    return run
+
+
+def _write_metric_runner(n: int, tag: str) -> Path:
+    csv_path = TMP / f"metrics_{tag}_wm_id1.csv"
+    if csv_path.exists():
+        csv_path.unlink()
+    ts = time.time()
+    for i in range(n):
+        PROBE.on_send()
+        write_metric(str(csv_path), "bench", "mqtt", "1", ts + i * 0.001, rtt=0.001234, status="OK")
+    return csv_path
+
+
+def read_rtts_us(csv_path: Path) -> Tuple[List[float], int]:
+    """(posortowane RTT w us, liczba wierszy z błędem)."""
+    out, errors = [], 0
+    with open(csv_path, encoding="utf-8") as f:
+        next(f, None)
+        for line in f:
+            r = line.split(",")[4]
+            if r:
+                out.append(float(r) * 1e6)
+            else:
+                errors += 1
+    return sorted(out), errors
+
+
+def bench_case(case: str, n: int, repeats: int, warmup: int, alloc: bool) -> Dict[str, float]:
+    run = _write_metric_runner if case == "write_metric" else _loop_runner(case)
+    devnull = open(os.devnull, "w")
+    stdout = sys.stdout
+    try:
+        sys.stdout = devnull  # log() = print + flush, jak do `docker logs`
+        if warmup:
+            run(warmup, "warm")
+        cpu, wall, rtts, errors = [], [], [], 0
+        retained = None
+        for i in range(repeats):
+            gc.collect()
+            blocks0 = sys.getallocatedblocks()
+            c0, w0 = time.process_time(), time.perf_counter()
+            csv_path = run(n, f"r{i}")
+            cpu.append((time.process_time() - c0) / n * 1e6)
+            wall.append((time.perf_counter() - w0) / n * 1e6)
+            gc.collect()
+            retained = (sys.getallocatedblocks() - blocks0) / n  # ostatnie powtórzenie
+            if case != "write_metric":
+                rtts, errors = read_rtts_us(csv_path)
+        alloc_b = None
+        if alloc:
+            gc.collect()
+            PROBE.trace, PROBE.last, PROBE.peaks = True, None, []
+            tracemalloc.start()
+            run(n, "alloc")
+            tracemalloc.stop()
+            PROBE.trace = False
+            alloc_b = bc.percentile(sorted(PROBE.peaks), 0.5)
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+    if errors:
+        print(f"WARN: {case}: {errors}/{n} messages failed on the fake transport - numbers are not comparable",
+              file=sys.stderr)
+    cpu_med, spread = bc.summarize(cpu)
+    return {
+        "msgs_per_core_s": 1e6 / cpu_med if cpu_med else None,
+        "cpu_us_per_msg": cpu_med,
+        "wall_us_per_msg": bc.summarize(wall)[0],
+        "rtt_p50_us": bc.percentile(rtts, 0.5),
+        "rtt_p99_us": bc.percentile(rtts, 0.99),
+        "alloc_b_per_msg": alloc_b,
+        "retained_blocks": retained,
+        "spread": spread,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Client hot-path micro-benchmarks on fake in-process transports.")
+    ap.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    ap.add_argument("-n", type=int, default=2000, help="Messages per repeat.")
+    ap.add_argument("-r", "--repeats", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=200, help="Messages before measuring (0 = none).")
+    ap.add_argument("--no-alloc", action="store_true", help="Skip the tracemalloc pass.")
+    ap.add_argument("--cpu", type=int, help="Pin to this CPU (more stable numbers).")
+    ap.add_argument("--freq", type=float, default=1.0, help="FREQ for the devices-per-core column.")
+    ap.add_argument("--save", help="Write results JSON.")
+    ap.add_argument("--compare", help="Compare with a saved results JSON.")
+    ap.add_argument("--noise", type=float, default=0.05, help="Relative change treated as noise in --compare.")
+    args = ap.parse_args()
+
+    old = bc.load_results(Path(args.compare), "client") if args.compare else None
+    pinned = bc.pin_cpu(args.cpu)
+    results: Dict[str, Dict[str, float]] = {}
+    rows = []
+    for case in args.cases:
+        print(f"[bench] {case} ...", file=sys.stderr)
+        res = bench_case(case, args.n, args.repeats, args.warmup, not args.no_alloc)
+        results[case] = res
+        per_core = res["msgs_per_core_s"]
+        rows.append({"case": case, **res, "devices": per_core * args.freq if per_core and case != "write_metric" else None})
+
+    print(f"n={args.n} repeats={args.repeats} cpu={pinned if pinned is not None else 'any'}  (FREQ={args.freq:g}s for devices/core)")
+    bc.print_table(rows, [
+        ("case", "case", "{}"), ("msgs_per_core_s", "msg/s/core", "{:.0f}"), ("devices", "dev/core", "{:.0f}"),
+        ("cpu_us_per_msg", "cpu us/msg", "{:.1f}"), ("wall_us_per_msg", "wall us/msg", "{:.1f}"),
+        ("rtt_p50_us", "rtt p50 us", "{:.1f}"), ("rtt_p99_us", "rtt p99 us", "{:.1f}"),
+        ("alloc_b_per_msg", "alloc B/msg", "{:.0f}"), ("retained_blocks", "retained/msg", "{:.2f}"),
+        ("spread", "spread", "{:.1%}"),
+    ])
+    if old is not None:
+        print("\n".join(bc.compare(old, results, METRICS, args.noise)))
+    if args.save:
+        params = {"n": args.n, "repeats": args.repeats, "warmup": args.warmup, "cpu": pinned}
+        print(f"saved {bc.save_results(Path(args.save), 'client', params, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Wspólne elementy benchmarków (bench_client.py, bench_servers.py): powtórzenia,
+statystyki, zapis wyników do JSON i porównanie z poprzednim zapisem.
+
+Plik wyników:
+  {"suite": "client", "version": 1, "env": {...git, python, cpu...}, "params": {...},
+   "results": {"<case>": {"<metric>": value, ...}, ...}}
+
+compare() zestawia wspólne przypadki; zmiana mniejsza niż szum (max z --noise
+i rozrzutu IQR obu pomiarów) jest oznaczana "~".
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+RESULTS_VERSION = 1
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        p = subprocess.run(["git", *args], capture_output=True, text=True, timeout=5, cwd=str(ROOT_DIR))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return p.stdout.strip() if p.returncode == 0 else None
+
+
+def cpu_model() -> Optional[str]:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+
+def env_info() -> Dict[str, object]:
+    return {
+        "git_commit": _git("rev-parse", "--short", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu": cpu_model(),
+        "cpus": os.cpu_count(),
+        "when": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def pin_cpu(cpu: Optional[int]) -> Optional[int]:
+    """Przypnij proces do jednego rdzenia (stabilniejsze wyniki); None = bez zmian."""
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return None
+    os.sched_setaffinity(0, {cpu})
+    return cpu
+
+
+def summarize(vals: Sequence[float]) -> Tuple[float, float]:
+    """(mediana, rozrzut IQR jako ułamek mediany)."""
+    vals = sorted(vals)
+    med = statistics.median(vals)
+    if len(vals) >= 4:
+        q = statistics.quantiles(vals, n=4)
+        spread = (q[2] - q[0]) / med if med else 0.0
+    else:
+        spread = (vals[-1] - vals[0]) / med if med and len(vals) > 1 else 0.0
+    return med, spread
+
+
+def percentile(sorted_vals: Sequence[float], p: float) -> Optional[float]:
+    """Nearest-rank jak w latency_summary.py."""
+    if not sorted_vals:
+        return None
+    return float(sorted_vals[int(round((len(sorted_vals) - 1) * p))])
+
+
+def save_results(path: Path, suite: str, params: Dict[str, object], results: Dict[str, Dict[str, float]]) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"suite": suite, "version": RESULTS_VERSION, "env": env_info(), "params": params, "results": results}
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+def load_results(path: Path, suite: str) -> Dict[str, object]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if data.get("suite") != suite:
+        raise ValueError(f"{path}: suite {data.get('suite')!r}, expected {suite!r}")
+    return data
+
+
+def compare(old: Dict[str, object], new_results: Dict[str, Dict[str, float]],
+            metrics: List[Tuple[str, int]], noise: float = 0.05) -> List[str]:
+    """metrics: (nazwa, kierunek) gdzie +1 = więcej znaczy lepiej. Zwraca linie raportu."""
+    env = old.get("env", {})
+    lines = [f"vs {env.get('git_commit')}{'+dirty' if env.get('git_dirty') else ''} ({env.get('when')}, {env.get('cpu')})"]
+    old_res = old.get("results", {})
+    width = max([len(c) for c in list(new_results) + list(old_res)] + [4])
+    for case in new_results:
+        if case not in old_res:
+            lines.append(f"  {case:<{width}}  (new case)")
+            continue
+        parts = []
+        for m, direction in metrics:
+            a, b = old_res[case].get(m), new_results[case].get(m)
+            if a in (None, 0) or b is None:
+                continue
+            rel = b / a - 1.0
+            thr = max(noise, old_res[case].get("spread", 0.0), new_results[case].get("spread", 0.0))
+            mark = "~" if abs(rel) < thr else ("+" if rel * direction > 0 else "-")
+            parts.append(f"{m} {rel * 100:+6.1f}%{mark}")
+        lines.append(f"  {case:<{width}}  " + "  ".join(parts))
+    for case in old_res:
+        if case not in new_results:
+            lines.append(f"  {case:<{width}}  (not run)")
+    lines.append("  (+ better, - worse, ~ within noise)")
+    return lines
+
+
+def print_table(rows: List[Dict[str, object]], cols: List[Tuple[str, str, str]], out=sys.stdout) -> None:
+    """cols: (klucz, nagłówek, format)."""
+    cells = [[("-" if r.get(k) is None else fmt.format(r[k])) for k, _, fmt in cols] for r in rows]
+    widths = [max(len(h), *(len(c[i]) for c in cells)) if cells else len(h) for i, (_, h, _) in enumerate(cols)]
+    print("  ".join(h.rjust(w) if i else h.ljust(w) for i, ((_, h, _), w) in enumerate(zip(cols, widths))), file=out)
+    for c in cells:
+        print("  ".join(v.rjust(w) if i else v.ljust(w) for i, (v, w) in enumerate(zip(c, widths))), file=out)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Narzut scripts/netem_proxy.py: ten sam ruch ping-pong do serwera echo (TCP i UDP,
+osobny proces) bezpośrednio i przez proxy.
+
+  msgs_per_s         wymiana/s przy --conns równoległych połączeniach (sesjach UDP),
+  rtt_p50/p99_us     RTT klienta,
+  overhead_p50_us    p50 przez proxy - p50 bezpośrednio (profil "none" = czysty narzut),
+  proxy_cpu_us_per_msg  CPU procesu proxy (rusage po zakończeniu, minus start bez ruchu) na wymianę,
+  delay_err_us       dla --delay-ms D: p50 - p50 bezpośrednio - 2*D (dokładność opóźniania).
+
+Proxy ma jedną pętlę asyncio, więc msgs_per_s przez proxy to jednocześnie górna
+granica ruchu, jaki jeden proces proxy przeniesie w przebiegu z IMPAIR_PROFILE.
+
+Uruchom:
+  python bench/bench_proxy.py [-n 5000] [--conns 1 8] [--size 64] [--delay-ms 10] [--cpu 0]
+  python bench/bench_proxy.py --save bench/results/proxy_$(git rev-parse --short HEAD).json
+  python bench/bench_proxy.py --compare bench/results/proxy_abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import bench_common as bc
+
+PROXY = bc.ROOT_DIR / "scripts" / "netem_proxy.py"
+HOST = "127.0.0.1"
+METRICS = [("msgs_per_s", +1), ("rtt_p50_us", -1), ("rtt_p99_us", -1), ("overhead_p50_us", -1),
+           ("proxy_cpu_us_per_msg", -1)]
+
+
+# ---------- serwer echo (osobny proces: --echo-server) ----------
+
+async def _echo_server(tcp_port: int, udp_port: int) -> None:
+    async def tcp_echo(reader, writer):
+        sock = writer.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+        writer.close()
+
+    class UdpEcho(asyncio.DatagramProtocol):
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.transport.sendto(data, addr)
+
+    await asyncio.start_server(tcp_echo, HOST, tcp_port)
+    await asyncio.get_running_loop().create_datagram_endpoint(UdpEcho, local_addr=(HOST, udp_port))
+    print("echo ready", flush=True)
+    await asyncio.Event().wait()
+
+
+def free_port(kind: int) -> int:
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_line(p: subprocess.Popen, needle: str, timeout: float = 15.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        line = p.stdout.readline()
+        if not line:
+            break
+        if needle in line:
+            return
+    raise RuntimeError(f"{p.args[2] if len(p.args) > 2 else p.args}: no {needle!r} within {timeout}s")
+
+
+# ---------- klient ping-pong ----------
+
+async def _tcp_worker(port: int, n: int, payload: bytes, out: List[int]) -> None:
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    size = len(payload)
+    for _ in range(n):
+        t0 = time.perf_counter_ns()
+        writer.write(payload)
+        await reader.readexactly(size)
+        out.append(time.perf_counter_ns() - t0)
+    writer.close()
+
+
+async def _udp_worker(port: int, n: int, payload: bytes, out: List[int], lost: List[int]) -> None:
+    loop = asyncio.get_running_loop()
+    waiter: List[Optional[asyncio.Future]] = [None]
+
+    class Proto(asyncio.DatagramProtocol):
+        def datagram_received(self, data, addr):
+            if waiter[0] is not None and not waiter[0].done():
+                waiter[0].set_result(None)
+
+    transport, _ = await loop.create_datagram_endpoint(Proto, remote_addr=(HOST, port))
+    for _ in range(n):
+        waiter[0] = loop.create_future()
+        t0 = time.perf_counter_ns()
+        transport.sendto(payload)
+        try:
+            await asyncio.wait_for(waiter[0], 1.0)
+        except asyncio.TimeoutError:
+            lost[0] += 1
+            continue
+        out.append(time.perf_counter_ns() - t0)
+    transport.close()
+
+
+def ping_pong(transport: str, port: int, n: int, conns: int, size: int) -> Dict[str, float]:
+    payload = b"x" * size
+    per = max(n // conns, 1)
+
+    async def run() -> Tuple[List[int], int, float]:
+        out: List[int] = []
+        lost = [0]
+        t0 = time.perf_counter()
+        if transport == "tcp":
+            await asyncio.gather(*[_tcp_worker(port, per, payload, out) for _ in range(conns)])
+        else:
+            await asyncio.gather(*[_udp_worker(port, per, payload, out, lost) for _ in range(conns)])
+        return out, lost[0], time.perf_counter() - t0
+
+    lat, lost, wall = asyncio.run(run())
+    lat_us = sorted(v / 1e3 for v in lat)
+    return {"msgs_per_s": len(lat) / wall, "rtt_p50_us": bc.percentile(lat_us, 0.5),
+            "rtt_p99_us": bc.percentile(lat_us, 0.99), "lost": lost, "msgs": len(lat)}
+
+
+# ---------- proxy ----------
+
+def start_proxy(profile: str, tcp_port: int, udp_port: int) -> Tuple[subprocess.Popen, int, int]:
+    ptcp, pudp = free_port(socket.SOCK_STREAM), free_port(socket.SOCK_DGRAM)
+    p = subprocess.Popen([sys.executable, "-u", str(PROXY), "--profile", profile, "--seed", "1", "--stats-every", "0",
+                          "--map", f"tcp:{HOST}:{ptcp}={HOST}:{tcp_port}",
+                          "--map", f"udp:{HOST}:{pudp}={HOST}:{udp_port}"],
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    wait_line(p, "profile=")
+    return p, ptcp, pudp
+
+
+def stop_proxy(p: subprocess.Popen) -> float:
+    """SIGTERM + wait4 -> CPU procesu proxy w sekundach."""
+    p.terminate()
+    _, _, ru = os.wait4(p.pid, 0)
+    p.returncode = 0
+    p.stdout.close()
+    return ru.ru_utime + ru.ru_stime
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Overhead and delay accuracy of scripts/netem_proxy.py.")
+    ap.add_argument("-n", type=int, default=5000, help="Ping-pongs per case (split across connections).")
+    ap.add_argument("--conns", nargs="+", type=int, default=[1, 8], help="Concurrent connections/sessions.")
+    ap.add_argument("--size", type=int, default=64, help="Payload bytes.")
+    ap.add_argument("--delay-ms", type=float, default=10.0, help="One-way delay for the accuracy cases (0 = skip).")
+    ap.add_argument("--cpu", type=int, help="Pin the client to this CPU.")
+    ap.add_argument("--save", help="Write results JSON.")
+    ap.add_argument("--compare", help="Compare with a saved results JSON.")
+    ap.add_argument("--noise", type=float, default=0.05, help="Relative change treated as noise in --compare.")
+    ap.add_argument("--echo-server", nargs=2, type=int, metavar=("TCP", "UDP"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.echo_server:
+        asyncio.run(_echo_server(*args.echo_server))
+        return
+
+    old = bc.load_results(args.compare, "proxy") if args.compare else None
+    pinned = bc.pin_cpu(args.cpu)
+    tcp_port, udp_port = free_port(socket.SOCK_STREAM), free_port(socket.SOCK_DGRAM)
+    echo = subprocess.Popen([sys.executable, "-u", __file__, "--echo-server", str(tcp_port), str(udp_port)],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    results: Dict[str, Dict[str, float]] = {}
+    rows = []
+    try:
+        wait_line(echo, "echo ready")
+        # CPU proxy bez ruchu (start interpretera + nasłuch) odejmowane od przypadków
+        p, _, _ = start_proxy("none", tcp_port, udp_port)
+        idle_cpu = stop_proxy(p)
+        delay_profile = json.dumps({"delay_ms": args.delay_ms})
+        for transport in ("tcp", "udp"):
+            direct_port = tcp_port if transport == "tcp" else udp_port
+            for conns in args.conns:
+                print(f"[bench] {transport} conns={conns} ...", file=sys.stderr)
+                direct = ping_pong(transport, direct_port, args.n, conns, args.size)
+                cases = [("none", f"{transport}_c{conns}")]
+                if args.delay_ms > 0:
+                    cases.append((delay_profile, f"{transport}_c{conns}_delay{args.delay_ms:g}ms"))
+                results[f"{transport}_c{conns}_direct"] = direct
+                rows.append({"case": f"{transport}_c{conns}_direct", **direct})
+                for profile, case in cases:
+                    p, ptcp, pudp = start_proxy(profile, tcp_port, udp_port)
+                    try:
+                        res = ping_pong(transport, ptcp if transport == "tcp" else pudp, args.n, conns, args.size)
+                    finally:
+                        cpu = stop_proxy(p)
+                    res["overhead_p50_us"] = res["rtt_p50_us"] - direct["rtt_p50_us"]
+                    res["proxy_cpu_us_per_msg"] = max(cpu - idle_cpu, 0.0) * 1e6 / res["msgs"] if res["msgs"] else None
+                    if profile != "none":
+                        res["delay_err_us"] = res["overhead_p50_us"] - 2000.0 * args.delay_ms
+                    results[case] = res
+                    rows.append({"case": case, **res})
+    finally:
+        echo.terminate()
+        echo.wait()
+
+    print(f"n={args.n} size={args.size}B cpu={pinned if pinned is not None else 'any'}")
+    bc.print_table(rows, [
+        ("case", "case", "{}"), ("msgs_per_s", "msg/s", "{:.0f}"), ("rtt_p50_us", "p50 us", "{:.1f}"),
+        ("rtt_p99_us", "p99 us", "{:.1f}"), ("overhead_p50_us", "+p50 us", "{:.1f}"),
+        ("proxy_cpu_us_per_msg", "proxy cpu us/msg", "{:.1f}"), ("delay_err_us", "delay err us", "{:+.0f}"),
+        ("lost", "lost", "{}"),
+    ])
+    if old is not None:
+        print("\n".join(bc.compare(old, results, METRICS, args.noise)))
+    if args.save:
+        params = {"n": args.n, "conns": args.conns, "size": args.size, "delay_ms": args.delay_ms, "cpu": pinned}
+        print(f"saved {bc.save_results(args.save, 'proxy', params, results)}")
+
+
+if __name__ == "__main__":
+    main()
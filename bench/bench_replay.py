@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Dokładność harmonogramu client/trace_replay.py bez sieci i serwerów.
+
+Sztuczny ślad (odstępy wykładnicze o średniej --gap-ms, jedno urządzenie, plik
+tymczasowy) odtwarzany przez Replay.wait() (pętla jak http_loop / mqtt_loop) albo
+Replay.wait_async() (jak coap_loop), z pustą "wysyłką". Dla każdego REPLAY_SPIN_US
+z --spins:
+
+  dev_p50/p99/max_us   osiągnięta - zamierzona chwila powrotu z wait(),
+  within_100us         udział wysyłek z odchyłką <= 100 us,
+  cpu_pct              CPU procesu / czas ściany (koszt aktywnego czekania).
+
+spin 0 = sam sen (time.sleep / asyncio.sleep), więc widać, ile daje busy-wait i ile
+kosztuje. Wynik to dolna granica odchyłek w przebiegu: tam dochodzi rywalizacja o CPU
+z serwerem i innymi klientami (sched_p99_us w replay_*.json).
+
+Uruchom:
+  python bench/bench_replay.py [-n 2000] [--gap-ms 5] [--spins 0 200 500 1000] [--cpu 0]
+  python bench/bench_replay.py --save bench/results/replay_$(git rev-parse --short HEAD).json
+  python bench/bench_replay.py --compare bench/results/replay_abc1234.json
+"""
+import argparse
+import asyncio
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import bench_common as bc
+
+sys.path.insert(0, str(bc.ROOT_DIR / "client"))
+import trace_replay  # noqa: E402
+
+METRICS = [("dev_p50_us", -1), ("dev_p99_us", -1), ("cpu_pct", -1)]
+TMP = Path(tempfile.mkdtemp(prefix="bench_replay_"))
+atexit.register(shutil.rmtree, TMP, True)
+
+
+def make_trace(n: int, gap_ms: float, seed: int) -> Path:
+    rng = random.Random(seed)
+    path = TMP / f"trace_{n}_{gap_ms:g}.csv"
+    t = 0.0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("ts,device,size\n")
+        for _ in range(n):
+            t += rng.expovariate(1000.0 / gap_ms)
+            f.write(f"{t:.6f},dev,\n")
+    return path
+
+
+def run_case(trace: Path, spin_us: float, use_async: bool) -> Dict[str, float]:
+    env = {"REPLAY_SPIN_US": str(spin_us), "REPLAY_LEAD": "0.05", "ARRIVAL_N": "1"}
+    rep = trace_replay.Replay(str(trace), "1", None, env=env)
+    c0, w0 = time.process_time(), time.perf_counter()
+    if use_async:
+        async def loop() -> None:
+            await rep.begin_async()
+            while not rep.done:
+                await rep.wait_async()
+        asyncio.run(loop())
+    else:
+        rep.begin()
+        while not rep.done:
+            rep.wait()
+    wall = time.perf_counter() - w0
+    cpu = time.process_time() - c0
+    s = rep.summary()
+    return {"dev_p50_us": s["dev_p50_us"], "dev_p99_us": s["dev_p99_us"], "dev_max_us": s["dev_max_us"],
+            "within_100us": s["within_100us"], "cpu_pct": 100.0 * cpu / wall, "sent": s["sent"]}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Schedule accuracy of the trace replay engine (no network).")
+    ap.add_argument("-n", type=int, default=2000, help="Trace rows per case.")
+    ap.add_argument("--gap-ms", type=float, default=5.0, help="Mean inter-arrival of the synthetic trace.")
+    ap.add_argument("--spins", nargs="+", type=float, default=[0, 200, 500, 1000], help="REPLAY_SPIN_US values.")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--cpu", type=int, help="Pin to this CPU.")
+    ap.add_argument("--save", help="Write results JSON.")
+    ap.add_argument("--compare", help="Compare with a saved results JSON.")
+    ap.add_argument("--noise", type=float, default=0.05, help="Relative change treated as noise in --compare.")
+    args = ap.parse_args()
+
+    old = bc.load_results(args.compare, "replay") if args.compare else None
+    pinned = bc.pin_cpu(args.cpu)
+    trace = make_trace(args.n, args.gap_ms, args.seed)
+    results: Dict[str, Dict[str, float]] = {}
+    rows: List[Dict[str, object]] = []
+    for use_async in (False, True):
+        for spin in args.spins:
+            case = f"{'async' if use_async else 'sync'}_spin{spin:g}us"
+            print(f"[bench] {case} ...", file=sys.stderr)
+            res = run_case(trace, spin, use_async)
+            results[case] = res
+            rows.append({"case": case, **res})
+
+    print(f"n={args.n} gap={args.gap_ms:g}ms cpu={pinned if pinned is not None else 'any'} "
+          f"(os.cpu_count={os.cpu_count()})")
+    bc.print_table(rows, [
+        ("case", "case", "{}"), ("dev_p50_us", "p50 us", "{:.1f}"), ("dev_p99_us", "p99 us", "{:.1f}"),
+        ("dev_max_us", "max us", "{:.0f}"), ("within_100us", "<=100us", "{:.1%}"), ("cpu_pct", "cpu %", "{:.1f}"),
+    ])
+    if old is not None:
+        print("\n".join(bc.compare(old, results, METRICS, args.noise)))
+    if args.save:
+        params = {"n": args.n, "gap_ms": args.gap_ms, "spins": args.spins, "seed": args.seed, "cpu": pinned}
+        print(f"saved {bc.save_results(args.save, 'replay', params, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Przepustowość handlerów serwerów w procesie, bez sieci i klientów.
+
+- http: servers/http_server.py:app wołana bezpośrednio jako aplikacja WSGI
+  (environ zbudowany raz przez werkzeug.test.EnvironBuilder, nowy wsgi.input
+  na żądanie) - routing Flask, widok, auth i budowa odpowiedzi; bez serwera
+  deweloperskiego werkzeug (gniazdo, parsowanie HTTP, log dostępu),
+- coap: servers/coap_server.py:Root - Message.decode(bajty z UDP), Site.render
+  (routing + SensorResource.render_post z logging.info do /dev/null) i
+  encode() odpowiedzi; bez transportu UDP i warstwy wiadomości aiocoap
+  (retransmisje, deduplikacja).
+
+Macierz: --protos x --modes (open/auth z poprawnym tokenem) x --sizes (bajty
+payloadu JSON jak z klienta, dopełnione polem "pad"). Na konfigurację -r
+powtórzeń po -n żądaniach (jednowątkowo, po rozgrzewce):
+
+  req_per_s        żądania/s zegarem = maks. przepustowość jednego rdzenia,
+  cpu_us_per_req   CPU procesu (time.process_time) na żądanie,
+  p50/p99_us       czas pojedynczego żądania (perf_counter_ns),
+  spread           rozrzut IQR cpu_us_per_req między powtórzeniami.
+
+Na końcu model kosztu per proto/mode: cpu_us ~ a + b * bajty (regresja po
+rozmiarach), do zestawienia z CPU/wiadomość serwera z resource_usage.py.
+
+Uruchom:
+  python bench/bench_servers.py [--protos http coap] [--modes open auth] [--sizes 64 512 4096] [--cpu 0]
+  python bench/bench_servers.py --save bench/results/servers_$(git rev-parse --short HEAD).json
+  python bench/bench_servers.py --compare bench/results/servers_abc1234.json
+"""
+import argparse
+import asyncio
+import gc
+import importlib
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import types
+from typing import Callable, Dict, List, Tuple
+
+import bench_common as bc
+
+SERVERS_DIR = bc.ROOT_DIR / "servers"
+TOKEN = "supersekret123"
+PROTOS = ["http", "coap"]
+MODES = ["open", "auth"]
+METRICS = [("req_per_s", +1), ("cpu_us_per_req", -1), ("p50_us", -1), ("p99_us", -1)]
+
+# moduły serwerów czytają env przy imporcie; prof_hooks wyłączony
+for k in ("PROF_PHASES", "PROF_MODE"):
+    os.environ.pop(k, None)
+os.environ.update(AUTH_MODE="open", API_TOKEN=TOKEN)
+sys.path.insert(0, str(SERVERS_DIR))
+sys.path.insert(1, str(bc.ROOT_DIR / "client"))  # prof_hooks
+
+
+def make_payload(size: int) -> bytes:
+    """JSON jak z klienta ({"id", "ts", "val"}), dopełniony do size bajtów (nie mniej niż bazowy)."""
+    base = {"id": "1", "ts": time.time(), "val": 42}
+    body = json.dumps(base).encode("utf-8")
+    if size > len(body):
+        pad = size - len(body) - len(', "pad": ""')
+        base["pad"] = "x" * max(pad, 0)
+        body = json.dumps(base).encode("utf-8")
+    return body
+
+
+# ---------- HTTP (WSGI) ----------
+
+def http_runner(mode: str, body: bytes) -> Callable[[], int]:
+    from werkzeug.test import EnvironBuilder
+    server = importlib.import_module("http_server")
+    server.AUTH_MODE, server.API_TOKEN = mode, TOKEN
+    headers = {"Content-Type": "application/json"}
+    if mode == "auth":
+        headers["Authorization"] = f"Bearer {TOKEN}"
+    builder = EnvironBuilder(path="/post", method="POST", data=body, headers=headers)
+    base = builder.get_environ()
+    builder.close()
+    wsgi = server.app.wsgi_app
+    status = []
+
+    def start_response(st, hdrs, exc_info=None):
+        status.append(st)
+
+    def one() -> int:
+        env = dict(base)
+        env["wsgi.input"] = io.BytesIO(body)
+        status.clear()
+        it = wsgi(env, start_response)
+        try:
+            for _ in it:
+                pass
+        finally:
+            if hasattr(it, "close"):
+                it.close()
+        return int(status[0].split(" ", 1)[0])
+
+    return one
+
+
+# ---------- CoAP (Site) ----------
+
+def coap_runner(mode: str, body: bytes, loop: asyncio.AbstractEventLoop) -> Callable[[], int]:
+    from aiocoap import CON, Code, Message
+    server = importlib.import_module("coap_server")
+    server.AUTH_MODE, server.API_TOKEN = mode, TOKEN
+    # logging.info w render_post zostaje (koszt formatowania), ale do /dev/null
+    root = logging.getLogger()
+    for h in root.handlers:
+        if isinstance(h, logging.StreamHandler):
+            h.setStream(open(os.devnull, "w"))
+    uri = "coap://127.0.0.1/sensors" + (f"?token={TOKEN}" if mode == "auth" else "")
+    req = Message(code=Code.POST, uri=uri, payload=body)
+    req.mtype, req.mid, req.token = CON, 1, b"\x01\x02"
+    wire = req.encode()
+    # zamiast adresu z transportu UDP (Site.render składa z niego URI żądania)
+    remote = types.SimpleNamespace(scheme="coap", hostinfo="127.0.0.1:40000", hostinfo_local="127.0.0.1:5683",
+                                   uri_base="coap://127.0.0.1:40000", uri_base_local="coap://127.0.0.1:5683",
+                                   is_multicast=False, is_multicast_locally=False)
+    site = server.Root()
+
+    async def handle() -> int:
+        msg = Message.decode(wire, remote)
+        resp = await site.render(msg)
+        resp.mid, resp.token = msg.mid, msg.token
+        if resp.mtype is None:
+            resp.mtype = CON
+        resp.encode()
+        return resp.code
+
+    async def batch(n: int) -> List[int]:
+        out = []
+        for _ in range(n):
+            t0 = time.perf_counter_ns()
+            code = await handle()
+            out.append(time.perf_counter_ns() - t0)
+            if not code.is_successful():
+                raise RuntimeError(f"coap: unexpected response {code}")
+        return out
+
+    def run_batch(n: int) -> List[int]:
+        return loop.run_until_complete(batch(n))
+
+    return run_batch
+
+
+def _sync_batch(one: Callable[[], int]) -> Callable[[int], List[int]]:
+    def run_batch(n: int) -> List[int]:
+        out = []
+        for _ in range(n):
+            t0 = time.perf_counter_ns()
+            code = one()
+            out.append(time.perf_counter_ns() - t0)
+            if code >= 400:
+                raise RuntimeError(f"http: unexpected status {code}")
+        return out
+
+    return run_batch
+
+
+def bench_config(run_batch: Callable[[int], List[int]], n: int, repeats: int, warmup: int) -> Dict[str, float]:
+    if warmup:
+        run_batch(warmup)
+    cpu, rate, lat = [], [], []
+    for _ in range(repeats):
+        gc.collect()
+        c0, w0 = time.process_time(), time.perf_counter()
+        lat = run_batch(n)
+        wall = time.perf_counter() - w0
+        cpu.append((time.process_time() - c0) / n * 1e6)
+        rate.append(n / wall)
+    lat_us = sorted(v / 1e3 for v in lat)  # ostatnie powtórzenie
+    cpu_med, spread = bc.summarize(cpu)
+    return {
+        "req_per_s": statistics.median(rate),
+        "cpu_us_per_req": cpu_med,
+        "p50_us": bc.percentile(lat_us, 0.5),
+        "p99_us": bc.percentile(lat_us, 0.99),
+        "spread": spread,
+    }
+
+
+def cost_model(rows: List[Dict[str, object]]) -> List[str]:
+    """cpu_us_per_req ~ a + b * bytes per proto/mode (najmniejsze kwadraty po rozmiarach)."""
+    lines = []
+    groups: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+    for r in rows:
+        groups.setdefault((r["proto"], r["mode"]), []).append((r["bytes"], r["cpu_us_per_req"]))
+    for (proto, mode), pts in groups.items():
+        if len({x for x, _ in pts}) < 2:
+            lines.append(f"  {proto}/{mode}: {pts[0][1]:.1f} us/req at {pts[0][0]:.0f} B")
+            continue
+        b, a = statistics.linear_regression([x for x, _ in pts], [y for _, y in pts])
+        lines.append(f"  {proto}/{mode}: {a:.1f} us {b * 1000:+.2f} us/kB")
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="In-process throughput of the Flask app and the aiocoap Site.")
+    ap.add_argument("--protos", nargs="+", default=PROTOS, choices=PROTOS)
+    ap.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    ap.add_argument("--sizes", nargs="+", type=int, default=[64, 256, 1024, 4096],
+                    help="Payload sizes in bytes (JSON padded; smaller than the base payload = base).")
+    ap.add_argument("-n", type=int, default=5000, help="Requests per repeat.")
+    ap.add_argument("-r", "--repeats", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=500)
+    ap.add_argument("--cpu", type=int, help="Pin to this CPU (more stable numbers).")
+    ap.add_argument("--save", help="Write results JSON.")
+    ap.add_argument("--compare", help="Compare with a saved results JSON.")
+    ap.add_argument("--noise", type=float, default=0.05, help="Relative change treated as noise in --compare.")
+    args = ap.parse_args()
+
+    old = bc.load_results(args.compare, "servers") if args.compare else None
+    pinned = bc.pin_cpu(args.cpu)
+    loop = asyncio.new_event_loop()
+    results: Dict[str, Dict[str, float]] = {}
+    rows = []
+    try:
+        for proto in args.protos:
+            for mode in args.modes:
+                for size in args.sizes:
+                    body = make_payload(size)
+                    case = f"{proto}_{mode}_{size}B"
+                    print(f"[bench] {case} ...", file=sys.stderr)
+                    if proto == "http":
+                        run_batch = _sync_batch(http_runner(mode, body))
+                    else:
+                        run_batch = coap_runner(mode, body, loop)
+                    res = bench_config(run_batch, args.n, args.repeats, args.warmup)
+                    results[case] = res
+                    rows.append({"case": case, "proto": proto, "mode": mode, "bytes": len(body), **res})
+    finally:
+        loop.close()
+
+    print(f"n={args.n} repeats={args.repeats} cpu={pinned if pinned is not None else 'any'}")
+    bc.print_table(rows, [
+        ("case", "case", "{}"), ("bytes", "bytes", "{}"), ("req_per_s", "req/s", "{:.0f}"),
+        ("cpu_us_per_req", "cpu us/req", "{:.1f}"), ("p50_us", "p50 us", "{:.1f}"), ("p99_us", "p99 us", "{:.1f}"),
+        ("spread", "spread", "{:.1%}"),
+    ])
+    print("cost model (cpu per request):")
+    print("\n".join(cost_model(rows)))
+    if old is not None:
+        print("\n".join(bc.compare(old, results, METRICS, args.noise)))
+    if args.save:
+        params = {"n": args.n, "repeats": args.repeats, "warmup": args.warmup, "cpu": pinned, "sizes": args.sizes}
+        print(f"saved {bc.save_results(args.save, 'servers', params, results)}")
+
+
+if __name__ == "__main__":
+    main()
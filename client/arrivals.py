@@ -0,0 +1,220 @@
+# arrivals.py
+"""
+Modele przybyć klienta: kiedy wysłać następną wiadomość (zamiast stałego sleep(FREQ)).
+
+Zmienne środowiskowe:
+  ARRIVAL=fixed        (domyślnie) jak dotąd: sleep(FREQ) po każdej wiadomości, okres = FREQ + RTT
+  ARRIVAL=periodic     stały okres FREQ liczony od startu (bez dryfu o czas obsługi)
+  ARRIVAL=jitter       okres FREQ * (1 ± ARRIVAL_JITTER), jednostajnie (domyślnie 0.1)
+  ARRIVAL=poisson      odstępy wykładnicze o średniej FREQ (proces Poissona)
+  ARRIVAL=burst        cykl pracy: ARRIVAL_BURST_N wiadomości co ARRIVAL_BURST_GAP s, potem
+                       przerwa tak, żeby średni okres nadal wynosił FREQ
+  ARRIVAL=trace        odstępy z pliku ARRIVAL_TRACE (jedna liczba w s na wiersz albo pierwsza
+                       kolumna CSV), zapętlone, start od losowej pozycji
+  ARRIVAL_PHASE=none | random (przesunięcie U[0, FREQ) przed pierwszą wiadomością)
+                     | spread ((ID-1)/ARRIVAL_N * FREQ, równo rozłożone po flocie;
+                       bez ARRIVAL_N > 0 ValueError)
+                     liczone od wspólnej chwili startu (mtime START_FILE), więc
+                     periodic + none = cała flota naraz, periodic + spread = równy rozkład
+  ARRIVAL_SEED=...     ziarno; generator klienta = Random("<seed>:<ID>"), więc ta sama flota
+                       z tym samym ziarnem wysyła w tych samych chwilach. Bez ziarna losowane
+                       i zapisywane.
+
+Modele inne niż fixed trzymają harmonogram bezwzględny (monotonic): jeśli odpowiedź
+przyszła po czasie kolejnego wysłania, wiadomość idzie od razu, a harmonogram
+przesuwa się do "teraz" (bez nadrabiania zaległości); takie przypadki są liczone
+jako late. Opis modelu, ziarno i liczniki trafiają do arrival_<RUN_ID>_<PROTO>_id<ID>.json
+obok metrics_*.csv (przy starcie i na końcu procesu), tylko gdy model lub faza nie są
+domyślne (fixed + none nie zapisuje pliku).
+"""
+import asyncio
+import atexit
+import json
+import os
+import random
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+MODELS = ("fixed", "periodic", "jitter", "poisson", "burst", "trace")
+PHASES = ("none", "random", "spread")
+SLEEP_SLICE = 0.5  # maks. pojedynczy sen, żeby STOP_FILE działał przy długich przerwach
+
+
+def load_trace(path: str) -> List[float]:
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cell = line.split(",", 1)[0].strip()
+            try:
+                v = float(cell)
+            except ValueError:
+                continue  # nagłówek / komentarz
+            if v >= 0:
+                out.append(v)
+    if not out:
+        raise ValueError(f"ARRIVAL_TRACE {path}: no inter-arrival values")
+    return out
+
+
+class Arrivals:
+    def __init__(self, freq: float, client_id: str, state_path: Optional[str] = None, env=os.environ):
+        self.freq = freq
+        self.client_id = client_id
+        self.state_path = state_path
+        self.model = env.get("ARRIVAL", "fixed").strip().lower() or "fixed"
+        if self.model not in MODELS:
+            raise ValueError(f"ARRIVAL={self.model!r}, expected one of {MODELS}")
+        self.phase_mode = env.get("ARRIVAL_PHASE", "none").strip().lower() or "none"
+        if self.phase_mode not in PHASES:
+            raise ValueError(f"ARRIVAL_PHASE={self.phase_mode!r}, expected one of {PHASES}")
+        self.seed = env.get("ARRIVAL_SEED") or str(random.SystemRandom().randrange(2 ** 32))
+        self.rng = random.Random(f"{self.seed}:{client_id}")
+        self.jitter = float(env.get("ARRIVAL_JITTER", "0.1"))
+        self.burst_n = max(int(env.get("ARRIVAL_BURST_N", "5")), 1)
+        self.burst_gap = float(env.get("ARRIVAL_BURST_GAP", "0.05"))
+        self.fleet = int(env.get("ARRIVAL_N", "0") or 0)
+        self.trace_path = env.get("ARRIVAL_TRACE") or None
+        if self.model == "trace" and not self.trace_path:
+            raise ValueError("ARRIVAL=trace needs ARRIVAL_TRACE")
+        if self.phase_mode == "spread" and self.fleet <= 0:
+            raise ValueError("ARRIVAL_PHASE=spread needs ARRIVAL_N > 0 (fleet size)")
+        self.trace = load_trace(self.trace_path) if self.model == "trace" else None
+        # fixed + none = zachowanie sprzed arrivals.py: bez kotwicy startu i bez arrival_*.json
+        self.default = self.model == "fixed" and self.phase_mode == "none"
+        self.gaps = self._gaps()
+        self.phase_s = self._phase()
+        self.next_t: Optional[float] = None
+        self.sent = 0
+        self.late = 0
+        self.max_late_s = 0.0
+        self.started: Optional[float] = None
+        # wspólny interfejs z trace_replay.Replay: rozmiar payloadu (None = domyślny), koniec ruchu
+        self.size: Optional[int] = None
+        self.done = False
+
+    # --- model ---
+
+    def _gaps(self) -> Iterator[float]:
+        f, rng = self.freq, self.rng
+        if self.model in ("fixed", "periodic"):
+            while True:
+                yield f
+        elif self.model == "jitter":
+            while True:
+                yield max(f * (1.0 + rng.uniform(-self.jitter, self.jitter)), 0.0)
+        elif self.model == "poisson":
+            while True:
+                yield rng.expovariate(1.0 / f) if f > 0 else 0.0
+        elif self.model == "burst":
+            idle = max(self.burst_n * f - (self.burst_n - 1) * self.burst_gap, 0.0)
+            while True:
+                for _ in range(self.burst_n - 1):
+                    yield self.burst_gap
+                yield idle
+        else:
+            i = rng.randrange(len(self.trace))
+            while True:
+                yield self.trace[i]
+                i = (i + 1) % len(self.trace)
+
+    def _phase(self) -> float:
+        if self.phase_mode == "random":
+            return self.rng.uniform(0.0, self.freq)
+        if self.phase_mode == "spread":
+            try:
+                idx = int(self.client_id) - 1
+            except ValueError:
+                return self.rng.uniform(0.0, self.freq)
+            return (idx % self.fleet) / self.fleet * self.freq
+        return 0.0
+
+    def describe(self) -> Dict[str, object]:
+        d = {"model": self.model, "seed": self.seed, "phase": self.phase_mode, "phase_offset_s": self.phase_s,
+             "freq_s": self.freq, "client_id": self.client_id}
+        if self.model == "jitter":
+            d["jitter"] = self.jitter
+        elif self.model == "burst":
+            d.update(burst_n=self.burst_n, burst_gap_s=self.burst_gap)
+        elif self.model == "trace":
+            d.update(trace=self.trace_path, trace_len=len(self.trace))
+        if self.phase_mode == "spread":
+            d["fleet"] = self.fleet
+        return d
+
+    def save(self) -> None:
+        if not self.state_path:
+            return
+        data = dict(self.describe(), started=self.started, sent=self.sent, late=self.late,
+                    max_late_s=round(self.max_late_s, 6))
+        try:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.state_path)
+        except OSError:
+            pass
+
+    # --- harmonogram ---
+
+    def _after_send(self) -> float:
+        """Ile spać po wysłaniu wiadomości (aktualizuje harmonogram i liczniki late)."""
+        self.sent += 1
+        gap = next(self.gaps)
+        if self.model == "fixed":
+            return gap
+        now = time.monotonic()
+        self.next_t += gap
+        if self.next_t < now:
+            late = now - self.next_t
+            self.late += 1
+            if late > self.max_late_s:
+                self.max_late_s = late
+            self.next_t = now
+        return self.next_t - now
+
+    def _begin(self, anchor: Optional[float]) -> float:
+        self.started = time.time()
+        delay = self.phase_s
+        if anchor is not None and not self.default:
+            # faza liczona od wspólnej chwili startu floty, nie od chwili, w której ten
+            # klient zauważył START_FILE (odpytywanie co 0.2 s rozsynchronizowałoby flotę)
+            delay = anchor + self.phase_s - self.started
+            if delay < 0 and self.freq > 0:
+                delay %= self.freq  # spóźniony start: następny slot tej samej siatki
+        delay = max(delay, 0.0)
+        self.next_t = time.monotonic() + delay
+        if not self.default:
+            self.save()
+            atexit.register(self.save)
+        return delay
+
+    def begin(self, stop: Callable[[], bool] = lambda: False, anchor: Optional[float] = None) -> None:
+        """Przed pierwszą wiadomością: przesunięcie fazy względem anchor (czas startu floty, time.time())."""
+        _sleep(self._begin(anchor), stop)
+
+    def wait(self, stop: Callable[[], bool] = lambda: False) -> None:
+        _sleep(self._after_send(), stop)
+
+    async def begin_async(self, stop: Callable[[], bool] = lambda: False, anchor: Optional[float] = None) -> None:
+        await _sleep_async(self._begin(anchor), stop)
+
+    async def wait_async(self, stop: Callable[[], bool] = lambda: False) -> None:
+        await _sleep_async(self._after_send(), stop)
+
+
+def _sleep(seconds: float, stop: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + seconds
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0 or stop():
+            return
+        time.sleep(min(left, SLEEP_SLICE))
+
+
+async def _sleep_async(seconds: float, stop: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + seconds
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0 or stop():
+            return
+        await asyncio.sleep(min(left, SLEEP_SLICE))
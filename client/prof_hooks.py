@@ -0,0 +1,237 @@
+# prof_hooks.py
+"""
+Opcjonalna instrumentacja klienta i serwerów (domyślnie wyłączona, koszt ~ jedno wywołanie no-op).
+
+Zmienne środowiskowe:
+  PROF_PHASES=1        liczniki faz: count / suma / max / histogram log2 (ns) per faza,
+                       zrzut do PROF_OUT/phases_<tag>.json (na końcu + co PROF_DUMP_S s)
+  PROF_MODE=sample     próbkujący profiler (wątek czytający sys._current_frames() co
+                       PROF_INTERVAL_MS, wszystkie wątki) -> profile_<tag>.folded (flamegraph.pl /
+                       speedscope) + profile_<tag>.txt (top funkcji)
+  PROF_MODE=cprofile   cProfile głównego wątku -> profile_<tag>.prof (pstats / snakeviz)
+  PROF_WINDOW=30       profiler tylko przez pierwsze N s (0 = do końca procesu)
+  PROF_OUT=dir         katalog zrzutów (klient: OUT_DIR, czyli obok metrics_*.csv)
+
+Fazy w kodzie:
+    t = PH.start()
+    ...serializacja...
+    t = PH.lap("serialize", t)      # zapisuje czas od t, zwraca "teraz" na następną fazę
+    PH.add("wait", ns)              # gotowy czas (np. między wątkami)
+
+Liczniki bez blokad: każda faza jest zapisywana z jednego wątku (np. MQTT: publish w
+głównym, odbiór w wątku paho), więc wyścigi co najwyżej gubią pojedyncze próbki.
+"""
+import atexit
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+NBUCKETS = 40  # 2^39 ns ~ 9 min
+
+
+class PhaseTimers:
+    def __init__(self):
+        self.phases: Dict[str, List] = {}  # name -> [count, total_ns, max_ns, buckets]
+        self.started = time.time()
+
+    start = staticmethod(time.perf_counter_ns)
+
+    def add(self, name: str, ns: int) -> None:
+        p = self.phases.get(name)
+        if p is None:
+            p = self.phases[name] = [0, 0, 0, [0] * NBUCKETS]
+        p[0] += 1
+        p[1] += ns
+        if ns > p[2]:
+            p[2] = ns
+        p[3][min(max(ns, 1).bit_length() - 1, NBUCKETS - 1)] += 1
+
+    def lap(self, name: str, t0: int) -> int:
+        now = time.perf_counter_ns()
+        self.add(name, now - t0)
+        return now
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for name, (count, total, mx, buckets) in list(self.phases.items()):
+            out[name] = {
+                "count": count, "total_ms": total / 1e6, "mean_us": total / count / 1e3 if count else 0.0,
+                "max_us": mx / 1e3, "p50_us": _bucket_q(buckets, count, 0.5), "p99_us": _bucket_q(buckets, count, 0.99),
+                "log2_ns_buckets": {str(i): c for i, c in enumerate(buckets) if c},
+            }
+        return out
+
+
+class NullTimers:
+    """Wyłączone liczniki - te same metody, nic nie robią."""
+
+    phases: Dict[str, List] = {}
+
+    @staticmethod
+    def start() -> int:
+        return 0
+
+    def add(self, name: str, ns: int) -> None:
+        pass
+
+    def lap(self, name: str, t0: int) -> int:
+        return 0
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {}
+
+
+def _bucket_q(buckets: List[int], count: int, q: float) -> Optional[float]:
+    """Kwantyl z histogramu log2: środek geometryczny kubełka [2^k, 2^(k+1)) ns, w us."""
+    if not count:
+        return None
+    rank = q * (count - 1)
+    acc = 0
+    for k, c in enumerate(buckets):
+        acc += c
+        if acc > rank:
+            return (2 ** k) * 1.4142135623730951 / 1e3
+    return None
+
+
+class SamplingProfiler(threading.Thread):
+    """Próbkowanie stosów wszystkich wątków (bez zależności) -> zliczone "folded stacks"."""
+
+    def __init__(self, interval_s: float, until: Optional[float]):
+        super().__init__(name="prof-sampler", daemon=True)
+        self.interval = interval_s
+        self.until = until
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            if self.until is not None and time.monotonic() >= self.until:
+                break
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    co = frame.f_code
+                    stack.append(f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})")
+                    frame = frame.f_back
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def dump(self, folded_path: str, top_path: str) -> None:
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        self_cnt: Counter = Counter()
+        incl: Counter = Counter()
+        for stack, n in self.stacks.items():
+            frames = stack.split(";")
+            self_cnt[frames[-1]] += n
+            for fr in set(frames[1:]):
+                incl[fr] += n
+        total = sum(self.stacks.values()) or 1
+        with open(top_path, "w", encoding="utf-8") as f:
+            f.write(f"samples={self.samples} interval={self.interval * 1000:.1f}ms stacks={total}\n\n")
+            f.write(f"{'self%':>7} {'incl%':>7}  function\n")
+            for fn, n in self_cnt.most_common(40):
+                f.write(f"{100 * n / total:7.2f} {100 * incl[fn] / total:7.2f}  {fn}\n")
+
+
+class Hooks:
+    def __init__(self, tag: str, out_dir: str):
+        self.tag = tag
+        self.out_dir = out_dir
+        self.timers = PhaseTimers() if os.environ.get("PROF_PHASES", "0") not in ("", "0") else NullTimers()
+        self.mode = os.environ.get("PROF_MODE", "").lower()
+        window = float(os.environ.get("PROF_WINDOW", "0") or 0)
+        self.until = time.monotonic() + window if window > 0 else None
+        self.dump_every = float(os.environ.get("PROF_DUMP_S", "10") or 0)
+        self.last_dump = time.monotonic()
+        self.cprof = None
+        self.sampler: Optional[SamplingProfiler] = None
+        self.done = False
+        self.lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return isinstance(self.timers, PhaseTimers) or self.mode in ("sample", "cprofile")
+
+    def _path(self, prefix: str, ext: str) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        return os.path.join(self.out_dir, f"{prefix}_{self.tag}.{ext}")
+
+    def start(self) -> None:
+        if self.mode == "cprofile":
+            import cProfile
+            self.cprof = cProfile.Profile()
+            self.cprof.enable()
+        elif self.mode == "sample":
+            interval = float(os.environ.get("PROF_INTERVAL_MS", "5")) / 1000.0
+            self.sampler = SamplingProfiler(interval, self.until)
+            self.sampler.start()
+        if self.active:
+            atexit.register(self.finish)
+            if threading.current_thread() is threading.main_thread():
+                # docker stop / terminate() -> SystemExit, żeby atexit zrzucił wyniki
+                signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    def tick(self) -> None:
+        """Wołane w pętli (główny wątek): koniec okna cProfile + okresowy zrzut faz."""
+        now = time.monotonic()
+        if self.cprof is not None and self.until is not None and now >= self.until:
+            self._stop_cprofile()
+        if self.dump_every > 0 and now - self.last_dump >= self.dump_every:
+            self.last_dump = now
+            self.dump_phases()
+
+    def _stop_cprofile(self) -> None:
+        if self.cprof is None:
+            return
+        self.cprof.disable()
+        self.cprof.dump_stats(self._path("profile", "prof"))
+        self.cprof = None
+
+    def dump_phases(self) -> None:
+        if not isinstance(self.timers, PhaseTimers):
+            return
+        data = {"tag": self.tag, "pid": os.getpid(), "started": self.timers.started, "dumped": time.time(),
+                "phases": self.timers.snapshot()}
+        path = self._path("phases", "json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def finish(self) -> None:
+        with self.lock:
+            if self.done:
+                return
+            self.done = True
+        try:
+            self._stop_cprofile()
+            if self.sampler is not None:
+                self.sampler.stopped.set()
+                self.sampler.join(timeout=2)
+                self.sampler.dump(self._path("profile", "folded"), self._path("profile", "txt"))
+            self.dump_phases()
+        except OSError as e:
+            print(f"prof_hooks: dump failed: {e}", file=sys.stderr)
+
+
+def install(tag: str, out_dir: Optional[str] = None) -> Hooks:
+    """Konfiguracja z env; zwraca Hooks (hooks.timers to PhaseTimers albo NullTimers)."""
+    hooks = Hooks(tag, os.environ.get("PROF_OUT") or out_dir or ".")
+    hooks.start()
+    return hooks
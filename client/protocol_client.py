@@ -3,6 +3,9 @@ import asyncio, os, time, json, sys
 from asyncio_mqtt import Client
 
 from write_results import write_metric
+import prof_hooks
+import arrivals
+import trace_replay
 import os
 # from dotenv import load_dotenv
 
@@ -15,6 +18,7 @@ MQTT_PASS = os.environ.get("MQTT_PASS")
 ID = os.environ.get("ID", "1")
 FREQ = float(os.environ.get("FREQ", "1.0"))
 BROKER = os.environ.get("BROKER", "127.0.0.1")
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
 PROTO = os.environ.get("PROTO", "mqtt")  # mqtt / http / coap
 HTTP_URL = os.environ.get("HTTP_URL", "http://127.0.0.1:5000/post")
 COAP_HOST = os.environ.get("COAP_HOST", "127.0.0.1")
@@ -31,6 +35,19 @@ START_FILE_TIMEOUT = float(os.environ.get("START_FILE_TIMEOUT", "300"))
 READY_FILE = os.environ.get("READY_FILE")
 STOP_FILE = os.environ.get("STOP_FILE")
 
+# PROF_PHASES / PROF_MODE (prof_hooks.py): fazy serialize/send/wait/receive/log/record, profil obok CSV
+HOOKS = prof_hooks.Hooks(f"{RUN_ID}_{PROTO}_id{ID}", os.environ.get("PROF_OUT") or OUT_DIR)
+PH = HOOKS.timers
+# HTTP: przy PROF_PHASES kodowanie JSON przed t0, więc RTT bez niego (nieporównywalne z seriami bez faz)
+SPLIT_JSON = isinstance(PH, prof_hooks.PhaseTimers)
+# ARRIVAL / ARRIVAL_PHASE / ARRIVAL_SEED (arrivals.py): kiedy wysłać kolejną wiadomość; model i ziarno obok CSV
+# REPLAY_TRACE (trace_replay.py): zamiast modelu chwile i rozmiary wysyłek ze śladu, odchyłki obok CSV
+REPLAY_TRACE = os.environ.get("REPLAY_TRACE")
+if REPLAY_TRACE:
+    ARR = trace_replay.Replay(REPLAY_TRACE, ID, os.path.join(OUT_DIR, f"replay_{RUN_ID}_{PROTO}_id{ID}.json"))
+else:
+    ARR = arrivals.Arrivals(FREQ, ID, os.path.join(OUT_DIR, f"arrival_{RUN_ID}_{PROTO}_id{ID}.json"))
+
 def log(*args, **kwargs):
     print(*args, **kwargs)
     sys.stdout.flush()
@@ -38,6 +55,14 @@ def log(*args, **kwargs):
 def emit(ts, rtt=None, status="", error=""):
     write_metric(CSV_PATH, RUN_ID, PROTO, ID, ts, rtt=rtt, status=status, error=error)
 
+def padded(payload, size):
+    """Dopełnij payload polem "pad" do size bajtów JSON (rozmiar ze śladu); None = bez zmian."""
+    if size:
+        pad = size - len(json.dumps(payload)) - len(', "pad": ""')
+        if pad > 0:
+            payload["pad"] = "x" * pad
+    return payload
+
 def write_ready_file():
     if not READY_FILE:
         return
@@ -62,6 +87,13 @@ def wait_for_start_file():
             return
         time.sleep(0.2)
 
+def start_anchor():
+    """Wspólna chwila startu floty (mtime START_FILE) dla faz arrivals.py; None bez START_FILE."""
+    try:
+        return os.path.getmtime(START_FILE) if START_FILE else None
+    except OSError:
+        return None
+
 def should_stop() -> bool:
     return bool(STOP_FILE) and os.path.exists(STOP_FILE)
 
@@ -69,29 +101,51 @@ def http_loop():
     import requests
     log(f"HTTP LOOP START id={ID} url={HTTP_URL}")
     samples = 0
+    got_headers = [0]  # perf_counter_ns po nagłówkach odpowiedzi (hook requests) -> send_wait / receive
+
+    def on_response(r, *args, **kwargs):
+        got_headers[0] = PH.start()
+
+    resp_hook = {"response": on_response}
+    ARR.begin(should_stop, start_anchor())
     while True:
         if should_stop():
             log(f"HTTP LOOP STOP id={ID} stop_file={STOP_FILE}")
             return
-        if MAX_SAMPLES > 0 and samples >= MAX_SAMPLES:
+        if (MAX_SAMPLES > 0 and samples >= MAX_SAMPLES) or ARR.done:
             log(f"HTTP LOOP DONE id={ID} samples={samples}")
             return
-        payload = {"id": ID, "ts": time.time(), "val": 42}
+        t = PH.start()
+        payload = padded({"id": ID, "ts": time.time(), "val": 42}, ARR.size)
+        headers = {}
+        if AUTH_MODE == "auth":
+            headers["Authorization"] = f"Bearer {API_TOKEN}"
+        if SPLIT_JSON:
+            # to samo co json=..., ale kodowanie JSON poza RTT (osobna faza serialize)
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+            send = {"data": body}
+        else:
+            send = {"json": payload}  # RTT z kodowaniem JSON, jak w seriach bez PROF_PHASES
+        t = PH.lap("serialize", t)
         t0 = time.time()
         try:
-            headers = {}
-            if AUTH_MODE == "auth":
-                headers["Authorization"] = f"Bearer {API_TOKEN}"
-            r = requests.post(HTTP_URL, json=payload, headers=headers, timeout=5)
+            r = requests.post(HTTP_URL, headers=headers, timeout=5, hooks=resp_hook, **send)
             t1 = time.time()
+            t_hdr = got_headers[0] or t
+            PH.add("send_wait", t_hdr - t)
+            t = PH.lap("receive", t_hdr)
             rtt = t1 - t0
             log(f"METRIC RTT http id={ID} ts={t1:.6f} rtt={rtt:.6f} status={r.status_code}")
+            t = PH.lap("log", t)
             emit(t1, rtt=rtt, status=str(r.status_code))
+            PH.lap("record", t)
         except Exception as e:
             log(f"ERR HTTP id={ID} {e}")
             emit(time.time(), error=str(e))
         samples += 1
-        time.sleep(FREQ)
+        HOOKS.tick()
+        ARR.wait(should_stop)
 
 def mqtt_loop():
     import paho.mqtt.client as mqtt
@@ -99,18 +153,25 @@ def mqtt_loop():
     topic = f"sensors/{ID}"
     log(f"MQTT LOOP START id={ID} broker={BROKER}")
     samples = 0
+    sent_at = [0]  # perf_counter_ns po publish(); klient czeka na echo przed kolejnym (FREQ >> RTT)
 
     def on_connect(client, userdata, flags, rc):
         client.subscribe(topic)
 
     def on_message(client, userdata, msg):
         try:
+            t = PH.start()
             t1 = time.time()
+            if sent_at[0]:
+                PH.add("wait", t - sent_at[0])  # broker + wątek sieciowy paho w obie strony
             data = json.loads(msg.payload.decode())
             t0 = float(data.get("t0", t1))
             rtt = t1 - t0
+            t = PH.lap("deserialize", t)
             log(f"METRIC RTT mqtt id={ID} ts={t1:.6f} rtt={rtt:.6f}")
+            t = PH.lap("log", t)
             emit(t1, rtt=rtt, status="OK")
+            PH.lap("record", t)
         except Exception as e:
             emit(time.time(), error=str(e))
 
@@ -123,7 +184,7 @@ def mqtt_loop():
 
     while True:
         try:
-            client.connect(BROKER, 1883, 60)
+            client.connect(BROKER, MQTT_PORT, 60)
             break
         except Exception as e:
             # Keep retrying instead of exiting the container when the broker is down
@@ -133,24 +194,30 @@ def mqtt_loop():
 
     client.loop_start()
 
+    ARR.begin(should_stop, start_anchor())
     while True:
         if should_stop():
             log(f"MQTT LOOP STOP id={ID} stop_file={STOP_FILE}")
             client.loop_stop()
             client.disconnect()
             return
-        if MAX_SAMPLES > 0 and samples >= MAX_SAMPLES:
+        if (MAX_SAMPLES > 0 and samples >= MAX_SAMPLES) or ARR.done:
             log(f"MQTT LOOP DONE id={ID} samples={samples}")
             client.loop_stop()
             client.disconnect()
             return
+        t = PH.start()
         t0 = time.time()
-        info = client.publish(topic, json.dumps({"id": ID, "t0": t0}))
+        body = json.dumps(padded({"id": ID, "t0": t0}, ARR.size))
+        t = PH.lap("serialize", t)
+        info = client.publish(topic, body)
+        sent_at[0] = PH.lap("send", t)  # kolejka paho -> zapis w wątku sieciowym
         if info.rc != mqtt.MQTT_ERR_SUCCESS:
             log(f"MQTT publish failed id={ID} rc={info.rc}")
             emit(time.time(), error=f"mqtt_publish_failed:{info.rc}")
         samples += 1
-        time.sleep(FREQ)
+        HOOKS.tick()
+        ARR.wait(should_stop)
 
 
 async def coap_loop():
@@ -159,36 +226,47 @@ async def coap_loop():
     base_uri = f"coap://{COAP_HOST}:{COAP_PORT}/{COAP_RESOURCE}"
     log(f"COAP LOOP START id={ID} uri={base_uri}")
     samples = 0
+    await ARR.begin_async(should_stop, start_anchor())
     while True:
         if should_stop():
             log(f"COAP LOOP STOP id={ID} stop_file={STOP_FILE}")
             return
-        if MAX_SAMPLES > 0 and samples >= MAX_SAMPLES:
+        if (MAX_SAMPLES > 0 and samples >= MAX_SAMPLES) or ARR.done:
             log(f"COAP LOOP DONE id={ID} samples={samples}")
             return
-        payload = {"id": ID, "ts": time.time(), "val": 42}
+        t = PH.start()
+        payload = padded({"id": ID, "ts": time.time(), "val": 42}, ARR.size)
         uri = base_uri
         if AUTH_MODE == "auth" and API_TOKEN:
             uri = f"{base_uri}?token={API_TOKEN}"
 
         request = Message(code=Code.POST, uri=uri, payload=json.dumps(payload).encode())
+        t = PH.lap("serialize", t)
         t0 = time.time()
         try:
-            _ = await protocol.request(request).response
+            pending = protocol.request(request)
+            t = PH.lap("send", t)  # synchroniczna część aiocoap (tokeny, MID, kolejka)
+            _ = await pending.response
             t1 = time.time()
+            t = PH.lap("wait", t)
             rtt = t1 - t0
             log(f"METRIC RTT coap id={ID} ts={t1:.6f} rtt={rtt:.6f}")
+            t = PH.lap("log", t)
             emit(t1, rtt=rtt, status="OK")
+            PH.lap("record", t)
         except Exception as e:
             log(f"ERR COAP id={ID} {e}")
             emit(time.time(), error=str(e))
         samples += 1
-        await asyncio.sleep(FREQ)
+        HOOKS.tick()
+        await ARR.wait_async(should_stop)
 
 if __name__ == "__main__":
     log(f"CLIENT START id={ID} proto={PROTO} freq={FREQ} run_id={RUN_ID} out={OUT_DIR}")
+    log("ARRIVAL " + " ".join(f"{k}={v}" for k, v in ARR.describe().items()))
     write_ready_file()
     wait_for_start_file()
+    HOOKS.start()
 
     if PROTO == "http":
         http_loop()
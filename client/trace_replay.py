@@ -0,0 +1,256 @@
+# trace_replay.py
+"""
+Odtwarzanie śladu ruchu (trace) w pętlach protocol_client.py zamiast modelu z arrivals.py.
+
+Format śladu (CSV, opcjonalnie .gz, posortowany po ts):
+  ts,device,size
+  1718000000.125,sensor-17,48
+  1718000000.310,sensor-03,
+  ts      sekundy (epoch albo względne, float); liczy się tylko odstęp od pierwszego wiersza
+  device  dowolny identyfikator urządzenia
+  size    bajty payloadu JSON (puste = domyślny payload klienta)
+Wiersze zaczynające się od "#" i nagłówek są pomijane. tools/trace_tool.py nagrywa
+ślad z wyników przebiegu i konwertuje ślady z innych źródeł.
+
+Zmienne środowiskowe:
+  REPLAY_TRACE=plik    włącza odtwarzanie
+  REPLAY_SPEED=1       tempo: 2 = dwa razy szybciej, 0.5 = dwa razy wolniej
+  REPLAY_MAP=order     urządzenia -> klienci: order (k-te nowe urządzenie w śladzie ->
+                       klient k mod N, równy podział), hash (crc32(device) mod N),
+                       mod (device jako liczba mod N)
+  REPLAY_LEAD=1.0      s od startu floty (mtime START_FILE) do pierwszego wiersza śladu
+  REPLAY_SPIN_US=500   końcówka oczekiwania aktywnie (busy-wait) zamiast snu - dokładność
+                       poniżej ms; w pętli asyncio dodatkowo 1 ms, bo epoll budzi z
+                       dokładnością do ms
+  ARRIVAL_N=N          liczba klientów (jak w arrivals.py)
+
+Plik czytany strumieniowo (pamięć ~ liczba urządzeń przy order, stała przy hash/mod).
+Klient wysyła wiersze swoich urządzeń o czasie origin + (ts - ts0) / REPLAY_SPEED;
+gdy poprzednia odpowiedź przyszła po czasie, wysyła od razu (odchyłka > 0, bez
+pomijania wierszy). Odchyłka = chwila powrotu z wait() (tuż przed budową payloadu)
+minus chwila zamierzona; podsumowanie w replay_<RUN_ID>_<PROTO>_id<ID>.json:
+dev_* dla wszystkich wysyłek (osiągnięte vs zamierzone), sched_* tylko dla tych,
+na które klient czekał (sam błąd harmonogramu), behind = wiersze, których czas
+minął w trakcie poprzedniej wymiany (klient w zamkniętej pętli nie nadąża:
+więcej klientów albo mniejsze REPLAY_SPEED).
+Po ostatnim wierszu pętla klienta kończy się jak przy MAX_SAMPLES.
+"""
+import asyncio
+import atexit
+import gzip
+import json
+import os
+import time
+import zlib
+from array import array
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+MAPS = ("order", "hash", "mod")
+ASYNC_EXTRA_SPIN = 0.001
+SLEEP_SLICE = 0.5  # jak w arrivals.py: STOP_FILE sprawdzany przy długich przerwach
+
+
+def _q(sorted_vals, p: float) -> float:
+    return round(sorted_vals[min(int(p * len(sorted_vals)), len(sorted_vals) - 1)], 1)
+
+
+def open_trace(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def iter_trace(path: str) -> Iterator[Tuple[float, str, Optional[int]]]:
+    """(ts, device, size|None) wiersz po wierszu; ValueError przy cofnięciu czasu."""
+    last = None
+    with open_trace(path) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            cells = line.split(",")
+            try:
+                ts = float(cells[0])
+            except ValueError:
+                if lineno == 1 or last is None:
+                    continue  # nagłówek
+                raise ValueError(f"{path}:{lineno}: bad ts {cells[0]!r}")
+            if last is not None and ts < last:
+                raise ValueError(f"{path}:{lineno}: ts goes back ({ts} < {last}); sort the trace")
+            last = ts
+            device = cells[1].strip() if len(cells) > 1 else ""
+            size = cells[2].strip() if len(cells) > 2 else ""
+            yield ts, device, int(float(size)) if size else None
+
+
+def device_owner(mode: str, n: int) -> Callable[[str], int]:
+    """Funkcja device -> numer klienta 1..n (dla order: kolejność pierwszego wystąpienia)."""
+    if mode == "hash":
+        return lambda dev: zlib.crc32(dev.encode("utf-8")) % n + 1
+    if mode == "mod":
+        return lambda dev: int(float(dev)) % n + 1
+    seen: Dict[str, int] = {}
+
+    def order(dev: str) -> int:
+        if dev not in seen:
+            seen[dev] = len(seen) % n + 1
+        return seen[dev]
+    return order
+
+
+class Replay:
+    """Ten sam interfejs co arrivals.Arrivals (begin / wait / *_async) + size i done."""
+
+    def __init__(self, trace: str, client_id: str, state_path: Optional[str] = None, env=os.environ):
+        self.trace_path = trace
+        self.client_id = client_id
+        self.state_path = state_path
+        self.speed = float(env.get("REPLAY_SPEED", "1") or 1)
+        if self.speed <= 0:
+            raise ValueError(f"REPLAY_SPEED={self.speed}, must be > 0")
+        self.map_mode = env.get("REPLAY_MAP", "order").strip().lower() or "order"
+        if self.map_mode not in MAPS:
+            raise ValueError(f"REPLAY_MAP={self.map_mode!r}, expected one of {MAPS}")
+        self.fleet = max(int(env.get("ARRIVAL_N", "1") or 1), 1)
+        self.lead = float(env.get("REPLAY_LEAD", "1.0"))
+        self.spin = float(env.get("REPLAY_SPIN_US", "500")) / 1e6
+        try:
+            self.me = (int(client_id) - 1) % self.fleet + 1
+        except ValueError:
+            self.me = zlib.crc32(client_id.encode("utf-8")) % self.fleet + 1
+        self.rows = iter_trace(trace)
+        self.owner = device_owner(self.map_mode, self.fleet)
+        self.ts0: Optional[float] = None
+        self.origin: Optional[float] = None  # time.monotonic() odpowiadające ts0
+        self.due: Optional[float] = None     # zamierzona chwila bieżącej wysyłki
+        self.size: Optional[int] = None      # rozmiar payloadu bieżącej wysyłki
+        self.device: Optional[str] = None
+        self.done = False
+        self.devices = set()
+        self.dev_us = array("d")      # odchyłka każdej wysyłki
+        self.sched_us = array("d")    # tylko wysyłki, na które klient czekał (sam błąd harmonogramu)
+        self.behind = 0               # wiersze, których czas minął, zanim klient skończył poprzednią wymianę
+        self.started: Optional[float] = None
+
+    # --- ślad ---
+
+    def _next_row(self) -> bool:
+        """Przesuń się do następnego wiersza tego klienta; False = koniec śladu."""
+        for ts, device, size in self.rows:
+            if self.ts0 is None:
+                self.ts0 = ts
+            if self.owner(device) != self.me:
+                continue
+            self.devices.add(device)
+            self.due = self.origin + (ts - self.ts0) / self.speed
+            self.size, self.device = size, device
+            return True
+        self.done = True
+        return False
+
+    def describe(self) -> Dict[str, object]:
+        return {"model": "replay", "trace": self.trace_path, "speed": self.speed, "map": self.map_mode,
+                "fleet": self.fleet, "lead_s": self.lead, "spin_us": self.spin * 1e6, "client_id": self.client_id}
+
+    def summary(self) -> Dict[str, object]:
+        d = sorted(self.dev_us)
+        out: Dict[str, object] = {"sent": len(d), "devices": len(self.devices), "behind": self.behind}
+        if d:
+            out.update(dev_mean_us=round(sum(d) / len(d), 1), dev_p50_us=_q(d, 0.5), dev_p90_us=_q(d, 0.9),
+                       dev_p99_us=_q(d, 0.99), dev_max_us=round(d[-1], 1),
+                       within_100us=round(sum(1 for v in d if v <= 100) / len(d), 4),
+                       within_1ms=round(sum(1 for v in d if v <= 1000) / len(d), 4))
+        s = sorted(self.sched_us)
+        if s:
+            out.update(sched_p50_us=_q(s, 0.5), sched_p99_us=_q(s, 0.99), sched_max_us=round(s[-1], 1))
+        return out
+
+    def save(self) -> None:
+        if not self.state_path:
+            return
+        data = dict(self.describe(), started=self.started, done=self.done, **self.summary())
+        try:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.state_path)
+        except OSError:
+            pass
+
+    # --- harmonogram ---
+
+    def _begin(self, anchor: Optional[float]) -> None:
+        self.started = time.time()
+        mono = time.monotonic()
+        start = anchor if anchor is not None else self.started
+        self.origin = mono + (start + self.lead - self.started)
+        self.save()
+        atexit.register(self.save)
+        self._next_row()
+
+    def _arm(self) -> bool:
+        """Po _next_row(): czy czas wiersza już minął (zamknięta pętla nie nadąża)."""
+        late = time.monotonic() > self.due
+        self.behind += late
+        return late
+
+    def _record(self, late: bool) -> None:
+        dev = (time.monotonic() - self.due) * 1e6
+        self.dev_us.append(dev)
+        if not late:
+            self.sched_us.append(dev)
+
+    def begin(self, stop: Callable[[], bool] = lambda: False, anchor: Optional[float] = None) -> None:
+        """Przed pierwszą wiadomością: ustal origin śladu i czekaj na pierwszy własny wiersz."""
+        self._begin(anchor)
+        if not self.done:
+            late = self._arm()
+            if _sleep_until(self.due, self.spin, stop):
+                self._record(late)
+
+    def wait(self, stop: Callable[[], bool] = lambda: False) -> None:
+        if self._next_row():
+            late = self._arm()
+            if _sleep_until(self.due, self.spin, stop):
+                self._record(late)
+
+    async def begin_async(self, stop: Callable[[], bool] = lambda: False, anchor: Optional[float] = None) -> None:
+        self._begin(anchor)
+        if not self.done:
+            late = self._arm()
+            if await _sleep_until_async(self.due, self.spin, stop):
+                self._record(late)
+
+    async def wait_async(self, stop: Callable[[], bool] = lambda: False) -> None:
+        if self._next_row():
+            late = self._arm()
+            if await _sleep_until_async(self.due, self.spin, stop):
+                self._record(late)
+
+
+def _sleep_until(deadline: float, spin: float, stop: Callable[[], bool]) -> bool:
+    """Śpij do deadline - spin, potem busy-wait; False = przerwane przez stop()."""
+    while True:
+        left = deadline - time.monotonic()
+        if left <= spin:
+            break
+        if stop():
+            return False
+        time.sleep(min(left - spin, SLEEP_SLICE))
+    while time.monotonic() < deadline:
+        pass
+    return True
+
+
+async def _sleep_until_async(deadline: float, spin: float, stop: Callable[[], bool]) -> bool:
+    spin += ASYNC_EXTRA_SPIN
+    while True:
+        left = deadline - time.monotonic()
+        if left <= spin:
+            break
+        if stop():
+            return False
+        await asyncio.sleep(min(left - spin, SLEEP_SLICE))
+    while time.monotonic() < deadline:
+        pass
+    return True
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Równoległe tworzenie/usuwanie kontenerów klienckich przez Docker Engine API.
+
+Zastępuje sekwencyjne `docker run` z start_clients.sh i `docker rm -f` po jednym
+z stop_clients.sh. Rozmawia bezpośrednio z /var/run/docker.sock (tylko stdlib),
+z limitem równoległości (--parallel), raportuje czas startu każdego kontenera
+i kończy się błędem, jeśli któryś klient padnie zaraz po starcie.
+
+Użycie (start_clients.sh woła to automatycznie):
+  python3 scripts/docker_clients.py start N PROTO FREQ RUN_ID MODE
+  python3 scripts/docker_clients.py stop
+
+Kod wyjścia 3 = API Dockera niedostępne (start_clients.sh przechodzi wtedy na CLI).
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import socket
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DOCKER_SOCK = os.environ.get("DOCKER_SOCK", "/var/run/docker.sock")
+NETWORK = os.environ.get("DOCKER_NETWORK", "impact-of-iot_default")
+IMAGE = os.environ.get("CLIENT_IMAGE", "iot-client:latest")
+# cele klientów nadpisywane przez run_experiments.sh, gdy ruch idzie przez scripts/netem_proxy.py:
+# CLIENT_HTTP_URL, CLIENT_BROKER, CLIENT_COAP_HOST
+# instrumentacja klienta (client/prof_hooks.py), przekazywana tylko gdy ustawiona
+PROF_ENV = ("PROF_PHASES", "PROF_MODE", "PROF_WINDOW", "PROF_INTERVAL_MS", "PROF_DUMP_S")
+# model przybyć (client/arrivals.py); plik ARRIVAL_TRACE z hosta montowany jako TRACE_IN_CONTAINER
+ARRIVAL_ENV = ("ARRIVAL", "ARRIVAL_PHASE", "ARRIVAL_SEED", "ARRIVAL_JITTER", "ARRIVAL_BURST_N", "ARRIVAL_BURST_GAP")
+TRACE_IN_CONTAINER = "/arrival_trace"
+# odtwarzanie śladu (client/trace_replay.py); REPLAY_TRACE z hosta montowany jak ARRIVAL_TRACE
+REPLAY_ENV = ("REPLAY_SPEED", "REPLAY_MAP", "REPLAY_LEAD", "REPLAY_SPIN_US")
+REPLAY_IN_CONTAINER = "/replay_trace"
+API_UNAVAILABLE = 3
+
+
+class DockerAPIError(RuntimeError):
+    pass
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 60.0):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.unix_path)
+        self.sock = sock
+
+
+class DockerAPI:
+    """Cienki klient Engine API; jedno połączenie keep-alive na wątek."""
+
+    def __init__(self, sock_path: str = DOCKER_SOCK):
+        self.sock_path = sock_path
+        self._local = threading.local()
+
+    def _conn(self) -> UnixHTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = UnixHTTPConnection(self.sock_path)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, object]:
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in (0, 1):
+            conn = self._conn()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+                break
+            except (http.client.HTTPException, ConnectionError, socket.timeout):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        payload: object = None
+        if raw:
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                payload = raw.decode(errors="replace")
+        return resp.status, payload
+
+    def check(self, status: int, payload: object, what: str) -> None:
+        if status >= 300:
+            msg = payload.get("message") if isinstance(payload, dict) else payload
+            raise DockerAPIError(f"{what}: HTTP {status} {msg}")
+
+    def ping(self) -> bool:
+        try:
+            status, _ = self.request("GET", "/_ping")
+        except OSError:
+            return False
+        return status == 200
+
+    def list_clients(self, prefix: str = "client_") -> List[Dict[str, object]]:
+        filters = quote(json.dumps({"name": [prefix]}))
+        status, payload = self.request("GET", f"/containers/json?all=1&filters={filters}")
+        self.check(status, payload, "list containers")
+        return list(payload or [])
+
+    def create(self, name: str, config: dict) -> str:
+        status, payload = self.request("POST", f"/containers/create?name={quote(name)}", config)
+        self.check(status, payload, f"create {name}")
+        return payload["Id"]
+
+    def start(self, cid: str) -> None:
+        status, payload = self.request("POST", f"/containers/{cid}/start")
+        self.check(status, payload, f"start {cid[:12]}")
+
+    def inspect(self, cid: str) -> dict:
+        status, payload = self.request("GET", f"/containers/{cid}/json")
+        self.check(status, payload, f"inspect {cid[:12]}")
+        return payload
+
+    def remove(self, cid: str) -> None:
+        status, payload = self.request("DELETE", f"/containers/{cid}?force=1")
+        if status != 404:
+            self.check(status, payload, f"remove {cid[:12]}")
+
+
+def load_env_file(path: Path) -> List[str]:
+    """Semantyka `docker run --env-file`: KEY=VAL dosłownie, samo KEY bierze wartość z hosta."""
+    out: List[str] = []
+    if not path.exists():
+        return out
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=" in line:
+            out.append(line)
+        elif line in os.environ:
+            out.append(f"{line}={os.environ[line]}")
+    return out
+
+
+def client_config(i: int, args, results_dir: Path, env_file: List[str]) -> dict:
+    env = env_file + [
+        f"ID={i}",
+        f"FREQ={args.freq}",
+        f"PROTO={args.proto}",
+        f"AUTH_MODE={args.mode}",
+        f"HTTP_URL={os.environ.get('CLIENT_HTTP_URL', 'http://http-server:5000/post')}",
+        f"BROKER={os.environ.get('CLIENT_BROKER', 'mqtt-broker')}",
+        f"COAP_HOST={os.environ.get('CLIENT_COAP_HOST', 'coap-server')}",
+        f"COAP_PORT={os.environ.get('COAP_PORT', '5683')}",
+        f"COAP_RESOURCE={os.environ.get('COAP_RESOURCE', 'sensors')}",
+        "OUT_DIR=/results",
+        f"RUN_ID={args.run_id}",
+        f"START_FILE=/results/.start_{args.run_id}",
+        f"START_FILE_TIMEOUT={os.environ.get('START_FILE_TIMEOUT', '300')}",
+        f"STOP_FILE=/results/.stop_{args.run_id}",
+        f"MAX_SAMPLES={os.environ.get('MAX_SAMPLES', '0')}",
+        f"READY_FILE=/results/{args.ready_prefix}{i}",
+        f"ARRIVAL_N={args.n}",
+    ] + [f"{k}={os.environ[k]}" for k in PROF_ENV + ARRIVAL_ENV + REPLAY_ENV if k in os.environ]
+    binds = [f"{results_dir}:/results"]
+    for var, target in (("ARRIVAL_TRACE", TRACE_IN_CONTAINER), ("REPLAY_TRACE", REPLAY_IN_CONTAINER)):
+        trace = os.environ.get(var)
+        if trace:
+            env.append(f"{var}={target}")
+            binds.append(f"{Path(trace).resolve()}:{target}:ro")
+    return {
+        "Image": IMAGE,
+        "Env": env,
+        "HostConfig": {
+            "Binds": binds,
+            "NetworkMode": NETWORK,
+        },
+    }
+
+
+def remove_all(api: DockerAPI, parallel: int) -> int:
+    ids = [c["Id"] for c in api.list_clients()]
+    if not ids:
+        return 0
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as ex:
+        for fut in as_completed([ex.submit(api.remove, cid) for cid in ids]):
+            fut.result()
+    print(f"Removed {len(ids)} client containers")
+    return len(ids)
+
+
+def launch_one(api: DockerAPI, name: str, config: dict, abort: threading.Event) -> Tuple[str, str, float]:
+    if abort.is_set():
+        raise DockerAPIError(f"{name}: skipped after earlier failure")
+    t0 = time.perf_counter()
+    cid = api.create(name, config)
+    api.start(cid)
+    return name, cid, time.perf_counter() - t0
+
+
+def watch_early_exits(api: DockerAPI, started: Dict[str, str], seconds: float, parallel: int) -> List[str]:
+    """Po starcie przez `seconds` sprawdzaj, czy któryś kontener nie wyszedł z błędem."""
+    failed: List[str] = []
+    deadline = time.time() + seconds
+    while True:
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as ex:
+            states = dict(zip(started, ex.map(lambda cid: api.inspect(cid)["State"], started.values())))
+        for name, st in states.items():
+            if not st.get("Running"):
+                failed.append(f"{name} exit={st.get('ExitCode')} {st.get('Error') or ''}".strip())
+        if failed or time.time() >= deadline:
+            return failed
+        time.sleep(0.5)
+
+
+def cmd_start(api: DockerAPI, args) -> int:
+    results_base = Path(os.environ.get("RESULTS_DIR_BASE", str(ROOT_DIR / "results")))
+    results_dir = (results_base / args.run_id).resolve()
+    results_dir.mkdir(parents=True, exist_ok=True)
+    env_file = load_env_file(ROOT_DIR / "configs" / f".env.{args.mode}")
+
+    print(f"Starting {args.n} clients proto={args.proto} freq={args.freq} parallel={args.parallel}")
+    remove_all(api, args.parallel)
+
+    abort = threading.Event()
+    started: Dict[str, str] = {}
+    latencies: Dict[str, float] = {}
+    errors: List[str] = []
+    t_all = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as ex:
+        futs = [
+            ex.submit(launch_one, api, f"client_{args.proto}_{i}",
+                      client_config(i, args, results_dir, env_file), abort)
+            for i in range(1, args.n + 1)
+        ]
+        for fut in as_completed(futs):
+            try:
+                name, cid, dt = fut.result()
+                started[name] = cid
+                latencies[name] = dt
+            except Exception as e:
+                abort.set()
+                errors.append(str(e))
+    wall = time.perf_counter() - t_all
+
+    if errors:
+        for e in errors:
+            print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+
+    failed = watch_early_exits(api, started, args.watch, args.parallel) if args.watch > 0 else []
+
+    lat_path = results_dir / "client_start_latency.csv"
+    with lat_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["container", "start_latency_s"])
+        for name in sorted(latencies, key=lambda x: int(x.rsplit("_", 1)[1])):
+            w.writerow([name, f"{latencies[name]:.6f}"])
+    vals = sorted(latencies.values())
+    print(f"Started {len(started)}/{args.n} in {wall:.2f}s | start latency "
+          f"median={median(vals):.3f}s max={vals[-1]:.3f}s -> {lat_path}")
+    print(f"Results: {results_dir}")
+
+    if failed:
+        for f_ in failed:
+            print(f"[ERROR] client exited early: {f_}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Parallel client container lifecycle via Docker Engine API.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ap_start = sub.add_parser("start")
+    ap_start.add_argument("n", type=int)
+    ap_start.add_argument("proto")
+    ap_start.add_argument("freq")
+    ap_start.add_argument("run_id")
+    ap_start.add_argument("mode", nargs="?", default="open")
+    ap_start.add_argument("--watch", type=float, default=float(os.environ.get("START_WATCH", "3")),
+                          help="Seconds to watch for early container exits after start (0 = off).")
+    ap_stop = sub.add_parser("stop")
+    for p in (ap_start, ap_stop):
+        p.add_argument("--parallel", type=int, default=int(os.environ.get("PARALLEL", "16")),
+                       help="Max concurrent Engine API calls.")
+    args = ap.parse_args()
+
+    api = DockerAPI()
+    if not api.ping():
+        print(f"[INFO] Docker API not reachable at {DOCKER_SOCK}", file=sys.stderr)
+        sys.exit(API_UNAVAILABLE)
+
+    if args.cmd == "start":
+        args.ready_prefix = os.environ.get("READY_FILE_PREFIX", f".ready_{args.run_id}_")
+        sys.exit(cmd_start(api, args))
+    remove_all(api, args.parallel)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Proxy TCP + UDP w przestrzeni użytkownika, degradujący łącze między klientami a
+serwerami (http-server, mqtt-broker, coap-server) - zamiast tc/netem, które
+wymaga uprawnień (NET_ADMIN) na hoście albo w kontenerach.
+
+Profile (configs/impairment_profiles.json albo JSON inline w --profile) opisują
+jeden kierunek łącza; "up" (klient -> serwer) i "down" nadpisują wartości wspólne:
+
+  delay_ms, jitter_ms, dist   opóźnienie: const | uniform (delay ± jitter) | normal (gauss) |
+                              lognormal (mediana delay, sigma = jitter/delay) |
+                              pareto (minimum delay, ogon pareto_alpha)
+  loss, loss_burst            udział strat; loss_burst > 1 = serie strat (Gilbert-Elliott,
+                              średnia długość serii w pakietach)
+  duplicate                   prawdopodobieństwo duplikatu (UDP, własne opóźnienie kopii)
+  reorder                     prawdopodobieństwo wysłania pakietu bez opóźnienia, czyli przed
+                              wcześniejszymi (UDP, jak netem reorder)
+  rate_kbit, burst_bytes      kubełek tokenów (0 = bez limitu); queue_ms = maks. czas w kolejce,
+                              powyżej pakiet UDP jest odrzucany (TCP czeka)
+  shared                      true = jeden kubełek/stan strat na kierunek dla wszystkich klientów
+                              (wspólne łącze, np. bramka), false = osobne łącze per połączenie/klient
+  tcp_rto_ms                  TCP nie gubi bajtów: "strata" fragmentu strumienia = opóźnienie o RTO
+
+TCP: każdy odczyt (do 64 KiB) jest opóźniany w całości, kolejność zachowana;
+duplikaty i zmiana kolejności nie dotyczą strumienia. Nawiązanie połączenia
+nie jest opóźniane - pierwsze dane płacą zwykłe opóźnienie kierunku.
+UDP: sesja per adres klienta (osobne gniazdo do serwera), wygasa po --udp-idle s.
+
+Statystyki (pakiety/bajty, straty, odrzucenia z kolejki, duplikaty, zmiany
+kolejności, średnie dodane opóźnienie) per nasłuch i kierunek trafiają do
+--stats-out (JSON) co --stats-every s i przy SIGTERM/SIGINT.
+
+Uruchom:
+  python3 scripts/netem_proxy.py --profile nbiot --seed 1 \\
+      --map tcp:5000=http-server:5000 --map tcp:1883=mqtt-broker:1883 --map udp:5683=coap-server:5683 \\
+      [--stats-out impair_stats.json]
+  python3 scripts/netem_proxy.py --list
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import signal
+import socket
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PROFILES_FILE = ROOT_DIR / "configs" / "impairment_profiles.json"
+
+SPEC_DEFAULTS: Dict[str, object] = {
+    "delay_ms": 0.0, "jitter_ms": 0.0, "dist": "const", "pareto_alpha": 3.0,
+    "loss": 0.0, "loss_burst": 1.0, "duplicate": 0.0, "reorder": 0.0,
+    "rate_kbit": 0.0, "burst_bytes": 1500, "queue_ms": 1000.0, "shared": False,
+    "tcp_rto_ms": 200.0,
+}
+DISTS = ("const", "uniform", "normal", "lognormal", "pareto")
+DIRECTIONS = ("up", "down")
+TCP_CHUNK = 65536
+TCP_QUEUE = 256  # fragmentów w locie na kierunek, potem backpressure na czytającym
+
+
+# ---------- profile ----------
+
+def load_profiles(path: Path = PROFILES_FILE) -> Dict[str, dict]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {k: v for k, v in data.items() if not k.startswith("_")}
+
+
+def resolve_profile(name: str, path: Path = PROFILES_FILE) -> Dict[str, Dict[str, object]]:
+    """Nazwa profilu z pliku albo JSON inline -> {"up": spec, "down": spec} z wartościami domyślnymi."""
+    if name.lstrip().startswith("{"):
+        prof = json.loads(name)
+    else:
+        profiles = load_profiles(path)
+        if name not in profiles:
+            raise ValueError(f"unknown impairment profile {name!r} (known: {', '.join(sorted(profiles))})")
+        prof = profiles[name]
+    common = {k: v for k, v in prof.items() if k not in ("up", "down", "description")}
+    out = {}
+    for d in DIRECTIONS:
+        spec = dict(SPEC_DEFAULTS)
+        spec.update(common)
+        spec.update(prof.get(d) or {})
+        unknown = sorted(set(spec) - set(SPEC_DEFAULTS))
+        if unknown:
+            raise ValueError(f"{name}: unknown keys {unknown}")
+        if spec["dist"] not in DISTS:
+            raise ValueError(f"{name}: dist must be one of {DISTS}")
+        for k in ("loss", "duplicate", "reorder"):
+            if not 0.0 <= float(spec[k]) <= 1.0:
+                raise ValueError(f"{name}: {k} must be in [0, 1]")
+        out[d] = spec
+    return out
+
+
+# ---------- model łącza ----------
+
+class Link:
+    """Jeden kierunek łącza: próbkowanie opóźnienia, straty, kubełek tokenów."""
+
+    def __init__(self, spec: Dict[str, object], rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        self.delay = float(spec["delay_ms"]) / 1000.0
+        self.jitter = float(spec["jitter_ms"]) / 1000.0
+        self.dist = spec["dist"]
+        self.rate = float(spec["rate_kbit"]) * 125.0  # B/s
+        self.burst = float(max(int(spec["burst_bytes"]), 1))
+        self.queue = float(spec["queue_ms"]) / 1000.0
+        self.tokens = self.burst
+        self.t_last: Optional[float] = None
+        self.loss = float(spec["loss"])
+        burst = max(float(spec["loss_burst"]), 1.0)
+        self.ge_r = 1.0 / burst                 # zły -> dobry
+        self.ge_p = self.loss * self.ge_r / (1.0 - self.loss) if self.loss < 1.0 else 1.0  # dobry -> zły
+        self.bad = False
+        self.in_bursts = burst > 1.0
+
+    def lost(self) -> bool:
+        if self.loss <= 0.0:
+            return False
+        if not self.in_bursts:
+            return self.rng.random() < self.loss
+        if self.bad:
+            self.bad = self.rng.random() >= self.ge_r
+        else:
+            self.bad = self.rng.random() < self.ge_p
+        return self.bad
+
+    def sample_delay(self) -> float:
+        d, j = self.delay, self.jitter
+        if self.dist == "uniform":
+            v = d + self.rng.uniform(-j, j)
+        elif self.dist == "normal":
+            v = self.rng.gauss(d, j)
+        elif self.dist == "lognormal":
+            v = self.rng.lognormvariate(math.log(d), j / d) if d > 0 else 0.0
+        elif self.dist == "pareto":
+            v = d * self.rng.paretovariate(float(self.spec["pareto_alpha"]))
+        else:
+            v = d
+        return max(v, 0.0)
+
+    def admit(self, size: int, now: float, drop: bool = True) -> Optional[float]:
+        """Czas opuszczenia kubełka (>= now); None = przepełniona kolejka (tylko gdy drop)."""
+        if self.rate <= 0.0:
+            return now
+        if self.t_last is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.t_last) * self.rate)
+        self.t_last = now
+        wait = (size - self.tokens) / self.rate if self.tokens < size else 0.0
+        if drop and wait > self.queue:
+            return None
+        self.tokens -= size
+        return now + wait
+
+
+class Stats:
+    def __init__(self):
+        self.by_key: Dict[str, Counter] = {}
+
+    def get(self, key: str) -> Counter:
+        c = self.by_key.get(key)
+        if c is None:
+            c = self.by_key[key] = Counter()
+        return c
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for key, c in sorted(self.by_key.items()):
+            d = dict(c)
+            sent = c.get("delayed", 0)
+            d["mean_added_ms"] = round(1000.0 * c.get("added_s", 0.0) / sent, 3) if sent else None
+            d.pop("added_s", None)
+            out[key] = d
+        return out
+
+
+# ---------- proxy ----------
+
+class Listener:
+    def __init__(self, spec: str):
+        """tcp:[bind:]port=host:port"""
+        try:
+            left, right = spec.split("=", 1)
+            proto, rest = left.split(":", 1)
+            bind, _, port = rest.rpartition(":")
+            host, _, tport = right.rpartition(":")
+            self.proto = proto.lower()
+            self.bind, self.port = bind or "0.0.0.0", int(port)
+            self.target = (host, int(tport))
+        except ValueError:
+            raise ValueError(f"bad --map {spec!r}, expected tcp|udp:[bind:]port=host:port") from None
+        if self.proto not in ("tcp", "udp"):
+            raise ValueError(f"bad --map {spec!r}: proto must be tcp or udp")
+        self.name = f"{self.proto}:{self.port}"
+
+    def __str__(self):
+        return f"{self.proto} {self.bind}:{self.port} -> {self.target[0]}:{self.target[1]}"
+
+
+class ImpairmentProxy:
+    def __init__(self, listeners: List[Listener], profile: Dict[str, Dict[str, object]], seed: Optional[int],
+                 udp_idle: float = 120.0):
+        self.listeners = listeners
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.udp_idle = udp_idle
+        self.stats = Stats()
+        self.shared: Dict[Tuple[str, str], Link] = {}
+        self.servers: List[object] = []
+
+    def link(self, lst: Listener, direction: str) -> Link:
+        spec = self.profile[direction]
+        if spec["shared"]:
+            key = (lst.name, direction)
+            if key not in self.shared:
+                self.shared[key] = Link(spec, random.Random(self.rng.random()))
+            return self.shared[key]
+        return Link(spec, random.Random(self.rng.random()))
+
+    # --- TCP ---
+
+    async def _tcp_sender(self, queue: asyncio.Queue, writer: asyncio.StreamWriter, st: Counter) -> None:
+        loop = asyncio.get_running_loop()
+        broken = False
+        while True:
+            when, data = await queue.get()
+            if broken:  # po błędzie zapisu tylko opróżniamy kolejkę, żeby czytający nie utknął
+                if data is None:
+                    return
+                continue
+            dt = when - loop.time()
+            if dt > 0:
+                await asyncio.sleep(dt)
+            try:
+                if data is None:
+                    if writer.can_write_eof():
+                        writer.write_eof()
+                    return
+                writer.write(data)
+                await writer.drain()
+            except (ConnectionError, OSError):
+                st["conn_errors"] += 1
+                broken = True
+                writer.close()  # druga strona dostaje EOF/reset i zamyka swój kierunek
+
+    async def _tcp_pump(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, link: Link,
+                        st: Counter) -> None:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(TCP_QUEUE)
+        sender = asyncio.create_task(self._tcp_sender(queue, writer, st))
+        rto = float(link.spec["tcp_rto_ms"]) / 1000.0
+        last = 0.0
+        try:
+            while True:
+                data = await reader.read(TCP_CHUNK)
+                if not data:
+                    break
+                now = loop.time()
+                st["pkts"] += 1
+                st["bytes"] += len(data)
+                when = link.admit(len(data), now, drop=False) + link.sample_delay()
+                if link.lost():
+                    when += rto
+                    st["retransmitted"] += 1
+                when = max(when, last)  # strumień: kolejność zachowana
+                last = when
+                st["delayed"] += 1
+                st["added_s"] += when - now
+                await queue.put((when, data))
+            await queue.put((last, None))
+            await sender  # half-close; pełne zamknięcie po obu kierunkach w _handle_tcp
+        except (ConnectionError, OSError):
+            st["conn_errors"] += 1
+            writer.close()
+        finally:
+            if not sender.done():
+                sender.cancel()
+
+    async def _handle_tcp(self, lst: Listener, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        up_st, down_st = self.stats.get(f"{lst.name}/up"), self.stats.get(f"{lst.name}/down")
+        try:
+            up_r, up_w = await asyncio.open_connection(*lst.target)
+        except OSError:
+            up_st["connect_errors"] += 1
+            writer.close()
+            return
+        for w in (writer, up_w):
+            sock = w.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        up_st["conns"] += 1
+        await asyncio.gather(self._tcp_pump(reader, up_w, self.link(lst, "up"), up_st),
+                             self._tcp_pump(up_r, writer, self.link(lst, "down"), down_st),
+                             return_exceptions=True)
+        for w in (writer, up_w):
+            w.close()
+
+    # --- UDP ---
+
+    async def _start_udp(self, lst: Listener) -> None:
+        loop = asyncio.get_running_loop()
+        proxy = self
+        infos = await loop.getaddrinfo(*lst.target, type=socket.SOCK_DGRAM)
+        family, _, _, _, target_addr = infos[0]
+
+        class Session:
+            def __init__(self, addr, transport):
+                self.addr = addr
+                self.up = proxy.link(lst, "up")
+                self.down = proxy.link(lst, "down")
+                self.sock = socket.socket(family, socket.SOCK_DGRAM)
+                self.sock.setblocking(False)
+                self.sock.connect(target_addr)
+                self.transport = transport
+                self.seen = loop.time()
+                loop.add_reader(self.sock.fileno(), self.on_reply)
+
+            def on_reply(self):
+                while True:
+                    try:
+                        data = self.sock.recv(65535)
+                    except (BlockingIOError, InterruptedError):
+                        return
+                    except OSError:
+                        proxy.stats.get(f"{lst.name}/up")["send_errors"] += 1  # np. ICMP port unreachable
+                        return
+                    self.seen = loop.time()
+                    proxy._udp_forward(data, self.down, proxy.stats.get(f"{lst.name}/down"),
+                                       lambda d, a=self.addr: self.transport.sendto(d, a))
+
+            def send_up(self, data: bytes):
+                try:
+                    self.sock.send(data)
+                except OSError:
+                    proxy.stats.get(f"{lst.name}/up")["send_errors"] += 1
+
+            def close(self):
+                loop.remove_reader(self.sock.fileno())
+                self.sock.close()
+
+        class Proto(asyncio.DatagramProtocol):
+            def __init__(self):
+                self.sessions: Dict[object, Session] = {}
+                self.transport = None
+
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, addr):
+                s = self.sessions.get(addr)
+                if s is None:
+                    s = self.sessions[addr] = Session(addr, self.transport)
+                    proxy.stats.get(f"{lst.name}/up")["sessions"] += 1
+                s.seen = loop.time()
+                proxy._udp_forward(data, s.up, proxy.stats.get(f"{lst.name}/up"), s.send_up)
+
+            def expire(self):
+                now = loop.time()
+                for addr in [a for a, s in self.sessions.items() if now - s.seen > proxy.udp_idle]:
+                    self.sessions.pop(addr).close()
+
+        transport, proto = await loop.create_datagram_endpoint(Proto, local_addr=(lst.bind, lst.port))
+        self.servers.append(transport)
+
+        async def expire_loop():
+            while True:
+                await asyncio.sleep(min(30.0, self.udp_idle))
+                proto.expire()
+
+        self.servers.append(asyncio.create_task(expire_loop()))
+
+    def _udp_forward(self, data: bytes, link: Link, st: Counter, send) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        st["pkts"] += 1
+        st["bytes"] += len(data)
+        if link.lost():
+            st["lost"] += 1
+            return
+        depart = link.admit(len(data), now)
+        if depart is None:
+            st["queue_drops"] += 1
+            return
+        if link.rng.random() < link.spec["reorder"]:
+            when = depart  # bez opóźnienia -> wyprzedza pakiety w drodze
+            st["reordered"] += 1
+        else:
+            when = depart + link.sample_delay()
+        st["delayed"] += 1
+        st["added_s"] += when - now
+        loop.call_at(when, send, data)
+        if link.rng.random() < link.spec["duplicate"]:
+            st["duplicated"] += 1
+            loop.call_at(depart + link.sample_delay(), send, data)
+
+    # --- cykl życia ---
+
+    async def start(self) -> None:
+        for lst in self.listeners:
+            if lst.proto == "tcp":
+                server = await asyncio.start_server(lambda r, w, lst=lst: self._handle_tcp(lst, r, w),
+                                                    lst.bind, lst.port, reuse_address=True)
+                self.servers.append(server)
+            else:
+                await self._start_udp(lst)
+            print(f"listening {lst}", flush=True)
+
+    def close(self) -> None:
+        for s in self.servers:
+            if isinstance(s, asyncio.Task):
+                s.cancel()
+            else:
+                s.close()
+
+
+def write_stats(path: Optional[str], proxy: ImpairmentProxy, meta: Dict[str, object]) -> None:
+    if not path:
+        return
+    data = dict(meta, dumped=time.time(), stats=proxy.stats.snapshot())
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    Path(tmp).replace(path)
+
+
+async def run(args) -> None:
+    profile = resolve_profile(args.profile, Path(args.profiles))
+    proxy = ImpairmentProxy([Listener(m) for m in args.map], profile, args.seed, args.udp_idle)
+    meta = {"profile": args.profile, "seed": args.seed, "spec": profile, "maps": args.map, "started": time.time()}
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await proxy.start()
+    print(f"profile={args.profile} seed={args.seed} up={json.dumps(profile['up'], sort_keys=True)}", flush=True)
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=args.stats_every if args.stats_every > 0 else None)
+            except asyncio.TimeoutError:
+                write_stats(args.stats_out, proxy, meta)
+    finally:
+        proxy.close()
+        write_stats(args.stats_out, proxy, meta)
+    for key, st in proxy.stats.snapshot().items():
+        print(f"{key}: {st}", flush=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Userspace TCP/UDP proxy with delay, jitter, loss, "
+                                             "duplication, reordering and bandwidth limits.")
+    ap.add_argument("--map", action="append", default=[], help="tcp|udp:[bind:]port=host:port (repeatable).")
+    ap.add_argument("--profile", default="none", help="Profile name from --profiles, or inline JSON.")
+    ap.add_argument("--profiles", default=str(PROFILES_FILE), help="Profiles JSON file.")
+    ap.add_argument("--seed", type=int, help="RNG seed (reproducible loss/delay sequence per flow order).")
+    ap.add_argument("--udp-idle", type=float, default=120.0, help="Forget UDP sessions idle for this long (s).")
+    ap.add_argument("--stats-out", help="Write per-listener/direction counters (JSON).")
+    ap.add_argument("--stats-every", type=float, default=10.0, help="Stats dump period in s (0 = only at exit).")
+    ap.add_argument("--list", action="store_true", help="List profiles and exit.")
+    args = ap.parse_args()
+
+    if args.list:
+        for name, prof in load_profiles(Path(args.profiles)).items():
+            print(f"{name:<16} {prof.get('description', '')}")
+        return
+    if not args.map:
+        ap.error("at least one --map is required")
+    try:
+        asyncio.run(run(args))
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Próbkowanie zasobów w trakcie przebiegu: cgroup v2 kontenerów + host, co --interval s.
+
+Zastępuje pojedynczy snapshot `docker stats --no-stream` / `top -b -n1` / `free -h`
+z run_experiments.sh. Każdy tick dopisuje do CSV jeden wiersz na cel z SUROWYMI,
+narastającymi licznikami (delty liczy tools/resource_usage.py):
+
+  ts, name, component, cpu_usec, user_usec, system_usec, throttled_usec, mem_bytes,
+  io_rbytes, io_wbytes, net_rx_bytes, net_tx_bytes, net_rx_packets, net_tx_packets
+
+Cele:
+- kontenery z `docker ps` (ponowny skan co --rescan s, klienci startują później);
+  cgroup z /proc/<pid>/cgroup ("0::/system.slice/docker-<id>.scope" albo /docker/<id>),
+  czytane cpu.stat, memory.current, io.stat; sieć z /proc/<pid>/net/dev (netns kontenera),
+- --pid NAME=PID: zwykłe procesy (np. run_local.py) - /proc/<pid>/stat, statm, io
+  (bez sieci: proces dzieli netns z hostem, jest tylko w wierszu host),
+- host: /proc/stat, /proc/meminfo, /proc/net/dev (bez lo),
+- sampler: własne CPU/RSS, żeby było widać koszt pomiaru.
+
+Mały narzut: deskryptory plików są otwarte przez cały przebieg i czytane przez
+os.pread(fd, ..., 0); jedyny subprocess to `docker ps` przy rescanie. Wiersze
+idą do pliku co tick (flush), więc przerwany przebieg zostawia dane do tej pory.
+
+Tylko biblioteka standardowa - skrypt woła się z hosta (jak run_manifest.py).
+
+Użycie:
+  python3 scripts/resource_sampler.py --out results_X/resources_N10_mqtt.csv [--interval 0.5] [--duration 200]
+  python3 scripts/resource_sampler.py --out r.csv --no-docker --pid broker=1234 --pid http=1240
+  (kończy się po --duration, SIGTERM/SIGINT albo gdy pojawi się plik --stop-file)
+"""
+import argparse
+import csv
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+PROC = "/proc"
+FIELDS = [
+    "ts", "name", "component", "cpu_usec", "user_usec", "system_usec", "throttled_usec", "mem_bytes",
+    "io_rbytes", "io_wbytes", "net_rx_bytes", "net_tx_bytes", "net_rx_packets", "net_tx_packets",
+]
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def component_of(name: str) -> str:
+    """Nazwa kontenera / procesu -> komponent (clients, broker, server, ...)."""
+    n = name.lower()
+    if n.startswith("client"):
+        return "clients"
+    if "broker" in n or "mosquitto" in n:
+        return "broker"
+    if "proxy" in n:
+        return "proxy"
+    if "server" in n or n in ("http", "coap"):
+        return "server"
+    return "other"
+
+
+class _File:
+    """Plik /proc lub cgroup otwarty na cały przebieg; read() = pread od zera."""
+
+    __slots__ = ("path", "fd")
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            self.fd: Optional[int] = os.open(path, os.O_RDONLY)
+        except OSError:
+            self.fd = None
+
+    def read(self) -> Optional[str]:
+        if self.fd is None:
+            return None
+        try:
+            return os.pread(self.fd, 1 << 16, 0).decode("ascii", errors="replace")
+        except OSError:
+            self.close()
+            return None
+
+    def close(self) -> None:
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+
+def _kv(text: Optional[str]) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for line in (text or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            out[parts[0]] = int(parts[1])
+    return out
+
+
+def parse_io_stat(text: Optional[str]) -> Dict[str, int]:
+    """io.stat: "8:0 rbytes=.. wbytes=.. rios=.." per urządzenie -> suma."""
+    rb = wb = 0
+    for line in (text or "").splitlines():
+        for tok in line.split()[1:]:
+            k, _, v = tok.partition("=")
+            if k == "rbytes":
+                rb += int(v)
+            elif k == "wbytes":
+                wb += int(v)
+    return {"io_rbytes": rb, "io_wbytes": wb}
+
+
+def parse_net_dev(text: Optional[str], skip_lo: bool = True) -> Dict[str, int]:
+    rx = tx = rxp = txp = 0
+    for line in (text or "").splitlines()[2:]:
+        iface, _, rest = line.partition(":")
+        if skip_lo and iface.strip() == "lo":
+            continue
+        v = rest.split()
+        if len(v) >= 10:
+            rx += int(v[0]); rxp += int(v[1]); tx += int(v[8]); txp += int(v[9])
+    return {"net_rx_bytes": rx, "net_tx_bytes": tx, "net_rx_packets": rxp, "net_tx_packets": txp}
+
+
+def cgroup_dir_of(pid: int) -> Optional[str]:
+    """Katalog cgroup v2 procesu (wpis "0::" w /proc/<pid>/cgroup)."""
+    try:
+        with open(f"{PROC}/{pid}/cgroup", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    d = CGROUP_ROOT + line[3:].strip()
+                    return d if os.path.exists(os.path.join(d, "cpu.stat")) else None
+    except OSError:
+        pass
+    return None
+
+
+class Target:
+    """Jeden kontener / proces; sample() -> dict liczników (brakujące pomija)."""
+
+    def __init__(self, name: str, pid: Optional[int], cgroup: Optional[str], netns: bool = False):
+        self.name = name
+        self.component = component_of(name)
+        self.files: Dict[str, _File] = {}
+        if cgroup:
+            for key in ("cpu.stat", "memory.current", "io.stat"):
+                self.files[key] = _File(os.path.join(cgroup, key))
+        elif pid is not None:
+            for key in ("stat", "statm", "io"):
+                self.files[key] = _File(f"{PROC}/{pid}/{key}")
+        if pid is not None and netns:  # bez własnego netns (zwykły proces) liczniki byłyby hostowe
+            self.files["net"] = _File(f"{PROC}/{pid}/net/dev")
+        self.alive = any(f.fd is not None for f in self.files.values())
+
+    def sample(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        f = self.files
+        if "cpu.stat" in f:
+            st = _kv(f["cpu.stat"].read())
+            if st:
+                out.update(cpu_usec=st.get("usage_usec", 0), user_usec=st.get("user_usec", 0),
+                           system_usec=st.get("system_usec", 0), throttled_usec=st.get("throttled_usec", 0))
+            mem = f["memory.current"].read()
+            if mem and mem.strip().isdigit():
+                out["mem_bytes"] = int(mem)
+            io = f["io.stat"].read()
+            if io is not None:
+                out.update(parse_io_stat(io))
+        elif "stat" in f:
+            stat = f["stat"].read()
+            if stat:
+                v = stat[stat.rfind(")") + 2:].split()  # po "(comm)"; utime/stime to pola 14/15
+                user, system = int(v[11]) * 1_000_000 // CLK_TCK, int(v[12]) * 1_000_000 // CLK_TCK
+                out.update(cpu_usec=user + system, user_usec=user, system_usec=system)
+            statm = f["statm"].read()
+            if statm:
+                out["mem_bytes"] = int(statm.split()[1]) * PAGE
+            io = _kv((f["io"].read() or "").replace(":", ""))
+            if io:
+                out.update(io_rbytes=io.get("read_bytes", 0), io_wbytes=io.get("write_bytes", 0))
+        if "net" in f:
+            net = f["net"].read()
+            if net:
+                out.update(parse_net_dev(net))
+        if not out:
+            self.alive = False
+        return out
+
+    def close(self) -> None:
+        for fh in self.files.values():
+            fh.close()
+
+
+class HostTarget(Target):
+    def __init__(self):
+        self.name = "host"
+        self.component = "host"
+        self.files = {k: _File(f"{PROC}/{k}") for k in ("stat", "meminfo", "net/dev")}
+        self.alive = True
+
+    def sample(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        stat = self.files["stat"].read()
+        if stat:
+            v = [int(x) for x in stat.split("\n", 1)[0].split()[1:]]
+            # user nice system idle iowait irq softirq steal
+            user, system = (v[0] + v[1]) * 1_000_000 // CLK_TCK, (v[2] + v[5] + v[6]) * 1_000_000 // CLK_TCK
+            steal = v[7] * 1_000_000 // CLK_TCK if len(v) > 7 else 0
+            out.update(cpu_usec=user + system + steal, user_usec=user, system_usec=system)
+        mi = _kv((self.files["meminfo"].read() or "").replace(":", "").replace(" kB", ""))
+        if "MemTotal" in mi and "MemAvailable" in mi:
+            out["mem_bytes"] = (mi["MemTotal"] - mi["MemAvailable"]) * 1024
+        out.update(parse_net_dev(self.files["net/dev"].read()))
+        return out
+
+
+class SelfTarget(Target):
+    def __init__(self):
+        super().__init__("sampler", os.getpid(), None)
+        self.component = "sampler"
+
+
+class Sampler:
+    def __init__(self, out: Path, interval: float, docker: Optional[List[str]], pids: Dict[str, int],
+                 rescan: float = 5.0, name_filter: Optional[str] = None, host: bool = True):
+        self.out = out
+        self.interval = interval
+        self.docker = docker
+        self.rescan = rescan
+        self.name_filter = name_filter
+        self.targets: Dict[str, Target] = {}
+        for name, pid in pids.items():
+            self.targets[name] = Target(name, pid, None)  # cgroup zwykłego procesu = cała sesja, więc procfs
+        if host:
+            self.targets["host"] = HostTarget()
+        self.targets["sampler"] = SelfTarget()
+        self.seen: set = set()
+        self.last_scan = -1e18
+        self.stop = False
+
+    def scan_docker(self) -> None:
+        self.last_scan = time.monotonic()
+        try:
+            p = subprocess.run(self.docker + ["ps", "--no-trunc", "--format", "{{.ID}} {{.Names}}"],
+                               capture_output=True, text=True, timeout=10)
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"[WARN] docker ps failed: {e}", file=sys.stderr)
+            return
+        new = []
+        for line in p.stdout.splitlines():
+            cid, _, name = line.strip().partition(" ")
+            if cid and cid not in self.seen and (not self.name_filter or self.name_filter in name):
+                new.append((cid, name))
+        if not new:
+            return
+        try:
+            q = subprocess.run(self.docker + ["inspect", "-f", "{{.Id}} {{.State.Pid}}"] + [c for c, _ in new],
+                               capture_output=True, text=True, timeout=10)
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"[WARN] docker inspect failed: {e}", file=sys.stderr)
+            return
+        pid_of = dict(line.split() for line in q.stdout.splitlines() if len(line.split()) == 2)
+        for cid, name in new:
+            pid = int(pid_of.get(cid, "0"))
+            if pid <= 0:
+                continue
+            self.seen.add(cid)
+            cg = cgroup_dir_of(pid)
+            if cg is None:
+                print(f"[WARN] {name}: no cgroup v2 dir (cgroup v1 host?) - only /proc counters", file=sys.stderr)
+            self.targets[name] = Target(name, pid, cg, netns=True)
+
+    def run(self, duration: float = 0, stop_file: Optional[Path] = None) -> int:
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        t_end = time.monotonic() + duration if duration > 0 else None
+        ticks = 0
+        with open(self.out, "w", newline="", encoding="utf-8") as fh:
+            w = csv.DictWriter(fh, fieldnames=FIELDS)
+            w.writeheader()
+            next_t = time.monotonic()
+            while not self.stop:
+                if self.docker and time.monotonic() - self.last_scan >= self.rescan:
+                    self.scan_docker()
+                ts = round(time.time(), 3)
+                for t in list(self.targets.values()):
+                    if not t.alive:
+                        continue
+                    vals = t.sample()
+                    if vals:
+                        w.writerow({"ts": ts, "name": t.name, "component": t.component, **vals})
+                fh.flush()
+                ticks += 1
+                if (t_end is not None and time.monotonic() >= t_end) or (stop_file and stop_file.exists()):
+                    break
+                next_t += self.interval
+                delay = next_t - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_t = time.monotonic()  # nie nadrabiaj zaległych ticków seriami
+        for t in self.targets.values():
+            t.close()
+        return ticks
+
+
+def _parse_pids(items: List[str]) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for item in items:
+        name, _, pid = item.partition("=")
+        if not pid.isdigit():
+            raise SystemExit(f"[ERROR] --pid expects NAME=PID, got: {item}")
+        out[name] = int(pid)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Sample cgroup v2 / procfs resource counters into a CSV time series.")
+    ap.add_argument("--out", required=True, help="Output CSV (overwritten).")
+    ap.add_argument("--interval", type=float, default=1.0, help="Sampling period in seconds.")
+    ap.add_argument("--duration", type=float, default=0, help="Stop after N seconds (0 = until signal/stop file).")
+    ap.add_argument("--stop-file", help="Stop when this file appears (e.g. STOP_FILE of run_experiments.sh).")
+    ap.add_argument("--docker", default=os.environ.get("DOCKER_BIN", "docker"),
+                    help="Docker command (e.g. 'sudo docker'); default $DOCKER_BIN or docker.")
+    ap.add_argument("--no-docker", action="store_true", help="Do not look for containers.")
+    ap.add_argument("--filter", help="Only containers whose name contains this string.")
+    ap.add_argument("--rescan", type=float, default=5.0, help="How often to look for new containers (s).")
+    ap.add_argument("--pid", action="append", default=[], metavar="NAME=PID", help="Extra process to sample.")
+    ap.add_argument("--no-host", action="store_true", help="Skip the host-wide row.")
+    args = ap.parse_args()
+    if args.interval <= 0:
+        ap.error("--interval must be > 0")
+
+    sampler = Sampler(Path(args.out), args.interval, None if args.no_docker else shlex.split(args.docker),
+                      _parse_pids(args.pid), args.rescan, args.filter, host=not args.no_host)
+
+    def _stop(signum, frame):
+        sampler.stop = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    ticks = sampler.run(args.duration, Path(args.stop_file) if args.stop_file else None)
+    print(f"[INFO] resource samples: {ticks} ticks, {len(sampler.targets)} targets -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
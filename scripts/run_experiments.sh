@@ -5,6 +5,8 @@ PROTO=${2:-mqtt}
 DUR=${3:-180}
 OUT=${4:-exp}
 MODE=${5:-open}
+FREQ=${FREQ:-1}                 # interwał wysyłki klienta (s), trafia też do run_manifest.json
+RUN_STARTED=$(date +%s.%N)
 KEEP_CLIENTS=${KEEP_CLIENTS:-0}
 USE_SUDO_CAPTURE=${USE_SUDO_CAPTURE:-auto} # auto|always|never
 STARTUP_PAD=${STARTUP_PAD:-0}   # dodatkowe sekundy dla capture na rozruch wielu klientów
@@ -18,6 +20,24 @@ READY_WAIT_INTERVAL=${READY_WAIT_INTERVAL:-2}
 CAPTURE_IF=${CAPTURE_IF:-auto}   # interfejs do sniffingu (auto/any/br-*)
 CAPTURE_FILTER=${CAPTURE_FILTER:-} # opcjonalny filtr BPF dla tshark (-f), np. "tcp port 5000"
 STOP_WAIT=${STOP_WAIT:-5}       # ile czekać po STOP_FILE zanim zacznie zbieranie logów
+RESOURCE_INTERVAL=${RESOURCE_INTERVAL:-1} # okres próbkowania zasobów (s, cgroup v2 + host); 0 = wyłącz
+IMPAIR_PROFILE=${IMPAIR_PROFILE:-none}   # profil łącza z configs/impairment_profiles.json (scripts/netem_proxy.py); none = bez proxy
+IMPAIR_SEED=${IMPAIR_SEED:-}             # ziarno proxy (puste = losowe)
+IMPAIR_IMAGE=${IMPAIR_IMAGE:-python:3.11-slim} # obraz dla proxy (tylko stdlib)
+IMPAIR_NAME=impair-proxy
+# model przybyć klientów (client/arrivals.py): fixed|periodic|jitter|poisson|burst|trace
+export ARRIVAL=${ARRIVAL:-fixed}
+export ARRIVAL_PHASE=${ARRIVAL_PHASE:-none}   # none|random|spread (desynchronizacja startu)
+ARRIVAL_SEED=${ARRIVAL_SEED:-$RANDOM$RANDOM}  # wspólne dla floty -> powtarzalne chwile wysyłek, zapisane w manifeście
+export ARRIVAL_SEED
+# odtwarzanie śladu zamiast modelu (client/trace_replay.py, tools/trace_tool.py): REPLAY_TRACE=plik,
+# REPLAY_SPEED (2 = 2x szybciej), REPLAY_MAP=order|hash|mod; DUR >= czas śladu / REPLAY_SPEED
+REPLAY_TRACE=${REPLAY_TRACE:-}
+REPLAY_SPEED=${REPLAY_SPEED:-1}
+REPLAY_MAP=${REPLAY_MAP:-order}
+if [ -n "$REPLAY_TRACE" ]; then
+  export REPLAY_TRACE REPLAY_SPEED REPLAY_MAP
+fi
 LOGDIR=./results_${OUT}
 RUN_DIR="$LOGDIR/$OUT"
 CAPTURE_LOG=$LOGDIR/tshark.log
@@ -97,6 +117,47 @@ rm -f "$START_FILE" || true
 rm -f "$READY_PREFIX"* 2>/dev/null || true
 rm -f "$STOP_FILE" || true
 
+# próbkowanie zasobów (CPU/pamięć/IO/sieć per kontener + host) przez cały przebieg -> tools/resource_usage.py
+RES_FILE=$LOGDIR/resources_N${N}_${PROTO}.csv
+SAMPLER_PID=
+if [ "$RESOURCE_INTERVAL" != "0" ]; then
+  python3 ./scripts/resource_sampler.py --out "$RES_FILE" --interval "$RESOURCE_INTERVAL" --docker "$DOCKER_BIN" \
+    --duration $((CAPTURE_DUR + STARTUP_WAIT_MAX + READY_WAIT_MAX + STOP_WAIT + 60)) >>"$LOGDIR/resource_sampler.log" 2>&1 &
+  SAMPLER_PID=$!
+fi
+
+# degradacja łącza: klienci -> impair-proxy (scripts/netem_proxy.py) -> serwer danego protokołu
+if [ "$IMPAIR_PROFILE" != "none" ]; then
+  case "$PROTO" in
+    http) IMPAIR_MAP="tcp:5000=http-server:5000" ;;
+    mqtt) IMPAIR_MAP="tcp:1883=mqtt-broker:1883" ;;
+    coap) IMPAIR_MAP="udp:${COAP_PORT:-5683}=coap-server:${COAP_PORT:-5683}" ;;
+  esac
+  IMPAIR_ARGS=(--profile "$IMPAIR_PROFILE" --map "$IMPAIR_MAP" --stats-out /out/impair_stats.json)
+  if [ -n "$IMPAIR_SEED" ]; then
+    IMPAIR_ARGS+=(--seed "$IMPAIR_SEED")
+  fi
+  $DOCKER_BIN rm -f "$IMPAIR_NAME" >/dev/null 2>&1 || true
+  if ! $DOCKER_BIN run -d --name "$IMPAIR_NAME" --network impact-of-iot_default \
+      -v "$(pwd)/scripts:/app/scripts:ro" -v "$(pwd)/configs:/app/configs:ro" -v "$(cd "$LOGDIR" && pwd):/out" \
+      "$IMPAIR_IMAGE" python3 -u /app/scripts/netem_proxy.py "${IMPAIR_ARGS[@]}" >/dev/null; then
+    echo "[ERROR] impair-proxy nie wystartował (IMPAIR_PROFILE=$IMPAIR_PROFILE)"
+    exit 1
+  fi
+  waited=0
+  until $DOCKER_BIN logs "$IMPAIR_NAME" 2>&1 | grep -q "^profile="; do
+    if [ "$waited" -ge 30 ] || [ "$($DOCKER_BIN inspect -f '{{.State.Running}}' "$IMPAIR_NAME" 2>/dev/null)" != "true" ]; then
+      echo "[ERROR] impair-proxy nie nasłuchuje:"
+      $DOCKER_BIN logs "$IMPAIR_NAME" 2>&1 | tail -5
+      exit 1
+    fi
+    sleep 1
+    waited=$((waited + 1))
+  done
+  echo "[INFO] IMPAIR_PROFILE=$IMPAIR_PROFILE -> klienci przez $IMPAIR_NAME ($IMPAIR_MAP)"
+  export CLIENT_HTTP_URL="http://$IMPAIR_NAME:5000/post" CLIENT_BROKER="$IMPAIR_NAME" CLIENT_COAP_HOST="$IMPAIR_NAME"
+fi
+
 PCAP_FILE=$LOGDIR/${OUT}_N${N}_${PROTO}.pcap
 PCAP_TMP=/tmp/${OUT}_N${N}_${PROTO}.pcap
 
@@ -114,7 +175,7 @@ start_capture() {
 
 if [ "$CAPTURE_AFTER_START" = "1" ]; then
   echo "[INFO] CAPTURE_AFTER_START=1 -> najpierw start klientów, potem capture"
-  RESULTS_DIR_BASE="$LOGDIR" DOCKER_BIN="$DOCKER_BIN" READY_FILE_PREFIX="$(basename "$READY_PREFIX")" ./scripts/start_clients.sh $N $PROTO 1 "$OUT" "$MODE"
+  RESULTS_DIR_BASE="$LOGDIR" DOCKER_BIN="$DOCKER_BIN" READY_FILE_PREFIX="$(basename "$READY_PREFIX")" ./scripts/start_clients.sh $N $PROTO "$FREQ" "$OUT" "$MODE"
   # poczekaj na wszystkie kontenery klienta
   waited=0
   while true; do
@@ -149,12 +210,14 @@ if [ "$CAPTURE_AFTER_START" = "1" ]; then
   fi
   start_capture
   # odblokuj ruch klientów po starcie capture
+  TRAFFIC_START=$(date +%s.%N)
   date +%s > "$START_FILE"
 else
   # domyślnie: capture przed klientami, łapie handshake
   start_capture
   sleep 3
-  RESULTS_DIR_BASE="$LOGDIR" DOCKER_BIN="$DOCKER_BIN" READY_FILE_PREFIX="$(basename "$READY_PREFIX")" ./scripts/start_clients.sh $N $PROTO 1 "$OUT" "$MODE"
+  RESULTS_DIR_BASE="$LOGDIR" DOCKER_BIN="$DOCKER_BIN" READY_FILE_PREFIX="$(basename "$READY_PREFIX")" ./scripts/start_clients.sh $N $PROTO "$FREQ" "$OUT" "$MODE"
+  TRAFFIC_START=$(date +%s.%N)
   date +%s > "$START_FILE"
 fi
 
@@ -170,21 +233,25 @@ else
   : > "$LOGDIR/clients_ips.txt"
 fi
 
-# collect docker stats
-$DOCKER_BIN stats --no-stream --format "{{.Name}},{{.CPUPerc}},{{.MemUsage}}" > $LOGDIR/docker_stats_N${N}_${PROTO}.csv
-
-# collect system snapshot during test (simple)
-top -b -n1 > $LOGDIR/top_N${N}_${PROTO}.txt
-free -h > $LOGDIR/mem_N${N}_${PROTO}.txt
-
 # wait until capture finishes
 wait $TSHARK_PID || true
 
 # stop clients at the same moment (file-based barrier)
+TRAFFIC_STOP=$(date +%s.%N)
 date +%s > "$STOP_FILE"
 if [ "$STOP_WAIT" -gt 0 ]; then
   sleep "$STOP_WAIT"
 fi
+if [ "$IMPAIR_PROFILE" != "none" ]; then
+  # SIGTERM -> proxy zapisuje impair_stats.json
+  $DOCKER_BIN stop -t 5 "$IMPAIR_NAME" >/dev/null 2>&1 || true
+  $DOCKER_BIN logs "$IMPAIR_NAME" > "$LOGDIR/impair_proxy.log" 2>&1 || true
+  $DOCKER_BIN rm -f "$IMPAIR_NAME" >/dev/null 2>&1 || true
+fi
+if [ -n "$SAMPLER_PID" ]; then
+  kill -TERM "$SAMPLER_PID" 2>/dev/null || true
+  wait "$SAMPLER_PID" 2>/dev/null || true
+fi
 
 # przenieś PCAP do katalogu wyników
 sudo_wrap mkdir -p "$LOGDIR"
@@ -193,8 +260,10 @@ if sudo_wrap mv -f "$PCAP_TMP" "$PCAP_FILE"; then
 else
   echo "[WARN] pcap move failed (capture may have failed)"
 fi
+RUN_STATUS=ok
 if [ ! -s "$PCAP_FILE" ]; then
   echo "[WARN] pcap file missing or empty: $PCAP_FILE" | tee -a "$CAPTURE_LOG"
+  RUN_STATUS=no_pcap
 fi
 
 # === NOWE: zbierz RTT z logów klientów ZANIM je usuniesz ===
@@ -215,6 +284,18 @@ else
   echo "KEEP_CLIENTS=1 -> kontenery klienckie pozostawione uruchomione"
 fi
 
+# manifest przebiegu (parametry, wersje, czasy) -> tools/results_catalog.py
+python3 ./scripts/run_manifest.py write --dir "$LOGDIR" --run-id "$OUT" --proto "$PROTO" --mode "$MODE" \
+  --n "$N" --duration "$DUR" --freq "$FREQ" --status "$RUN_STATUS" \
+  --started "$RUN_STARTED" --traffic-start "${TRAFFIC_START:-}" --traffic-stop "${TRAFFIC_STOP:-}" \
+  --set "capture_if=$CAPTURE_IF" "capture_after_start=$CAPTURE_AFTER_START" \
+        "impair_profile=$IMPAIR_PROFILE" "impair_seed=$IMPAIR_SEED" \
+        "arrival=$ARRIVAL" "arrival_phase=$ARRIVAL_PHASE" "arrival_seed=$ARRIVAL_SEED" \
+        "arrival_trace=${ARRIVAL_TRACE:-}" \
+        "replay_trace=$REPLAY_TRACE" "replay_speed=$REPLAY_SPEED" "replay_map=$REPLAY_MAP" \
+        "prof_phases=${PROF_PHASES:-0}" \
+  || echo "[WARN] run_manifest.json not written"
+
 # ensure current user can read the artifacts (pcaps owned by root otherwise)
 sudo_wrap chown -R "$OWNER":"$OWNER_GROUP" "$LOGDIR" || chown -R "$OWNER":"$OWNER_GROUP" "$LOGDIR" || true
 sudo_wrap chmod -R u+rwX,go+rX "$LOGDIR" || chmod -R u+rwX,go+rX "$LOGDIR" || true
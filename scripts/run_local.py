@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Docker-free odpowiednik run_experiments.sh: serwery i klienci jako lokalne procesy.
+
+Uruchamia servers/http_server.py, servers/coap_server.py albo broker MQTT
+(systemowy mosquitto jeśli jest, inaczej servers/mqtt_broker.py) na localhost,
+odpala N procesów client/protocol_client.py z tym samym kontraktem zmiennych
+środowiskowych co start_clients.sh i zostawia wyniki w tym samym układzie:
+
+  results_<OUT>/<OUT>/metrics_<OUT>_<PROTO>_id<i>.csv
+  results_<OUT>/<OUT>_N<N>_<PROTO>_rtt.log
+
+Z --impair PROFIL klienci łączą się przez scripts/netem_proxy.py (port serwera
++ --impair-port-offset), jak IMPAIR_PROFILE w run_experiments.sh. --arrival /
+--arrival-phase / --arrival-seed wybierają model przybyć klientów (client/arrivals.py),
+--replay ŚLAD odtwarza ślad ruchu (client/trace_replay.py).
+
+Użycie:
+  python scripts/run_local.py N PROTO DURATION_SEC OUT [MODE] [--impair nbiot] [--arrival poisson]
+  python scripts/run_local.py N PROTO 0 OUT [MODE] --replay trace.csv --replay-speed 10
+"""
+import argparse
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import run_manifest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "client"))
+import arrivals  # noqa: E402  (MODELS / PHASES dla argparse)
+import trace_replay  # noqa: E402
+
+# domyślne dane logowania jak w SCENARIOS.md (configs/.env.auth ma pierwszeństwo)
+AUTH_DEFAULTS = {
+    "API_TOKEN": "supersekret123",
+    "MQTT_USER": "mqtt_user",
+    "MQTT_PASS": "mqtt_password",
+}
+
+
+def load_env_file(path: Path) -> Dict[str, str]:
+    env: Dict[str, str] = {}
+    if not path.exists():
+        return env
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        k, v = line.split("=", 1)
+        env[k.strip()] = v.strip().strip('"').strip("'")
+    return env
+
+
+def mode_env(mode: str) -> Dict[str, str]:
+    env = {"AUTH_MODE": mode}
+    if mode == "auth":
+        env.update(AUTH_DEFAULTS)
+    env.update(load_env_file(ROOT_DIR / "configs" / f".env.{mode}"))
+    env["AUTH_MODE"] = mode
+    return env
+
+
+def wait_tcp(host: str, port: int, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def wait_log(path: Path, needle: str, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if path.exists() and needle in path.read_text(encoding="utf-8", errors="ignore"):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+class LocalHarness:
+    """Cykl życia jednego przebiegu: serwer -> klienci -> START/STOP -> sprzątanie."""
+
+    def __init__(self, n: int, proto: str, duration: float, out: str, mode: str = "open",
+                 freq: float = 1.0, max_samples: int = 0, results_base: Optional[Path] = None,
+                 host: str = "127.0.0.1", http_port: int = 5000, mqtt_port: int = 1883,
+                 coap_port: int = 5683, broker: str = "auto", stop_wait: float = 5.0,
+                 extra_client_env: Optional[Dict[str, str]] = None, resource_interval: float = 1.0,
+                 prof_env: Optional[Dict[str, str]] = None, impair: str = "none",
+                 impair_seed: Optional[int] = None, impair_port_offset: int = 10000,
+                 arrival_env: Optional[Dict[str, str]] = None):
+        self.n = n
+        self.proto = proto
+        self.duration = duration
+        self.out = out
+        self.mode = mode
+        self.freq = freq
+        self.max_samples = max_samples
+        self.logdir = (results_base or Path(f"results_{out}")).resolve()
+        self.run_dir = self.logdir / out
+        self.host = host
+        self.http_port = http_port
+        self.mqtt_port = mqtt_port
+        self.coap_port = coap_port
+        self.broker = broker
+        self.stop_wait = stop_wait
+        self.extra_client_env = extra_client_env or {}
+        self.resource_interval = resource_interval
+        self.sampler: Optional[subprocess.Popen] = None
+        self.impair = impair
+        self.impair_seed = impair_seed
+        self.impair_port_offset = impair_port_offset if impair != "none" else 0
+        self.proxy: Optional[subprocess.Popen] = None
+        # ARRIVAL* / REPLAY_* (client/arrivals.py, client/trace_replay.py) tylko dla klientów
+        self.arrival_env = dict(arrival_env or {})
+        self.env = mode_env(mode)
+        # PROF_* (client/prof_hooks.py) dla serwera i klientów; zrzuty serwera do results_<OUT>/prof
+        self.prof_env = dict(prof_env or {})
+        if self.prof_env:
+            self.env.update(self.prof_env)
+        self.server_procs: List[subprocess.Popen] = []
+        self.client_procs: List[subprocess.Popen] = []
+        self.tmpdir = Path(tempfile.mkdtemp(prefix="iot_local_"))
+        self.start_file = self.run_dir / f".start_{out}"
+        self.stop_file = self.run_dir / f".stop_{out}"
+        self.ready_prefix = f".ready_{out}_"
+
+    # --- serwery ---
+
+    def _spawn(self, cmd: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+        log_f = log_path.open("w", encoding="utf-8")
+        p = subprocess.Popen(cmd, cwd=str(ROOT_DIR), env={**os.environ, **env},
+                             stdout=log_f, stderr=subprocess.STDOUT)
+        log_f.close()
+        return p
+
+    def _mosquitto_cmd(self) -> Optional[List[str]]:
+        if self.broker == "builtin" or not shutil.which("mosquitto"):
+            return None
+        conf = self.tmpdir / "mosquitto.conf"
+        lines = [f"listener {self.mqtt_port} {self.host}"]
+        if self.mode == "auth":
+            if not shutil.which("mosquitto_passwd"):
+                return None
+            pw = self.tmpdir / "passwords"
+            subprocess.run(["mosquitto_passwd", "-b", "-c", str(pw),
+                            self.env["MQTT_USER"], self.env["MQTT_PASS"]], check=True)
+            lines += ["allow_anonymous false", f"password_file {pw}"]
+        else:
+            lines.append("allow_anonymous true")
+        conf.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return ["mosquitto", "-c", str(conf)]
+
+    def start_server(self) -> None:
+        py = sys.executable
+        log_path = self.logdir / f"server_{self.proto}.log"
+        env = dict(self.env)
+        if self.prof_env:
+            env.setdefault("PROF_OUT", str(self.logdir / "prof"))
+        # serwery importują prof_hooks z client/ (w obrazie coap leży obok, w compose PYTHONPATH)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT_DIR / "client"), os.environ.get("PYTHONPATH")]))
+        if self.proto == "http":
+            env.update(HTTP_BIND=self.host, HTTP_PORT=str(self.http_port))
+            self.server_procs.append(self._spawn([py, "-u", "servers/http_server.py"], env, log_path))
+            ok = wait_tcp(self.host, self.http_port, 30)
+        elif self.proto == "coap":
+            env.update(COAP_BIND=self.host, COAP_PORT=str(self.coap_port))
+            self.server_procs.append(self._spawn([py, "-u", "servers/coap_server.py"], env, log_path))
+            ok = wait_log(log_path, "listening", 30)
+        else:
+            cmd = self._mosquitto_cmd()
+            if cmd is None:
+                if self.broker == "mosquitto":
+                    raise SystemExit("[ERROR] --broker mosquitto, ale brak mosquitto/mosquitto_passwd w PATH")
+                env.update(MQTT_BIND=self.host, MQTT_PORT=str(self.mqtt_port))
+                cmd = [py, "-u", "servers/mqtt_broker.py"]
+            self.server_procs.append(self._spawn(cmd, env, log_path))
+            ok = wait_tcp(self.host, self.mqtt_port, 30)
+        if not ok:
+            self.stop_servers()
+            raise SystemExit(f"[ERROR] serwer {self.proto} nie wystartował, zobacz {log_path}")
+        print(f"[INFO] server {self.proto} up (log: {log_path})")
+
+    def stop_servers(self) -> None:
+        for p in self.server_procs:
+            p.terminate()
+        for p in self.server_procs:
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        self.server_procs.clear()
+
+    # --- degradacja łącza (scripts/netem_proxy.py) ---
+
+    def server_port(self) -> int:
+        return {"http": self.http_port, "mqtt": self.mqtt_port, "coap": self.coap_port}[self.proto]
+
+    def start_proxy(self) -> None:
+        if self.impair == "none":
+            return
+        port = self.server_port()
+        transport = "udp" if self.proto == "coap" else "tcp"
+        log_path = self.logdir / "impair_proxy.log"
+        cmd = [sys.executable, "-u", str(ROOT_DIR / "scripts" / "netem_proxy.py"), "--profile", self.impair,
+               "--map", f"{transport}:{self.host}:{port + self.impair_port_offset}={self.host}:{port}",
+               "--stats-out", str(self.logdir / "impair_stats.json")]
+        if self.impair_seed is not None:
+            cmd += ["--seed", str(self.impair_seed)]
+        self.proxy = self._spawn(cmd, {}, log_path)
+        if not wait_log(log_path, "profile=", 15):
+            self.stop_proxy()
+            self.stop_servers()
+            raise SystemExit(f"[ERROR] netem_proxy nie wystartował, zobacz {log_path}")
+        print(f"[INFO] impair proxy {self.impair} on port {port + self.impair_port_offset} (log: {log_path})")
+
+    def stop_proxy(self) -> None:
+        if self.proxy is None:
+            return
+        self.proxy.terminate()  # SIGTERM -> impair_stats.json
+        try:
+            self.proxy.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proxy.kill()
+        self.proxy = None
+
+    # --- klienci ---
+
+    def client_env(self, i: int) -> Dict[str, str]:
+        env = dict(self.env)
+        env.update({
+            "ID": str(i),
+            "FREQ": str(self.freq),
+            "PROTO": self.proto,
+            "HTTP_URL": f"http://{self.host}:{self.http_port + self.impair_port_offset}/post",
+            "BROKER": self.host,
+            "MQTT_PORT": str(self.mqtt_port + self.impair_port_offset),
+            "COAP_HOST": self.host,
+            "COAP_PORT": str(self.coap_port + self.impair_port_offset),
+            "COAP_RESOURCE": "sensors",
+            "OUT_DIR": str(self.run_dir),
+            "RUN_ID": self.out,
+            "START_FILE": str(self.start_file),
+            "START_FILE_TIMEOUT": "300",
+            "STOP_FILE": str(self.stop_file),
+            "MAX_SAMPLES": str(self.max_samples),
+            "READY_FILE": str(self.run_dir / f"{self.ready_prefix}{i}"),
+            "ARRIVAL_N": str(self.n),
+        })
+        env.update(self.arrival_env)
+        env.update(self.extra_client_env)
+        return env
+
+    def client_log(self, i: int) -> Path:
+        return self.logdir / "clients" / f"client_{self.proto}_{i}.log"
+
+    def start_clients(self) -> None:
+        self.client_log(1).parent.mkdir(parents=True, exist_ok=True)
+        cmd = [sys.executable, "-u", str(ROOT_DIR / "client" / "protocol_client.py")]
+        for i in range(1, self.n + 1):
+            self.client_procs.append(self._spawn(cmd, self.client_env(i), self.client_log(i)))
+        print(f"[INFO] started {self.n} clients proto={self.proto} freq={self.freq}")
+
+    def wait_ready(self, timeout: float = 120.0) -> int:
+        deadline = time.time() + timeout
+        while True:
+            ready = len(list(self.run_dir.glob(f"{self.ready_prefix}*")))
+            if ready >= self.n or time.time() > deadline:
+                break
+            if all(p.poll() is not None for p in self.client_procs):
+                break
+            time.sleep(0.1)
+        if ready < self.n:
+            print(f"[WARN] READY files not complete (ready={ready}/{self.n})")
+        return ready
+
+    def stop_clients(self) -> None:
+        self.stop_file.write_text(f"{int(time.time())}\n", encoding="utf-8")
+        deadline = time.time() + self.stop_wait
+        for p in self.client_procs:
+            try:
+                p.wait(timeout=max(0.0, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                p.terminate()
+        for p in self.client_procs:
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    # --- próbkowanie zasobów (scripts/resource_sampler.py, jak w run_experiments.sh) ---
+
+    def start_sampler(self) -> None:
+        if self.resource_interval <= 0:
+            return
+        server_name = {"http": "http-server", "coap": "coap-server", "mqtt": "mqtt-broker"}[self.proto]
+        targets = [f"{server_name}={p.pid}" for p in self.server_procs]
+        targets += [f"client_{self.proto}_{i}={p.pid}" for i, p in enumerate(self.client_procs, 1)]
+        if self.proxy is not None:
+            targets.append(f"impair-proxy={self.proxy.pid}")
+        cmd = [sys.executable, str(ROOT_DIR / "scripts" / "resource_sampler.py"), "--no-docker",
+               "--out", str(self.logdir / f"resources_N{self.n}_{self.proto}.csv"),
+               "--interval", str(self.resource_interval)]
+        for t in targets:
+            cmd += ["--pid", t]
+        self.sampler = self._spawn(cmd, {}, self.logdir / "resource_sampler.log")
+
+    def stop_sampler(self) -> None:
+        if self.sampler is None:
+            return
+        self.sampler.terminate()
+        try:
+            self.sampler.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.sampler.kill()
+        self.sampler = None
+
+    def collect_rtt_log(self) -> Path:
+        # odpowiednik pętli `docker logs client_*` z run_experiments.sh
+        rtt_file = self.logdir / f"{self.out}_N{self.n}_{self.proto}_rtt.log"
+        with rtt_file.open("w", encoding="utf-8") as out_f:
+            for i in range(1, self.n + 1):
+                log_path = self.client_log(i)
+                if log_path.exists():
+                    out_f.write(log_path.read_text(encoding="utf-8", errors="ignore"))
+        return rtt_file
+
+    def write_manifest(self, timings: Dict[str, Optional[float]]) -> Path:
+        extra = {"broker": self.broker, "max_samples": self.max_samples, "host": self.host,
+                 "impair_profile": self.impair, "impair_seed": self.impair_seed,
+                 "arrival": self.arrival_env.get("ARRIVAL", "fixed"),
+                 "arrival_phase": self.arrival_env.get("ARRIVAL_PHASE", "none"),
+                 "arrival_seed": self.arrival_env.get("ARRIVAL_SEED"),
+                 "arrival_trace": self.arrival_env.get("ARRIVAL_TRACE"),
+                 "replay_trace": self.arrival_env.get("REPLAY_TRACE"),
+                 "replay_speed": self.arrival_env.get("REPLAY_SPEED"),
+                 "replay_map": self.arrival_env.get("REPLAY_MAP"),
+                 # przy PROF_PHASES RTT HTTP bez kodowania JSON (client/protocol_client.py)
+                 "prof_phases": self.prof_env.get("PROF_PHASES", "0")}
+        data = run_manifest.build_manifest(self.out, self.proto, self.mode, self.n, self.duration,
+                                           self.freq, harness="local", timings=timings,
+                                           extra=extra, docker=False)
+        return run_manifest.write_manifest(self.logdir, data)
+
+    # --- całość ---
+
+    def run(self) -> Path:
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        for f in [self.start_file, self.stop_file, *self.run_dir.glob(f"{self.ready_prefix}*")]:
+            f.unlink(missing_ok=True)
+        started = time.time()
+        traffic_start = traffic_stop = None
+        self.start_server()
+        try:
+            self.start_proxy()
+            self.start_clients()
+            self.start_sampler()
+            self.wait_ready()
+            traffic_start = time.time()
+            self.start_file.write_text(f"{int(traffic_start)}\n", encoding="utf-8")
+            if self.duration <= 0 and (self.max_samples > 0 or "REPLAY_TRACE" in self.arrival_env):
+                for p in self.client_procs:
+                    p.wait()
+            else:
+                time.sleep(self.duration)
+            traffic_stop = time.time()
+            self.stop_clients()
+        finally:
+            self.stop_sampler()
+            for p in self.client_procs:
+                if p.poll() is None:
+                    p.kill()
+            self.stop_proxy()
+            self.stop_servers()
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+        rtt_file = self.collect_rtt_log()
+        print(f"[INFO] RTT log: {rtt_file}")
+        self.write_manifest({"started": started, "traffic_start": traffic_start,
+                             "traffic_stop": traffic_stop, "finished": time.time()})
+        print(f"Experiment finished. Files in {self.logdir}")
+        return self.run_dir
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run one experiment cell with local processes (no Docker, no root).")
+    ap.add_argument("n", type=int, nargs="?", default=10)
+    ap.add_argument("proto", nargs="?", default="mqtt", choices=["http", "mqtt", "coap"])
+    ap.add_argument("duration", type=float, nargs="?", default=180.0,
+                    help="Seconds of traffic (0 + --max-samples or --replay = run until clients finish).")
+    ap.add_argument("out", nargs="?", default="exp")
+    ap.add_argument("mode", nargs="?", default="open", choices=["open", "auth"])
+    ap.add_argument("--freq", type=float, default=1.0, help="Client send interval (FREQ).")
+    ap.add_argument("--max-samples", type=int, default=0)
+    ap.add_argument("--results-base", help="Output dir (default ./results_<OUT>, like run_experiments.sh).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--http-port", type=int, default=5000)
+    ap.add_argument("--mqtt-port", type=int, default=1883)
+    ap.add_argument("--coap-port", type=int, default=5683)
+    ap.add_argument("--broker", default="auto", choices=["auto", "builtin", "mosquitto"],
+                    help="MQTT broker: system mosquitto if present (auto), or the Python stand-in.")
+    ap.add_argument("--stop-wait", type=float, default=5.0)
+    ap.add_argument("--resource-interval", type=float, default=1.0,
+                    help="Resource sampling period in s (resources_N<N>_<PROTO>.csv); 0 = off.")
+    ap.add_argument("--prof-phases", action="store_true",
+                    help="Per-phase timers in clients and server (phases_*.json, see client/prof_hooks.py).")
+    ap.add_argument("--prof-mode", choices=["sample", "cprofile"], help="Also profile clients and server.")
+    ap.add_argument("--prof-window", type=float, default=0, help="Profile only the first N s of traffic (0 = all).")
+    ap.add_argument("--impair", default="none",
+                    help="Link impairment profile (configs/impairment_profiles.json) via scripts/netem_proxy.py.")
+    ap.add_argument("--impair-seed", type=int, help="Proxy RNG seed.")
+    ap.add_argument("--impair-port-offset", type=int, default=10000,
+                    help="Proxy listens on server port + offset.")
+    ap.add_argument("--arrival", default="fixed", choices=arrivals.MODELS,
+                    help="Client arrival model (client/arrivals.py).")
+    ap.add_argument("--arrival-phase", default="none", choices=arrivals.PHASES,
+                    help="Start-time desynchronization: random offset or evenly spread over FREQ.")
+    ap.add_argument("--arrival-seed", help="Arrival RNG seed shared by the fleet (default: random, recorded).")
+    ap.add_argument("--arrival-trace", help="Inter-arrival file for --arrival trace (seconds per line).")
+    ap.add_argument("--replay", help="Replay a traffic trace (ts,device,size) instead of an arrival model.")
+    ap.add_argument("--replay-speed", type=float, default=1.0, help="Replay speed factor (2 = twice as fast).")
+    ap.add_argument("--replay-map", default="order", choices=trace_replay.MAPS,
+                    help="Device -> client mapping (REPLAY_MAP).")
+    args = ap.parse_args()
+    if args.arrival == "trace" and not args.arrival_trace:
+        ap.error("--arrival trace needs --arrival-trace")
+
+    prof_env: Dict[str, str] = {}
+    if args.prof_phases:
+        prof_env["PROF_PHASES"] = "1"
+    if args.prof_mode:
+        prof_env.update(PROF_MODE=args.prof_mode, PROF_WINDOW=str(args.prof_window))
+    arrival_env = {"ARRIVAL": args.arrival, "ARRIVAL_PHASE": args.arrival_phase,
+                   "ARRIVAL_SEED": args.arrival_seed or str(random.randrange(2 ** 32))}
+    if args.arrival_trace:
+        arrival_env["ARRIVAL_TRACE"] = str(Path(args.arrival_trace).resolve())
+    if args.replay:
+        if args.replay_speed <= 0:
+            ap.error("--replay-speed must be > 0")
+        arrival_env.update(REPLAY_TRACE=str(Path(args.replay).resolve()), REPLAY_SPEED=str(args.replay_speed),
+                           REPLAY_MAP=args.replay_map)
+
+    harness = LocalHarness(
+        args.n, args.proto, args.duration, args.out, args.mode,
+        freq=args.freq, max_samples=args.max_samples,
+        results_base=Path(args.results_base) if args.results_base else None,
+        host=args.host, http_port=args.http_port, mqtt_port=args.mqtt_port,
+        coap_port=args.coap_port, broker=args.broker, stop_wait=args.stop_wait,
+        resource_interval=args.resource_interval, prof_env=prof_env,
+        impair=args.impair, impair_seed=args.impair_seed, impair_port_offset=args.impair_port_offset,
+        arrival_env=arrival_env,
+    )
+    harness.run()
+
+
+if __name__ == "__main__":
+    main()
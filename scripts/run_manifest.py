@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Manifest przebiegu: run_manifest.json w katalogu wyników (results_<OUT>/).
+
+Jeden plik JSON na przebieg z parametrami, które do tej pory trzeba było
+zgadywać z nazw katalogów (protokół, tryb, N, rep, FREQ, payload), wersjami
+(git, python, docker, tshark, obraz klienta) i czasami faz (start, START_FILE,
+STOP_FILE, koniec). Pisany przez run_experiments.sh i run_local.py, uzupełniany
+przez run_series.sh (series, rep) po przeniesieniu wyników; czytany przez
+tools/results_catalog.py.
+
+Tylko biblioteka standardowa - skrypt woła się z hosta, poza venv narzędzi.
+
+Użycie:
+  python3 scripts/run_manifest.py write --dir results_X --run-id X --proto mqtt --mode open \\
+      --n 10 --duration 180 --freq 1 --started 1718000000.1 --traffic-start ... --finished ...
+  python3 scripts/run_manifest.py update --dir results/series/mqtt/open/N10/rep1 --set series=s1 rep=1
+  python3 scripts/run_manifest.py show --dir results_X
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_NAME = "run_manifest.json"
+SCHEMA_VERSION = 1
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CLIENT_IMAGE = "iot-client:latest"
+
+# co wysyła client/protocol_client.py (zmienia się tylko razem z klientem)
+DEFAULT_PAYLOAD = {
+    "http": "json {id, ts, val}",
+    "coap": "json {id, ts, val}",
+    "mqtt": "json {id, t0}",
+}
+
+INT_FIELDS = ("N", "rep")
+FLOAT_FIELDS = ("freq_s", "duration_s")
+
+
+def _cmd(cmd: List[str], timeout: float = 5.0) -> Optional[str]:
+    try:
+        p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, cwd=str(ROOT_DIR))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if p.returncode != 0:
+        return None
+    out = p.stdout.strip().splitlines()
+    return out[0].strip() if out else None
+
+
+def collect_versions(docker: bool = True) -> Dict[str, Optional[str]]:
+    commit = _cmd(["git", "rev-parse", "HEAD"])
+    dirty = _cmd(["git", "status", "--porcelain", "--untracked-files=no"]) if commit else None
+    versions: Dict[str, Optional[str]] = {
+        "git_commit": commit,
+        "git_dirty": bool(dirty) if commit else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "hostname": socket.gethostname(),
+        "tshark": _cmd(["tshark", "--version"]),
+    }
+    if docker:
+        versions["docker"] = _cmd(["docker", "version", "--format", "{{.Server.Version}}"])
+        versions["client_image"] = _cmd(["docker", "image", "inspect", "-f", "{{.Id}}", CLIENT_IMAGE])
+    return versions
+
+
+def artifacts(logdir: Path) -> Dict[str, object]:
+    """Co faktycznie powstało - bez hashowania, tylko nazwy/rozmiary."""
+    files = []
+    csvs = 0
+    for p in sorted(logdir.rglob("*")):
+        if not p.is_file() or p.name == MANIFEST_NAME or p.name.startswith("."):
+            continue
+        rel = p.relative_to(logdir).as_posix()
+        files.append({"path": rel, "bytes": p.stat().st_size})
+        if p.name.startswith("metrics_") and p.suffix == ".csv":
+            csvs += 1
+    return {"files": files, "client_csvs": csvs}
+
+
+def _coerce(key: str, value: str):
+    if value == "":
+        return None
+    if key in INT_FIELDS:
+        return int(value)
+    if key in FLOAT_FIELDS or key.startswith("t_"):
+        return float(value)
+    return value
+
+
+def build_manifest(run_id: str, proto: str, mode: str, n: int, duration: float, freq: float,
+                   payload: Optional[str] = None, rep: Optional[int] = None, series: Optional[str] = None,
+                   harness: str = "docker", timings: Optional[Dict[str, Optional[float]]] = None,
+                   status: str = "ok", extra: Optional[Dict[str, object]] = None,
+                   docker: bool = True) -> Dict[str, object]:
+    proto = proto.lower()
+    return {
+        "schema": SCHEMA_VERSION,
+        "run_id": run_id,
+        "series": series,
+        "proto": proto,
+        "mode": mode.lower(),
+        "N": int(n),
+        "rep": rep,
+        "freq_s": float(freq),
+        "duration_s": float(duration),
+        "payload": payload or DEFAULT_PAYLOAD.get(proto),
+        "harness": harness,
+        "status": status,
+        "timings": {k: v for k, v in (timings or {}).items()},
+        "versions": collect_versions(docker=docker),
+        "extra": extra or {},
+    }
+
+
+def manifest_path(logdir: Path) -> Path:
+    return Path(logdir) / MANIFEST_NAME
+
+
+def write_manifest(logdir: Path, data: Dict[str, object]) -> Path:
+    logdir = Path(logdir)
+    logdir.mkdir(parents=True, exist_ok=True)
+    data = dict(data)
+    data["artifacts"] = artifacts(logdir)
+    data["written_at"] = time.time()
+    out = manifest_path(logdir)
+    tmp = out.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, out)
+    return out
+
+
+def read_manifest(logdir: Path) -> Optional[Dict[str, object]]:
+    p = manifest_path(logdir)
+    if not p.exists():
+        return None
+    return json.loads(p.read_text(encoding="utf-8"))
+
+
+def update_manifest(logdir: Path, fields: Dict[str, object]) -> Path:
+    data = read_manifest(logdir)
+    if data is None:
+        raise FileNotFoundError(manifest_path(logdir))
+    for k, v in fields.items():
+        if k.startswith("t_"):
+            data.setdefault("timings", {})[k[2:]] = v
+        else:
+            data[k] = v
+    return write_manifest(logdir, data)
+
+
+def _parse_set(pairs: List[str]) -> Dict[str, object]:
+    out: Dict[str, object] = {}
+    for item in pairs:
+        if "=" not in item:
+            raise SystemExit(f"[ERROR] --set expects key=value, got: {item}")
+        k, v = item.split("=", 1)
+        out[k.strip()] = _coerce(k.strip(), v.strip())
+    return out
+
+
+def _epoch(v: Optional[str]) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    return float(v)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Write/update run_manifest.json for one experiment run.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    w = sub.add_parser("write", help="Create the manifest (overwrites).")
+    w.add_argument("--dir", required=True, help="Run results dir (results_<OUT>).")
+    w.add_argument("--run-id", required=True)
+    w.add_argument("--proto", required=True, choices=["http", "mqtt", "coap"])
+    w.add_argument("--mode", required=True, choices=["open", "auth"])
+    w.add_argument("--n", type=int, required=True)
+    w.add_argument("--duration", type=float, required=True)
+    w.add_argument("--freq", type=float, default=1.0)
+    w.add_argument("--payload", help="Payload description (default: what protocol_client.py sends).")
+    w.add_argument("--rep", type=int)
+    w.add_argument("--series")
+    w.add_argument("--harness", default="docker", choices=["docker", "local"])
+    w.add_argument("--status", default="ok")
+    w.add_argument("--started", help="Epoch seconds.")
+    w.add_argument("--traffic-start", help="Epoch seconds of START_FILE.")
+    w.add_argument("--traffic-stop", help="Epoch seconds of STOP_FILE.")
+    w.add_argument("--finished", help="Epoch seconds (default: now).")
+    w.add_argument("--set", nargs="*", default=[], metavar="KEY=VALUE", help="Extra fields under 'extra'.")
+    w.add_argument("--no-docker", action="store_true", help="Skip docker version/image lookups.")
+
+    u = sub.add_parser("update", help="Set top-level fields (t_<name> sets timings.<name>).")
+    u.add_argument("--dir", required=True)
+    u.add_argument("--set", nargs="+", required=True, metavar="KEY=VALUE")
+
+    s = sub.add_parser("show", help="Print the manifest.")
+    s.add_argument("--dir", required=True)
+
+    args = ap.parse_args()
+    logdir = Path(args.dir)
+
+    if args.cmd == "write":
+        timings = {
+            "started": _epoch(args.started),
+            "traffic_start": _epoch(args.traffic_start),
+            "traffic_stop": _epoch(args.traffic_stop),
+            "finished": _epoch(args.finished) or time.time(),
+        }
+        data = build_manifest(args.run_id, args.proto, args.mode, args.n, args.duration, args.freq,
+                              payload=args.payload, rep=args.rep, series=args.series,
+                              harness=args.harness, timings=timings, status=args.status,
+                              extra=_parse_set(args.set), docker=not args.no_docker)
+        print(f"[INFO] manifest: {write_manifest(logdir, data)}")
+    elif args.cmd == "update":
+        try:
+            print(f"[INFO] manifest: {update_manifest(logdir, _parse_set(args.set))}")
+        except FileNotFoundError as e:
+            print(f"[WARN] no manifest to update: {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        data = read_manifest(logdir)
+        if data is None:
+            print(f"[WARN] no manifest in {logdir}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(data, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
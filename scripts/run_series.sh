@@ -10,6 +10,13 @@ USE_SUDO="${USE_SUDO:-auto}"     # auto|always|never – jak wołać run_experim
 CLEAN_SOURCES="${CLEAN_SOURCES:-1}" # po rsync usuń oryginalne katalogi results_* / results/<id>
 SKIP_COMPOSE_UP="${SKIP_COMPOSE_UP:-0}"    # 1 = nie rób docker compose up (użytkownik podnosi stack ręcznie)
 SKIP_COMPOSE_DOWN="${SKIP_COMPOSE_DOWN:-0}" # 1 = nie rób docker compose down w hard_clean
+IMPAIR_PROFILES="${IMPAIR_PROFILES:-none}" # profile łącza (configs/impairment_profiles.json), np. "none nbiot lte_m"
+ARRIVAL="${ARRIVAL:-fixed}"            # model przybyć klientów (client/arrivals.py), np. poisson
+ARRIVAL_PHASE="${ARRIVAL_PHASE:-none}" # none|random|spread
+ARRIVAL_SEED="${ARRIVAL_SEED:-}"       # puste = nowe ziarno na przebieg (zapisane w run_manifest.json)
+REPLAY_TRACE="${REPLAY_TRACE:-}"       # ślad do odtworzenia zamiast modelu (tools/trace_tool.py)
+REPLAY_SPEED="${REPLAY_SPEED:-1}"
+REPLAY_MAP="${REPLAY_MAP:-order}"
 
 PROTOS=("http" "mqtt" "coap")
 
@@ -31,15 +38,34 @@ else
   echo "[INFO] brak sudo w PATH – domyślnie odpalę bez sudo"
 fi
 
-echo "SERIES=$SERIES | DUR=$DUR | REPS=$REPS | NS=$NS"
+# każdy profil != none to osobna seria results/<SERIES>_<profil> (ten sam układ katalogów -> te same narzędzia)
+series_for() {
+  if [[ "$1" == "none" ]]; then echo "$SERIES"; else echo "${SERIES}_$1"; fi
+}
+
+echo "SERIES=$SERIES | DUR=$DUR | REPS=$REPS | NS=$NS | IMPAIR_PROFILES=$IMPAIR_PROFILES | ARRIVAL=$ARRIVAL/$ARRIVAL_PHASE${REPLAY_TRACE:+ | REPLAY_TRACE=$REPLAY_TRACE x$REPLAY_SPEED}"
 echo "OUTROOT=$OUTROOT"
 echo "USE_SUDO=$USE_SUDO (CAN_SUDO=$CAN_SUDO) | SKIP_COMPOSE_UP=$SKIP_COMPOSE_UP SKIP_COMPOSE_DOWN=$SKIP_COMPOSE_DOWN"
 mkdir -p "$OUTROOT"
 
+for profile in $IMPAIR_PROFILES; do
+  if [[ "$profile" != "none" ]] && ! python3 "$PROJECT_DIR/scripts/netem_proxy.py" --list | awk '{print $1}' | grep -qx "$profile"; then
+    echo "[ERROR] nieznany profil IMPAIR_PROFILES: $profile (python3 scripts/netem_proxy.py --list)"
+    exit 1
+  fi
+done
+if [[ -n "$REPLAY_TRACE" ]]; then
+  if ! python3 "$PROJECT_DIR/tools/trace_tool.py" info "$REPLAY_TRACE" --speed "$REPLAY_SPEED"; then
+    echo "[ERROR] REPLAY_TRACE nieczytelny: $REPLAY_TRACE"
+    exit 1
+  fi
+fi
+
 hard_clean() {
   echo "[CLEAN] stop clients + down -v"
   cd "$PROJECT_DIR"
   DOCKER_BIN="docker" ./scripts/stop_clients.sh >/dev/null 2>&1 || true
+  docker rm -f impair-proxy >/dev/null 2>&1 || true
   if [[ "$SKIP_COMPOSE_DOWN" != "1" ]]; then
     docker compose down --remove-orphans -v >/dev/null 2>&1 || true
   else
@@ -49,37 +75,47 @@ hard_clean() {
 }
 
 run_one() {
-  local mode="$1" proto="$2" n="$3" rep="$4"
+  local mode="$1" proto="$2" n="$3" rep="$4" profile="${5:-none}"
   local run_id="${mode}_${proto}_N${n}_rep${rep}"
+  local series
+  series="$(series_for "$profile")"
   local src_dir1="$PROJECT_DIR/results_${run_id}"      # tak zapisuje run_experiments.sh
   local src_dir2="$PROJECT_DIR/results/$run_id"        # czasem tak bywa w innych wersjach
-  local dst_dir="$OUTROOT/$proto/$mode/N${n}/rep${rep}"
+  local dst_dir="$PROJECT_DIR/results/$series/$proto/$mode/N${n}/rep${rep}"
   local status=0
 
   mkdir -p "$dst_dir"
 
-  echo "=== RUN: $run_id ==="
+  echo "=== RUN: $run_id (impair=$profile) ==="
 
   # ważne: jeśli u Ciebie run_experiments wymaga sudo dla capture, zostaw sudo
+  # (env zamiast eksportu: sudo czyści środowisko)
   local run_log="$dst_dir/run_experiments.log"
+  local cmd=(env "IMPAIR_PROFILE=$profile" "ARRIVAL=$ARRIVAL" "ARRIVAL_PHASE=$ARRIVAL_PHASE")
+  if [[ -n "$ARRIVAL_SEED" ]]; then cmd+=("ARRIVAL_SEED=$ARRIVAL_SEED"); fi
+  if [[ -n "${ARRIVAL_TRACE:-}" ]]; then cmd+=("ARRIVAL_TRACE=$(realpath "$ARRIVAL_TRACE")"); fi
+  if [[ -n "$REPLAY_TRACE" ]]; then
+    cmd+=("REPLAY_TRACE=$(realpath "$REPLAY_TRACE")" "REPLAY_SPEED=$REPLAY_SPEED" "REPLAY_MAP=$REPLAY_MAP")
+  fi
+  cmd+=(./scripts/run_experiments.sh "$n" "$proto" "$DUR" "$run_id" "$mode")
   case "$USE_SUDO" in
     always)
-      if ! sudo ./scripts/run_experiments.sh "$n" "$proto" "$DUR" "$run_id" "$mode" >"$run_log" 2>&1; then
+      if ! sudo "${cmd[@]}" >"$run_log" 2>&1; then
         status=$?
       fi
       ;;
     never)
-      if ! ./scripts/run_experiments.sh "$n" "$proto" "$DUR" "$run_id" "$mode" >"$run_log" 2>&1; then
+      if ! "${cmd[@]}" >"$run_log" 2>&1; then
         status=$?
       fi
       ;;
     *)
       if [[ "$CAN_SUDO" -eq 1 ]]; then
-        if ! sudo ./scripts/run_experiments.sh "$n" "$proto" "$DUR" "$run_id" "$mode" >"$run_log" 2>&1; then
+        if ! sudo "${cmd[@]}" >"$run_log" 2>&1; then
           status=$?
         fi
       else
-        if ! ./scripts/run_experiments.sh "$n" "$proto" "$DUR" "$run_id" "$mode" >"$run_log" 2>&1; then
+        if ! "${cmd[@]}" >"$run_log" 2>&1; then
           status=$?
         fi
       fi
@@ -105,6 +141,16 @@ run_one() {
   # Dodatkowo dorzuć logi stacka (super przy debugowaniu)
   docker compose logs --no-color > "$dst_dir/docker_logs.txt" 2>/dev/null || true
 
+  # manifest: dopisz serię/rep (znane tylko tutaj); jeśli przebieg padł przed zapisem - minimalny wpis
+  if [[ -f "$dst_dir/run_manifest.json" ]]; then
+    python3 ./scripts/run_manifest.py update --dir "$dst_dir" --set "series=$series" "rep=$rep" \
+      >/dev/null || echo "[WARN] manifest update failed dla $run_id"
+  else
+    python3 ./scripts/run_manifest.py write --dir "$dst_dir" --run-id "$run_id" --proto "$proto" --mode "$mode" \
+      --n "$n" --duration "$DUR" --rep "$rep" --series "$series" --status failed \
+      >/dev/null || echo "[WARN] manifest write failed dla $run_id"
+  fi
+
   # Szybki sanity: czy jest jakiś pcap?
   if ! ls "$dst_dir"/*.pcap "$dst_dir"/*.pcapng >/dev/null 2>&1; then
     echo "[WARN] brak PCAP w $dst_dir"
@@ -119,10 +165,12 @@ mode_block() {
   echo "# MODE: $mode"
   echo "############################"
 
-  for n in $NS; do
-    for rep in $(seq 1 "$REPS"); do
-      for proto in "${PROTOS[@]}"; do
-        run_one "$mode" "$proto" "$n" "$rep"
+  for profile in $IMPAIR_PROFILES; do
+    for n in $NS; do
+      for rep in $(seq 1 "$REPS"); do
+        for proto in "${PROTOS[@]}"; do
+          run_one "$mode" "$proto" "$n" "$rep" "$profile"
+        done
       done
     done
   done
@@ -152,4 +200,7 @@ if [[ "${RUN_MODES:-open auth}" =~ auth ]]; then
   mode_block "auth"
 fi
 
-echo "DONE. Wyniki: $OUTROOT"
+echo "DONE. Wyniki:"
+for profile in $IMPAIR_PROFILES; do
+  echo "  $profile: $PROJECT_DIR/results/$(series_for "$profile")"
+done
@@ -1,5 +1,6 @@
 #!/bin/bash
-# Usage: ./start_clients.sh N PROTO FREQ [RUN_ID]
+# Usage: ./start_clients.sh N PROTO FREQ [RUN_ID] [MODE]
+# Env: CLIENT_LAUNCHER=api|cli, PARALLEL=16 (limit równoległych startów)
 ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 cd "$ROOT_DIR"
 
@@ -21,18 +22,49 @@ MAX_SAMPLES="${MAX_SAMPLES:-0}"
 mkdir -p "$RESULTS_DIR"
 
 COAP_HOST=${COAP_HOST:-127.0.0.1}
+# cele klientów w sieci compose (run_experiments.sh podmienia je na impair-proxy przy IMPAIR_PROFILE)
+CLIENT_HTTP_URL=${CLIENT_HTTP_URL:-http://http-server:5000/post}
+CLIENT_BROKER=${CLIENT_BROKER:-mqtt-broker}
+CLIENT_COAP_HOST=${CLIENT_COAP_HOST:-coap-server}
 COAP_PORT=${COAP_PORT:-5683}
 COAP_RESOURCE=${COAP_RESOURCE:-sensors}
 
+# model przybyć (client/arrivals.py): ARRIVAL* przekazywane, gdy ustawione; ARRIVAL_TRACE = plik na hoście
+TRACE_ARGS=()
+if [ -n "${ARRIVAL_TRACE:-}" ]; then
+  TRACE_ARGS=(-v "$(realpath "$ARRIVAL_TRACE"):/arrival_trace:ro" -e ARRIVAL_TRACE=/arrival_trace)
+fi
+# odtwarzanie śladu (client/trace_replay.py): REPLAY_TRACE = plik na hoście
+if [ -n "${REPLAY_TRACE:-}" ]; then
+  TRACE_ARGS+=(-v "$(realpath "$REPLAY_TRACE"):/replay_trace:ro" -e REPLAY_TRACE=/replay_trace)
+fi
+
+CLIENT_LAUNCHER=${CLIENT_LAUNCHER:-api}   # api = równolegle przez Docker Engine API, cli = docker run
+PARALLEL=${PARALLEL:-16}                  # maks. równoległych startów kontenerów
+
+if [ "$CLIENT_LAUNCHER" = "api" ] && command -v python3 >/dev/null 2>&1; then
+  RESULTS_DIR_BASE="$RESULTS_DIR_BASE" READY_FILE_PREFIX="$READY_FILE_PREFIX" \
+    START_FILE_TIMEOUT="$START_FILE_TIMEOUT" MAX_SAMPLES="$MAX_SAMPLES" \
+    COAP_PORT="$COAP_PORT" COAP_RESOURCE="$COAP_RESOURCE" PARALLEL="$PARALLEL" \
+    CLIENT_HTTP_URL="$CLIENT_HTTP_URL" CLIENT_BROKER="$CLIENT_BROKER" CLIENT_COAP_HOST="$CLIENT_COAP_HOST" \
+    python3 ./scripts/docker_clients.py start "$N" "$PROTO" "$FREQ" "$RUN_ID" "$MODE"
+  rc=$?
+  if [ "$rc" -ne 3 ]; then
+    exit $rc
+  fi
+  echo "[INFO] Docker API unavailable -> fallback to $DOCKER_BIN run (parallel=$PARALLEL)"
+fi
+
 echo "Starting $N clients proto=$PROTO freq=$FREQ"
+echo "MODE=$MODE ENV_FILE=$ENV_FILE"
 
 # ensure old clients are removed
 ./scripts/stop_clients.sh
 
-for i in $(seq 1 $N); do
-  NAME="client_${PROTO}_${i}"
+start_one() {
+  local i="$1"
+  local NAME="client_${PROTO}_${i}"
   echo "Starting $NAME"
-  echo "MODE=$MODE ENV_FILE=$ENV_FILE"
   "$DOCKER_BIN" run -d \
     --name $NAME \
     --network impact-of-iot_default \
@@ -41,9 +73,9 @@ for i in $(seq 1 $N); do
     -e FREQ=$FREQ \
     -e PROTO=$PROTO \
     -e AUTH_MODE="$MODE" \
-    -e HTTP_URL=http://http-server:5000/post \
-    -e BROKER=mqtt-broker \
-    -e COAP_HOST=coap-server \
+    -e HTTP_URL="$CLIENT_HTTP_URL" \
+    -e BROKER="$CLIENT_BROKER" \
+    -e COAP_HOST="$CLIENT_COAP_HOST" \
     -e COAP_PORT=$COAP_PORT \
     -e COAP_RESOURCE=$COAP_RESOURCE \
     -v "$RESULTS_DIR:/results" \
@@ -54,7 +86,23 @@ for i in $(seq 1 $N); do
     -e STOP_FILE="/results/.stop_${RUN_ID}" \
     -e MAX_SAMPLES="$MAX_SAMPLES" \
     -e READY_FILE="/results/${READY_FILE_PREFIX}${i}" \
-    iot-client:latest
+    -e PROF_PHASES -e PROF_MODE -e PROF_WINDOW -e PROF_INTERVAL_MS -e PROF_DUMP_S \
+    -e ARRIVAL -e ARRIVAL_PHASE -e ARRIVAL_SEED -e ARRIVAL_JITTER -e ARRIVAL_BURST_N -e ARRIVAL_BURST_GAP \
+    -e REPLAY_SPEED -e REPLAY_MAP -e REPLAY_LEAD -e REPLAY_SPIN_US \
+    -e ARRIVAL_N="$N" "${TRACE_ARGS[@]}" \
+    iot-client:latest >/dev/null
+}
+
+FAILED=0
+for i in $(seq 1 $N); do
+  start_one "$i" &
+  while [ "$(jobs -rp | wc -l)" -ge "$PARALLEL" ]; do
+    wait -n || FAILED=1
+  done
+done
+while [ "$(jobs -rp | wc -l)" -gt 0 ]; do
+  wait -n || FAILED=1
 done
 
 echo "Results: $RESULTS_DIR"
+exit $FAILED
@@ -1,7 +1,19 @@
 #!/bin/bash
-# Stop and remove only IoT client containers
+# Stop and remove only IoT client containers (bulk, bez pętli po jednym)
+ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 DOCKER_BIN=${DOCKER_BIN:-docker}
-for c in $($DOCKER_BIN ps -a --filter "name=client_" -q); do
-    echo "Removing container $c"
-    $DOCKER_BIN rm -f $c
-done
+CLIENT_LAUNCHER=${CLIENT_LAUNCHER:-api}
+
+if [ "$CLIENT_LAUNCHER" = "api" ] && command -v python3 >/dev/null 2>&1; then
+  python3 "$ROOT_DIR/scripts/docker_clients.py" stop
+  rc=$?
+  if [ "$rc" -ne 3 ]; then
+    exit $rc
+  fi
+fi
+
+ids=$($DOCKER_BIN ps -a --filter "name=client_" -q)
+if [ -n "$ids" ]; then
+    echo "Removing $(echo "$ids" | wc -l) client containers"
+    $DOCKER_BIN rm -f $ids >/dev/null
+fi
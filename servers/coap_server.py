@@ -8,18 +8,26 @@ import time
 from aiocoap import Message, Context, resource, Code, error as aiocoap_error
 from dotenv import load_dotenv
 
+from server_hooks import Hooks  # client/prof_hooks.py albo atrapa, gdy go nie ma na ścieżce
+
 load_dotenv()
 AUTH_MODE = os.environ.get("AUTH_MODE", "open")
 API_TOKEN = os.environ.get("API_TOKEN", "")
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
+# PROF_PHASES / PROF_MODE (prof_hooks.py): fazy decode/auth/log/respond, zrzut do PROF_OUT
+HOOKS = Hooks("server_coap", os.environ.get("PROF_OUT") or ".")
+PH = HOOKS.timers
+
 
 class SensorResource(resource.Resource):
     async def render_post(self, request: Message) -> Message:
+        t = PH.start()
         payload = request.payload.decode() if request.payload else ""
         try:
             data = json.loads(payload)
+            t = PH.lap("decode", t)
             if AUTH_MODE == "auth":
                 q = (request.opt.uri_query or [])
                 token = ""
@@ -30,11 +38,16 @@ class SensorResource(resource.Resource):
                 if token != API_TOKEN:
                     logging.info("Unauthorized CoAP (bad token)")
                     return Message(code=Code.UNAUTHORIZED, payload=b"UNAUTHORIZED")
+                t = PH.lap("auth", t)
 
         except Exception:
             data = payload
         logging.info("Received CoAP POST: %s", data)
-        return Message(code=Code.CHANGED, payload=b"OK")
+        t = PH.lap("log", t)
+        response = Message(code=Code.CHANGED, payload=b"OK")
+        PH.lap("respond", t)
+        HOOKS.tick()
+        return response
 
 
 class Root(resource.Site):
@@ -44,6 +57,7 @@ class Root(resource.Site):
 
 
 async def main():
+    HOOKS.start()
     site = Root()
     bind_host = os.environ.get("COAP_BIND", "0.0.0.0")
     bind_port = int(os.environ.get("COAP_PORT", "5683"))
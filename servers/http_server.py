@@ -1,5 +1,7 @@
-from flask import Flask, request
+from flask import Flask, request, g
 import os
+
+from server_hooks import Hooks  # client/prof_hooks.py albo atrapa, gdy go nie ma na ścieżce
 # from dotenv import load_dotenv
 # load_dotenv()
 
@@ -7,17 +9,41 @@ AUTH_MODE = os.environ.get("AUTH_MODE", "open")
 API_TOKEN = os.getenv("API_TOKEN")
 app = Flask(__name__)
 
+# PROF_PHASES / PROF_MODE (prof_hooks.py): fazy auth/handler/request, zrzut do PROF_OUT
+HOOKS = Hooks("server_http", os.environ.get("PROF_OUT") or ".")
+PH = HOOKS.timers
+
+if HOOKS.active:
+    @app.before_request
+    def _prof_begin():
+        g.prof_t0 = PH.start()
+
+    @app.after_request
+    def _prof_end(response):
+        t0 = getattr(g, "prof_t0", 0)
+        if t0:
+            PH.lap("request", t0)  # routing + widok + budowa odpowiedzi (bez zapisu do gniazda)
+        HOOKS.tick()
+        return response
+
 @app.route("/post", methods=["POST"])
 def p():
+    t = PH.start()
     if AUTH_MODE == "auth":
         auth = request.headers.get("Authorization", "")
         expected = f"Bearer {API_TOKEN}"
         if auth != expected:
             return "Unauthorized", 401
+        t = PH.lap("auth", t)
 
     # tutaj możesz potem dodać logowanie payloadu jeśli chcesz
+    PH.lap("handler", t)
     return "OK", 200
 
 if __name__ == "__main__":
-    # serwer HTTP będzie nasłuchiwał na 0.0.0.0:5000
-    app.run(host="0.0.0.0", port=5000)
+    HOOKS.start()
+    # cProfile widzi tylko główny wątek -> przy PROF_MODE=cprofile żądania obsługiwane bez wątków
+    threaded = HOOKS.mode != "cprofile"
+    # serwer HTTP będzie nasłuchiwał na 0.0.0.0:5000 (HTTP_BIND/HTTP_PORT dla lokalnego harnessu)
+    app.run(host=os.environ.get("HTTP_BIND", "0.0.0.0"), port=int(os.environ.get("HTTP_PORT", "5000")),
+            threaded=threaded)
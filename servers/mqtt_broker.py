@@ -0,0 +1,190 @@
+"""
+Minimal MQTT 3.1.1 broker used as a local stand-in for mosquitto.
+
+Supports exactly what protocol_client.py needs: CONNECT (optionally with
+username/password when AUTH_MODE=auth), SUBSCRIBE/UNSUBSCRIBE with + and #
+wildcards, PUBLISH QoS 0/1 (forwarded to subscribers at QoS 0), PINGREQ and
+DISCONNECT. No retained messages, sessions or wills.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+AUTH_MODE = os.environ.get("AUTH_MODE", "open")
+MQTT_USER = os.environ.get("MQTT_USER", "")
+MQTT_PASS = os.environ.get("MQTT_PASS", "")
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+# MQTT control packet types (upper nibble of the fixed header)
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+CONNACK_ACCEPTED = 0
+CONNACK_NOT_AUTHORIZED = 5
+
+
+def encode_remaining_length(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        if n:
+            byte |= 0x80
+        out.append(byte)
+        if not n:
+            return bytes(out)
+
+
+def packet(ptype: int, flags: int, body: bytes) -> bytes:
+    return bytes([(ptype << 4) | flags]) + encode_remaining_length(len(body)) + body
+
+
+def read_str(buf: bytes, pos: int) -> Tuple[bytes, int]:
+    n = int.from_bytes(buf[pos:pos + 2], "big")
+    return buf[pos + 2:pos + 2 + n], pos + 2 + n
+
+
+def topic_matches(filt: str, topic: str) -> bool:
+    f_parts = filt.split("/")
+    t_parts = topic.split("/")
+    for i, f in enumerate(f_parts):
+        if f == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if f != "+" and f != t_parts[i]:
+            return False
+    return len(f_parts) == len(t_parts)
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Optional[Tuple[int, int, bytes]]:
+    try:
+        first = await reader.readexactly(1)
+        mult = 1
+        length = 0
+        while True:
+            b = (await reader.readexactly(1))[0]
+            length += (b & 0x7F) * mult
+            if not b & 0x80:
+                break
+            mult *= 128
+        body = await reader.readexactly(length) if length else b""
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return first[0] >> 4, first[0] & 0x0F, body
+
+
+class Broker:
+    def __init__(self, auth_mode: str = AUTH_MODE, user: str = MQTT_USER, password: str = MQTT_PASS):
+        self.auth_mode = auth_mode
+        self.user = user
+        self.password = password
+        self.subs: Dict[asyncio.StreamWriter, Set[str]] = {}
+
+    def authorized(self, username: Optional[bytes], password: Optional[bytes]) -> bool:
+        if self.auth_mode != "auth":
+            return True
+        return username == self.user.encode() and password == self.password.encode()
+
+    def handle_connect(self, body: bytes) -> Tuple[int, str]:
+        _, pos = read_str(body, 0)  # protocol name
+        flags = body[pos + 1]
+        pos += 4  # level, flags, keepalive
+        client_id, pos = read_str(body, pos)
+        if flags & 0x04:  # will flag
+            _, pos = read_str(body, pos)
+            _, pos = read_str(body, pos)
+        username = password = None
+        if flags & 0x80:
+            username, pos = read_str(body, pos)
+        if flags & 0x40:
+            password, pos = read_str(body, pos)
+        rc = CONNACK_ACCEPTED if self.authorized(username, password) else CONNACK_NOT_AUTHORIZED
+        return rc, client_id.decode(errors="replace")
+
+    def forward(self, topic: str, payload: bytes) -> None:
+        out = packet(PUBLISH, 0, len(topic.encode()).to_bytes(2, "big") + topic.encode() + payload)
+        for writer, filters in self.subs.items():
+            if any(topic_matches(f, topic) for f in filters):
+                writer.write(out)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        pkt = await read_packet(reader)
+        if pkt is None or pkt[0] != CONNECT:
+            writer.close()
+            return
+        rc, client_id = self.handle_connect(pkt[2])
+        writer.write(packet(CONNACK, 0, bytes([0, rc])))
+        if rc != CONNACK_ACCEPTED:
+            logging.info("Client %s (%s) not authorised", client_id, peer)
+            await writer.drain()
+            writer.close()
+            return
+        logging.info("New client connected from %s as %s", peer, client_id)
+        self.subs[writer] = set()
+        try:
+            while True:
+                pkt = await read_packet(reader)
+                if pkt is None:
+                    break
+                ptype, flags, body = pkt
+                if ptype == PUBLISH:
+                    topic, pos = read_str(body, 0)
+                    qos = (flags >> 1) & 0x03
+                    if qos:
+                        pid = body[pos:pos + 2]
+                        pos += 2
+                        writer.write(packet(PUBACK, 0, pid))
+                    self.forward(topic.decode(errors="replace"), body[pos:])
+                elif ptype == SUBSCRIBE:
+                    pid, pos = body[:2], 2
+                    granted: List[int] = []
+                    while pos < len(body):
+                        filt, pos = read_str(body, pos)
+                        pos += 1  # requested QoS; we always grant 0
+                        self.subs[writer].add(filt.decode(errors="replace"))
+                        granted.append(0)
+                    writer.write(packet(SUBACK, 0, pid + bytes(granted)))
+                elif ptype == UNSUBSCRIBE:
+                    pid, pos = body[:2], 2
+                    while pos < len(body):
+                        filt, pos = read_str(body, pos)
+                        self.subs[writer].discard(filt.decode(errors="replace"))
+                    writer.write(packet(UNSUBACK, 0, pid))
+                elif ptype == PINGREQ:
+                    writer.write(packet(PINGRESP, 0, b""))
+                elif ptype == DISCONNECT:
+                    break
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.subs.pop(writer, None)
+            writer.close()
+            logging.info("Client %s disconnected", client_id)
+
+
+async def main():
+    bind_host = os.environ.get("MQTT_BIND", "0.0.0.0")
+    bind_port = int(os.environ.get("MQTT_PORT", "1883"))
+    broker = Broker()
+    server = await asyncio.start_server(broker.handle, bind_host, bind_port)
+    logging.info("MQTT broker listening on tcp/%s (bind %s, auth=%s)", bind_port, bind_host, AUTH_MODE)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+# server_hooks.py
+"""
+prof_hooks dla serwerów bez zależności od układu katalogów.
+
+client/prof_hooks.py jest importowany, gdy jest na ścieżce (obraz coap kopiuje go obok,
+compose i run_local.py ustawiają PYTHONPATH). Serwer uruchomiony wprost
+(python servers/http_server.py) bez niego działa z atrapą bez instrumentacji; gdy
+ustawiono PROF_PHASES / PROF_MODE, brak modułu jest błędem, a nie cichym wyłączeniem.
+"""
+import os
+
+try:
+    from prof_hooks import Hooks
+except ImportError:
+    if os.environ.get("PROF_PHASES", "0") not in ("", "0") or os.environ.get("PROF_MODE"):
+        raise ImportError("PROF_PHASES / PROF_MODE set, but prof_hooks is not importable "
+                          "(add client/ to PYTHONPATH or copy client/prof_hooks.py next to the server)")
+
+    class _NullTimers:
+        @staticmethod
+        def start() -> int:
+            return 0
+
+        def add(self, name: str, ns: int) -> None:
+            pass
+
+        def lap(self, name: str, t0: int) -> int:
+            return 0
+
+    class Hooks:  # type: ignore[no-redef]
+        """Ten sam interfejs co prof_hooks.Hooks, nic nie mierzy."""
+
+        active = False
+        mode = ""
+
+        def __init__(self, tag: str, out_dir: str):
+            self.tag = tag
+            self.out_dir = out_dir
+            self.timers = _NullTimers()
+
+        def start(self) -> None:
+            pass
+
+        def tick(self) -> None:
+            pass
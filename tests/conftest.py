@@ -0,0 +1,6 @@
+"""Wspólne ustawienia testów: narzędzia z tools/ importowane jak w skryptach (import rodzeństwa)."""
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "tools"))
@@ -0,0 +1,33 @@
+"""
+client/arrivals.py: błędna konfiguracja kończy się ValueError przy tworzeniu Arrivals.
+
+Uruchom:
+  python -m pytest -q tests/test_arrivals.py
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "client"))
+import arrivals  # noqa: E402
+
+
+def test_trace_without_path():
+    with pytest.raises(ValueError, match="ARRIVAL_TRACE"):
+        arrivals.Arrivals(1.0, "1", env={"ARRIVAL": "trace"})
+
+
+@pytest.mark.parametrize("n", [None, "", "0"])
+def test_spread_without_fleet(n):
+    env = {"ARRIVAL_PHASE": "spread"}
+    if n is not None:
+        env["ARRIVAL_N"] = n
+    with pytest.raises(ValueError, match="ARRIVAL_N"):
+        arrivals.Arrivals(1.0, "1", env=env)
+
+
+def test_spread_offsets():
+    offsets = [arrivals.Arrivals(1.0, str(i), env={"ARRIVAL_PHASE": "spread", "ARRIVAL_N": "4"}).phase_s
+               for i in range(1, 6)]
+    assert offsets == [0.0, 0.25, 0.5, 0.75, 0.0]
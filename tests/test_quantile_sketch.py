@@ -0,0 +1,94 @@
+"""
+tools/quantile_sketch.py: granica błędu względnego i scalanie DDSketch wobec dokładnych
+kwantyli NumPy (method="nearest" = ranga round((n - 1) * q), jak percentile() w narzędziach).
+
+Uruchom:
+  python -m pytest -q tests/test_quantile_sketch.py
+"""
+import numpy as np
+import pytest
+
+from quantile_sketch import MIN_VALUE, DDSketch
+
+N = 20_000
+QS = (0.0, 0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 0.999, 1.0)
+
+
+def dataset(name: str, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if name == "lognormal":
+        return rng.lognormal(1.5, 0.6, N)
+    if name == "pareto":
+        return (rng.pareto(1.5, N) + 1) * 2.0
+    if name == "uniform":
+        return rng.uniform(0.5, 50.0, N)
+    if name == "bimodal":
+        return np.concatenate([rng.normal(5, 0.5, N // 2).clip(0.01), rng.normal(900, 50, N - N // 2)])
+    if name == "with_zeros":
+        return np.concatenate([np.zeros(N // 10), rng.exponential(3.0, N - N // 10)])
+    raise ValueError(name)
+
+
+DISTRIBUTIONS = ["lognormal", "pareto", "uniform", "bimodal", "with_zeros"]
+
+
+def assert_within(sk: DDSketch, vals: np.ndarray, alpha: float) -> None:
+    for q in QS:
+        exact = float(np.quantile(vals, q, method="nearest"))
+        est = sk.quantile(q)
+        if exact > MIN_VALUE:
+            assert abs(est - exact) <= alpha * exact + 1e-12, (q, est, exact)
+        else:
+            assert est == pytest.approx(exact, abs=MIN_VALUE), (q, est, exact)
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+@pytest.mark.parametrize("name", DISTRIBUTIONS)
+def test_relative_error_bound(name, alpha):
+    vals = dataset(name)
+    sk = DDSketch.of(vals, alpha)
+    assert_within(sk, vals, alpha)
+    assert sk.count == vals.size
+    assert sk.min == vals.min() and sk.max == vals.max()
+    assert sk.mean() == pytest.approx(vals.mean(), rel=1e-9)
+    assert sk.pstdev() == pytest.approx(vals.std(), rel=1e-6)
+
+
+@pytest.mark.parametrize("name", DISTRIBUTIONS)
+def test_merge_of_parts_equals_whole(name):
+    alpha = 0.01
+    vals = dataset(name)
+    parts = np.array_split(np.random.default_rng(1).permutation(vals), 17)
+    merged = DDSketch(alpha)
+    for part in parts:
+        # per-plik szkic przez to_array()/from_array(), jak w ParseCache
+        merged.merge(DDSketch.from_array(DDSketch.of(part, alpha).to_array()))
+    whole = DDSketch.of(vals, alpha)
+
+    assert merged.count == whole.count and merged.zero == whole.zero
+    assert merged.min == whole.min and merged.max == whole.max
+    for q in QS:
+        assert merged.quantile(q) == whole.quantile(q)
+    assert_within(merged, vals, alpha)
+
+
+def test_merge_disjoint_ranges():
+    # szkice bez wspólnych kubełków (np. dwa protokoły) -> offset i rozmiar po scaleniu
+    low = np.random.default_rng(2).uniform(0.1, 1.0, 5000)
+    high = np.random.default_rng(3).uniform(1000.0, 5000.0, 5000)
+    merged = DDSketch.of(high).merge(DDSketch.of(low))
+    assert_within(merged, np.concatenate([low, high]), 0.01)
+
+
+def test_merge_rejects_different_alpha():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
+
+
+def test_empty_and_nan():
+    sk = DDSketch()
+    assert sk.quantile(0.5) is None and sk.mean() is None
+    sk.add([np.nan, 4.0, np.nan])
+    assert sk.count == 1 and sk.quantile(0.99) == 4.0
+    with pytest.raises(ValueError):
+        sk.add([-1.0])
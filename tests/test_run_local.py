@@ -0,0 +1,42 @@
+"""
+scripts/run_local.py end-to-end: serwer + 1 klient na localhost przez kilka sekund.
+
+Uruchom:
+  python -m pytest -q tests/test_run_local.py
+"""
+import csv
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port(kind: int) -> int:
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize("proto", ["http", "mqtt", "coap"])
+def test_one_client_writes_rtt_rows(proto, tmp_path):
+    out = f"t_{proto}"
+    cmd = [sys.executable, str(ROOT_DIR / "scripts" / "run_local.py"), "1", proto, "3", out,
+           "--freq", "0.2", "--results-base", str(tmp_path), "--broker", "builtin",
+           "--resource-interval", "0", "--stop-wait", "5",
+           "--http-port", str(free_port(socket.SOCK_STREAM)),
+           "--mqtt-port", str(free_port(socket.SOCK_STREAM)),
+           "--coap-port", str(free_port(socket.SOCK_DGRAM))]
+    res = subprocess.run(cmd, cwd=str(ROOT_DIR), capture_output=True, text=True, timeout=120)
+    assert res.returncode == 0, res.stdout + res.stderr
+
+    files = list((tmp_path / out).glob(f"metrics_{out}_{proto}_id1.csv"))
+    assert files, f"no metrics CSV in {tmp_path / out}: {res.stdout}"
+    with open(files[0], encoding="utf-8", newline="") as f:
+        rows = [r for r in csv.DictReader(f) if r["rtt"]]
+    assert rows, "metrics CSV has no RTT rows"
+    assert all(float(r["rtt"]) > 0 for r in rows)
+    assert (tmp_path / "run_manifest.json").exists()
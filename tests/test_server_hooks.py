@@ -0,0 +1,37 @@
+"""
+servers/server_hooks.py: serwer uruchomiony wprost (bez client/ na ścieżce) startuje z atrapą,
+a z PROF_PHASES brak prof_hooks jest błędem.
+
+Uruchom:
+  python -m pytest -q tests/test_server_hooks.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CODE = "import sys, server_hooks; h = server_hooks.Hooks('t', sys.argv[1]); h.start(); h.tick(); print(h.active, h.timers.lap('x', h.timers.start()))"
+
+
+def run_in_servers(out: Path, **env: str) -> subprocess.CompletedProcess:
+    base = {k: v for k, v in os.environ.items() if not k.startswith("PROF_") and k != "PYTHONPATH"}
+    return subprocess.run([sys.executable, "-c", CODE, str(out)], cwd=str(ROOT_DIR / "servers"), env={**base, **env},
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_without_prof_hooks_is_noop(tmp_path):
+    res = run_in_servers(tmp_path)
+    assert res.returncode == 0, res.stderr
+    assert res.stdout.split() == ["False", "0"]
+
+
+def test_without_prof_hooks_but_prof_requested_fails(tmp_path):
+    res = run_in_servers(tmp_path, PROF_PHASES="1")
+    assert res.returncode != 0 and "prof_hooks is not importable" in res.stderr
+
+
+def test_with_client_on_path_uses_prof_hooks(tmp_path):
+    res = run_in_servers(tmp_path, PYTHONPATH=str(ROOT_DIR / "client"), PROF_PHASES="1")
+    assert res.returncode == 0, res.stderr
+    assert res.stdout.split()[0] == "True"
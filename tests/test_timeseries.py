@@ -0,0 +1,71 @@
+"""
+tools/timeseries.py: korzeń z samymi pcapami i pcap z ruchem protokołu bez CSV klientów
+(kolumny lat_* puste, a nie KeyError).
+
+Uruchom:
+  python -m pytest -q tests/test_timeseries.py
+"""
+import struct
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import timeseries
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+LINKTYPE_RAW = 101
+
+
+def udp_packet(sport: int, dport: int, payload: bytes) -> bytes:
+    udp = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0,
+                     bytes([127, 0, 0, 1]), bytes([127, 0, 0, 1]))
+    return ip + udp
+
+
+def write_pcap(path: Path, packets) -> None:
+    """Klasyczny pcap (LINKTYPE_RAW), pakiety jako (ts, bajty IP)."""
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_RAW))
+        for ts, data in packets:
+            sec = int(ts)
+            f.write(struct.pack("<IIII", sec, int(round((ts - sec) * 1e6)), len(data), len(data)))
+            f.write(data)
+
+
+def coap_pcap(path: Path, n: int = 20, t0: float = 1_700_000_000.0) -> None:
+    write_pcap(path, [(t0 + i * 0.05, udp_packet(40000, 5683, b"\x40\x02\x00\x01")) for i in range(n)])
+
+
+def test_pcap_only_root(tmp_path):
+    run = tmp_path / "coap" / "open" / "N1" / "rep1"
+    run.mkdir(parents=True)
+    coap_pcap(run / "cap.pcap")
+    out = tmp_path / "ts.csv"
+    res = subprocess.run([sys.executable, str(ROOT_DIR / "tools" / "timeseries.py"), "--root", str(tmp_path),
+                          "--out", str(out), "--bin-ms", "100", "--quiet"],
+                         capture_output=True, text=True, timeout=120)
+    assert res.returncode == 0, res.stdout + res.stderr
+
+    df = pd.read_csv(out)
+    assert list(df.columns) == timeseries.COLUMNS
+    assert set(df["proto"]) == {"coap"}
+    assert df["packets"].sum() == 20
+    assert df[timeseries.LAT_COLUMNS + ["requests"]].isna().all().all()
+
+
+def test_pcap_proto_without_client_csvs(tmp_path):
+    coap_pcap(tmp_path / "cap.pcap", t0=1_700_000_000.0)
+    csv = tmp_path / "metrics_r_http_id1.csv"
+    rows = [f"r,http,1,{1_700_000_000.0 + i * 0.1:.6f},0.002,200," for i in range(10)]
+    csv.write_text("run_id,proto,client_id,ts,rtt,status,error\n" + "\n".join(rows) + "\n", encoding="utf-8")
+
+    df, err = timeseries.build_series(("s", tmp_path / "cap.pcap", [csv], str(tmp_path / "cap.pcap"), 0.1))
+    assert err == "" and df is not None
+    coap, http = df[df["proto"] == "coap"], df[df["proto"] == "http"]
+    assert coap["lat_p99_ms"].isna().all() and coap["packets"].sum() == 20
+    assert http["packets"].isna().all()
+    assert np.allclose(http["lat_p50_ms"].dropna(), 2.0, rtol=0.02)
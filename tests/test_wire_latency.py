@@ -0,0 +1,70 @@
+"""
+tools/wire_latency.py: parowanie CoAP przy ponownym użyciu MID i sprzątanie otwartych
+wymian, obcięty PUBLISH MQTT (snaplen) bez przerwania pliku.
+
+Uruchom:
+  python -m pytest -q tests/test_wire_latency.py
+"""
+import struct
+from types import SimpleNamespace
+
+import wire_latency
+from wire_latency import EXCHANGE_LIFETIME, CoapPairer, MqttPairer
+
+FLOW = ("10.0.0.2", 40000)
+
+
+def frame(ts: float, payload: bytes, seq: int = 0) -> SimpleNamespace:
+    """Minimalny odpowiednik pcap_reader.Decoded dla Pairer.feed()."""
+    return SimpleNamespace(ts=ts, payload=payload, wire_len=len(payload) + 42, tcp_flags=0, seq=seq)
+
+
+def coap(mtype: int, code: int, mid: int, token: bytes = b"\x01") -> bytes:
+    return bytes([0x40 | mtype << 4 | len(token), code]) + struct.pack("!H", mid) + token
+
+
+def test_coap_retransmission_and_eviction():
+    p = CoapPairer()
+    p.feed(frame(0.0, coap(0, 2, 7)), FLOW, True)
+    p.feed(frame(2.0, coap(0, 2, 7)), FLOW, True)            # CON retransmission
+    p.feed(frame(2.5, coap(2, 0x44, 7)), FLOW, False)        # piggybacked 2.04
+    assert len(p.messages) == 1
+    assert p.messages[0].latency_ms == 2500.0
+    assert not p.by_mid and not p.by_token
+
+
+def test_coap_separate_response_by_token():
+    p = CoapPairer()
+    p.feed(frame(0.0, coap(0, 2, 7, b"\xaa")), FLOW, True)
+    p.feed(frame(0.1, coap(2, 0, 7, b"")), FLOW, False)      # empty ACK
+    p.feed(frame(0.4, coap(0, 0x44, 900, b"\xaa")), FLOW, False)
+    assert p.messages[0].latency_ms == 400.0
+    assert not p.by_mid and not p.by_token
+
+
+def test_coap_mid_reuse_after_wrap_is_new_message():
+    p = CoapPairer()
+    p.feed(frame(0.0, coap(0, 2, 7, b"\x01")), FLOW, True)   # never answered
+    t = EXCHANGE_LIFETIME + 10.0
+    p.feed(frame(t, coap(0, 2, 7, b"\x02")), FLOW, True)     # same MID after wrap
+    p.feed(frame(t + 0.01, coap(2, 0x44, 7, b"\x02")), FLOW, False)
+    assert len(p.messages) == 2
+    assert p.messages[0].t_resp is None
+    assert round(p.messages[1].latency_ms, 6) == 10.0
+    assert not p.by_mid and not p.by_token                    # unanswered one pruned too
+
+
+def mqtt_publish(topic: bytes, body: bytes, qos: int) -> bytes:
+    var = struct.pack("!H", len(topic)) + topic + body
+    return bytes([wire_latency.MQTT_PUBLISH << 4 | qos << 1, len(var)]) + var
+
+
+def test_mqtt_truncated_qos1_publish_is_skipped():
+    p = MqttPairer()
+    short = mqtt_publish(b"t", b"", 1)                        # QoS1, but no packet id
+    ok = mqtt_publish(b"t", b"\x00\x05{}", 1)
+    p.feed(frame(0.0, short, seq=1), FLOW, True)
+    p.feed(frame(0.1, ok, seq=1 + len(short)), FLOW, True)
+    p.feed(frame(0.2, bytes([wire_latency.MQTT_PUBACK << 4, 2, 0, 5]), seq=1), FLOW, False)
+    assert len(p.messages) == 1
+    assert round(p.messages[0].ack_ms, 6) == 100.0
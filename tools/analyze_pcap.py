@@ -1,9 +1,15 @@
 # analyze_pcap.py
-import sys, subprocess, json, csv
+import sys, subprocess, json, csv, shutil
 if len(sys.argv)<2:
-    print("Usage: python analyze_pcap.py file.pcap")
+    print("Usage: python analyze_pcap.py file.pcap [--native]")
     sys.exit(1)
 pcap=sys.argv[1]
+if "--native" in sys.argv or shutil.which("tshark") is None:
+    # no tshark -> frames/bytes/duration + per-port summary from the built-in reader
+    import pcap_reader
+    sys.argv=[sys.argv[0], pcap]
+    pcap_reader.main()
+    sys.exit(0)
 # use tshark to get protocol hierarchy statistics in JSON-like
 cmd=['tshark','-r',pcap,'-q','-z','io,phs']
 proc=subprocess.run(cmd, capture_output=True, text=True)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Synchronizacja floty klientów: jak bardzo wysyłki skupiają się w czasie i co to robi z RTT.
+
+Dla każdego katalogu z metrics_*_id*.csv (przebieg) chwile wysłania to ts - rtt
+(ts = odpowiedź) ze wszystkich klientów razem; błędy bez rtt są pomijane.
+
+- rate_per_s              wysyłki/s (cała flota, od pierwszej do ostatniej),
+- iat_cv                  współczynnik zmienności odstępów między kolejnymi wysyłkami
+                          floty: ~1 dla procesu Poissona, >> 1 gdy klienci strzelają
+                          paczkami (ten sam START_FILE + ten sam FREQ),
+- peak_per_window / mean_per_window / peak_to_mean
+                          wysyłki w oknie --window-ms (maks., średnia po wszystkich oknach
+                          między pierwszą a ostatnią wysyłką),
+- sync_frac               udział wysyłek, które mają inną wysyłkę bliżej niż --window-ms,
+- rtt_p50_ms / rtt_p99_ms, late / max_late_ms (z arrival_*.json klientów),
+- model / phase / seed    z run_manifest.json (extra.arrival*) albo z arrival_*.json,
+- przy odtwarzaniu śladu (replay_*.json z client/trace_replay.py) odchyłka osiągniętej
+  chwili wysłania od zamierzonej: replay_behind (wiersze spóźnione przez zamkniętą
+  pętlę), dev_p50_us (mediana median klientów), dev_p99_us / dev_max_us / sched_p99_us
+  (maksimum po klientach, więc górne ograniczenie dla floty), within_1ms (ważone).
+
+Porównanie np. ARRIVAL=fixed i ARRIVAL=poisson przy tym samym N pokazuje, ile
+ogona RTT wynika z synchronizacji, a nie z samego obciążenia.
+
+Uruchom:
+  python arrival_stats.py --root ../results/series_x --out arrival_stats.csv [--window-ms 10]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from coordinated_omission import read_ts_rtt
+from job_pool import file_weight, run_ordered
+from timeseries import client_csvs
+
+RE_PROTO = re.compile(r"metrics_.+_(http|mqtt|coap)_id\d+\.csv$", re.IGNORECASE)
+MANIFEST_NAME = "run_manifest.json"  # == scripts/run_manifest.py
+
+
+def read_arrival_meta(run_dir: Path) -> Dict[str, object]:
+    """model/phase/seed przebiegu + suma late z arrival_*.json klientów."""
+    meta: Dict[str, object] = {"model": None, "phase": None, "seed": None, "late": None, "max_late_ms": None}
+    late, max_late, seen = 0, 0.0, False
+    for f in sorted(run_dir.glob("arrival_*_id*.json")):
+        try:
+            d = json.loads(f.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        seen = True
+        for k in ("model", "phase", "seed"):
+            if meta[k] is None:
+                meta[k] = d.get(k)
+        late += int(d.get("late") or 0)
+        max_late = max(max_late, float(d.get("max_late_s") or 0.0) * 1000.0)
+    if seen:
+        meta["late"], meta["max_late_ms"] = late, round(max_late, 3)
+    # manifest: results_<OUT>/run_manifest.json obok albo nad katalogiem z CSV
+    for d in (run_dir, run_dir.parent):
+        mf = d / MANIFEST_NAME
+        if not mf.exists():
+            continue
+        try:
+            extra = json.loads(mf.read_text(encoding="utf-8")).get("extra") or {}
+        except ValueError:
+            break
+        for k, key in (("model", "arrival"), ("phase", "arrival_phase"), ("seed", "arrival_seed")):
+            if extra.get(key) not in (None, ""):
+                meta[k] = extra[key]
+        break
+    meta.update(read_replay(run_dir))
+    if meta["model"] is None and not seen:
+        meta.update(model="fixed", phase="none")  # przebiegi sprzed arrivals.py
+    return meta
+
+
+def read_replay(run_dir: Path) -> Dict[str, object]:
+    """Odchyłki wysyłek z replay_*.json klientów (puste, gdy przebieg nie odtwarzał śladu)."""
+    docs = []
+    for f in sorted(run_dir.glob("replay_*_id*.json")):
+        try:
+            docs.append(json.loads(f.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    if not docs:
+        return {}
+    sent = sum(int(d.get("sent") or 0) for d in docs)
+    p50s = [d["dev_p50_us"] for d in docs if d.get("dev_p50_us") is not None]
+
+    def worst(key: str) -> Optional[float]:
+        vals = [d[key] for d in docs if d.get(key) is not None]
+        return max(vals) if vals else None
+
+    within = sum(float(d.get("within_1ms") or 0.0) * int(d.get("sent") or 0) for d in docs)
+    return {"model": "replay", "phase": f"x{docs[0].get('speed')}/{docs[0].get('map')}", "seed": docs[0].get("trace"),
+            "replay_sent": sent, "replay_behind": sum(int(d.get("behind") or 0) for d in docs),
+            "dev_p50_us": float(np.median(p50s)) if p50s else None, "dev_p99_us": worst("dev_p99_us"),
+            "dev_max_us": worst("dev_max_us"), "sched_p99_us": worst("sched_p99_us"),
+            "within_1ms": within / sent if sent else None}
+
+
+def send_stats(send: np.ndarray, window_s: float) -> Dict[str, Optional[float]]:
+    out: Dict[str, Optional[float]] = {"rate_per_s": None, "iat_cv": None, "peak_per_window": None,
+                                       "mean_per_window": None, "peak_to_mean": None, "sync_frac": None}
+    if send.size < 2:
+        return out
+    send = np.sort(send)
+    span = send[-1] - send[0]
+    iat = np.diff(send)
+    if span > 0:
+        out["rate_per_s"] = (send.size - 1) / span
+    m = iat.mean()
+    if m > 0:
+        out["iat_cv"] = float(iat.std() / m)
+    bins = np.floor((send - send[0]) / window_s).astype(np.int64)
+    counts = np.bincount(bins)
+    out["peak_per_window"] = int(counts.max())
+    out["mean_per_window"] = float(counts.mean())
+    out["peak_to_mean"] = float(counts.max() / counts.mean())
+    close = np.zeros(send.size, dtype=bool)
+    close[1:] |= iat < window_s
+    close[:-1] |= iat < window_s
+    out["sync_frac"] = float(close.mean())
+    return out
+
+
+def analyse_dir(job: Tuple[Path, List[Path]], window_s: float = 0.01) -> Dict[str, object]:
+    """Pool worker: katalog z CSV klientów -> wiersz wyniku (błąd w kolumnie error)."""
+    run_dir, files = job
+    row: Dict[str, object] = {"run": str(run_dir), "proto": None, "clients": len(files)}
+    try:
+        send_parts, rtt_parts = [], []
+        for f in files:
+            m = RE_PROTO.search(f.name)
+            if m and row["proto"] is None:
+                row["proto"] = m.group(1).lower()
+            ts, rtt = read_ts_rtt(f)
+            ok = ~np.isnan(rtt)
+            send_parts.append(ts[ok] - rtt[ok])
+            rtt_parts.append(rtt[ok] * 1000.0)
+        send = np.concatenate(send_parts) if send_parts else np.empty(0)
+        rtt_ms = np.concatenate(rtt_parts) if rtt_parts else np.empty(0)
+        row.update(read_arrival_meta(run_dir))
+        row["sends"] = int(send.size)
+        row.update(send_stats(send, window_s))
+        row["rtt_p50_ms"] = float(np.percentile(rtt_ms, 50)) if rtt_ms.size else None
+        row["rtt_p99_ms"] = float(np.percentile(rtt_ms, 99)) if rtt_ms.size else None
+        row["error"] = ""
+    except (OSError, ValueError, pd.errors.EmptyDataError) as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def _fmt(v: object, spec: str) -> str:
+    return "-" if v is None else spec.format(v)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fleet send-time synchronization and its effect on RTT, per run.")
+    ap.add_argument("--root", required=True, help="Results root (searched recursively for metrics_*_id*.csv).")
+    ap.add_argument("--out", required=True, help="Output CSV (one row per run directory).")
+    ap.add_argument("--window-ms", type=float, default=10.0, help="Window for peak/sync counting.")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel worker processes (0 = all CPUs).")
+    ap.add_argument("--quiet", action="store_true", help="No per-file progress on stderr.")
+    args = ap.parse_args()
+
+    if args.window_ms <= 0:
+        ap.error("--window-ms must be > 0")
+    root = Path(os.path.expanduser(args.root)).resolve()
+    groups: Dict[Path, List[Path]] = defaultdict(list)
+    for f in client_csvs(root):
+        groups[f.parent].append(f)
+    if not groups:
+        print(f"ERROR: no metrics_*.csv under {root}", file=sys.stderr)
+        sys.exit(1)
+
+    jobs = sorted(groups.items())
+    weights = [sum(file_weight(f) for f in files) for _, files in jobs]
+    rows = run_ordered(partial(analyse_dir, window_s=args.window_ms / 1000.0), jobs,
+                       jobs=args.jobs or os.cpu_count() or 1, weights=weights, label="arrivals ",
+                       progress=not args.quiet)
+
+    for r in rows:
+        if r["error"]:
+            print(f"WARN: {r['run']}: {r['error']}", file=sys.stderr)
+            continue
+        print(f"{r['run']}\n  {r['proto']} N={r['clients']} {r['model']}/{r['phase']} seed={r['seed']}"
+              f"  rate={_fmt(r['rate_per_s'], '{:.1f}')}/s  iat_cv={_fmt(r['iat_cv'], '{:.2f}')}"
+              f"  peak/mean={_fmt(r['peak_to_mean'], '{:.1f}')}  sync={_fmt(r['sync_frac'], '{:.0%}')}"
+              f"  p50={_fmt(r['rtt_p50_ms'], '{:.2f}')}ms  p99={_fmt(r['rtt_p99_ms'], '{:.2f}')}ms"
+              f"  late={_fmt(r['late'], '{}')}")
+        if r.get("model") == "replay":
+            print(f"  replay: sent={r['replay_sent']} behind={r['replay_behind']}"
+                  f"  dev p50={_fmt(r['dev_p50_us'], '{:.1f}')}us p99<={_fmt(r['dev_p99_us'], '{:.0f}')}us"
+                  f" max={_fmt(r['dev_max_us'], '{:.0f}')}us  sched p99<={_fmt(r['sched_p99_us'], '{:.0f}')}us"
+                  f"  within 1ms={_fmt(r['within_1ms'], '{:.1%}')}")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows).to_csv(out, index=False)
+    print(f"\nWrote {out} ({len(rows)} runs, window {args.window_ms:g} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Coordinated-omission correction for closed-loop clients (vectorised, NumPy).
+
+The client sleeps FREQ after every response, so a stall of S seconds yields ONE
+slow sample instead of the ~S/interval requests that the intended schedule
+would have sent meanwhile. Like HdrHistogram's recordValueWithExpectedInterval,
+each sample v > interval is backfilled with the latencies those missing requests
+would have seen:
+
+    v - interval, v - 2*interval, ...   (while >= interval)
+
+The expected interval comes from --co-interval (e.g. FREQ) or, per client file,
+from the median spacing of consecutive samples (ts is the completion time, so
+this is FREQ + the typical RTT). With a non-fixed arrival model (client/arrivals.py)
+the median spacing is not the period; pass --co-interval FREQ there.
+
+Used by latency_summary.py and latency_metrics.py (--co-correct), which report
+corrected percentiles next to the uncorrected ones. The correction runs on all
+samples: their outlier filters (> mult * median) would otherwise drop the very
+stalls it is meant to expand.
+"""
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# hard cap on synthetic samples per file (protects against a tiny interval)
+MAX_BACKFILL = 10_000_000
+
+
+def read_ts_rtt(path: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """(ts [s], rtt [s]) of a client CSV; rtt is NaN for failed requests."""
+    df = pd.read_csv(path, usecols=lambda c: c in ("ts", "rtt"))
+    if "ts" not in df.columns or "rtt" not in df.columns:
+        return np.empty(0), np.empty(0)
+    ts = pd.to_numeric(df["ts"], errors="coerce").to_numpy(dtype=np.float64)
+    rtt = pd.to_numeric(df["rtt"], errors="coerce").to_numpy(dtype=np.float64)
+    keep = ~np.isnan(ts)
+    return ts[keep], rtt[keep]
+
+
+def infer_interval(ts: np.ndarray) -> Optional[float]:
+    """Median spacing of consecutive samples (same unit as ts), None if it cannot be told."""
+    if ts.size < 2:
+        return None
+    d = np.diff(np.sort(ts))
+    d = d[d > 0]
+    if d.size == 0:
+        return None
+    return float(np.median(d))
+
+
+def backfill(vals: np.ndarray, interval: float) -> np.ndarray:
+    """Synthetic samples for every value > interval (same unit as interval)."""
+    if interval is None or interval <= 0 or vals.size == 0:
+        return np.empty(0)
+    m = np.floor(vals / interval).astype(np.int64) - 1
+    np.maximum(m, 0, out=m)
+    total = int(m.sum())
+    if total == 0:
+        return np.empty(0)
+    if total > MAX_BACKFILL:
+        raise ValueError(f"coordinated-omission backfill would add {total} samples "
+                         f"(interval {interval:g} too small?)")
+    # k = 1..m[i] for every source sample, without a Python loop
+    k = np.arange(total) - np.repeat(np.cumsum(m) - m, m) + 1
+    return np.repeat(vals, m) - k * interval
+
+
+def corrected(vals_ms: np.ndarray, interval_ms: Optional[float]) -> np.ndarray:
+    extra = backfill(vals_ms, interval_ms) if interval_ms else np.empty(0)
+    return np.concatenate([vals_ms, extra]) if extra.size else vals_ms
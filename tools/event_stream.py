@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+System-wide event timeline from per-client metrics_{RUN_ID}_{PROTO}_id{ID}.csv.
+
+The client files of one run directory are merged with a heap-based k-way merge
+(heapq.merge) on `ts`: one buffered csv reader per file, so memory does not
+depend on run length. The merged stream feeds rolling aggregates, emitted per
+second as soon as a second can no longer change:
+
+- completions / errors per second and a rolling mean over --window seconds,
+- in-flight estimate: average number of outstanding requests in the second,
+  sum of the overlap of [ts - rtt, ts] with the second (Little's law); a request
+  is attributed to the seconds it was in flight, so a second is closed only
+  once the stream is --max-rtt past its end,
+- per-second RTT p50/p99/max (ms) by completion time.
+
+Per-client files are expected in ts order (the client appends as it goes);
+out-of-order rows are counted and reported, not re-sorted.
+
+Uruchom:
+  python event_stream.py --root results/series_x --out timeline.csv [--events-out events.csv]
+"""
+import argparse
+import csv
+import heapq
+import math
+import os
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, NamedTuple, Optional
+
+from timeseries import RE_METRICS, client_csvs
+
+
+class Event(NamedTuple):
+    ts: float
+    rtt: Optional[float]  # seconds, None = failed request
+    client: str
+    proto: str
+    error: str
+
+
+class FileStats:
+    def __init__(self):
+        self.rows = 0
+        self.bad_rows = 0
+        self.out_of_order = 0
+
+
+def iter_client_csv(path: Path, stats: FileStats) -> Iterator[Event]:
+    """One buffered reader per file; yields Events in file order."""
+    proto = RE_METRICS.match(path.name).group(1).lower()
+    last = -math.inf
+    with path.open("r", encoding="utf-8", errors="ignore", newline="", buffering=1 << 16) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+        col = {name: i for i, name in enumerate(header)}
+        i_ts, i_rtt, i_cid, i_err = col.get("ts"), col.get("rtt"), col.get("client_id"), col.get("error")
+        if i_ts is None or i_rtt is None:
+            return
+        client = path.stem.rsplit("_id", 1)[-1]
+        for row in reader:
+            stats.rows += 1
+            try:
+                ts = float(row[i_ts])
+            except (ValueError, IndexError):
+                stats.bad_rows += 1
+                continue
+            try:
+                rtt: Optional[float] = float(row[i_rtt]) if row[i_rtt] else None
+            except ValueError:
+                rtt = None
+            if ts < last:
+                stats.out_of_order += 1
+            last = ts
+            err = row[i_err] if i_err is not None and i_err < len(row) else ""
+            cid = row[i_cid] if i_cid is not None and i_cid < len(row) else client
+            yield Event(ts, rtt, cid, proto, err)
+
+
+def merge_events(files: List[Path], stats: Dict[Path, FileStats]) -> Iterator[Event]:
+    """Globally ts-ordered stream of all events (k-way heap merge)."""
+    streams = []
+    for p in files:
+        stats[p] = FileStats()
+        streams.append(iter_client_csv(p, stats[p]))
+    return heapq.merge(*streams, key=lambda e: e.ts)
+
+
+def _pct(sorted_vals: List[float], p: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    return sorted_vals[int(round((len(sorted_vals) - 1) * p))]
+
+
+class _Second:
+    __slots__ = ("done", "errors", "busy", "rtts")
+
+    def __init__(self):
+        self.done = 0
+        self.errors = 0
+        self.busy = 0.0  # request-seconds in flight within this second
+        self.rtts: List[float] = []
+
+
+class RollingAggregates:
+    """Consumes a ts-ordered Event stream, yields one row per closed second."""
+
+    def __init__(self, window_s: int = 10, max_rtt_s: float = 10.0):
+        self.window = window_s
+        self.max_rtt = max_rtt_s
+        self.open: Dict[int, _Second] = {}
+        self.next_sec: Optional[int] = None  # first second not emitted yet
+        self.t0: Optional[int] = None
+        self.recent: Deque[int] = deque()
+        self.recent_sum = 0
+
+    def _get(self, sec: int) -> _Second:
+        s = self.open.get(sec)
+        if s is None:
+            s = self.open[sec] = _Second()
+        return s
+
+    def add(self, e: Event) -> Iterator[Dict[str, object]]:
+        sec = int(math.floor(e.ts))
+        if self.next_sec is None:
+            self.next_sec = self.t0 = sec
+        s = self._get(sec)
+        if e.rtt is None:
+            s.errors += 1
+        else:
+            s.done += 1
+            s.rtts.append(e.rtt * 1000.0)
+            # spread the in-flight time over the seconds it covers (already closed ones are lost)
+            start = max(e.ts - e.rtt, float(self.next_sec))
+            t = start
+            while t < e.ts:
+                k = int(math.floor(t))
+                end = min(e.ts, k + 1.0)
+                self._get(k).busy += end - t
+                t = end
+        yield from self._close_until(e.ts - self.max_rtt)
+
+    def finish(self) -> Iterator[Dict[str, object]]:
+        if self.open:
+            yield from self._close_until(max(self.open) + 1.0)
+
+    def _close_until(self, t: float) -> Iterator[Dict[str, object]]:
+        while self.next_sec is not None and self.next_sec + 1 <= t:
+            sec = self.next_sec
+            self.next_sec += 1
+            s = self.open.pop(sec, None) or _Second()
+            self.recent.append(s.done)
+            self.recent_sum += s.done
+            if len(self.recent) > self.window:
+                self.recent_sum -= self.recent.popleft()
+            rtts = sorted(s.rtts)
+            yield {
+                "second": sec,
+                "t_rel_s": sec - self.t0,
+                "completions": s.done,
+                "errors": s.errors,
+                "rolling_rps": round(self.recent_sum / len(self.recent), 3),
+                "inflight_avg": round(s.busy, 3),
+                "rtt_p50_ms": _r(_pct(rtts, 0.50)),
+                "rtt_p99_ms": _r(_pct(rtts, 0.99)),
+                "rtt_max_ms": _r(rtts[-1] if rtts else None),
+            }
+
+
+def _r(v: Optional[float]) -> Optional[float]:
+    return round(v, 6) if v is not None else None
+
+
+TIMELINE_FIELDS = ["run", "second", "t_rel_s", "completions", "errors", "rolling_rps",
+                   "inflight_avg", "rtt_p50_ms", "rtt_p99_ms", "rtt_max_ms"]
+EVENT_FIELDS = ["run", "ts", "client", "proto", "rtt", "error"]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="k-way merge of per-client CSVs into a system-wide timeline.")
+    ap.add_argument("--root", required=True, help="Directory with metrics_*_id*.csv (one run per directory).")
+    ap.add_argument("--out", required=True, help="Per-second timeline CSV.")
+    ap.add_argument("--events-out", help="Optional merged, time-ordered event CSV.")
+    ap.add_argument("--window", type=int, default=10, help="Rolling throughput window in seconds.")
+    ap.add_argument("--max-rtt", type=float, default=10.0,
+                    help="Longest expected RTT (s); a second is emitted once the stream is this far past it.")
+    args = ap.parse_args()
+
+    root = Path(os.path.expanduser(args.root)).resolve()
+    runs: Dict[Path, List[Path]] = {}
+    for f in client_csvs(root):
+        runs.setdefault(f.parent, []).append(f)
+    if not runs:
+        print(f"ERROR: No metrics_*_id*.csv found under: {root}", file=sys.stderr)
+        sys.exit(1)
+
+    out = Path(os.path.expanduser(args.out)).resolve()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    ev_f = None
+    ev_w = None
+    if args.events_out:
+        ev_path = Path(os.path.expanduser(args.events_out)).resolve()
+        ev_path.parent.mkdir(parents=True, exist_ok=True)
+        ev_f = ev_path.open("w", newline="", encoding="utf-8")
+        ev_w = csv.writer(ev_f)
+        ev_w.writerow(EVENT_FIELDS)
+
+    n_seconds = 0
+    n_events = 0
+    try:
+        with out.open("w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=TIMELINE_FIELDS)
+            w.writeheader()
+            for run_dir, files in sorted(runs.items()):
+                run = str(run_dir.relative_to(root)) if run_dir != root else run_dir.name
+                stats: Dict[Path, FileStats] = {}
+                agg = RollingAggregates(args.window, args.max_rtt)
+                for e in merge_events(files, stats):
+                    n_events += 1
+                    if ev_w is not None:
+                        ev_w.writerow([run, f"{e.ts:.6f}", e.client, e.proto,
+                                       "" if e.rtt is None else f"{e.rtt:.6f}", e.error])
+                    for row in agg.add(e):
+                        row["run"] = run
+                        w.writerow(row)
+                        n_seconds += 1
+                for row in agg.finish():
+                    row["run"] = run
+                    w.writerow(row)
+                    n_seconds += 1
+                bad = sum(s.out_of_order for s in stats.values())
+                if bad:
+                    print(f"WARN: {run}: {bad} rows out of ts order within their client file", file=sys.stderr)
+                print(f"[OK] {run}: {len(files)} clients, {sum(s.rows for s in stats.values())} rows")
+    finally:
+        if ev_f is not None:
+            ev_f.close()
+
+    print(f"Saved timeline: {out} | seconds: {n_seconds} | events: {n_events}")
+
+
+if __name__ == "__main__":
+    main()
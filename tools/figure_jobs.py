@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Figure rendering as independent, cached jobs (plot_metrics.py, plot_metris_scientific.py).
+
+Each figure is a FigureJob: a top-level render function, the data slice it plots
+(DataFrames / arrays / scalars), keyword parameters and rcParams style. The cache
+key is a hash of
+
+- the data slice (pd.util.hash_pandas_object + columns/dtypes, raw bytes for arrays),
+- params and style (JSON),
+- the render function's source (editing a plot function re-renders its figures;
+  shared helpers/constants are not tracked - use --no-cache after changing them),
+- matplotlib version and FIGURE_CACHE_VERSION.
+
+Keys are kept per output file in <outdir>/.figure_cache.json; a job is skipped when
+its key is unchanged and the file still exists. The rest is rendered through
+job_pool.run_ordered (process pool for --jobs > 1); each worker applies the
+job's style before calling the function, so it does not depend on the parent's
+global rcParams.
+
+    jobs = [FigureJob(out / "F1.png", facet_lines, (df,), {"title": ...}, STYLE), ...]
+    rendered, skipped, failed = render_figures(jobs, cache_file, jobs=4)
+"""
+import hashlib
+import inspect
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from job_pool import run_ordered
+
+FIGURE_CACHE_VERSION = 1
+CACHE_NAME = ".figure_cache.json"
+
+
+class FigureJob(NamedTuple):
+    out: Path
+    func: Callable
+    data: tuple = ()
+    params: Dict[str, object] = {}
+    style: Dict[str, object] = {}
+
+    def __str__(self) -> str:  # progress line of run_ordered
+        return str(self.out)
+
+
+def _hash_value(h, v) -> None:
+    if isinstance(v, pd.DataFrame):
+        h.update(json.dumps([[str(c), str(t)] for c, t in v.dtypes.items()]).encode())
+        h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+    elif isinstance(v, pd.Series):
+        h.update(f"{v.name}:{v.dtype}".encode())
+        h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+    elif isinstance(v, np.ndarray):
+        h.update(f"{v.dtype}{v.shape}".encode())
+        h.update(np.ascontiguousarray(v).tobytes())
+    else:
+        h.update(json.dumps(v, sort_keys=True, default=str).encode())
+
+
+def _func_fingerprint(func: Callable) -> str:
+    try:
+        src = inspect.getsource(func)
+    except (OSError, TypeError):
+        src = func.__code__.co_code.hex()
+    return f"{func.__module__}.{func.__qualname__}:{src}"
+
+
+def job_key(job: FigureJob) -> str:
+    import matplotlib
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{FIGURE_CACHE_VERSION}|{matplotlib.__version__}|{_func_fingerprint(job.func)}".encode())
+    for v in job.data:
+        h.update(b"\x00")
+        _hash_value(h, v)
+    h.update(json.dumps(job.params, sort_keys=True, default=str).encode())
+    h.update(json.dumps(job.style, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def render_job(job: FigureJob) -> Optional[str]:
+    """Pool worker: render one figure; returns an error message instead of raising."""
+    import matplotlib.pyplot as plt
+    try:
+        plt.rcParams.update(job.style)
+        job.out.parent.mkdir(parents=True, exist_ok=True)
+        job.func(*job.data, out=job.out, **job.params)
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    finally:
+        plt.close("all")
+
+
+class FigureCache:
+    def __init__(self, path: Path, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self.keys: Dict[str, str] = {}
+        if enabled and path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                if data.get("version") == FIGURE_CACHE_VERSION:
+                    self.keys = data.get("figures", {})
+            except ValueError:
+                pass
+
+    def _rel(self, out: Path) -> str:
+        return os.path.relpath(out, self.path.parent)
+
+    def fresh(self, out: Path, key: str) -> bool:
+        if not self.enabled:
+            return False
+        got = self.keys.get(self._rel(out))
+        # "-key": the function ran but had nothing to draw (e.g. no OPEN/AUTH pair)
+        return (got == key and out.exists()) or (got == "-" + key and not out.exists())
+
+    def record(self, out: Path, key: str) -> None:
+        self.keys[self._rel(out)] = key if out.exists() else "-" + key
+
+    def save(self) -> None:
+        if not self.enabled:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": FIGURE_CACHE_VERSION, "figures": self.keys},
+                                  indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def render_figures(figs: Sequence[FigureJob], cache_file: Path, jobs: int = 1, use_cache: bool = True,
+                   progress: bool = True) -> Tuple[int, int, int]:
+    """Render stale figures (in parallel if jobs > 1) -> (rendered, skipped, failed)."""
+    cache = FigureCache(cache_file, use_cache)
+    keys = [job_key(f) for f in figs]
+    todo = [i for i, (f, k) in enumerate(zip(figs, keys)) if not cache.fresh(f.out, k)]
+    errors = run_ordered(render_job, [figs[i] for i in todo], jobs=jobs,
+                         label="fig ", progress=progress) if todo else []
+    failed = 0
+    for i, err in zip(todo, errors):
+        if err is None:
+            cache.record(figs[i].out, keys[i])
+        else:
+            failed += 1
+            print(f"WARN: {figs[i].out}: {err}", file=sys.stderr)
+    cache.save()
+    return len(todo) - failed, len(figs) - len(todo), failed
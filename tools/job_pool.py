@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Process-pool fan-out for per-file analysis jobs (pcap_metrics, latency_metrics).
+
+- results come back in input order, so output CSVs are deterministic,
+- at most `max_heavy` "heavy" items (e.g. big pcaps) are in flight at once,
+  which bounds peak memory independently of --jobs,
+- progress with ETA (weighted by file size) is printed to stderr.
+
+jobs <= 1 runs everything in-process, in order, with the same progress output.
+"""
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+class Progress:
+    def __init__(self, total: int, total_weight: float, label: str = "", enabled: bool = True):
+        self.total = total
+        self.total_weight = max(total_weight, 1.0)
+        self.done = 0
+        self.done_weight = 0.0
+        self.label = label
+        self.enabled = enabled
+        self.t0 = time.time()
+
+    def update(self, weight: float, name: str = "") -> None:
+        self.done += 1
+        self.done_weight += weight
+        if not self.enabled:
+            return
+        elapsed = time.time() - self.t0
+        frac = self.done_weight / self.total_weight
+        eta = elapsed * (1 - frac) / frac if frac > 0 else float("nan")
+        print(f"[{self.label}{self.done}/{self.total}] {100 * frac:5.1f}% "
+              f"elapsed {elapsed:6.1f}s ETA {eta:6.1f}s {name}", file=sys.stderr)
+
+
+def file_weight(path: Path) -> float:
+    try:
+        return float(path.stat().st_size)
+    except OSError:
+        return 0.0
+
+
+def item_name(item) -> str:
+    """Progress name: a plain (path, options...) tuple shows only its first element."""
+    if type(item) is tuple and item:
+        return str(item[0])
+    return str(item)
+
+
+def run_ordered(func: Callable, items: Sequence, jobs: int = 1,
+                weights: Optional[Sequence[float]] = None,
+                heavy: Optional[Sequence[bool]] = None, max_heavy: int = 0,
+                label: str = "", progress: bool = True,
+                name: Callable[[object], str] = item_name) -> List:
+    """
+    Apply `func` to every item (in worker processes when jobs > 1) and return results
+    in input order. `func` must be a picklable top-level function and should catch
+    its own per-item errors (e.g. return a row with an `error` column). `name(item)`
+    is the text shown on the progress line.
+    """
+    n = len(items)
+    weights = list(weights) if weights is not None else [1.0] * n
+    heavy = list(heavy) if heavy is not None else [False] * n
+    prog = Progress(n, sum(weights), label, progress)
+    results: List = [None] * n
+
+    if jobs <= 1 or n <= 1:
+        for i, item in enumerate(items):
+            results[i] = func(item)
+            prog.update(weights[i], name(item))
+        return results
+
+    pending = list(range(n))
+    running: Dict = {}
+    heavy_running = 0
+    with ProcessPoolExecutor(max_workers=jobs) as ex:
+        while pending or running:
+            # submit in order, but let small files overtake a blocked heavy one
+            while pending and len(running) < jobs:
+                pick = None
+                for k, i in enumerate(pending):
+                    if not heavy[i] or max_heavy <= 0 or heavy_running < max_heavy:
+                        pick = k
+                        break
+                if pick is None:
+                    break
+                i = pending.pop(pick)
+                running[ex.submit(func, items[i])] = i
+                heavy_running += heavy[i]
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = running.pop(fut)
+                heavy_running -= heavy[i]
+                results[i] = fut.result()
+                prog.update(weights[i], name(items[i]))
+    return results
@@ -3,11 +3,23 @@ import argparse
 import csv
 import os
 import re
+import time
 from pathlib import Path
 from statistics import mean, median, pstdev
 from typing import List, Optional, Dict, Tuple
 
+import numpy as np
+
+from coordinated_omission import corrected, infer_interval, read_ts_rtt
+from job_pool import file_weight, run_ordered
+from parse_cache import ParseCache, default_cache_dir
+from quantile_sketch import DEFAULT_ALPHA, DDSketch, save_sketches
+
 LOG_EXTS = (".log", ".txt", ".csv")
+# klucz ParseCache: podbij przy każdej zmianie tego, co parser zwraca dla pliku
+#   1 - jednoprzebiegowy parser logów tekstowych (parse_latency_from_text)
+#   2 - kolumny *_co_latency_ms liczone przed filtrem outlierów
+PARSER_VERSION = 2
 
 # Regexy łapiące typowe zapisy RTT/latency (ms)
 LAT_PATTERNS = [
@@ -72,27 +84,85 @@ def parse_latency_from_csv(path: Path) -> Tuple[List[float], int, int]:
                 errors += 1
     return lat, timeouts, errors
 
-def parse_latency_from_text(path: Path) -> Tuple[List[float], int, int]:
+# Znane formaty logów klienta (protocol_client.py, `docker logs` -> *_rtt.log):
+#   METRIC RTT <proto> id=.. ts=.. rtt=<sekundy> [status=..]
+#   ERR <PROTO> id=.. <wyjątek> / MQTT publish|connect failed ...
+METRIC_PREFIX = "METRIC RTT "
+CLIENT_ERROR_PREFIXES = ("ERR ", "MQTT publish failed", "MQTT connect failed")
+CLIENT_INFO_PREFIXES = ("HTTP LOOP ", "MQTT LOOP ", "COAP LOOP ", "CLIENT START ", "READY_FILE ",
+                        "WAIT FOR START_FILE", "START_FILE ")
+# logging serwera CoAP: "2024-01-01 12:00:00,123 LEVEL msg"
+SERVER_LOG = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d+ (\w+) ")
+READ_BLOCK = 1 << 20
+
+def iter_line_blocks(path: Path):
+    """Lines of a text file, read in ~1 MiB blocks (list of lines per block)."""
+    with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
+        carry = ""
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            lines = (carry + block).split("\n")
+            carry = lines.pop()
+            yield lines
+        if carry:
+            yield [carry]
+
+def parse_generic_line(line: str, lat: List[float]) -> Tuple[int, int]:
+    """Fallback for unknown formats: timeout/error regexes + LAT_PATTERNS (ms). Returns (timeouts, errors)."""
+    to = 1 if TIMEOUT_PAT.search(line) else 0
+    err = 1 if ERROR_PAT.search(line) else 0
+    s = line.strip()
+    for pat in LAT_PATTERNS:
+        m = pat.search(s)
+        if m:
+            try:
+                lat.append(float(m.group(1)))
+            except ValueError:
+                pass
+            break
+    return to, err
+
+def parse_latency_from_text(path: Path) -> Tuple[List[float], int, int, int]:
+    """
+    Single pass over a text log -> (latencies_ms, timeouts, errors, lines).
+    Known client/server lines go through a prefix-dispatch fast path; only unknown
+    lines pay for the generic regexes.
+    """
     lat: List[float] = []
     timeouts = 0
     errors = 0
-    with path.open("r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if TIMEOUT_PAT.search(line):
-                timeouts += 1
-            if ERROR_PAT.search(line):
-                errors += 1
-
-            s = line.strip()
-            for pat in LAT_PATTERNS:
-                m = pat.search(s)
-                if m:
+    lines_seen = 0
+    append = lat.append
+    for lines in iter_line_blocks(path):
+        lines_seen += len(lines)
+        for line in lines:
+            if line.startswith(METRIC_PREFIX):
+                i = line.find(" rtt=")
+                if i >= 0:
+                    j = line.find(" ", i + 5)
                     try:
-                        lat.append(float(m.group(1)))
+                        # client RTT is in seconds -> ms
+                        append(float(line[i + 5:j] if j >= 0 else line[i + 5:]) * 1000.0)
+                        continue
                     except ValueError:
                         pass
-                    break
-    return lat, timeouts, errors
+            elif line.startswith(CLIENT_ERROR_PREFIXES):
+                errors += 1
+                if TIMEOUT_PAT.search(line):
+                    timeouts += 1
+                continue
+            elif line.startswith(CLIENT_INFO_PREFIXES) or not line.strip():
+                continue
+            elif line[:1].isdigit():
+                m = SERVER_LOG.match(line)
+                if m and m.group(1) == "INFO":
+                    continue
+            to, err = parse_generic_line(line, lat)
+            timeouts += to
+            errors += err
+    return lat, timeouts, errors, lines_seen
 
 def guess_scenario_from_path(path: Path) -> str:
     # np. paper_run_open/http/N100/rep1/client.log
@@ -108,12 +178,49 @@ def guess_scenario_from_path(path: Path) -> str:
     name = path.stem.lower()
     return f"{mode}_{proto}_{N}_{rep}_{name}"
 
-def analyze_file(path: Path) -> Dict[str, object]:
+CO_FIELDS = ["median_co_latency_ms", "p90_co_latency_ms", "p95_co_latency_ms", "p99_co_latency_ms",
+             "co_interval_ms", "co_added"]
+
+def co_columns(path: Path, lat: List[float], co_interval: float) -> Dict[str, object]:
+    """Coordinated-omission corrected percentiles of all samples, before the outlier filter
+    (CSV only; co_interval <= 0 -> inferred from ts)."""
+    out: Dict[str, object] = {k: None for k in CO_FIELDS}
+    if not lat or path.suffix.lower() != ".csv":
+        return out
+    interval = co_interval
+    if interval <= 0:
+        ts, rtt = read_ts_rtt(path)
+        interval = infer_interval(ts[~np.isnan(rtt)]) or 0.0
+    if interval <= 0:
+        return out
+    vals = np.asarray(lat, dtype=np.float64)
+    co = np.sort(corrected(vals, interval * 1000.0))
+    p = percentiles(co, [0.90, 0.95, 0.99])
+    out.update({
+        "median_co_latency_ms": round(float(np.median(co)), 6),
+        "p90_co_latency_ms": round(p["p90"], 6),
+        "p95_co_latency_ms": round(p["p95"], 6),
+        "p99_co_latency_ms": round(p["p99"], 6),
+        "co_interval_ms": round(interval * 1000.0, 6),
+        "co_added": int(co.size - vals.size),
+    })
+    return out
+
+def analyze_job(job: Tuple[Path, Optional[float], Optional[float]]) -> Dict[str, object]:
+    path, co_interval, sketch_alpha = job
+    return analyze_file(path, co_interval, sketch_alpha)
+
+def analyze_file(path: Path, co_interval: Optional[float] = None,
+                 sketch_alpha: Optional[float] = None) -> Dict[str, object]:
     if path.suffix.lower() == ".csv":
         lat, to, err = parse_latency_from_csv(path)
+        text_lines = None
     else:
-        lat, to, err = parse_latency_from_text(path)
+        t0 = time.perf_counter()
+        lat, to, err, text_lines = parse_latency_from_text(path)
+        parse_s = time.perf_counter() - t0
 
+    raw_lat = lat  # CO correction expands exactly the stalls the outlier filter drops
     # Drop extreme outliers: anything > 10x median for this client
     if lat:
         med_raw = float(median(lat))
@@ -124,7 +231,7 @@ def analyze_file(path: Path) -> Dict[str, object]:
     n = len(lat_sorted)
 
     if n == 0:
-        return {
+        row = {
             "scenario": guess_scenario_from_path(path),
             "log_path": str(path),
             "count": 0,
@@ -142,6 +249,13 @@ def analyze_file(path: Path) -> Dict[str, object]:
             "errors": err,
             "loss_rate_pct": None,
         }
+        if co_interval is not None:
+            row.update({k: None for k in CO_FIELDS})
+        if sketch_alpha is not None:
+            row["sketch"] = None
+        if text_lines is not None:
+            row.update({"lines_parsed": text_lines, "parse_seconds": parse_s})
+        return row
 
     mu = float(mean(lat_sorted))
     med = float(median(lat_sorted))
@@ -155,7 +269,7 @@ def analyze_file(path: Path) -> Dict[str, object]:
     if denom > 0:
         loss = 100.0 * to / denom
 
-    return {
+    row = {
         "scenario": guess_scenario_from_path(path),
         "log_path": str(path),
         "count": n,
@@ -173,6 +287,15 @@ def analyze_file(path: Path) -> Dict[str, object]:
         "errors": int(err),
         "loss_rate_pct": round(loss, 6) if loss is not None else None,
     }
+    if co_interval is not None:
+        row.update(co_columns(path, raw_lat, co_interval))
+    if sketch_alpha is not None:
+        # mergeable per-file sketch (quantile_sketch.py merge) - not written to the CSV
+        row["sketch"] = DDSketch.of(lat, sketch_alpha).to_array().tolist()
+    if text_lines is not None:
+        # not CSV columns; summed up for the lines/s report in main()
+        row.update({"lines_parsed": text_lines, "parse_seconds": parse_s})
+    return row
 
 def find_logs(root: Path) -> List[Path]:
     out = []
@@ -185,7 +308,21 @@ def main():
     ap = argparse.ArgumentParser(description="Extract latency/jitter metrics from logs -> CSV")
     ap.add_argument("--root", required=True, help="Root folder with logs (recursive).")
     ap.add_argument("--out", required=True, help="Output CSV path.")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel worker processes (0 = all CPUs).")
+    ap.add_argument("--quiet", action="store_true", help="No per-file progress/ETA on stderr.")
+    ap.add_argument("--co-correct", action="store_true",
+                    help="Add coordinated-omission corrected percentiles (*_co_latency_ms, CSV inputs only; "
+                         "computed before the 10x-median outlier filter).")
+    ap.add_argument("--co-interval", type=float, default=0.0,
+                    help="Expected send interval in s for --co-correct (e.g. FREQ; 0 = infer per file).")
+    ap.add_argument("--sketch-out", help="Also write per-file DDSketches (JSON lines) for quantile_sketch.py merge.")
+    ap.add_argument("--sketch-alpha", type=float, default=DEFAULT_ALPHA, help="Sketch relative accuracy.")
+    ap.add_argument("--cache-dir", help="Parse cache dir (default: <root>/.analysis_cache).")
+    ap.add_argument("--no-cache", action="store_true", help="Parse every file, do not read/write the cache.")
+    ap.add_argument("--rebuild", action="store_true", help="Ignore existing cache entries and re-parse everything.")
     args = ap.parse_args()
+    co_interval = args.co_interval if args.co_correct else None
+    sketch_alpha = args.sketch_alpha if args.sketch_out else None
 
     root = Path(os.path.expanduser(args.root)).resolve()
     out_csv = Path(os.path.expanduser(args.out)).resolve()
@@ -194,9 +331,32 @@ def main():
     if not logs:
         raise SystemExit(f"No log/csv/txt files found under {root}")
 
+    cache_params = {"parser_version": PARSER_VERSION}
+    if args.co_correct:
+        cache_params["co_interval"] = co_interval
+    if args.sketch_out:
+        cache_params["sketch_alpha"] = sketch_alpha
+    cache = ParseCache(Path(args.cache_dir) if args.cache_dir else default_cache_dir(root),
+                       "latency_metrics", params=cache_params,
+                       kind="rows", rebuild=args.rebuild, enabled=not args.no_cache)
+
+    cached, todo = cache.lookup(logs)
+    jobs = args.jobs or os.cpu_count() or 1
+    results = run_ordered(analyze_job, [(f, co_interval, sketch_alpha) for f in todo], jobs=jobs, weights=[file_weight(f) for f in todo],
+                          label="logs ", progress=not args.quiet)
+    for f, row in zip(todo, results):
+        cache.store(f, row)
+        cached[f] = row
+    text_rows = [r for r in results if r.get("lines_parsed") is not None]
+    if text_rows:
+        n_lines = sum(r["lines_parsed"] for r in text_rows)
+        secs = sum(r["parse_seconds"] for r in text_rows)
+        rate = n_lines / secs if secs > 0 else float("inf")
+        print(f"Text logs: {len(text_rows)} files, {n_lines} lines in {secs:.2f}s CPU ({rate:,.0f} lines/s)")
+
     rows = []
     for f in logs:
-        row = analyze_file(f)
+        row = cached[f]
         # bierzemy tylko te pliki, gdzie znaleziono choć 1 pomiar ALBO są timeouty/błędy
         if row["count"] > 0 or (row["timeouts"] or 0) > 0 or (row["errors"] or 0) > 0:
             rows.append(row)
@@ -208,15 +368,28 @@ def main():
         "jitter_std_ms","jitter_mad_ms","outliers_3sigma",
         "timeouts","errors","loss_rate_pct"
     ]
+    if args.co_correct:
+        fieldnames += CO_FIELDS
 
     out_csv.parent.mkdir(parents=True, exist_ok=True)
     with out_csv.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
         w.writeheader()
         for r in rows:
             w.writerow(r)
 
-    print(f"Saved: {out_csv} | rows: {len(rows)}")
+    if args.sketch_out:
+        records = []
+        for r in rows:
+            if r.get("sketch"):
+                mode, proto, n, rep = (r["scenario"].split("_") + [None] * 4)[:4]
+                records.append(({"mode": mode, "proto": proto, "N": n, "rep": rep, "file": r["log_path"]},
+                                DDSketch.from_array(np.asarray(r["sketch"]))))
+        n_sk = save_sketches(Path(os.path.expanduser(args.sketch_out)).resolve(), records)
+        print(f"Saved {n_sk} per-file sketches: {args.sketch_out}")
+
+    cache.save(logs)
+    print(f"Saved: {out_csv} | rows: {len(rows)} | {cache.summary()}")
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 import argparse
+import math
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from statistics import mean, median, pstdev
 
+import numpy as np
 import pandas as pd
 
+from coordinated_omission import backfill, infer_interval, read_ts_rtt
+from parse_cache import ParseCache, default_cache_dir
+from quantile_sketch import DEFAULT_ALPHA, DDSketch, save_sketches
+
 RE_MODE = re.compile(r"(?:^|[_/\\-])(open|auth)(?:[_/\\-]|$)", re.I)
 RE_PROTO = re.compile(r"(?:^|[_/\\-])(http|mqtt|coap)(?:[_/\\-]|$)", re.I)
-RE_N = re.compile(r"(?:^|[_/\\-])n(\\d+)(?:[_/\\-]|$)", re.I)
-RE_REP = re.compile(r"(?:^|[_/\\-])rep(\\d+)(?:[_/\\-]|$)", re.I)
+RE_N = re.compile(r"(?:^|[_/\\-])n(\d+)(?:[_/\\-]|$)", re.I)
+RE_REP = re.compile(r"(?:^|[_/\\-])rep(\d+)(?:[_/\\-]|$)", re.I)
+# klucz ParseCache: podbij przy każdej zmianie odczytu / filtrowania próbek
+PARSER_VERSION = 2
 
 
 def parse_meta(path: Path):
@@ -25,11 +34,103 @@ def parse_meta(path: Path):
     return mode, proto, n, rep
 
 
-def percentile(sorted_vals, p):
-    if not sorted_vals:
+def percentile(vals: np.ndarray, p):
+    """Nearest-rank jak wcześniej (idx = round((n-1)*p)), ale przez partition zamiast sort."""
+    if vals.size == 0:
+        return None
+    idx = int(round((vals.size - 1) * p))
+    return float(np.partition(vals, idx)[idx])
+
+
+def median(vals: np.ndarray) -> float:
+    # ta sama definicja co statistics.median (średnia dwóch środkowych dla parzystego n)
+    n = vals.size
+    mid = n // 2
+    if n % 2:
+        return float(np.partition(vals, mid)[mid])
+    part = np.partition(vals, [mid - 1, mid])
+    return float((part[mid - 1] + part[mid]) / 2)
+
+
+def mean(vals: np.ndarray) -> float:
+    # fsum = suma dokładnie zaokrąglona, jak w statistics.mean (i niezależna od kolejności plików)
+    return math.fsum(vals) / vals.size
+
+
+def pstdev(vals: np.ndarray) -> float:
+    mu = mean(vals)
+    return math.sqrt(math.fsum((vals - mu) ** 2) / vals.size)
+
+
+def read_rtt_ms(path: Path, outlier_mult: float):
+    """Jeden plik klienta -> tablica RTT w ms po odrzuceniu outlierów (albo None)."""
+    try:
+        df = pd.read_csv(path, usecols=lambda c: c == "rtt", dtype={"rtt": "float64"}, engine="c")
+    except ValueError:
+        # śmieci w kolumnie rtt -> wolniejsza, tolerancyjna ścieżka jak wcześniej
+        df = pd.read_csv(path, usecols=lambda c: c == "rtt")
+    if "rtt" not in df.columns:
+        return None
+    rtt = pd.to_numeric(df["rtt"], errors="coerce").to_numpy(dtype=np.float64)
+    return drop_outliers(rtt[~np.isnan(rtt)], outlier_mult)
+
+
+def drop_outliers(rtt: np.ndarray, outlier_mult: float):
+    """RTT w sekundach -> ms, bez próbek > mult * mediana (None gdy nic nie zostało)."""
+    if rtt.size == 0:
+        return None
+    # rtt in seconds -> ms
+    rtt_ms = rtt * 1000.0
+    med = median(rtt_ms)
+    if med > 0 and outlier_mult > 0:
+        rtt_ms = rtt_ms[rtt_ms <= outlier_mult * med]
+    if rtt_ms.size == 0:
+        return None
+    return rtt_ms
+
+
+def read_co_extra_ms(path: Path, interval_s: float):
+    """
+    Próbki dosztukowane korektą coordinated omission dla jednego klienta (ms).
+    Liczone z próbek bez filtra --outlier-mult: odrzucone przez niego przestoje to
+    dokładnie to, co korekta ma rozwinąć. interval_s <= 0 -> interwał z mediany
+    odstępów ts w pliku.
+    """
+    ts, rtt = read_ts_rtt(path)
+    ok = ~np.isnan(rtt)
+    rtt_ms = drop_outliers(rtt[ok], 0.0)
+    if rtt_ms is None:
+        return None
+    interval = interval_s if interval_s > 0 else infer_interval(ts[ok])
+    if interval is None:
+        return np.empty(0)
+    return backfill(rtt_ms, interval * 1000.0)
+
+
+def read_rtt_sketch(path: Path, outlier_mult: float, alpha: float):
+    """Jak read_rtt_ms, ale zwraca szkic DDSketch (jako tablicę do cache) zamiast próbek."""
+    rtt_ms = read_rtt_ms(path, outlier_mult)
+    if rtt_ms is None:
         return None
-    idx = int(round((len(sorted_vals) - 1) * p))
-    return float(sorted_vals[idx])
+    return DDSketch.of(rtt_ms, alpha).to_array()
+
+
+def parse_files(func, paths, jobs: int, *args):
+    """func(path, *args) dla każdego pliku, równolegle gdy jobs > 1 (kolejność zachowana)."""
+    consts = [[a] * len(paths) for a in args]
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            return list(ex.map(func, paths, *consts, chunksize=max(1, len(paths) // (jobs * 4))))
+    return list(map(func, paths, *consts))
+
+
+def group_stats(vals) -> dict:
+    """mean/median/p95/p99/jitter z pełnej tablicy próbek albo ze scalonego szkicu."""
+    if isinstance(vals, DDSketch):
+        return {"mean": vals.mean(), "median": vals.quantile(0.5), "p95": vals.quantile(0.95),
+                "p99": vals.quantile(0.99), "jitter": vals.pstdev() if vals.count >= 2 else 0.0}
+    return {"mean": mean(vals), "median": median(vals), "p95": percentile(vals, 0.95),
+            "p99": percentile(vals, 0.99), "jitter": pstdev(vals) if vals.size >= 2 else 0.0}
 
 
 def main():
@@ -38,34 +139,91 @@ def main():
     ap.add_argument("--out", required=True, help="Output latency summary CSV (ms).")
     ap.add_argument("--out-jitter", required=True, help="Output jitter summary CSV (ms).")
     ap.add_argument("--outlier-mult", type=float, default=10.0, help="Drop samples > mult * median per client.")
+    ap.add_argument("--co-correct", action="store_true",
+                    help="Also report percentiles corrected for coordinated omission (*_co_ms columns, "
+                         "from all samples: --outlier-mult does not apply to them).")
+    ap.add_argument("--co-interval", type=float, default=0.0,
+                    help="Expected send interval in s for --co-correct (e.g. FREQ; 0 = infer per client file).")
+    ap.add_argument("--sketch", action="store_true",
+                    help="Aggregate via mergeable per-file DDSketches (bounded memory, <= alpha relative error).")
+    ap.add_argument("--sketch-alpha", type=float, default=DEFAULT_ALPHA, help="Sketch relative accuracy.")
+    ap.add_argument("--sketch-out", help="Write per-file sketches (JSON lines) for quantile_sketch.py merge.")
+    ap.add_argument("--by-rep", action="store_true",
+                    help="One row per mode/proto/N/rep (adds a rep column), e.g. for perf_gate.py.")
+    ap.add_argument("--jobs", type=int, default=0, help="Parallel CSV readers (0 = all CPUs, 1 = serial).")
+    ap.add_argument("--cache-dir", help="Parse cache dir (default: <root>/.analysis_cache).")
+    ap.add_argument("--no-cache", action="store_true", help="Parse every file, do not read/write the cache.")
+    ap.add_argument("--rebuild", action="store_true", help="Ignore existing cache entries and re-parse everything.")
     args = ap.parse_args()
 
     root = Path(args.root).resolve()
     out = Path(args.out).resolve()
     out_jitter = Path(args.out_jitter).resolve()
 
-    by = {}
-    file_count = 0
-    for path in root.rglob("metrics_*_id*.csv"):
+    tasks = []
+    for path in sorted(root.rglob("metrics_*_id*.csv")):
         mode, proto, n, rep = parse_meta(path)
         if mode is None or proto is None or n is None or rep is None:
             continue
-        df = pd.read_csv(path)
-        if "rtt" not in df.columns:
-            continue
-        rtt = pd.to_numeric(df["rtt"], errors="coerce").dropna().tolist()
-        if not rtt:
-            continue
-        # rtt in seconds -> ms
-        rtt_ms = [v * 1000.0 for v in rtt]
-        med = median(rtt_ms)
-        if med > 0 and args.outlier_mult > 0:
-            rtt_ms = [v for v in rtt_ms if v <= args.outlier_mult * med]
-        if not rtt_ms:
+        tasks.append(((mode, proto, n, rep) if args.by_rep else (mode, proto, n), path))
+
+    cache_dir = Path(args.cache_dir) if args.cache_dir else default_cache_dir(root)
+    jobs = args.jobs or os.cpu_count() or 1
+    paths = [p for _, p in tasks]
+    def load(namespace: str, params: dict, reader, *reader_args) -> dict:
+        cache = ParseCache(cache_dir, namespace, params={"parser_version": PARSER_VERSION, **params},
+                           kind="values", rebuild=args.rebuild, enabled=not args.no_cache)
+        found, todo = cache.lookup(paths)
+        for path, arr in zip(todo, parse_files(reader, todo, jobs, *reader_args)):
+            cache.store(path, arr)
+            found[path] = arr
+        cache.save(paths)
+        print(cache.summary())
+        return found
+
+    def load_rtt(outlier_mult: float) -> dict:
+        if args.sketch:
+            # per-plik szkic zamiast wszystkich próbek -> pamięć nie rośnie z długością runu
+            return load("latency_summary_sketch", {"outlier_mult": outlier_mult, "alpha": args.sketch_alpha},
+                        read_rtt_sketch, outlier_mult, args.sketch_alpha)
+        return load("latency_summary", {"outlier_mult": outlier_mult}, read_rtt_ms, outlier_mult)
+
+    cached = load_rtt(args.outlier_mult)
+    raw, extra = {}, {}
+    if args.co_correct:
+        # kolumny *_co_ms: wszystkie próbki (bez --outlier-mult) + dosztukowane
+        raw = cached if args.outlier_mult <= 0 else load_rtt(0.0)
+        extra = load("latency_summary_co", {"co_interval": args.co_interval}, read_co_extra_ms, args.co_interval)
+
+    parts = {}
+    co_parts = {}
+    sketch_records = []
+    file_count = 0
+    for key, path in tasks:
+        arr = cached[path]
+        if arr is None or arr.size == 0:
             continue
-        key = (mode, proto, n)
-        by.setdefault(key, []).extend(rtt_ms)
+        parts.setdefault(key, []).append(arr)
+        if args.co_correct:
+            co_parts.setdefault(key, ([], []))
+            co_parts[key][0].append(raw[path])
+            if extra.get(path) is not None:
+                co_parts[key][1].append(extra[path])
+        if args.sketch_out:
+            sk = DDSketch.from_array(arr) if args.sketch else DDSketch.of(arr, args.sketch_alpha)
+            mode, proto, n = key[:3]
+            sketch_records.append(({"mode": mode, "proto": proto, "N": n, "rep": parse_meta(path)[3],
+                                    "file": str(path)}, sk))
         file_count += 1
+    if args.sketch:
+        by = {}
+        for key, arrs in parts.items():
+            sk = DDSketch(args.sketch_alpha)
+            for arr in arrs:
+                sk.merge(DDSketch.from_array(arr))
+            by[key] = sk
+    else:
+        by = {key: np.concatenate(arrs) for key, arrs in parts.items()}
 
     if not by:
         raise SystemExit("No RTT samples found under root.")
@@ -75,25 +233,49 @@ def main():
 
     lat_rows = []
     jit_rows = []
-    for (mode, proto, n), vals in sorted(by.items(), key=lambda x: (x[0][1], x[0][0], x[0][2])):
-        vals_sorted = sorted(vals)
+    for key, vals in sorted(by.items(), key=lambda x: (x[0][1], x[0][0]) + x[0][2:]):
+        mode, proto, n = key[:3]
+        rep_col = {"rep": key[3]} if args.by_rep else {}
+        st = group_stats(vals)
         lat_rows.append({
             "mode": mode,
             "proto": proto,
             "N": n,
-            "mean_rtt_ms": round(mean(vals_sorted), 6),
-            "median_ms": round(median(vals_sorted), 6),
-            "p95_ms": round(percentile(vals_sorted, 0.95), 6),
-            "p99_ms": round(percentile(vals_sorted, 0.99), 6),
+            **rep_col,
+            "mean_rtt_ms": round(st["mean"], 6),
+            "median_ms": round(st["median"], 6),
+            "p95_ms": round(st["p95"], 6),
+            "p99_ms": round(st["p99"], 6),
         })
-        jitter = pstdev(vals_sorted) if len(vals_sorted) >= 2 else 0.0
+        if args.co_correct:
+            observed, extras = co_parts[key]
+            added = np.concatenate(extras) if extras else np.empty(0)
+            if args.sketch:
+                co_vals = DDSketch(args.sketch_alpha)
+                for arr in observed:
+                    co_vals.merge(DDSketch.from_array(arr))
+                co_vals.add(added)
+            else:
+                co_vals = np.concatenate(observed + [added])
+            co = group_stats(co_vals)
+            lat_rows[-1].update({
+                "mean_rtt_co_ms": round(co["mean"], 6),
+                "median_co_ms": round(co["median"], 6),
+                "p95_co_ms": round(co["p95"], 6),
+                "p99_co_ms": round(co["p99"], 6),
+                "co_added": int(added.size),
+            })
         jit_rows.append({
             "mode": mode,
             "proto": proto,
             "N": n,
-            "mean_jitter_ms": round(jitter, 6),
+            **rep_col,
+            "mean_jitter_ms": round(st["jitter"], 6),
         })
 
+    if args.sketch_out:
+        n_sk = save_sketches(Path(args.sketch_out).resolve(), sketch_records)
+        print(f"Wrote {n_sk} per-file sketches to {args.sketch_out}")
     pd.DataFrame(lat_rows).to_csv(out, index=False)
     pd.DataFrame(jit_rows).to_csv(out_jitter, index=False)
     print(f"Wrote {out} and {out_jitter}")
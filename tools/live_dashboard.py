@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Live terminal dashboard for a running experiment: tails metrics_*_id*.csv.
+
+Each client CSV is followed from a saved byte offset - only appended bytes are
+read, an incomplete last line is kept until its newline arrives, a truncated or
+replaced file is re-read from the start. New files are picked up on a periodic
+rescan, and files whose size did not change are skipped with a single stat().
+
+Rows go into per-protocol, per-second buckets (completions, errors and a
+DDSketch of RTT, see quantile_sketch.py); only the seconds covered by the
+longest window are kept, so memory does not grow with run length. Every
+refresh merges the buckets of each sliding window:
+
+  proto  files  rows  | per window: req/s  err%  p50  p95  p99 (ms)
+
+Windows are anchored at the newest completion timestamp seen for the protocol
+(client clock), so a stalled protocol shows its last values and its lag.
+
+Uruchom:
+  python live_dashboard.py --root results_open_mqtt_N100/open_mqtt_N100 [--windows 10 60] [--interval 1]
+  python live_dashboard.py --root ... --once          # one snapshot (e.g. from a script)
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from quantile_sketch import DDSketch
+from timeseries import RE_METRICS, client_csvs
+
+READ_BUDGET = 1 << 20  # max bytes per file per poll: bounds memory and keeps one big file from starving the rest
+SKETCH_ALPHA = 0.01
+CLEAR = "\x1b[H\x1b[2J"
+
+
+class TailedFile:
+    """Incremental reader of one client CSV (offset + partial-line carry-over)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.proto = RE_METRICS.match(path.name).group(1).lower()
+        self.offset = 0
+        self.carry = b""
+        self.i_ts: Optional[int] = None
+        self.i_rtt: Optional[int] = None
+        self.rows = 0
+        self.bad = 0
+        self.ino: Optional[int] = None
+        self.bytes_read = 0
+
+    def _reset(self) -> None:
+        self.offset = 0
+        self.carry = b""
+        self.i_ts = self.i_rtt = None
+
+    def poll(self, budget: int = READ_BUDGET) -> Tuple[List[float], List[float]]:
+        """New complete rows -> (ts, rtt_ms); rtt NaN = failed request."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return [], []
+        if (self.ino is not None and st.st_ino != self.ino) or st.st_size < self.offset:
+            self._reset()  # plik podmieniony / obcięty -> od początku
+        self.ino = st.st_ino
+        if st.st_size == self.offset:
+            return [], []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(min(budget, st.st_size - self.offset))
+        self.offset += len(chunk)
+        self.bytes_read += len(chunk)
+        data = self.carry + chunk
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            self.carry = data
+            return [], []
+        self.carry = data[cut + 1:]
+        lines = data[:cut].decode("utf-8", errors="ignore").split("\n")
+        if self.i_ts is None:
+            header = lines[0].strip().split(",")
+            if "ts" not in header or "rtt" not in header:
+                self.bad += len(lines)
+                return [], []
+            self.i_ts, self.i_rtt = header.index("ts"), header.index("rtt")
+            lines = lines[1:]
+        ts_out: List[float] = []
+        rtt_out: List[float] = []
+        i_ts, i_rtt = self.i_ts, self.i_rtt
+        need = max(i_ts, i_rtt)
+        for line in lines:
+            parts = line.split(",")
+            if len(parts) <= need:
+                self.bad += 1
+                continue
+            try:
+                ts = float(parts[i_ts])
+            except ValueError:
+                self.bad += 1
+                continue
+            r = parts[i_rtt]
+            try:
+                rtt = float(r) * 1000.0 if r else math.nan
+            except ValueError:
+                rtt = math.nan
+            ts_out.append(ts)
+            rtt_out.append(rtt)
+        self.rows += len(ts_out)
+        return ts_out, rtt_out
+
+
+class _Bucket:
+    __slots__ = ("ok", "err", "sketch")
+
+    def __init__(self):
+        self.ok = 0
+        self.err = 0
+        self.sketch = DDSketch(SKETCH_ALPHA)
+
+
+class ProtoWindows:
+    """Per-second buckets of one protocol, trimmed to the longest window."""
+
+    def __init__(self, keep_s: int):
+        self.keep = keep_s
+        self.buckets: Dict[int, _Bucket] = {}
+        self.latest: Optional[float] = None
+        self.rows = 0
+
+    def add(self, ts: np.ndarray, rtt_ms: np.ndarray) -> None:
+        if not ts.size:
+            return
+        self.rows += int(ts.size)
+        newest = float(ts.max())
+        self.latest = newest if self.latest is None else max(self.latest, newest)
+        floor = int(math.floor(self.latest)) - self.keep
+        secs = np.floor(ts).astype(np.int64)
+        keep = secs > floor
+        secs, rtt_ms = secs[keep], rtt_ms[keep]
+        order = np.argsort(secs, kind="stable")
+        secs, rtt_ms = secs[order], rtt_ms[order]
+        uniq, starts = np.unique(secs, return_index=True)
+        ends = np.append(starts[1:], secs.size)
+        for sec, a, b in zip(uniq.tolist(), starts.tolist(), ends.tolist()):
+            vals = rtt_ms[a:b]
+            ok = vals[~np.isnan(vals)]
+            bk = self.buckets.get(sec)
+            if bk is None:
+                bk = self.buckets[sec] = _Bucket()
+            bk.ok += int(ok.size)
+            bk.err += int(vals.size - ok.size)
+            bk.sketch.add(ok)
+        for sec in [s for s in self.buckets if s <= floor]:
+            del self.buckets[sec]
+
+    def window(self, w: int) -> Dict[str, Optional[float]]:
+        if self.latest is None:
+            return {"rps": None, "err_pct": None, "p50": None, "p95": None, "p99": None}
+        hi = int(math.floor(self.latest))
+        sk = DDSketch(SKETCH_ALPHA)
+        ok = err = 0
+        for sec in range(hi - w + 1, hi + 1):
+            bk = self.buckets.get(sec)
+            if bk is not None:
+                ok += bk.ok
+                err += bk.err
+                sk.merge(bk.sketch)
+        total = ok + err
+        return {
+            "rps": ok / w,
+            "err_pct": 100.0 * err / total if total else None,
+            "p50": sk.quantile(0.5), "p95": sk.quantile(0.95), "p99": sk.quantile(0.99),
+        }
+
+
+class Dashboard:
+    def __init__(self, root: Path, windows: List[int], rescan_s: float = 5.0):
+        self.root = root
+        self.windows = sorted(set(windows))
+        self.rescan_s = rescan_s
+        self.files: Dict[Path, TailedFile] = {}
+        self.protos: Dict[str, ProtoWindows] = {}
+        self.last_scan = -math.inf
+
+    def scan(self) -> None:
+        for p in client_csvs(self.root):
+            if p not in self.files:
+                self.files[p] = TailedFile(p)
+        self.last_scan = time.monotonic()
+
+    def poll(self) -> int:
+        if time.monotonic() - self.last_scan >= self.rescan_s:
+            self.scan()
+        n = 0
+        for tf in self.files.values():
+            ts, rtt = tf.poll()
+            if ts:
+                pw = self.protos.get(tf.proto)
+                if pw is None:
+                    pw = self.protos[tf.proto] = ProtoWindows(max(self.windows))
+                pw.add(np.asarray(ts, dtype=np.float64), np.asarray(rtt, dtype=np.float64))
+                n += len(ts)
+        return n
+
+    def render(self, now: Optional[float] = None) -> str:
+        now = time.time() if now is None else now
+
+        def f(v, fmt="{:.1f}"):
+            return "-" if v is None else fmt.format(v)
+
+        head = f"{'proto':<6}{'files':>6}{'rows':>10}{'lag s':>7}"
+        for w in self.windows:
+            head += f" | {w:>4}s {'req/s':>8}{'err%':>6}{'p50':>8}{'p95':>8}{'p99':>8}"
+        lines = [f"{self.root}  {time.strftime('%H:%M:%S', time.localtime(now))}  "
+                 f"files={len(self.files)}  read={sum(tf.bytes_read for tf in self.files.values()) / 1e6:.1f} MB", head, "-" * len(head)]
+        for proto in ("http", "mqtt", "coap"):
+            pw = self.protos.get(proto)
+            if pw is None:
+                continue
+            nfiles = sum(1 for tf in self.files.values() if tf.proto == proto)
+            lag = now - pw.latest if pw.latest is not None else None
+            lag_s = "stale" if lag is not None and lag > 86400 else f(lag)
+            row = f"{proto:<6}{nfiles:>6}{pw.rows:>10}{lag_s:>7}"
+            for w in self.windows:
+                s = pw.window(w)
+                row += (f" | {'':>5} {f(s['rps']):>8}{f(s['err_pct']):>6}"
+                        f"{f(s['p50'], '{:.2f}'):>8}{f(s['p95'], '{:.2f}'):>8}{f(s['p99'], '{:.2f}'):>8}")
+            lines.append(row)
+        if not self.protos:
+            lines.append("(waiting for metrics_*_id*.csv rows...)")
+        bad = sum(tf.bad for tf in self.files.values())
+        if bad:
+            lines.append(f"skipped malformed rows: {bad}")
+        return "\n".join(lines)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Live dashboard: tail client metrics CSVs of a running experiment.")
+    ap.add_argument("--root", required=True, help="Run directory (searched recursively for metrics_*_id*.csv).")
+    ap.add_argument("--windows", type=int, nargs="+", default=[10, 60], help="Sliding windows in seconds.")
+    ap.add_argument("--interval", type=float, default=1.0, help="Refresh period in seconds.")
+    ap.add_argument("--rescan", type=float, default=5.0, help="How often to look for new client files (s).")
+    ap.add_argument("--once", action="store_true", help="Read what is there, print one snapshot, exit.")
+    ap.add_argument("--plain", action="store_true", help="Append snapshots instead of redrawing the screen.")
+    ap.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0 = until Ctrl+C).")
+    args = ap.parse_args()
+
+    root = Path(os.path.expanduser(args.root)).resolve()
+    if not root.exists():
+        print(f"ERROR: root not found: {root}", file=sys.stderr)
+        sys.exit(1)
+    if any(w <= 0 for w in args.windows):
+        ap.error("--windows must be positive")
+
+    dash = Dashboard(root, args.windows, args.rescan)
+    if args.once:
+        while dash.poll():  # wczytaj całość (READ_BUDGET na plik na obrót)
+            pass
+        print(dash.render())
+        return
+
+    redraw = sys.stdout.isatty() and not args.plain
+    t_end = time.monotonic() + args.duration if args.duration > 0 else math.inf
+    try:
+        while time.monotonic() < t_end:
+            t0 = time.monotonic()
+            while dash.poll() and time.monotonic() - t0 < args.interval:
+                pass
+            out = dash.render()
+            sys.stdout.write((CLEAR + out + "\n") if redraw else (out + "\n\n"))
+            sys.stdout.flush()
+            time.sleep(max(0.0, args.interval - (time.monotonic() - t0)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
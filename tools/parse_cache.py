@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Inkrementalny cache sparsowanych plików dla narzędzi analizy.
+
+Każdy plik źródłowy (CSV klienta, log, pcap) jest kluczowany ścieżką + rozmiarem +
+mtime; gdy rozmiar/mtime się zmieni, porównujemy jeszcze hash treści (np. po rsync
+z nowym mtime plik nie jest parsowany ponownie). Wyniki trzymane są kolumnowo:
+Feather (pyarrow) jeśli dostępny, inaczej pickle DataFrame'u. Wpisy dla plików,
+których już nie ma w drzewie, są usuwane przy zapisie.
+
+Dwa rodzaje payloadu:
+- "rows":   jeden wiersz (dict) na plik, kolumna na pole; komórki jako JSON, więc
+            int/float/None/str wracają z cache bez zmiany typu,
+- "values": tablica float64 na plik (np. RTT w ms), zapisana w formacie długim
+            (pusta tablica = plik bez próbek, też cache'owany).
+
+Klucz wpisu nie widzi zmian w kodzie parsera, dlatego każde narzędzie podaje w
+params własny PARSER_VERSION (oraz wszystko, co zmienia wynik parsowania, np.
+engine w pcap_metrics.py). PARSER_VERSION trzeba podbić przy każdej zmianie
+semantyki parsowania - inaczej nowy kod czyta stare wpisy. CACHE_VERSION
+dotyczy tylko formatu samego cache.
+
+Użycie:
+    cache = ParseCache(cache_dir, "latency_metrics", params={"parser_version": PARSER_VERSION, ...}, kind="rows")
+    hits, misses = cache.lookup(paths)
+    ... parsuj misses ...
+    cache.store(path, payload)
+    cache.save(paths)
+"""
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CACHE_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def default_cache_dir(root: Path) -> Path:
+    return root / ".analysis_cache"
+
+
+class ParseCache:
+    def __init__(self, cache_dir: Path, namespace: str, params: Optional[dict] = None,
+                 kind: str = "rows", rebuild: bool = False, enabled: bool = True):
+        if kind not in ("rows", "values"):
+            raise ValueError(f"unknown cache kind: {kind}")
+        if "parser_version" not in (params or {}):
+            raise ValueError(f"{namespace}: params must include parser_version")
+        self.kind = kind
+        self.enabled = enabled
+        self.dirty = False
+        # parametry parsowania są częścią klucza -> osobny plik na każdy zestaw
+        key = json.dumps({"v": CACHE_VERSION, **(params or {})}, sort_keys=True)
+        tag = hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+        self.base = Path(cache_dir) / f"{namespace}-{tag}"
+        self.index: Dict[str, Tuple[int, int, str]] = {}
+        self.data: Dict[str, object] = {}
+        self.hits = 0
+        self.misses = 0
+        if not enabled:
+            return
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            print("[INFO] pandas not installed -> parse cache disabled", file=sys.stderr)
+            self.enabled = False
+            return
+        try:
+            import pyarrow  # noqa: F401
+            self.fmt = "feather"
+        except ImportError:
+            self.fmt = "pkl"
+        if not rebuild:
+            self._load()
+
+    # --- storage ---
+
+    def _file(self, part: str) -> Path:
+        return self.base.with_name(f"{self.base.name}.{part}.{self.fmt}")
+
+    def _read(self, path: Path):
+        import pandas as pd
+        return pd.read_feather(path) if self.fmt == "feather" else pd.read_pickle(path)
+
+    def _write(self, df, path: Path) -> None:
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        if self.fmt == "feather":
+            df.reset_index(drop=True).to_feather(tmp)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, path)
+
+    def _load(self) -> None:
+        idx_path, data_path = self._file("index"), self._file("data")
+        if not idx_path.exists() or not data_path.exists():
+            return
+        try:
+            idx = self._read(idx_path)
+            data = self._read(data_path)
+        except Exception as e:
+            print(f"[WARN] parse cache unreadable ({e}) -> rebuilding", file=sys.stderr)
+            return
+        for p, size, mtime, h in zip(idx["path"], idx["size"], idx["mtime_ns"], idx["hash"]):
+            self.index[p] = (int(size), int(mtime), h)
+        if self.kind == "values":
+            import numpy as np
+            for p in self.index:
+                self.data[p] = np.empty(0, dtype=np.float64)
+            paths = data["path"].to_numpy()
+            vals = data["value"].to_numpy(dtype=np.float64)
+            if len(paths):
+                # dane zapisane grupami po ścieżce -> tniemy po granicach grup
+                cuts = np.flatnonzero(paths[1:] != paths[:-1]) + 1
+                starts = np.concatenate(([0], cuts))
+                ends = np.concatenate((cuts, [len(paths)]))
+                for s, e in zip(starts, ends):
+                    self.data[paths[s]] = vals[s:e]
+        else:
+            cols = [c for c in data.columns if c != "path"]
+            data = data.astype(object).where(data.notna(), None)
+            for rec in data.to_dict("records"):
+                self.data[rec["path"]] = {c: json.loads(rec[c]) for c in cols if rec[c] is not None}
+
+    def save(self, seen: Optional[Iterable[Path]] = None) -> None:
+        """Zapisz cache; wpisy spoza `seen` (usunięte pliki) są wyrzucane."""
+        if not self.enabled:
+            return
+        if seen is not None:
+            keep = {str(p) for p in seen}
+            stale = [p for p in self.index if p not in keep]
+            for p in stale:
+                self.index.pop(p, None)
+                self.data.pop(p, None)
+            self.dirty = self.dirty or bool(stale)
+        if not self.dirty:
+            return
+        import numpy as np
+        import pandas as pd
+        self.base.parent.mkdir(parents=True, exist_ok=True)
+        paths = sorted(p for p in self.index if p in self.data)
+        idx = pd.DataFrame({
+            "path": paths,
+            "size": np.array([self.index[p][0] for p in paths], dtype=np.int64),
+            "mtime_ns": np.array([self.index[p][1] for p in paths], dtype=np.int64),
+            "hash": [self.index[p][2] for p in paths],
+        })
+        if self.kind == "values":
+            arrays = [np.asarray(self.data[p], dtype=np.float64) for p in paths]
+            data = pd.DataFrame({
+                "path": np.repeat(np.array(paths, dtype=object), [a.size for a in arrays]),
+                "value": np.concatenate(arrays) if arrays else np.empty(0, dtype=np.float64),
+            })
+        else:
+            cols = sorted({c for p in paths for c in self.data[p]})
+            data = pd.DataFrame({"path": paths})
+            for c in cols:
+                # brak klucza w wierszu -> None (null), a nie "null"
+                data[c] = [json.dumps(self.data[p][c]) if c in self.data[p] else None for p in paths]
+        self._write(idx, self._file("index"))
+        self._write(data, self._file("data"))
+        self.dirty = False
+
+    # --- lookup/store ---
+
+    def lookup(self, paths: Iterable[Path]) -> Tuple[Dict[Path, object], List[Path]]:
+        """Rozdziel pliki na trafienia (payload z cache) i te do sparsowania."""
+        hits: Dict[Path, object] = {}
+        misses: List[Path] = []
+        for path in paths:
+            payload = self.get(path)
+            if payload is None:
+                misses.append(path)
+            else:
+                hits[path] = payload
+        return hits, misses
+
+    def get(self, path: Path):
+        if not self.enabled:
+            self.misses += 1
+            return None
+        key = str(path)
+        entry = self.index.get(key)
+        if entry is None or key not in self.data:
+            self.misses += 1
+            return None
+        st = path.stat()
+        if entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            self.hits += 1
+            return self.data[key]
+        if entry[0] == st.st_size and file_hash(path) == entry[2]:
+            # ta sama treść, inny mtime (touch / rsync) -> odśwież tylko klucz
+            self.index[key] = (st.st_size, st.st_mtime_ns, entry[2])
+            self.dirty = True
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def store(self, path: Path, payload) -> None:
+        if not self.enabled:
+            return
+        st = path.stat()
+        key = str(path)
+        self.index[key] = (st.st_size, st.st_mtime_ns, file_hash(path))
+        if self.kind == "values" and payload is None:
+            import numpy as np
+            payload = np.empty(0, dtype=np.float64)
+        self.data[key] = payload
+        self.dirty = True
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "cache: off"
+        return f"cache: {self.hits} hit / {self.misses} parsed ({self.base.parent})"
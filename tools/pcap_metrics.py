@@ -5,9 +5,14 @@ import os
 import re
 import subprocess
 import sys
-from dataclasses import dataclass
+from collections import Counter
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pcap_reader
+from job_pool import file_weight, run_ordered
+from parse_cache import ParseCache, default_cache_dir
 
 # Ports used in your lab setup
 PROTO_FILTERS = {
@@ -16,7 +21,22 @@ PROTO_FILTERS = {
     "http": ("tcp.port==5000", "TCP/5000"),
 }
 
+# The same filters as (transport, port) for the single-pass scanner
+PROTO_PORTS = {
+    "coap": ("udp", 5683),
+    "mqtt": ("tcp", 1883),
+    "http": ("tcp", 5000),
+}
+
 PCAP_EXTS = (".pcap", ".pcapng")
+# klucz ParseCache (razem z --engine): podbij przy każdej zmianie skanowania / metryk
+PARSER_VERSION = 1
+
+# One tshark pass: everything compute_metrics_for_pcap needs per packet
+TSHARK_PACKET_FIELDS = [
+    "frame.len", "frame.time_relative",
+    "tcp.srcport", "tcp.dstport", "udp.srcport", "udp.dstport",
+]
 
 
 @dataclass
@@ -26,6 +46,49 @@ class CaptureStats:
     bytes: int
 
 
+class Packet(NamedTuple):
+    length: int
+    time_rel: float
+    transport: Optional[str]  # "tcp" / "udp" / None
+    sport: Optional[int]
+    dport: Optional[int]
+
+
+@dataclass
+class StreamStats:
+    """Running frames/bytes/duration + frame-length histogram (bounded memory)."""
+    frames: int = 0
+    bytes: int = 0
+    max_t: float = 0.0
+    lengths: Counter = field(default_factory=Counter)
+
+    def add(self, length: int, t: float) -> None:
+        self.frames += 1
+        self.bytes += length
+        if t > self.max_t:
+            self.max_t = t
+        self.lengths[length] += 1
+
+    def capture_stats(self) -> CaptureStats:
+        return CaptureStats(duration_s=self.max_t, frames=self.frames, bytes=self.bytes)
+
+    def length_percentile(self, p: float) -> Optional[float]:
+        """Nearest-rank index round((n - 1) * p) on the sorted lengths, read off the histogram."""
+        if not self.frames:
+            return None
+        if p <= 0:
+            return float(min(self.lengths))
+        if p >= 1:
+            return float(max(self.lengths))
+        idx = int(round((self.frames - 1) * p))
+        seen = 0
+        for length in sorted(self.lengths):
+            seen += self.lengths[length]
+            if seen > idx:
+                return float(length)
+        return float(max(self.lengths))
+
+
 def run_cmd(cmd: List[str]) -> Tuple[int, str, str]:
     """Run a command and capture stdout/stderr."""
     p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
@@ -33,96 +96,96 @@ def run_cmd(cmd: List[str]) -> Tuple[int, str, str]:
 
 
 def require_tshark() -> None:
-    rc, out, err = run_cmd(["tshark", "-v"])
-    if rc != 0:
+    if not tshark_available():
         print("ERROR: tshark is not available. Install it with: sudo apt install -y tshark", file=sys.stderr)
         sys.exit(2)
 
 
-def parse_io_stat_output(text: str) -> Optional[CaptureStats]:
+def _first_port(value: str) -> Optional[int]:
+    # tunnelled packets (e.g. ICMP errors) carry "a,b" -> take the outer header
+    if not value:
+        return None
+    try:
+        return int(value.split(",", 1)[0])
+    except ValueError:
+        return None
+
+
+def tshark_packets(pcap: Path) -> Iterator[Packet]:
     """
-    Parse output of: tshark -r FILE -q -z io,stat,0[,FILTER]
-    We extract Duration, Frames, Bytes from the "=== General ===" section.
+    Stream per-packet fields from ONE tshark pass, line by line (no stdout buffering).
+    Uses: tshark -r FILE -T fields -e frame.len -e frame.time_relative -e tcp/udp ports
     """
-    # tshark output varies slightly between versions; be tolerant
-    # Example lines:
-    #   Duration: 13.623 secs
-    #   Frames: 2008
-    #   Bytes: 2167205
-    dur = None
-    frames = None
-    byt = None
-
-    for line in text.splitlines():
-        line = line.strip()
-        m = re.match(r"^Duration:\s*([0-9]*\.?[0-9]+)\s*(?:sec|secs|seconds)\b", line)
-        if m:
-            dur = float(m.group(1))
-            continue
-        m = re.match(r"^Frames:\s*([0-9]+)\s*$", line)
-        if m:
-            frames = int(m.group(1))
-            continue
-        m = re.match(r"^Bytes:\s*([0-9]+)\s*$", line)
-        if m:
-            byt = int(m.group(1))
-            continue
+    cmd = ["tshark", "-r", str(pcap), "-T", "fields", "-E", "separator=/t"]
+    for f in TSHARK_PACKET_FIELDS:
+        cmd += ["-e", f]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1 << 16)
+    try:
+        for line in proc.stdout:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 2:
+                continue
+            try:
+                flen = int(parts[0]) if parts[0] else 0
+                t = float(parts[1]) if parts[1] else 0.0
+            except ValueError:
+                continue
+            parts += [""] * (6 - len(parts))
+            if parts[2] or parts[3]:
+                yield Packet(flen, t, "tcp", _first_port(parts[2]), _first_port(parts[3]))
+            elif parts[4] or parts[5]:
+                yield Packet(flen, t, "udp", _first_port(parts[4]), _first_port(parts[5]))
+            else:
+                yield Packet(flen, t, None, None, None)
+    finally:
+        proc.stdout.close()
+        err = proc.stderr.read()
+        proc.stderr.close()
+        rc = proc.wait()
+    if rc != 0:
+        raise RuntimeError(f"tshark fields failed for {pcap.name}.\n{err}")
 
-    if dur is None or frames is None or byt is None:
-        return None
-    return CaptureStats(duration_s=dur, frames=frames, bytes=byt)
+
+def native_packets(pcap: Path) -> Iterator[Packet]:
+    """Same Packet stream as tshark_packets(), from the mmap pcap/pcapng reader."""
+    first_ts = None
+    for d in pcap_reader.iter_decoded(pcap, addresses=False):
+        if first_ts is None:
+            first_ts = d.ts
+        yield Packet(d.wire_len, d.ts - first_ts, d.transport, d.sport, d.dport)
 
 
-def tshark_io_stat(pcap: Path, display_filter: Optional[str] = None) -> CaptureStats:
-    cmd = ["tshark", "-r", str(pcap), "-q", "-z", "io,stat,0"]
-    if display_filter:
-        # NOTE: io,stat expects exactly ONE filter argument (no labels)
-        cmd[-1] = f"io,stat,0,{display_filter}"
-    rc, out, err = run_cmd(cmd)
-    # tshark often prints to stderr; merge both
-    text = (out or "") + "\n" + (err or "")
-    stats = parse_io_stat_output(text)
-    if rc != 0 or stats is None:
-        raise RuntimeError(f"tshark io,stat failed for {pcap.name} (filter={display_filter}). Output:\n{text}")
-    return stats
+def tshark_available() -> bool:
+    try:
+        rc, _, _ = run_cmd(["tshark", "-v"])
+    except OSError:
+        return False
+    return rc == 0
 
 
-def tshark_frame_lengths(pcap: Path, display_filter: str) -> List[int]:
+def packet_stream(pcap: Path, engine: str = "auto") -> Iterator[Packet]:
     """
-    Return list of frame lengths (ints) for packets matching display_filter.
-    Uses: tshark -Y FILTER -T fields -e frame.len
+    engine: native = mmap reader only, tshark = tshark only,
+            auto = native when the file format is recognised, tshark otherwise.
     """
-    cmd = [
-        "tshark",
-        "-r", str(pcap),
-        "-Y", display_filter,
-        "-T", "fields",
-        "-e", "frame.len",
-    ]
-    rc, out, err = run_cmd(cmd)
-    if rc != 0:
-        raise RuntimeError(f"tshark frame.len failed for {pcap.name} (filter={display_filter}).\n{err}")
-    lens: List[int] = []
-    for line in out.splitlines():
-        line = line.strip()
-        if not line:
+    if engine == "native" or (engine == "auto" and pcap_reader.is_supported(pcap)):
+        return native_packets(pcap)
+    return tshark_packets(pcap)
+
+
+def scan_packets(packets: Iterator[Packet]) -> Tuple[StreamStats, Dict[str, StreamStats]]:
+    """Total + per-protocol (port-based, like PROTO_FILTERS) stats in a single pass."""
+    total = StreamStats()
+    per_proto = {p: StreamStats() for p in PROTO_PORTS}
+    port_map = {(tr, port): p for p, (tr, port) in PROTO_PORTS.items()}
+    for pkt in packets:
+        total.add(pkt.length, pkt.time_rel)
+        if pkt.transport is None:
             continue
-        try:
-            lens.append(int(line))
-        except ValueError:
-            pass
-    return lens
-
-
-def percentile(sorted_vals: List[int], p: float) -> Optional[float]:
-    if not sorted_vals:
-        return None
-    if p <= 0:
-        return float(sorted_vals[0])
-    if p >= 1:
-        return float(sorted_vals[-1])
-    idx = int(round((len(sorted_vals) - 1) * p))
-    return float(sorted_vals[idx])
+        proto = port_map.get((pkt.transport, pkt.sport)) or port_map.get((pkt.transport, pkt.dport))
+        if proto:
+            per_proto[proto].add(pkt.length, pkt.time_rel)
+    return total, per_proto
 
 
 def guess_meta_from_path(pcap: Path) -> Dict[str, Optional[str]]:
@@ -185,52 +248,12 @@ def ensure_csv_header(csv_path: Path, fieldnames: List[str]) -> None:
         w.writeheader()
 
 
-def tshark_basic_stats(pcap: Path, display_filter: Optional[str] = None) -> CaptureStats:
-    """
-    Robust stats from fields (works across tshark versions):
-    - frames: count rows
-    - bytes: sum frame.len
-    - duration: max frame.time_relative
-    """
-    cmd = ["tshark", "-r", str(pcap)]
-    if display_filter:
-        cmd += ["-Y", display_filter]
-    cmd += ["-T", "fields", "-e", "frame.len", "-e", "frame.time_relative"]
-
-    rc, out, err = run_cmd(cmd)
-    if rc != 0:
-        raise RuntimeError(f"tshark fields failed for {pcap.name} (filter={display_filter}).\n{err}")
-
-    frames = 0
-    total_bytes = 0
-    max_t = 0.0
-
-    for line in out.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split("\t")
-        if len(parts) < 2:
-            continue
-        try:
-            flen = int(parts[0]) if parts[0] else 0
-            t = float(parts[1]) if parts[1] else 0.0
-        except ValueError:
-            continue
-        frames += 1
-        total_bytes += flen
-        if t > max_t:
-            max_t = t
-
-    return CaptureStats(duration_s=max_t, frames=frames, bytes=total_bytes)
-
-
-
-def compute_metrics_for_pcap(pcap: Path) -> Dict[str, object]:
+def compute_metrics_for_pcap(pcap: Path, engine: str = "auto") -> Dict[str, object]:
     meta = guess_meta_from_path(pcap)
 
-    # Total capture stats (all traffic)
-    total = tshark_basic_stats(pcap, None)
+    # Total + per-port stats from a single pass over the capture
+    total_acc, per_proto = scan_packets(packet_stream(pcap, engine))
+    total = total_acc.capture_stats()
 
     # Decide which protocol filter to use
     proto = meta["proto"]
@@ -240,39 +263,26 @@ def compute_metrics_for_pcap(pcap: Path) -> Dict[str, object]:
     if proto in PROTO_FILTERS:
         proto_filter, proto_label = PROTO_FILTERS[proto]
     else:
-        # Fallback: compute bytes for each known port and pick the biggest one
-        best = None  # (bytes, proto, filter, label)
-        for p, (flt, lbl) in PROTO_FILTERS.items():
-            try:
-                st = tshark_basic_stats(pcap, flt)
-                cand = (st.bytes, p, flt, lbl)
-                if best is None or cand[0] > best[0]:
-                    best = cand
-            except Exception:
-                continue
-        if best:
-            _, proto, proto_filter, proto_label = best
-        else:
-            proto = None
+        # Fallback: pick the known port with the most bytes (first one wins on ties)
+        best = None  # (bytes, proto)
+        for p in PROTO_FILTERS:
+            if best is None or per_proto[p].bytes > best[0]:
+                best = (per_proto[p].bytes, p)
+        _, proto = best
+        proto_filter, proto_label = PROTO_FILTERS[proto]
 
-    proto_stats = None
-    if proto_filter:
-        proto_stats = tshark_basic_stats(pcap, proto_filter)
+    acc = per_proto[proto]
+    proto_stats = acc.capture_stats()
 
     # Frame length stats for proto filter (port-based, works even if dissector doesn't)
     avg_len = None
     p95_len = None
     p99_len = None
-    frame_count_port = None
-
-    if proto_filter:
-        lengths = tshark_frame_lengths(pcap, proto_filter)
-        frame_count_port = len(lengths)
-        if lengths:
-            lengths.sort()
-            avg_len = sum(lengths) / len(lengths)
-            p95_len = percentile(lengths, 0.95)
-            p99_len = percentile(lengths, 0.99)
+    frame_count_port = acc.frames
+    if acc.frames:
+        avg_len = acc.bytes / acc.frames
+        p95_len = acc.length_percentile(0.95)
+        p99_len = acc.length_percentile(0.99)
 
     # Rates
     bytes_per_sec = None
@@ -313,6 +323,40 @@ def compute_metrics_for_pcap(pcap: Path) -> Dict[str, object]:
     }
 
 
+def process_pcap(job: Tuple[Path, str]) -> Dict[str, object]:
+    """One pool job: metrics row for a capture, or a minimal row + error."""
+    pcap, engine = job
+    try:
+        row = compute_metrics_for_pcap(pcap, engine)
+        row["error"] = ""
+        return row
+    except Exception as e:
+        # zapisujemy minimalny wiersz + error
+        meta = guess_meta_from_path(pcap)
+        return {
+            "scenario": pcap.stem,
+            "pcap_path": str(pcap),
+            "mode": meta.get("mode"),
+            "proto": meta.get("proto"),
+            "proto_port": None,
+            "N": meta.get("N"),
+            "payload_size": meta.get("payload_size"),
+            "duration_s_total": None,
+            "frames_total": None,
+            "bytes_total": None,
+            "duration_s_proto": None,
+            "frames_proto": None,
+            "bytes_proto": None,
+            "avg_frame_len_proto": None,
+            "p95_frame_len_proto": None,
+            "p99_frame_len_proto": None,
+            "frames_per_sec_proto": None,
+            "bytes_per_sec_proto": None,
+            "frames_per_message_proxy": None,
+            "error": str(e)[:200],
+        }
+
+
 def find_pcaps(root: Path) -> List[Path]:
     pcaps: List[Path] = []
     for p in root.rglob("*"):
@@ -326,10 +370,18 @@ def main() -> None:
     ap.add_argument("--root", required=True, help="Root directory containing results (will be scanned recursively).")
     ap.add_argument("--out", required=True, help="Output CSV path.")
     ap.add_argument("--append", action="store_true", help="Append to existing CSV (default overwrites header if empty).")
+    ap.add_argument("--engine", choices=["auto", "native", "tshark"], default="auto",
+                    help="Packet source: built-in pcap/pcapng reader, tshark, or native with tshark fallback.")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel worker processes (0 = all CPUs).")
+    ap.add_argument("--max-large", type=int, default=2,
+                    help="Max captures >= --large-mb processed at once (bounds memory; 0 = no limit).")
+    ap.add_argument("--large-mb", type=float, default=200.0, help="Size threshold for --max-large.")
+    ap.add_argument("--quiet", action="store_true", help="No per-file progress/ETA on stderr.")
+    ap.add_argument("--cache-dir", help="Parse cache dir (default: <root>/.analysis_cache).")
+    ap.add_argument("--no-cache", action="store_true", help="Parse every file, do not read/write the cache.")
+    ap.add_argument("--rebuild", action="store_true", help="Ignore existing cache entries and re-parse everything.")
     args = ap.parse_args()
 
-    require_tshark()
-
     root = Path(os.path.expanduser(args.root)).resolve()
     out_csv = Path(os.path.expanduser(args.out)).resolve()
 
@@ -338,6 +390,16 @@ def main() -> None:
         print(f"ERROR: No .pcap/.pcapng found under: {root}", file=sys.stderr)
         sys.exit(1)
 
+    cache = ParseCache(Path(args.cache_dir) if args.cache_dir else default_cache_dir(root),
+                       "pcap_metrics", params={"parser_version": PARSER_VERSION, "engine": args.engine},
+                       kind="rows", rebuild=args.rebuild, enabled=not args.no_cache)
+    cached, todo = cache.lookup(pcaps)
+    if args.engine == "tshark":
+        require_tshark()
+    elif args.engine == "auto" and not all(pcap_reader.is_supported(p) for p in todo) and not tshark_available():
+        # nierozpoznane pliki i tak dostaną wiersz z error
+        print("WARN: some captures need tshark, which is not available", file=sys.stderr)
+
     fieldnames = [
         "scenario", "pcap_path", "mode", "proto", "proto_port", "N", "payload_size",
         "duration_s_total", "frames_total", "bytes_total",
@@ -352,38 +414,28 @@ def main() -> None:
     # If not append, we still keep header but we will rewrite rows from scratch
     rows: List[Dict[str, object]] = []
 
+    jobs = args.jobs or os.cpu_count() or 1
+    large = args.large_mb * 1024 * 1024
+    results = run_ordered(
+        process_pcap, [(p, args.engine) for p in todo], jobs=jobs,
+        weights=[file_weight(p) for p in todo],
+        heavy=[file_weight(p) >= large for p in todo], max_heavy=args.max_large,
+        label="pcap ", progress=not args.quiet,
+    )
+    fresh = dict(zip(todo, results))
+
     for pcap in pcaps:
-        try:
-            row = compute_metrics_for_pcap(pcap)
-            row["error"] = ""
-            rows.append(row)
+        if pcap in cached:
+            rows.append(cached[pcap])
+            print(f"[CACHED] {pcap}")
+            continue
+        row = fresh[pcap]
+        rows.append(row)
+        if row["error"]:
+            print(f"[FAIL] {pcap}: {row['error']}", file=sys.stderr)
+        else:
+            cache.store(pcap, row)
             print(f"[OK] {pcap}")
-        except Exception as e:
-            # zapisujemy minimalny wiersz + error
-            meta = guess_meta_from_path(pcap)
-            rows.append({
-                "scenario": pcap.stem,
-                "pcap_path": str(pcap),
-                "mode": meta.get("mode"),
-                "proto": meta.get("proto"),
-                "proto_port": None,
-                "N": meta.get("N"),
-                "payload_size": meta.get("payload_size"),
-                "duration_s_total": None,
-                "frames_total": None,
-                "bytes_total": None,
-                "duration_s_proto": None,
-                "frames_proto": None,
-                "bytes_proto": None,
-                "avg_frame_len_proto": None,
-                "p95_frame_len_proto": None,
-                "p99_frame_len_proto": None,
-                "frames_per_sec_proto": None,
-                "bytes_per_sec_proto": None,
-                "frames_per_message_proxy": None,
-                "error": str(e)[:200],
-            })
-            print(f"[FAIL] {pcap}: {e}", file=sys.stderr)
 
     # Write
     mode = "a" if args.append else "w"
@@ -394,8 +446,9 @@ def main() -> None:
         for r in rows:
             w.writerow(r)
 
+    cache.save(pcaps)
     print(f"\nSaved CSV: {out_csv}")
-    print(f"Rows written: {len(rows)} / PCAPs found: {len(pcaps)}")
+    print(f"Rows written: {len(rows)} / PCAPs found: {len(pcaps)} | {cache.summary()}")
 
 
 if __name__ == "__main__":
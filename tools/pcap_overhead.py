@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Where do the bytes go? Per-capture protocol overhead breakdown.
+
+pcap_metrics.py only sums frame.len per port. Here every frame on the lab
+ports (PROTO_PORTS) is split, in ONE streaming pass over the native reader,
+into:
+
+- link / IP / transport headers (+ Ethernet padding),
+- TCP connection management: handshake (SYN), teardown (FIN/RST) and pure
+  ACK frames (no payload),
+- application bytes, split into
+    * app_header_bytes  - per-message protocol headers: HTTP request/status
+      line + headers, MQTT PUBLISH fixed header + topic + packet id, CoAP
+      header + token + options,
+    * app_control_bytes - standalone control messages: MQTT CONNECT/CONNACK/
+      SUBSCRIBE/SUBACK/PUBACK/PINGREQ/PINGRESP/DISCONNECT, CoAP empty ACK/RST/ping,
+    * app_payload_bytes - the actual reading (HTTP body, MQTT/CoAP payload),
+    * app_unparsed_bytes - retransmitted or unparseable bytes (capture gaps,
+      snaplen cut-offs, chunked HTTP bodies).
+
+For every row: bytes = link_hdr + link_pad + ip_hdr + l4_hdr + app_header +
+app_control + app_payload + app_unparsed.
+
+"readings" are deliveries the client counts as success: HTTP 2xx responses,
+CoAP 2.xx responses, MQTT PUBLISH forwarded by the broker to the subscriber.
+bytes_per_reading = all bytes on the port / readings.
+
+Uruchom:
+  python pcap_overhead.py --root results/series_x --out overhead.csv [--jobs 4]
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pcap_reader
+from job_pool import file_weight, run_ordered
+from pcap_metrics import PROTO_PORTS, find_pcaps, guess_meta_from_path
+from wire_latency import MQTT_PUBLISH, mqtt_packets
+
+MQTT_NAMES = {
+    1: "CONNECT", 2: "CONNACK", 3: "PUBLISH", 4: "PUBACK", 5: "PUBREC", 6: "PUBREL",
+    7: "PUBCOMP", 8: "SUBSCRIBE", 9: "SUBACK", 10: "UNSUBSCRIBE", 11: "UNSUBACK",
+    12: "PINGREQ", 13: "PINGRESP", 14: "DISCONNECT",
+}
+COAP_TYPES = ("CON", "NON", "ACK", "RST")
+
+
+@dataclass
+class Breakdown:
+    frames: int = 0
+    bytes: int = 0
+    link_hdr_bytes: int = 0
+    link_pad_bytes: int = 0
+    ip_hdr_bytes: int = 0
+    l4_hdr_bytes: int = 0
+    tcp_handshake_frames: int = 0
+    tcp_handshake_bytes: int = 0
+    tcp_teardown_frames: int = 0
+    tcp_teardown_bytes: int = 0
+    tcp_ack_frames: int = 0
+    tcp_ack_bytes: int = 0
+    data_frames: int = 0
+    app_bytes: int = 0  # sum of payload_len (IP-length based)
+    app_header_bytes: int = 0
+    app_control_bytes: int = 0
+    app_payload_bytes: int = 0
+    readings: int = 0
+    control_msgs: Counter = field(default_factory=Counter)
+
+    def add_frame(self, d: pcap_reader.Decoded) -> None:
+        self.frames += 1
+        self.bytes += d.wire_len
+        self.link_hdr_bytes += d.link_len
+        self.ip_hdr_bytes += d.ip_len
+        self.l4_hdr_bytes += d.l4_len
+        self.link_pad_bytes += max(d.wire_len - d.link_len - d.ip_len - d.l4_len - d.payload_len, 0)
+        self.app_bytes += d.payload_len
+        if d.transport == "tcp":
+            if d.tcp_flags & pcap_reader.TCP_SYN:
+                self.tcp_handshake_frames += 1
+                self.tcp_handshake_bytes += d.wire_len
+                return
+            if d.tcp_flags & (pcap_reader.TCP_FIN | pcap_reader.TCP_RST):
+                self.tcp_teardown_frames += 1
+                self.tcp_teardown_bytes += d.wire_len
+                return
+            if d.payload_len == 0:
+                self.tcp_ack_frames += 1
+                self.tcp_ack_bytes += d.wire_len
+                return
+        self.data_frames += 1
+
+    def control(self, name: str, nbytes: int) -> None:
+        self.control_msgs[name] += 1
+        self.app_control_bytes += nbytes
+
+
+def _varint_len(n: int) -> int:
+    return 1 if n < 128 else 2 if n < 16384 else 3 if n < 2097152 else 4
+
+
+class HttpStream:
+    """One direction of an HTTP/1.x connection: head until CRLFCRLF, then Content-Length body."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.body_left = 0
+        self.opaque = False  # chunked / unknown framing -> rest of the stream is unparsed
+
+    def feed(self, data: bytes, br: Breakdown) -> None:
+        pos = 0
+        n = len(data)
+        while pos < n and not self.opaque:
+            if self.body_left:
+                take = min(self.body_left, n - pos)
+                br.app_payload_bytes += take
+                self.body_left -= take
+                pos += take
+                continue
+            self.buf += data[pos:]
+            pos = n
+            end = self.buf.find(b"\r\n\r\n")
+            if end < 0:
+                break
+            head = bytes(self.buf[:end + 4])
+            rest = bytes(self.buf[end + 4:])
+            self.buf.clear()
+            br.app_header_bytes += len(head)
+            self._on_head(head, br)
+            data, pos, n = rest, 0, len(rest)
+
+    def _on_head(self, head: bytes, br: Breakdown) -> None:
+        lines = head.split(b"\r\n")
+        if lines[0].startswith(b"HTTP/1.") and lines[0][9:10] == b"2":
+            br.readings += 1
+        for line in lines[1:]:
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                try:
+                    self.body_left = int(value.strip())
+                except ValueError:
+                    self.opaque = True
+            elif name == b"transfer-encoding" and b"chunked" in value.lower():
+                self.opaque = True
+
+
+def _coap_ext(nib: int, p: memoryview, i: int) -> Tuple[int, int]:
+    """Extended option delta/length (RFC 7252 3.1) -> (value, next index)."""
+    if nib == 13:
+        return p[i] + 13, i + 1
+    if nib == 14:
+        return ((p[i] << 8) | p[i + 1]) + 269, i + 2
+    return nib, i
+
+
+def coap_split(p: memoryview) -> Optional[Tuple[int, int, int]]:
+    """CoAP datagram -> (type, code, header length incl. token+options+marker), None if not CoAP."""
+    n = len(p)
+    if n < 4 or p[0] >> 6 != 1:
+        return None
+    i = 4 + (p[0] & 0x0F)
+    try:
+        while i < n:
+            b = p[i]
+            i += 1
+            if b == 0xFF:
+                break
+            _, i = _coap_ext(b >> 4, p, i)
+            length, i = _coap_ext(b & 0x0F, p, i)
+            i += length
+    except IndexError:  # truncated capture
+        i = n
+    return (p[0] >> 4) & 0x03, p[1], min(i, n)
+
+
+class ProtoScanner:
+    def __init__(self, proto: str):
+        self.proto = proto
+        self.br = Breakdown()
+        self.tcp = pcap_reader.TcpStreams()
+        self.mqtt_bufs: Dict[tuple, bytearray] = {}
+        self.http: Dict[tuple, HttpStream] = {}
+
+    def feed(self, d: pcap_reader.Decoded, key: tuple, from_client: bool) -> None:
+        self.br.add_frame(d)
+        if self.proto == "coap":
+            self._coap(d.payload, from_client)
+            return
+        data, reset = self.tcp.feed(key, d)
+        if self.proto == "mqtt":
+            buf = self.mqtt_bufs.setdefault(key, bytearray())
+            if reset:
+                buf.clear()
+            if data:
+                buf += data
+                self._mqtt(mqtt_packets(buf), from_client)
+        else:
+            if reset or key not in self.http:
+                self.http[key] = HttpStream()
+            if data:
+                self.http[key].feed(data, self.br)
+
+    def _mqtt(self, packets: List[Tuple[int, int, bytes]], from_client: bool) -> None:
+        br = self.br
+        for ptype, flags, body in packets:
+            total = 1 + _varint_len(len(body)) + len(body)
+            if ptype == MQTT_PUBLISH and len(body) >= 2:
+                hdr = 1 + _varint_len(len(body)) + 2 + ((body[0] << 8) | body[1])
+                if (flags >> 1) & 0x03:
+                    hdr += 2
+                hdr = min(hdr, total)
+                br.app_header_bytes += hdr
+                br.app_payload_bytes += total - hdr
+                if not from_client:
+                    br.readings += 1
+            else:
+                br.control(MQTT_NAMES.get(ptype, f"type{ptype}"), total)
+
+    def _coap(self, p: memoryview, from_client: bool) -> None:
+        parsed = coap_split(p)
+        if parsed is None:
+            return
+        mtype, code, hdr = parsed
+        if code == 0:
+            self.br.control(COAP_TYPES[mtype] if mtype >= 2 else f"{COAP_TYPES[mtype]}-ping", len(p))
+            return
+        self.br.app_header_bytes += hdr
+        self.br.app_payload_bytes += len(p) - hdr
+        if not from_client and code >> 5 == 2:
+            self.br.readings += 1
+
+
+def scan_capture(pcap: Path) -> Dict[str, Breakdown]:
+    scanners = {p: ProtoScanner(p) for p in PROTO_PORTS}
+    port_map = {(tr, port): p for p, (tr, port) in PROTO_PORTS.items()}
+    for d in pcap_reader.iter_decoded(pcap):
+        if d.transport is None:
+            continue
+        if (d.transport, d.dport) in port_map:
+            proto, flow, from_client = port_map[(d.transport, d.dport)], (d.src, d.sport), True
+        elif (d.transport, d.sport) in port_map:
+            proto, flow, from_client = port_map[(d.transport, d.sport)], (d.dst, d.dport), False
+        else:
+            continue
+        scanners[proto].feed(d, (flow, from_client), from_client)
+    return {p: s.br for p, s in scanners.items() if s.br.frames}
+
+
+def _per(v: int, n: int) -> Optional[float]:
+    return round(v / n, 3) if n else None
+
+
+def breakdown_rows(pcap: Path, per_proto: Dict[str, Breakdown]) -> List[Dict[str, object]]:
+    meta = guess_meta_from_path(pcap)
+    rows = []
+    for proto, br in per_proto.items():
+        parsed = br.app_header_bytes + br.app_control_bytes + br.app_payload_bytes
+        rows.append({
+            "scenario": pcap.stem,
+            "pcap_path": str(pcap),
+            "mode": meta["mode"],
+            "proto": proto,
+            "N": meta["N"],
+            "frames": br.frames,
+            "bytes": br.bytes,
+            "link_hdr_bytes": br.link_hdr_bytes,
+            "link_pad_bytes": br.link_pad_bytes,
+            "ip_hdr_bytes": br.ip_hdr_bytes,
+            "l4_hdr_bytes": br.l4_hdr_bytes,
+            "tcp_handshake_frames": br.tcp_handshake_frames,
+            "tcp_handshake_bytes": br.tcp_handshake_bytes,
+            "tcp_teardown_frames": br.tcp_teardown_frames,
+            "tcp_teardown_bytes": br.tcp_teardown_bytes,
+            "tcp_ack_frames": br.tcp_ack_frames,
+            "tcp_ack_bytes": br.tcp_ack_bytes,
+            "data_frames": br.data_frames,
+            "app_header_bytes": br.app_header_bytes,
+            "app_control_bytes": br.app_control_bytes,
+            "app_payload_bytes": br.app_payload_bytes,
+            "app_unparsed_bytes": br.app_bytes - parsed,
+            "control_msgs": ";".join(f"{k}={v}" for k, v in sorted(br.control_msgs.items())),
+            "readings": br.readings,
+            "frames_per_reading": _per(br.frames, br.readings),
+            "bytes_per_reading": _per(br.bytes, br.readings),
+            "payload_bytes_per_reading": _per(br.app_payload_bytes, br.readings),
+            "payload_share_pct": round(100.0 * br.app_payload_bytes / br.bytes, 3) if br.bytes else None,
+        })
+    return rows
+
+
+def analyze(pcap: Path) -> Tuple[List[Dict[str, object]], str]:
+    try:
+        return breakdown_rows(pcap, scan_capture(pcap)), ""
+    except Exception as e:
+        return [], str(e)[:200]
+
+
+FIELDS = [
+    "scenario", "pcap_path", "mode", "proto", "N", "frames", "bytes",
+    "link_hdr_bytes", "link_pad_bytes", "ip_hdr_bytes", "l4_hdr_bytes",
+    "tcp_handshake_frames", "tcp_handshake_bytes", "tcp_teardown_frames", "tcp_teardown_bytes",
+    "tcp_ack_frames", "tcp_ack_bytes", "data_frames",
+    "app_header_bytes", "app_control_bytes", "app_payload_bytes", "app_unparsed_bytes", "control_msgs",
+    "readings", "frames_per_reading", "bytes_per_reading", "payload_bytes_per_reading", "payload_share_pct",
+    "error",
+]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Protocol overhead breakdown (headers / TCP / control / payload) from pcaps.")
+    ap.add_argument("--root", required=True, help="Root directory with pcaps (recursive).")
+    ap.add_argument("--out", required=True, help="Output CSV (one row per capture/proto).")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel worker processes (0 = all CPUs).")
+    ap.add_argument("--quiet", action="store_true", help="No per-file progress on stderr.")
+    args = ap.parse_args()
+
+    root = Path(os.path.expanduser(args.root)).resolve()
+    pcaps = [p for p in find_pcaps(root) if pcap_reader.is_supported(p)]
+    if not pcaps:
+        print(f"ERROR: No .pcap/.pcapng found under: {root}", file=sys.stderr)
+        sys.exit(1)
+
+    results = run_ordered(analyze, pcaps, jobs=args.jobs or os.cpu_count() or 1,
+                          weights=[file_weight(p) for p in pcaps], label="pcap ", progress=not args.quiet)
+
+    out_csv = Path(os.path.expanduser(args.out)).resolve()
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    n_rows = 0
+    with out_csv.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
+        w.writeheader()
+        for pcap, (rows, err) in zip(pcaps, results):
+            if err:
+                w.writerow({"scenario": pcap.stem, "pcap_path": str(pcap), "error": err})
+                print(f"[FAIL] {pcap}: {err}", file=sys.stderr)
+            for r in rows:
+                r["error"] = ""
+                w.writerow(r)
+            n_rows += len(rows)
+
+    print(f"Saved CSV: {out_csv} | rows: {n_rows} / PCAPs: {len(pcaps)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Pure-Python, memory-mapped pcap/pcapng reader (tshark-free fast path).
+
+The file is mmap'ed and record headers are walked with struct.unpack_from;
+packet bytes are handed out as memoryview slices of the map (zero-copy).
+decode_packet() parses just enough of the link/IP/transport headers for
+port-based filtering and header accounting:
+
+- link: Ethernet (+802.1Q), Linux cooked v1/v2 (tshark -i any), raw IP, BSD loopback
+- network: IPv4, IPv6 (with the common extension headers)
+- transport: TCP, UDP
+
+Usage:
+  python pcap_reader.py capture.pcap   # prints a short per-port summary
+"""
+import mmap
+import socket
+import struct
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Hashable, Iterator, NamedTuple, Optional, Tuple
+
+# link-layer types (LINKTYPE_*)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_ALT = 12  # some BSDs write DLT_RAW
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPV6_EXT_HEADERS = (0, 43, 60)  # hop-by-hop, routing, destination options
+IPV6_FRAGMENT = 44
+
+# TCP flags
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BOM = 0x1A2B3C4D
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+class RawRecord(NamedTuple):
+    ts: float            # absolute timestamp (s)
+    wire_len: int        # original length on the wire (= frame.len)
+    linktype: int
+    data: memoryview     # captured bytes (may be shorter than wire_len)
+
+
+class Decoded(NamedTuple):
+    ts: float
+    wire_len: int
+    link_len: int                 # link-layer header bytes
+    ip_version: Optional[int]
+    src: Optional[str]
+    dst: Optional[str]
+    ip_len: int                   # IP header bytes (incl. IPv6 extension headers)
+    transport: Optional[str]      # "tcp" / "udp" / None
+    sport: Optional[int]
+    dport: Optional[int]
+    l4_len: int                   # TCP/UDP header bytes (incl. TCP options)
+    tcp_flags: int
+    seq: int
+    ack: int
+    payload_len: int              # application bytes (IP length based, no Ethernet padding)
+    payload: memoryview           # captured part of the application bytes
+
+
+# --- record walking ---------------------------------------------------------
+
+def _iter_pcap(mm: mmap.mmap, view: memoryview) -> Iterator[RawRecord]:
+    endian, tsres = PCAP_MAGIC[bytes(view[:4])]
+    linktype = struct.unpack_from(endian + "I", view, 20)[0] & 0x0FFFFFFF
+    rec = struct.Struct(endian + "IIII")
+    pos = 24
+    end = len(view)
+    while pos + 16 <= end:
+        sec, frac, caplen, wirelen = rec.unpack_from(view, pos)
+        pos += 16
+        if pos + caplen > end:
+            break  # truncated last record (capture killed mid-write)
+        yield RawRecord(sec + frac * tsres, wirelen, linktype, view[pos:pos + caplen])
+        pos += caplen
+
+
+def _pcapng_tsresol(view: memoryview, endian: str, start: int, end: int) -> float:
+    """Read if_tsresol from IDB options (default microseconds)."""
+    pos = start
+    while pos + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", view, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            v = view[pos + 4]
+            return 2.0 ** -(v & 0x7F) if v & 0x80 else 10.0 ** -v
+        pos += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def _iter_pcapng(mm: mmap.mmap, view: memoryview) -> Iterator[RawRecord]:
+    end = len(view)
+    pos = 0
+    endian = "<"
+    ifaces = []  # (linktype, snaplen, tsresol)
+    while pos + 12 <= end:
+        btype = struct.unpack_from("<I", view, pos)[0]
+        if btype == PCAPNG_SHB:
+            bom = view[pos + 8:pos + 12]
+            endian = "<" if struct.unpack_from("<I", bom)[0] == PCAPNG_BOM else ">"
+            ifaces = []  # new section -> new interface numbering
+        else:
+            btype = struct.unpack_from(endian + "I", view, pos)[0]
+        blen = struct.unpack_from(endian + "I", view, pos + 4)[0]
+        if blen < 12 or pos + blen > end:
+            break
+        body = pos + 8
+        if btype == 1:  # Interface Description Block
+            linktype, _, snaplen = struct.unpack_from(endian + "HHI", view, body)
+            ifaces.append((linktype, snaplen, _pcapng_tsresol(view, endian, body + 8, pos + blen - 4)))
+        elif btype == 6:  # Enhanced Packet Block
+            iface, ts_hi, ts_lo, caplen, wirelen = struct.unpack_from(endian + "IIIII", view, body)
+            linktype, _, tsres = ifaces[iface] if iface < len(ifaces) else (LINKTYPE_ETHERNET, 0, 1e-6)
+            data = body + 20
+            yield RawRecord(((ts_hi << 32) | ts_lo) * tsres, wirelen, linktype, view[data:data + caplen])
+        elif btype == 3:  # Simple Packet Block (no timestamp)
+            wirelen = struct.unpack_from(endian + "I", view, body)[0]
+            linktype, snaplen, _ = ifaces[0] if ifaces else (LINKTYPE_ETHERNET, 0, 1e-6)
+            caplen = min(wirelen, snaplen) if snaplen else wirelen
+            yield RawRecord(0.0, wirelen, linktype, view[body + 4:body + 4 + caplen])
+        elif btype == 2:  # obsolete Packet Block
+            iface, _, ts_hi, ts_lo, caplen, wirelen = struct.unpack_from(endian + "HHIIII", view, body)
+            linktype, _, tsres = ifaces[iface] if iface < len(ifaces) else (LINKTYPE_ETHERNET, 0, 1e-6)
+            data = body + 20
+            yield RawRecord(((ts_hi << 32) | ts_lo) * tsres, wirelen, linktype, view[data:data + caplen])
+        pos += blen
+
+
+def iter_records(path: Path) -> Iterator[RawRecord]:
+    """Yield raw records from a pcap or pcapng file (memory-mapped, zero-copy)."""
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return
+    view = memoryview(mm)
+    try:
+        magic = bytes(view[:4])
+        if magic in PCAP_MAGIC:
+            yield from _iter_pcap(mm, view)
+        elif len(view) >= 4 and struct.unpack_from("<I", view, 0)[0] == PCAPNG_SHB:
+            yield from _iter_pcapng(mm, view)
+        else:
+            raise PcapFormatError(f"{Path(path).name}: not a pcap/pcapng file")
+    finally:
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            # a consumer still holds a slice; the map is freed with the last reference
+            pass
+
+
+def is_supported(path: Path) -> bool:
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    return magic in PCAP_MAGIC or magic == b"\x0a\x0d\x0d\x0a"
+
+
+# --- header decoding --------------------------------------------------------
+
+def _link(linktype: int, data: memoryview) -> Tuple[int, Optional[int]]:
+    """Return (link header length, ethertype) for the frame."""
+    n = len(data)
+    if linktype == LINKTYPE_ETHERNET:
+        if n < 14:
+            return n, None
+        off = 12
+        etype = (data[off] << 8) | data[off + 1]
+        while etype in ETHERTYPE_VLAN and n >= off + 6:
+            off += 4
+            etype = (data[off] << 8) | data[off + 1]
+        return off + 2, etype
+    if linktype == LINKTYPE_LINUX_SLL:
+        return (16, (data[14] << 8) | data[15]) if n >= 16 else (n, None)
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return (20, (data[0] << 8) | data[1]) if n >= 20 else (n, None)
+    if linktype in (LINKTYPE_RAW, LINKTYPE_RAW_ALT, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if not n:
+            return 0, None
+        return 0, ETHERTYPE_IPV4 if data[0] >> 4 == 4 else ETHERTYPE_IPV6
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if n < 5:
+            return n, None
+        return 4, ETHERTYPE_IPV4 if data[4] >> 4 == 4 else ETHERTYPE_IPV6
+    return 0, None
+
+
+_IPV4 = struct.Struct("!BBHHHBBH4s4s")
+_TCP = struct.Struct("!HHIIBB")
+_PORTS = struct.Struct("!HH")
+
+
+def decode_packet(rec: RawRecord, addresses: bool = True) -> Decoded:
+    """Decode link/IP/TCP/UDP headers of one record; unknown layers are left as None/0."""
+    data = rec.data
+    link_len, etype = _link(rec.linktype, data)
+    ipv = None
+    src = dst = None
+    ip_len = l4_len = 0
+    transport = None
+    sport = dport = None
+    flags = seq = ack = 0
+    proto = None
+    l4_end = rec.wire_len - link_len  # IP datagram length, refined below
+    off = link_len
+    n = len(data)
+
+    if etype == ETHERTYPE_IPV4 and n >= off + 20:
+        vihl, _, total_len, _, frag, _, proto, _, s, d = _IPV4.unpack_from(data, off)
+        ipv = 4
+        ip_len = (vihl & 0x0F) * 4
+        l4_end = total_len
+        if addresses:
+            src, dst = socket.inet_ntop(socket.AF_INET, s), socket.inet_ntop(socket.AF_INET, d)
+        if frag & 0x1FFF:
+            proto = None  # non-first fragment: no transport header
+    elif etype == ETHERTYPE_IPV6 and n >= off + 40:
+        ipv = 6
+        plen = (data[off + 4] << 8) | data[off + 5]
+        proto = data[off + 6]
+        if addresses:
+            src = socket.inet_ntop(socket.AF_INET6, bytes(data[off + 8:off + 24]))
+            dst = socket.inet_ntop(socket.AF_INET6, bytes(data[off + 24:off + 40]))
+        ip_len = 40
+        while proto in IPV6_EXT_HEADERS and n >= off + ip_len + 2:
+            proto, hlen = data[off + ip_len], (data[off + ip_len + 1] + 1) * 8
+            ip_len += hlen
+        if proto == IPV6_FRAGMENT and n >= off + ip_len + 8:
+            frag_off = ((data[off + ip_len + 2] << 8) | data[off + ip_len + 3]) >> 3
+            proto = data[off + ip_len] if frag_off == 0 else None
+            ip_len += 8
+        l4_end = 40 + plen
+
+    off += ip_len
+    if proto == IPPROTO_TCP and n >= off + 14:
+        sport, dport, seq, ack, doff, flags = _TCP.unpack_from(data, off)
+        transport = "tcp"
+        l4_len = (doff >> 4) * 4
+    elif proto == IPPROTO_UDP and n >= off + 4:
+        sport, dport = _PORTS.unpack_from(data, off)
+        transport = "udp"
+        l4_len = 8
+
+    payload_len = max(0, l4_end - ip_len - l4_len) if ipv else 0
+    start = off + l4_len
+    payload = data[start:min(n, start + payload_len)] if payload_len else data[0:0]
+    return Decoded(rec.ts, rec.wire_len, link_len, ipv, src, dst, ip_len, transport,
+                   sport, dport, l4_len, flags, seq, ack, payload_len, payload)
+
+
+class TcpStreams:
+    """
+    Minimal in-order TCP payload reassembly per (flow, direction) key.
+
+    feed() returns the bytes that extend the stream (retransmitted/overlapping
+    data is trimmed). A gap in the capture resets the stream at the new segment;
+    callers see `reset=True` and should drop any partially parsed state.
+    """
+
+    def __init__(self):
+        self.next_seq: Dict[Hashable, Optional[int]] = {}
+
+    def feed(self, key: Hashable, d: Decoded) -> Tuple[bytes, bool]:
+        nxt = self.next_seq.get(key)
+        reset = False
+        if d.tcp_flags & TCP_SYN:
+            nxt = (d.seq + 1) & 0xFFFFFFFF
+            reset = True
+        data = bytes(d.payload)
+        if data:
+            if nxt is None:
+                nxt = d.seq
+            delta = (d.seq - nxt) & 0xFFFFFFFF
+            if delta >= 0x80000000:
+                # segment starts before what we already have (retransmission / overlap)
+                data = data[(nxt - d.seq) & 0xFFFFFFFF:]
+            elif delta:
+                # gap in the capture -> resync on this segment
+                nxt = d.seq
+                reset = True
+            nxt = (nxt + len(data)) & 0xFFFFFFFF
+        self.next_seq[key] = nxt
+        return data, reset
+
+
+def iter_decoded(path: Path, addresses: bool = True) -> Iterator[Decoded]:
+    for rec in iter_records(path):
+        yield decode_packet(rec, addresses=addresses)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python pcap_reader.py file.pcap[ng]")
+        sys.exit(1)
+    frames = 0
+    total = 0
+    first = last = None
+    ports: Counter = Counter()
+    port_bytes: Counter = Counter()
+    for pkt in iter_decoded(Path(sys.argv[1]), addresses=False):
+        frames += 1
+        total += pkt.wire_len
+        first = pkt.ts if first is None else first
+        last = pkt.ts
+        if pkt.transport:
+            key = f"{pkt.transport.upper()}/{min(pkt.sport, pkt.dport)}"
+            ports[key] += 1
+            port_bytes[key] += pkt.wire_len
+    dur = (last - first) if frames else 0.0
+    print(f"Frames: {frames}")
+    print(f"Bytes: {total}")
+    print(f"Duration: {dur:.6f} secs")
+    for key, cnt in ports.most_common(20):
+        print(f"  {key:<12} frames={cnt:<8} bytes={port_bytes[key]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Bramka regresji wydajności: nazwany baseline + porównanie nowej serii z baseline.
+
+Wejście to wyjścia istniejących narzędzi, z wartościami per powtórzenie (rep):
+
+- latency_summary.py --by-rep  -> mode, proto, N, rep, mean_rtt_ms, median_ms, p95_ms, p99_ms (+ *_co_ms)
+- pcap_metrics.py              -> jeden wiersz na pcap; rep z pcap_path (.../rep2/..., *_rep2_*)
+
+`save` zapisuje wartości per (mode, proto, N) i metryka jako listy per rep do
+<store>/<name>.json. `compare` liczy dla każdej pary grupa/metryka:
+
+- delta = mediana(nowe) / mediana(baseline) - 1 (znak tak, że + = gorzej),
+- jednostronny test Manna-Whitneya (dokładny, permutacyjny po rangach) na wartościach per rep,
+- bootstrap 95% CI delty median (resampling repów w obu grupach).
+
+Werdykt: REGRESSION gdy delta > próg metryki i test istotny (mwu: p <= alpha,
+bootstrap: dolna granica CI > 0); "worse?" gdy delta > próg, ale przy tej liczbie
+repów nie da się tego potwierdzić; "better" symetrycznie. Kod wyjścia 1 przy REGRESSION
+(z --strict także przy "worse?"), 2 przy błędzie wejścia.
+
+--test auto (domyślnie) wybiera test per wiersz: MWU, gdy przy tej liczbie repów może
+osiągnąć alpha, inaczej bootstrap. Przy 2 vs 2 repach (REPS=2 w run_series.sh)
+najmniejsze możliwe p MWU to 1/6, więc sam MWU nigdy nie zgłosiłby regresji.
+
+Uruchom:
+  python latency_summary.py --root ../results/series_a --out lat_a.csv --by-rep
+  python pcap_metrics.py --root ../results/series_a --out pcap_a.csv
+  python perf_gate.py save --name broker-v1 --lat lat_a.csv --pcap pcap_a.csv
+  python perf_gate.py compare --baseline broker-v1 --lat lat_b.csv --pcap pcap_b.csv \\
+      [--threshold p99_ms=20% bytes_per_sec_proto=5%] [--report diff.md]
+  python perf_gate.py list
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BASELINE_VERSION = 1
+DEFAULT_STORE = Path(__file__).resolve().parent.parent / "results" / "baselines"
+
+# metryka -> (źródło, kierunek: +1 = większa wartość jest gorsza, domyślny próg względny)
+METRICS: Dict[str, Tuple[str, int, float]] = {
+    "median_ms": ("lat", +1, 0.10),
+    "p95_ms": ("lat", +1, 0.10),
+    "p99_ms": ("lat", +1, 0.15),
+    "mean_rtt_ms": ("lat", +1, 0.10),
+    "p99_co_ms": ("lat", +1, 0.15),
+    "avg_frame_len_proto": ("pcap", +1, 0.02),
+    "bytes_per_sec_proto": ("pcap", +1, 0.10),
+}
+GROUP_COLS = ("mode", "proto", "N")
+
+RE_REP = re.compile(r"(?:^|[_/\\-])rep(\d+)(?:[_/\\.-]|$)", re.I)
+EXACT_MAX_PERMS = 200_000
+
+
+# ---------- wczytanie wyjść latency_summary / pcap_metrics ----------
+
+def _norm_groups(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["mode"] = df["mode"].astype(str).str.lower()
+    df["proto"] = df["proto"].astype(str).str.lower()
+    df["N"] = pd.to_numeric(df["N"], errors="coerce")
+    return df.dropna(subset=["N"]).astype({"N": int})
+
+
+def load_lat(path: Path) -> pd.DataFrame:
+    df = _norm_groups(pd.read_csv(path))
+    if "rep" not in df.columns:
+        print(f"WARN: {path} has no rep column (run latency_summary.py --by-rep); "
+              f"each group counts as a single rep", file=sys.stderr)
+        df["rep"] = 1
+    return df
+
+
+def load_pcap(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    if "error" in df.columns:
+        df = df[df["error"].isna() | (df["error"].astype(str).str.strip() == "")]
+    if "rep" not in df.columns:
+        src = df["pcap_path"] if "pcap_path" in df.columns else df["scenario"]
+        df = df.assign(rep=[int(m.group(1)) if (m := RE_REP.search(str(s))) else None for s in src])
+    df = _norm_groups(df)
+    df["rep"] = df["rep"].fillna(1).astype(int)
+    return df
+
+
+def per_rep_values(lat: Optional[pd.DataFrame], pcap: Optional[pd.DataFrame]) -> Dict[str, Dict[str, List[float]]]:
+    """{"open/mqtt/N10": {"p99_ms": [rep1, rep2, ...], ...}}"""
+    out: Dict[str, Dict[str, List[float]]] = {}
+    for src, df in (("lat", lat), ("pcap", pcap)):
+        if df is None:
+            continue
+        metrics = [m for m, (s, _, _) in METRICS.items() if s == src and m in df.columns]
+        for key, sub in df.groupby(list(GROUP_COLS), sort=True):
+            mode, proto, n = key
+            # kilka wierszy na rep (np. kilka pcapów) -> średnia
+            by_rep = sub.groupby("rep")[metrics].mean(numeric_only=True)
+            g = out.setdefault(f"{mode}/{proto}/N{n}", {})
+            for m in metrics:
+                vals = pd.to_numeric(by_rep[m], errors="coerce").dropna()
+                if len(vals):
+                    g[m] = [float(v) for v in vals]
+    return out
+
+
+# ---------- statystyka ----------
+
+def _ranks(x: np.ndarray) -> np.ndarray:
+    """Rangi średnie (remisy dostają średnią rangę), od 1."""
+    order = np.argsort(x, kind="mergesort")
+    ranks = np.empty(x.size, dtype=np.float64)
+    xs = x[order]
+    i = 0
+    while i < xs.size:
+        j = i
+        while j + 1 < xs.size and xs[j + 1] == xs[i]:
+            j += 1
+        ranks[order[i:j + 1]] = (i + j) / 2.0 + 1.0
+        i = j + 1
+    return ranks
+
+
+def mann_whitney_greater(new: List[float], base: List[float]) -> Tuple[float, float]:
+    """Jednostronny MWU (H1: new stochastycznie większe) -> (U, p).
+
+    Dokładny rozkład permutacyjny sumy rang (poprawny też przy remisach), gdy liczba
+    podziałów <= EXACT_MAX_PERMS; inaczej przybliżenie normalne z poprawką na remisy."""
+    x, y = np.asarray(new, dtype=np.float64), np.asarray(base, dtype=np.float64)
+    n1, n2 = x.size, y.size
+    if n1 == 0 or n2 == 0:
+        return math.nan, math.nan
+    ranks = _ranks(np.concatenate([x, y]))
+    r1 = float(ranks[:n1].sum())
+    u = r1 - n1 * (n1 + 1) / 2.0
+    if math.comb(n1 + n2, n1) <= EXACT_MAX_PERMS:
+        sums = np.fromiter((ranks[list(c)].sum() for c in combinations(range(n1 + n2), n1)), dtype=np.float64)
+        return u, float(np.mean(sums >= r1 - 1e-9))
+    n = n1 + n2
+    _, counts = np.unique(ranks, return_counts=True)
+    var = n1 * n2 / 12.0 * ((n + 1) - float(((counts ** 3) - counts).sum()) / (n * (n - 1)))
+    if var <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(var)
+    return u, 0.5 * math.erfc(z / math.sqrt(2.0))
+
+
+def min_p(n1: int, n2: int) -> float:
+    """Najmniejsze osiągalne p dokładnego MWU dla n1 vs n2 repów."""
+    return 1.0 / math.comb(n1 + n2, n1) if n1 and n2 else 1.0
+
+
+def bootstrap_ci(new: List[float], base: List[float], iters: int = 2000, level: float = 0.95,
+                 seed: int = 0) -> Tuple[float, float]:
+    """Percentylowy CI względnej zmiany median (new/base - 1)."""
+    x, y = np.asarray(new, dtype=np.float64), np.asarray(base, dtype=np.float64)
+    if x.size == 0 or y.size == 0:
+        return math.nan, math.nan
+    rng = np.random.default_rng(seed)
+    mx = np.median(x[rng.integers(0, x.size, (iters, x.size))], axis=1)
+    my = np.median(y[rng.integers(0, y.size, (iters, y.size))], axis=1)
+    ok = my != 0
+    rel = mx[ok] / my[ok] - 1.0
+    if rel.size == 0:
+        return math.nan, math.nan
+    a = (1.0 - level) / 2.0
+    return float(np.quantile(rel, a)), float(np.quantile(rel, 1.0 - a))
+
+
+def compare_metric(metric: str, base: List[float], new: List[float], threshold: float, test: str,
+                   alpha: float, iters: int, seed: int) -> Dict[str, object]:
+    direction = METRICS[metric][1]
+    mb, mn = float(np.median(base)), float(np.median(new))
+    delta = (mn / mb - 1.0) if mb else (0.0 if mn == mb else math.inf)
+    worse = delta * direction
+    if direction > 0:
+        _, p_worse = mann_whitney_greater(new, base)
+        _, p_better = mann_whitney_greater(base, new)
+        lo, hi = bootstrap_ci(new, base, iters, seed=seed)
+    else:
+        _, p_worse = mann_whitney_greater(base, new)
+        _, p_better = mann_whitney_greater(new, base)
+        lo, hi = bootstrap_ci(base, new, iters, seed=seed)  # CI "pogorszenia" zawsze w stronę +
+    if test == "bootstrap":
+        sig_worse, sig_better = lo > 0, hi < 0
+    else:
+        sig_worse, sig_better = p_worse <= alpha, p_better <= alpha
+    if worse > threshold:
+        verdict = "REGRESSION" if sig_worse else "worse?"
+    elif worse < -threshold:
+        verdict = "better" if sig_better else "better?"
+    else:
+        verdict = "ok"
+    return {
+        "metric": metric, "n_base": len(base), "n_new": len(new),
+        "base": mb, "new": mn, "delta": delta, "threshold": threshold,
+        "p": p_worse, "ci_lo": lo, "ci_hi": hi, "verdict": verdict,
+    }
+
+
+# ---------- baseline store ----------
+
+def baseline_path(store: Path, name: str) -> Path:
+    if not re.fullmatch(r"[\w.-]+", name):
+        raise ValueError(f"invalid baseline name: {name!r} (letters, digits, _ . -)")
+    return store / f"{name}.json"
+
+
+def save_baseline(store: Path, name: str, groups: Dict[str, Dict[str, List[float]]],
+                  sources: Dict[str, Optional[str]], note: Optional[str] = None) -> Path:
+    store.mkdir(parents=True, exist_ok=True)
+    out = baseline_path(store, name)
+    data = {
+        "version": BASELINE_VERSION, "name": name, "created": time.time(),
+        "sources": sources, "note": note, "groups": groups,
+    }
+    tmp = out.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(data, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, out)
+    return out
+
+
+def load_baseline(store: Path, name: str) -> Dict[str, object]:
+    p = Path(name) if name.endswith(".json") else baseline_path(store, name)
+    data = json.loads(p.read_text(encoding="utf-8"))
+    if data.get("version") != BASELINE_VERSION:
+        raise ValueError(f"{p}: unsupported baseline version {data.get('version')}")
+    return data
+
+
+# ---------- porównanie + raport ----------
+
+def parse_thresholds(items: List[str]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for item in items:
+        if "=" not in item:
+            raise ValueError(f"--threshold expects metric=value, got: {item}")
+        k, v = (s.strip() for s in item.split("=", 1))
+        if k not in METRICS:
+            raise ValueError(f"unknown metric {k!r} (known: {', '.join(METRICS)})")
+        out[k] = float(v[:-1]) / 100.0 if v.endswith("%") else float(v)
+    return out
+
+
+def pick_test(test: str, n_base: int, n_new: int, alpha: float) -> str:
+    """auto -> MWU, jeśli przy tej liczbie repów może dać p <= alpha, inaczej bootstrap."""
+    if test != "auto":
+        return test
+    return "mwu" if min_p(n_new, n_base) <= alpha else "bootstrap"
+
+
+def compare(base_groups: Dict[str, Dict[str, List[float]]], new_groups: Dict[str, Dict[str, List[float]]],
+            thresholds: Dict[str, float], test: str = "auto", alpha: float = 0.05,
+            iters: int = 2000, seed: int = 0) -> Tuple[List[Dict[str, object]], List[str]]:
+    rows: List[Dict[str, object]] = []
+    notes: List[str] = []
+    for g in sorted(set(base_groups) - set(new_groups)):
+        notes.append(f"missing in new series: {g}")
+    for g in sorted(set(new_groups) - set(base_groups)):
+        notes.append(f"not in baseline (skipped): {g}")
+    for g in sorted(set(base_groups) & set(new_groups)):
+        for metric in METRICS:
+            b, n = base_groups[g].get(metric), new_groups[g].get(metric)
+            if not b or not n:
+                continue
+            thr = thresholds.get(metric, METRICS[metric][2])
+            t = pick_test(test, len(b), len(n), alpha)
+            row = compare_metric(metric, b, n, thr, t, alpha, iters, seed)
+            rows.append({"group": g, **row, "test": t})
+    weak = sorted({(r["n_base"], r["n_new"]) for r in rows if min_p(r["n_new"], r["n_base"]) > alpha})
+    for nb, nn in weak:
+        if test == "mwu":
+            notes.append(f"{nb} vs {nn} reps: MWU cannot reach alpha={alpha} "
+                         f"(min p={min_p(nn, nb):.3f}) - such rows are at most 'worse?'")
+        elif test == "auto":
+            notes.append(f"{nb} vs {nn} reps: MWU cannot reach alpha={alpha} "
+                         f"(min p={min_p(nn, nb):.3f}) - bootstrap CI used for these rows")
+    return rows, notes
+
+
+def _fmt(v: float, spec: str = "{:.3g}") -> str:
+    return "-" if v is None or (isinstance(v, float) and math.isnan(v)) else spec.format(v)
+
+
+def format_report(rows: List[Dict[str, object]], notes: List[str], show_all: bool = False,
+                  markdown: bool = False) -> str:
+    cols = ["group", "metric", "reps", "test", "base", "new", "delta", "thr", "p", "CI95", "verdict"]
+    table = []
+    for r in rows:
+        if not show_all and r["verdict"] == "ok":
+            continue
+        table.append([
+            r["group"], r["metric"], f"{r['n_base']}/{r['n_new']}", r.get("test", "-"),
+            _fmt(r["base"]), _fmt(r["new"]), _fmt(100 * r["delta"], "{:+.1f}%"),
+            _fmt(100 * r["threshold"], "{:.0f}%"), _fmt(r["p"], "{:.3f}"),
+            f"[{_fmt(100 * r['ci_lo'], '{:+.0f}')},{_fmt(100 * r['ci_hi'], '{:+.0f}')}]%",
+            r["verdict"],
+        ])
+    counts: Dict[str, int] = {}
+    for r in rows:
+        counts[r["verdict"]] = counts.get(r["verdict"], 0) + 1
+    summary = "compared {} metric/group pairs: {}".format(
+        len(rows), ", ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "-")
+    lines = []
+    if markdown:
+        lines += [summary, "", "| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+        lines += ["| " + " | ".join(t) + " |" for t in table]
+        lines += [""] + [f"- {n}" for n in notes]
+    else:
+        widths = [max(len(c), *(len(t[i]) for t in table)) if table else len(c) for i, c in enumerate(cols)]
+        lines.append(summary)
+        if table:
+            lines.append("  ".join(c.ljust(w) for c, w in zip(cols, widths)).rstrip())
+            lines += ["  ".join(v.ljust(w) for v, w in zip(t, widths)).rstrip() for t in table]
+        lines += [f"NOTE: {n}" for n in notes]
+    return "\n".join(lines)
+
+
+def _load_inputs(args) -> Dict[str, Dict[str, List[float]]]:
+    if not args.lat and not args.pcap:
+        raise ValueError("need --lat and/or --pcap")
+    lat = load_lat(Path(args.lat)) if args.lat else None
+    pcap = load_pcap(Path(args.pcap)) if args.pcap else None
+    groups = per_rep_values(lat, pcap)
+    if not groups:
+        raise ValueError("no usable rows (mode/proto/N) in inputs")
+    return groups
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Store a performance baseline and gate new series against it.")
+    ap.add_argument("--store", default=str(DEFAULT_STORE), help="Baseline directory (default: results/baselines).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("save", help="Save per-rep values of a series as a named baseline.")
+    s.add_argument("--name", required=True)
+    s.add_argument("--lat", help="latency_summary.py --by-rep CSV.")
+    s.add_argument("--pcap", help="pcap_metrics.py CSV.")
+    s.add_argument("--note", help="Free text (e.g. broker config, commit).")
+    s.add_argument("--force", action="store_true", help="Overwrite an existing baseline.")
+
+    c = sub.add_parser("compare", help="Compare a series with a baseline; exit 1 on regression.")
+    c.add_argument("--baseline", required=True, help="Baseline name (or path to .json).")
+    c.add_argument("--lat", help="latency_summary.py --by-rep CSV of the new series.")
+    c.add_argument("--pcap", help="pcap_metrics.py CSV of the new series.")
+    c.add_argument("--threshold", nargs="+", default=[], metavar="METRIC=X",
+                   help="Relative threshold per metric, e.g. p99_ms=20%% or p99_ms=0.2.")
+    c.add_argument("--test", choices=["auto", "mwu", "bootstrap"], default="auto",
+                   help="Significance: one-sided Mann-Whitney (p <= alpha), bootstrap CI of delta > 0, "
+                        "or auto = MWU where the rep counts allow p <= alpha, else bootstrap.")
+    c.add_argument("--alpha", type=float, default=0.05)
+    c.add_argument("--bootstrap", type=int, default=2000, help="Bootstrap iterations.")
+    c.add_argument("--seed", type=int, default=0)
+    c.add_argument("--strict", action="store_true", help="Also fail on over-threshold changes that are not significant.")
+    c.add_argument("--all", action="store_true", help="Show unchanged rows too.")
+    c.add_argument("--report", help="Write the report to a file (.md = markdown table, .json = rows).")
+
+    sub.add_parser("list", help="List stored baselines.")
+
+    args = ap.parse_args()
+    store = Path(os.path.expanduser(args.store))
+
+    try:
+        if args.cmd == "list":
+            for p in sorted(store.glob("*.json")):
+                d = json.loads(p.read_text(encoding="utf-8"))
+                when = time.strftime("%Y-%m-%d %H:%M", time.localtime(d.get("created", 0)))
+                print(f"{d.get('name', p.stem):<24} {when}  groups={len(d.get('groups', {}))}  {d.get('note') or ''}")
+            return
+
+        if args.cmd == "save":
+            out = baseline_path(store, args.name)
+            if out.exists() and not args.force:
+                raise ValueError(f"baseline exists: {out} (use --force)")
+            groups = _load_inputs(args)
+            sources = {"lat": os.path.abspath(args.lat) if args.lat else None,
+                       "pcap": os.path.abspath(args.pcap) if args.pcap else None}
+            out = save_baseline(store, args.name, groups, sources, args.note)
+            reps = sorted({len(v) for g in groups.values() for v in g.values()})
+            print(f"[OK] baseline {args.name}: {len(groups)} groups, reps per group {reps} -> {out}")
+            return
+
+        thresholds = parse_thresholds(args.threshold)
+        base = load_baseline(store, args.baseline)
+        new_groups = _load_inputs(args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    rows, notes = compare(base["groups"], new_groups, thresholds, args.test, args.alpha, args.bootstrap, args.seed)
+    print(f"baseline: {base['name']}  test: {args.test}  alpha: {args.alpha}")
+    print(format_report(rows, notes, show_all=args.all))
+    if args.report:
+        rp = Path(args.report)
+        rp.parent.mkdir(parents=True, exist_ok=True)
+        if rp.suffix == ".json":
+            rp.write_text(json.dumps({"baseline": base["name"], "rows": rows, "notes": notes}, indent=1), encoding="utf-8")
+        else:
+            rp.write_text(format_report(rows, notes, show_all=args.all, markdown=rp.suffix == ".md") + "\n",
+                          encoding="utf-8")
+
+    failing = {"REGRESSION", "worse?"} if args.strict else {"REGRESSION"}
+    if any(r["verdict"] in failing for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,114 @@
 #!/usr/bin/env python3
 import argparse
 import os
+import sys
 from pathlib import Path
+from typing import List
 
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from figure_jobs import CACHE_NAME, FigureJob, render_figures
+
+def timeseries_figure(g: pd.DataFrame, scenario: str, proto: str, out: Path):
+    """Throughput + per-bin latency vs time for one scenario/proto (output of timeseries.py)."""
+    bin_ms = float(g["bin_s"].iloc[0]) * 1000
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), sharex=True)
+    if g["bytes_per_s"].notna().any():
+        ax1.plot(g["t_rel_s"], g["bytes_per_s"] / 1024, label="KB/s (pcap)")
+    if g["requests_per_s"].notna().any():
+        ax1b = ax1.twinx()
+        ax1b.plot(g["t_rel_s"], g["requests_per_s"], color="#D55E00", label="requests/s")
+        ax1b.set_ylabel("requests/s")
+        ax1b.legend(loc="upper right")
+    ax1.set_ylabel("KB/s")
+    if ax1.lines:
+        ax1.legend(loc="upper left")
+    ax1.set_title(f"{scenario} {proto} ({bin_ms:g} ms bins)")
+    for col in ("lat_p50_ms", "lat_p95_ms", "lat_p99_ms"):
+        if g[col].notna().any():
+            ax2.plot(g["t_rel_s"], g[col], label=col.split("_")[1])
+    ax2.set_ylabel("RTT (ms)")
+    ax2.set_xlabel("t (s)")
+    if ax2.lines:
+        ax2.legend(loc="upper left")
+    fig.tight_layout()
+    fig.savefig(out, dpi=200)
+    plt.close(fig)
+
+def timeseries_jobs(path: Path, odir: Path) -> List[FigureJob]:
+    """One figure job per scenario/proto of a timeseries.py table."""
+    from timeseries import read_table
+    ts = read_table(path)
+    cols = ["t_rel_s", "bin_s", "bytes_per_s", "requests_per_s", "lat_p50_ms", "lat_p95_ms", "lat_p99_ms"]
+    jobs = []
+    for (scenario, proto), g in ts.groupby(["scenario", "proto"], sort=True):
+        g = g.sort_values("t_rel_s")[cols].reset_index(drop=True)
+        jobs.append(FigureJob(odir / f"{scenario}_{proto}_timeseries.png", timeseries_figure,
+                              (g, scenario, proto)))
+    return jobs
+
+def bar_figure(df: pd.DataFrame, column: str, ylabel: str, figsize, rotation: int, fontsize: int, out: Path):
+    plt.figure(figsize=figsize)
+    plt.bar(df["label"], df[column])
+    plt.ylabel(ylabel)
+    plt.xticks(rotation=rotation, ha="right", fontsize=fontsize)
+    plt.tight_layout()
+    plt.savefig(out, dpi=200)
+    plt.close()
+
+def errorbar_figure(sub: pd.DataFrame, ylabel: str, title: str, out: Path):
+    """mean ± std vs N, one line per mode (sub = one proto of the aggregate)."""
+    plt.figure(figsize=(8, 4))
+    for mode in sorted(sub["mode"].dropna().unique()):
+        s = sub[sub["mode"] == mode].sort_values("N")
+        plt.errorbar(s["N"], s["mean"], yerr=s["std"], marker="o", label=mode, capsize=3)
+    plt.xlabel("N")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(out, dpi=200)
+    plt.close()
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--pcap", required=True)
-    ap.add_argument("--lat", required=True)
+    ap.add_argument("--pcap")
+    ap.add_argument("--lat")
     ap.add_argument("--outdir", required=True)
     ap.add_argument("--filter-n", nargs="*", help="Optional list of N values to include (e.g. 10 50 100).")
     ap.add_argument("--split-proto", action="store_true", help="Produce per-proto plots in subfolders.")
     ap.add_argument("--split-mode", action="store_true", help="Produce per-mode plots in subfolders.")
     ap.add_argument("--aggregate", action="store_true", help="Plot aggregated metrics per proto/mode/N with error bars.")
+    ap.add_argument("--timeseries", help="Time series file from timeseries.py (.parquet/.feather/.csv) -> <outdir>/timeseries.")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel render processes (0 = all CPUs).")
+    ap.add_argument("--no-cache", action="store_true", help="Re-render every figure (default: skip unchanged ones).")
+    ap.add_argument("--quiet", action="store_true", help="No progress output.")
     args = ap.parse_args()
+    if not args.timeseries and not (args.pcap and args.lat):
+        ap.error("--pcap and --lat are required (unless only --timeseries is plotted)")
 
     outdir = Path(os.path.expanduser(args.outdir))
     outdir.mkdir(parents=True, exist_ok=True)
 
+    # każdy wykres to osobne zadanie (pula procesów + cache po treści danych)
+    figs: List[FigureJob] = []
+
+    def render():
+        rendered, skipped, failed = render_figures(figs, outdir / CACHE_NAME, jobs=args.jobs or os.cpu_count() or 1,
+                                                   use_cache=not args.no_cache, progress=not args.quiet)
+        print(f"Figures: {rendered} rendered, {skipped} unchanged (cached), {failed} failed")
+        if failed:
+            print(f"ERROR: {failed} figure(s) failed, see WARN lines above", file=sys.stderr)
+            sys.exit(1)
+
+    if args.timeseries:
+        figs.extend(timeseries_jobs(Path(os.path.expanduser(args.timeseries)), outdir / "timeseries"))
+        if not (args.pcap and args.lat):
+            render()
+            print(f"Saved plots to: {outdir}")
+            return
+
     pcap = pd.read_csv(os.path.expanduser(args.pcap))
     lat = pd.read_csv(os.path.expanduser(args.lat))
 
@@ -83,18 +172,9 @@ def main():
         ).reset_index()
         agg["std"] = agg["std"].fillna(0)
         for proto in sorted(agg["proto"].dropna().unique()):
-            sub = agg[agg["proto"] == proto]
-            plt.figure(figsize=(8, 4))
-            for mode in sorted(sub["mode"].dropna().unique()):
-                s = sub[sub["mode"] == mode].sort_values("N")
-                plt.errorbar(s["N"], s["mean"], yerr=s["std"], marker="o", label=mode, capsize=3)
-            plt.xlabel("N")
-            plt.ylabel(f"{metric} (mean ± std)")
-            plt.title(f"{proto} throughput")
-            plt.legend()
-            plt.tight_layout()
-            plt.savefig(odir / f"{proto}_{metric}_aggregate.png", dpi=200)
-            plt.close()
+            sub = agg[agg["proto"] == proto].reset_index(drop=True)
+            figs.append(FigureJob(odir / f"{proto}_{metric}_aggregate.png", errorbar_figure, (sub,),
+                                  dict(ylabel=f"{metric} (mean ± std)", title=f"{proto} throughput")))
 
         # Latency aggregate (if columns present)
         if not lat_df.empty:
@@ -109,18 +189,9 @@ def main():
                 ).reset_index()
                 agg_lat["std"] = agg_lat["std"].fillna(0)
                 for proto in sorted(agg_lat["proto"].dropna().unique()):
-                    sub = agg_lat[agg_lat["proto"] == proto]
-                    plt.figure(figsize=(8, 4))
-                    for mode in sorted(sub["mode"].dropna().unique()):
-                        s = sub[sub["mode"] == mode].sort_values("N")
-                        plt.errorbar(s["N"], s["mean"], yerr=s["std"], marker="o", label=mode, capsize=3)
-                    plt.xlabel("N")
-                    plt.ylabel("Mean latency (ms)")
-                    plt.title(f"{proto} latency")
-                    plt.legend()
-                    plt.tight_layout()
-                    plt.savefig(odir / f"{proto}_latency_aggregate.png", dpi=200)
-                    plt.close()
+                    sub = agg_lat[agg_lat["proto"] == proto].reset_index(drop=True)
+                    figs.append(FigureJob(odir / f"{proto}_latency_aggregate.png", errorbar_figure, (sub,),
+                                          dict(ylabel="Mean latency (ms)", title=f"{proto} latency")))
 
             if "jitter_std_ms" in lat_df.columns:
                 agg_jit = lat_df.dropna(subset=["jitter_std_ms"]).groupby(["proto", "mode", "N"]).agg(
@@ -130,18 +201,9 @@ def main():
                 ).reset_index()
                 agg_jit["std"] = agg_jit["std"].fillna(0)
                 for proto in sorted(agg_jit["proto"].dropna().unique()):
-                    sub = agg_jit[agg_jit["proto"] == proto]
-                    plt.figure(figsize=(8, 4))
-                    for mode in sorted(sub["mode"].dropna().unique()):
-                        s = sub[sub["mode"] == mode].sort_values("N")
-                        plt.errorbar(s["N"], s["mean"], yerr=s["std"], marker="o", label=mode, capsize=3)
-                    plt.xlabel("N")
-                    plt.ylabel("Jitter std (ms)")
-                    plt.title(f"{proto} jitter")
-                    plt.legend()
-                    plt.tight_layout()
-                    plt.savefig(odir / f"{proto}_jitter_aggregate.png", dpi=200)
-                    plt.close()
+                    sub = agg_jit[agg_jit["proto"] == proto].reset_index(drop=True)
+                    figs.append(FigureJob(odir / f"{proto}_jitter_aggregate.png", errorbar_figure, (sub,),
+                                          dict(ylabel="Jitter std (ms)", title=f"{proto} jitter")))
 
     # Wczytaj dane
     pcap_df = pd.read_csv(os.path.expanduser(args.pcap))
@@ -169,13 +231,9 @@ def main():
             p["N_num"] = pd.to_numeric(p.get("N"), errors="coerce")
             p = p.sort_values(["proto", "mode", "N_num"])
 
-            plt.figure(figsize=(10, 5))
-            plt.bar(p["label"], p["bytes_per_sec_proto"])
-            plt.ylabel("Bytes/sec (proto)")
-            plt.xticks(rotation=60, ha="right", fontsize=8)
-            plt.tight_layout()
-            plt.savefig(odir / "bytes_per_sec_proto.png", dpi=200)
-            plt.close()
+            figs.append(FigureJob(odir / "bytes_per_sec_proto.png", bar_figure,
+                                  (p[["label", "bytes_per_sec_proto"]].reset_index(drop=True), "bytes_per_sec_proto"),
+                                  dict(ylabel="Bytes/sec (proto)", figsize=(10, 5), rotation=60, fontsize=8)))
 
             l = lat_df[lat_df["count"] > 0].copy() if "count" in lat_df.columns else lat_df.copy()
             if l.empty:
@@ -187,26 +245,18 @@ def main():
             if sort_cols:
                 l = l.sort_values(sort_cols, na_position="last")
 
-            plt.figure(figsize=(12, 6))
-            plt.bar(l["label"], l["mean_latency_ms"])
-            plt.ylabel("Mean latency (ms)")
-            plt.xticks(rotation=75, ha="right", fontsize=7)
-            plt.tight_layout()
-            plt.savefig(odir / "mean_latency_ms.png", dpi=200)
-            plt.close()
+            figs.append(FigureJob(odir / "mean_latency_ms.png", bar_figure,
+                                  (l[["label", "mean_latency_ms"]].reset_index(drop=True), "mean_latency_ms"),
+                                  dict(ylabel="Mean latency (ms)", figsize=(12, 6), rotation=75, fontsize=7)))
 
             if "jitter_std_ms" in l.columns:
                 l_j = l.dropna(subset=["jitter_std_ms"])
                 l_j["jitter_std_ms"] = pd.to_numeric(l_j["jitter_std_ms"], errors="coerce")
                 l_j = l_j.dropna(subset=["jitter_std_ms"])
                 if not l_j.empty:
-                    plt.figure(figsize=(12, 6))
-                    plt.bar(l_j["label"], l_j["jitter_std_ms"])
-                    plt.ylabel("Jitter (std dev, ms)")
-                    plt.xticks(rotation=75, ha="right", fontsize=7)
-                    plt.tight_layout()
-                    plt.savefig(odir / "jitter_std_ms.png", dpi=200)
-                    plt.close()
+                    figs.append(FigureJob(odir / "jitter_std_ms.png", bar_figure,
+                                          (l_j[["label", "jitter_std_ms"]].reset_index(drop=True), "jitter_std_ms"),
+                                          dict(ylabel="Jitter (std dev, ms)", figsize=(12, 6), rotation=75, fontsize=7)))
 
         # Główne wykresy
         plot_set(pcap_df, lat_df, outdir)
@@ -233,6 +283,7 @@ def main():
                     l_sub = l_sub[l_sub["scenario"].str.contains(mode, case=False, na=False)]
                 plot_set(p_sub, l_sub, outdir / f"mode_{mode}")
 
+    render()
     print(f"Saved plots to: {outdir}")
 
 if __name__ == "__main__":
@@ -13,15 +13,25 @@ F7: Dumbbell throughput (KB/s) dla N=100 — OPEN vs AUTH per protokół
 
 Uruchom:
   python plot_metrics_scientific.py --lat latency_metrics.csv --pcap pcap_metrics.csv --outdir results/plots
+  python plot_metrics_scientific.py --catalog results/catalog.sqlite --series series_x --outdir results/plots
+  python plot_metrics_scientific.py ... --jobs 4     # wykresy równolegle; niezmienione są pomijane
+
+Z --catalog (results_catalog.py) proto/mode/N/rep pochodzą z manifestów przebiegów,
+a RTT/jitter z agregatów per przebieg (wszystkie próbki przebiegu, nie średnia po
+klientach); F4/F7 wymagają indeksu z --pcap.
 """
 import argparse
+import os
 import re
+import sys
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from figure_jobs import CACHE_NAME, FigureJob, render_figures
+
 # ---- jeśli masz inne nazwy scenariuszy, edytuj regexy ----
 RE_MODE = re.compile(r"\b(open|auth)\b", re.I)
 RE_PROTO = re.compile(r"\b(http|mqtt|coap)\b", re.I)
@@ -50,22 +60,24 @@ def parse_meta(s: str):
     rep = int(m_rep.group(1)) if m_rep else None
     return mode, proto, N, rep
 
+RC_STYLE = {
+    "figure.dpi": 120,
+    "axes.grid": True,
+    "grid.linestyle": "--",
+    "grid.linewidth": 0.6,
+    "grid.alpha": 0.35,
+    "axes.spines.top": False,
+    "axes.spines.right": False,
+    "axes.titleweight": "semibold",
+    "axes.labelsize": 10,
+    "axes.titlesize": 12,
+    "legend.frameon": True,
+    "legend.framealpha": 0.9,
+    "legend.fontsize": 9,
+}
+
 def set_rcparams():
-    plt.rcParams.update({
-        "figure.dpi": 120,
-        "axes.grid": True,
-        "grid.linestyle": "--",
-        "grid.linewidth": 0.6,
-        "grid.alpha": 0.35,
-        "axes.spines.top": False,
-        "axes.spines.right": False,
-        "axes.titleweight": "semibold",
-        "axes.labelsize": 10,
-        "axes.titlesize": 12,
-        "legend.frameon": True,
-        "legend.framealpha": 0.9,
-        "legend.fontsize": 9,
-    })
+    plt.rcParams.update(RC_STYLE)
 
 def savefig(path: Path):
     plt.tight_layout()
@@ -130,6 +142,28 @@ def prep_pcap_rep(pcap_csv: Path) -> pd.DataFrame:
     return (df.groupby(["mode","proto","N","rep"], as_index=False)
               .agg(bytes_per_sec=("bytes_per_sec","mean")))
 
+def prep_catalog_rep(db: Path, series=None, since=None):
+    from results_catalog import load_catalog
+    runs = pd.DataFrame(load_catalog(db, series=series, since=since))
+    if runs.empty:
+        raise SystemExit(f"Brak przebiegów w katalogu {db} dla podanych filtrów.")
+    runs = runs.dropna(subset=["mode", "proto", "N"])
+    runs["N"] = runs["N"].astype(int)
+    runs["rep"] = runs["rep"].fillna(1).astype(int)
+    keys = ["mode", "proto", "N", "rep"]
+    lat = runs.dropna(subset=["rtt_median_ms"]).rename(
+        columns={"rtt_median_ms": "median_latency_ms", "rtt_p95_ms": "p95_latency_ms"})
+    lat = lat[lat["samples"] > 0]
+    rep_lat = (lat.groupby(keys, as_index=False)
+                  .agg(median_latency_ms=("median_latency_ms", "mean"),
+                       p95_latency_ms=("p95_latency_ms", "mean"),
+                       jitter_std_ms=("jitter_std_ms", "mean")))
+    pc = runs.dropna(subset=["bytes_per_sec_proto"]).rename(columns={"bytes_per_sec_proto": "bytes_per_sec"})
+    rep_pcap = pc.groupby(keys, as_index=False).agg(bytes_per_sec=("bytes_per_sec", "mean"))
+    if rep_lat.empty:
+        raise SystemExit(f"Katalog {db} nie ma agregatów RTT dla podanych filtrów.")
+    return rep_lat, rep_pcap
+
 def summarize(rep_df: pd.DataFrame, metric: str) -> pd.DataFrame:
     return (rep_df.groupby(["mode","proto","N"], as_index=False)
                   .agg(mean=(metric,"mean"), sd=(metric,"std"), reps=("rep","nunique")))
@@ -252,8 +286,9 @@ def dumbbell_open_auth(summary_df: pd.DataFrame, ylabel: str, title: str, out: P
     piv = ensure_order(piv)
     protos = [p for p in PROTO_ORDER if p in piv["proto"].unique().tolist()]
     y = np.arange(len(protos))
-    open_v = piv.set_index("proto").loc[protos, "open"].astype(float).values
-    auth_v = piv.set_index("proto").loc[protos, "auth"].astype(float).values
+    # to_numpy(copy=True): .values bywa widokiem tylko do odczytu, a niżej dzielimy w miejscu
+    open_v = piv.set_index("proto").loc[protos, "open"].to_numpy(dtype=float, copy=True)
+    auth_v = piv.set_index("proto").loc[protos, "auth"].to_numpy(dtype=float, copy=True)
     if scale_kb:
         open_v /= 1024.0
         auth_v /= 1024.0
@@ -271,17 +306,30 @@ def dumbbell_open_auth(summary_df: pd.DataFrame, ylabel: str, title: str, out: P
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--lat", required=True)
-    ap.add_argument("--pcap", required=True)
+    ap.add_argument("--lat")
+    ap.add_argument("--pcap")
+    ap.add_argument("--catalog", help="SQLite catalog from results_catalog.py (instead of --lat/--pcap).")
+    ap.add_argument("--series", nargs="+", help="With --catalog: only these series.")
+    ap.add_argument("--since", help="With --catalog: only runs started since (7d, 2024-06-01, ...).")
     ap.add_argument("--outdir", default="results/plots")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel render processes (0 = all CPUs).")
+    ap.add_argument("--no-cache", action="store_true", help="Re-render every figure.")
+    ap.add_argument("--quiet", action="store_true", help="No progress output.")
     args = ap.parse_args()
+    if not args.catalog and not (args.lat and args.pcap):
+        ap.error("--lat and --pcap are required (unless --catalog is given)")
 
     set_rcparams()
     outdir = Path(args.outdir)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    rep_lat = prep_latency_rep(Path(args.lat))
-    rep_pcap = prep_pcap_rep(Path(args.pcap))
+    if args.catalog:
+        from results_catalog import parse_since
+        rep_lat, rep_pcap = prep_catalog_rep(Path(args.catalog), args.series,
+                                             parse_since(args.since) if args.since else None)
+    else:
+        rep_lat = prep_latency_rep(Path(args.lat))
+        rep_pcap = prep_pcap_rep(Path(args.pcap))
 
     lat_med_sum = ensure_order(summarize(rep_lat, "median_latency_ms"))
     lat_p95_sum = ensure_order(summarize(rep_lat, "p95_latency_ms"))
@@ -293,48 +341,45 @@ def main():
     jit_sum.to_csv(outdir / "summary_jitter_std.csv", index=False)
     bytes_sum.to_csv(outdir / "summary_bytes_per_sec.csv", index=False)
 
-    facet_lines_with_band(lat_med_sum,
-        ylabel="RTT median [ms] (mean±SD z 3 rep)",
-        title="F1: RTT (median) vs N — OPEN vs AUTH",
-        out=outdir / "F1_rtt_median_vs_N.png",
-        style_map={"open": "-", "auth": "--"}
-    )
-
-    facet_lines_with_band(lat_p95_sum,
-        ylabel="RTT p95 [ms] (mean±SD z 3 rep)",
-        title="F2: RTT (p95) vs N — ogon opóźnień (inne style)",
-        out=outdir / "F2_rtt_p95_vs_N.png",
-        style_map={"open": ":", "auth": "-."}
-    )
-
-    facet_lines_with_rep_points(rep_lat, jit_sum, "jitter_std_ms",
-        ylabel="Jitter STD [ms] (kropki=replikacje; linia=mean±SD)",
-        title="F3: Jitter vs N — OPEN vs AUTH",
-        out=outdir / "F3_jitter_vs_N_points.png"
-    )
-
-    facet_area_bytes(bytes_sum, outdir / "F4_bytes_vs_N_area.png")
-
-    delta_bars(lat_med_sum,
-        ylabel="Δ RTT median [ms] (AUTH − OPEN)",
-        title="F5: Narzut AUTH na RTT (Δ) vs N",
-        out=outdir / "F5_delta_rtt_median.png"
-    )
-
-    dumbbell_open_auth(lat_med_sum,
-        ylabel="RTT median [ms]",
-        title="F6: OPEN vs AUTH przy N=100 (RTT) — dumbbell",
-        out=outdir / "F6_dumbbell_rtt_N100.png",
-        N_focus=100, scale_kb=False
-    )
-
-    dumbbell_open_auth(bytes_sum,
-        ylabel="KB/s",
-        title="F7: OPEN vs AUTH przy N=100 (Throughput) — dumbbell",
-        out=outdir / "F7_dumbbell_bytes_N100.png",
-        N_focus=100, scale_kb=True
-    )
-
+    figs = [
+        FigureJob(outdir / "F1_rtt_median_vs_N.png", facet_lines_with_band, (lat_med_sum,), dict(
+            ylabel="RTT median [ms] (mean±SD z 3 rep)",
+            title="F1: RTT (median) vs N — OPEN vs AUTH",
+            style_map={"open": "-", "auth": "--"}), RC_STYLE),
+        FigureJob(outdir / "F2_rtt_p95_vs_N.png", facet_lines_with_band, (lat_p95_sum,), dict(
+            ylabel="RTT p95 [ms] (mean±SD z 3 rep)",
+            title="F2: RTT (p95) vs N — ogon opóźnień (inne style)",
+            style_map={"open": ":", "auth": "-."}), RC_STYLE),
+        FigureJob(outdir / "F3_jitter_vs_N_points.png", facet_lines_with_rep_points,
+                  (rep_lat, jit_sum, "jitter_std_ms"), dict(
+            ylabel="Jitter STD [ms] (kropki=replikacje; linia=mean±SD)",
+            title="F3: Jitter vs N — OPEN vs AUTH"), RC_STYLE),
+        FigureJob(outdir / "F5_delta_rtt_median.png", delta_bars, (lat_med_sum,), dict(
+            ylabel="Δ RTT median [ms] (AUTH − OPEN)",
+            title="F5: Narzut AUTH na RTT (Δ) vs N"), RC_STYLE),
+        FigureJob(outdir / "F6_dumbbell_rtt_N100.png", dumbbell_open_auth, (lat_med_sum,), dict(
+            ylabel="RTT median [ms]",
+            title="F6: OPEN vs AUTH przy N=100 (RTT) — dumbbell",
+            N_focus=100, scale_kb=False), RC_STYLE),
+    ]
+    if not bytes_sum.empty:
+        figs += [
+            FigureJob(outdir / "F4_bytes_vs_N_area.png", facet_area_bytes, (bytes_sum,), {}, RC_STYLE),
+            FigureJob(outdir / "F7_dumbbell_bytes_N100.png", dumbbell_open_auth, (bytes_sum,), dict(
+                ylabel="KB/s",
+                title="F7: OPEN vs AUTH przy N=100 (Throughput) — dumbbell",
+                N_focus=100, scale_kb=True), RC_STYLE),
+        ]
+    else:
+        print("[WARN] brak bytes_per_sec (katalog bez --pcap?) -> pomijam F4/F7")
+
+    # każdy wykres to osobne zadanie; niezmienione dane/styl -> plik zostaje
+    rendered, skipped, failed = render_figures(figs, outdir / CACHE_NAME, jobs=args.jobs or os.cpu_count() or 1,
+                                               use_cache=not args.no_cache, progress=not args.quiet)
+    print(f"[INFO] wykresy: {rendered} wyrenderowane, {skipped} bez zmian (cache), {failed} błędów")
+    if failed:
+        print(f"[ERROR] {failed} wykres(ów) nie powstało, zobacz WARN powyżej", file=sys.stderr)
+        sys.exit(1)
     print("[OK] Zapisano:", outdir.resolve())
 
 if __name__ == "__main__":
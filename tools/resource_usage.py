@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Zużycie zasobów per komponent i dopasowanie do opóźnień (resources_*.csv z scripts/resource_sampler.py).
+
+Dla każdego katalogu z resources_*.csv (przebieg) bierze liczniki narastające
+per cel (kontener / proces), liczy delty między próbkami (spadek licznika =
+restart kontenera -> delta = nowa wartość) i sumuje po komponentach
+(clients, broker, server, proxy, other; host i sampler jako odniesienie):
+
+- cpu_s, cpu_ms_per_msg         - CPU-sekundy, na dostarczoną wiadomość,
+- net_bytes, bytes_per_msg      - rx + tx z netns kontenera,
+- io_bytes, mem_peak_mb, mem_mean_mb (suma celów komponentu w jednym ticku),
+
+gdzie "dostarczona wiadomość" = wiersz klienta z rtt (metrics_*_id*.csv pod
+tym samym katalogiem). Okno: traffic_start..traffic_stop z run_manifest.json
+(--window traffic, domyślnie gdy jest manifest) albo cały plik.
+
+Dopasowanie w czasie: delty CPU trafiają do binów --bin s (wg czasu próbki),
+RTT klientów wg ts (p99 i liczba na bin). Raport podaje korelację Spearmana
+CPU komponentu z p99 oraz --top binów z najwyższym p99 razem z CPU komponentów
+w tych binach; --timeseries-out zapisuje całą serię (jak timeseries.py: .csv/.parquet).
+
+Uruchom:
+  python resource_usage.py --root ../results/series_x --out resource_usage.csv \\
+      [--timeseries-out resource_ts.csv] [--bin 1] [--top 5]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from functools import partial
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from job_pool import run_ordered
+from timeseries import client_csvs, write_table
+
+COUNTERS = ["cpu_usec", "throttled_usec", "io_rbytes", "io_wbytes",
+            "net_rx_bytes", "net_tx_bytes", "net_rx_packets", "net_tx_packets"]
+COMPONENT_ORDER = ["clients", "broker", "server", "proxy", "other", "host", "sampler"]
+
+
+def counter_deltas(df: pd.DataFrame) -> pd.DataFrame:
+    """Delty liczników per cel (pierwsza próbka celu = 0, reset licznika -> nowa wartość)."""
+    df = df.sort_values(["name", "ts"], kind="stable").reset_index(drop=True)
+    out = df[["ts", "name", "component"]].copy()
+    first = df["name"].ne(df["name"].shift())
+    for c in COUNTERS:
+        if c not in df.columns:
+            out[c] = 0.0
+            continue
+        v = pd.to_numeric(df[c], errors="coerce")
+        d = v.diff()
+        d = d.where(d >= 0, v)          # reset -> cała nowa wartość
+        d[first] = 0.0
+        out[c] = d.fillna(0.0)
+    out["mem_bytes"] = pd.to_numeric(df.get("mem_bytes"), errors="coerce") if "mem_bytes" in df.columns else np.nan
+    return out
+
+
+def read_window(run_dir: Path, mode: str) -> Tuple[Optional[float], Optional[float]]:
+    if mode == "all":
+        return None, None
+    p = run_dir / "run_manifest.json"
+    if not p.exists():
+        return None, None
+    try:
+        t = json.loads(p.read_text(encoding="utf-8")).get("timings") or {}
+    except ValueError:
+        return None, None
+    return t.get("traffic_start"), t.get("traffic_stop")
+
+
+def read_client_rows(run_dir: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """(ts, rtt_ms) wszystkich klientów przebiegu; rtt NaN = błąd."""
+    ts_parts, rtt_parts = [], []
+    for f in client_csvs(run_dir):
+        try:
+            df = pd.read_csv(f, usecols=["ts", "rtt"], dtype={"ts": "float64", "rtt": "float64"})
+        except (ValueError, pd.errors.EmptyDataError) as e:
+            print(f"WARN: {f}: {e}", file=sys.stderr)
+            continue
+        ts_parts.append(df["ts"].to_numpy())
+        rtt_parts.append(df["rtt"].to_numpy() * 1000.0)
+    if not ts_parts:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(ts_parts), np.concatenate(rtt_parts)
+
+
+def _in_window(ts: pd.Series, lo: Optional[float], hi: Optional[float]) -> pd.Series:
+    m = pd.Series(True, index=ts.index)
+    if lo is not None:
+        m &= ts > lo
+    if hi is not None:
+        m &= ts <= hi
+    return m
+
+
+def analyse_run(res_csv: Path, window: str = "traffic", bin_s: float = 1.0, top: int = 5) -> Dict[str, object]:
+    """Pool worker: jeden resources_*.csv -> {"summary": [...], "ts": DataFrame, "spikes": [...], "error": ...}"""
+    run_dir = res_csv.parent
+    try:
+        raw = pd.read_csv(res_csv)
+    except (OSError, ValueError, pd.errors.EmptyDataError) as e:
+        return {"run": str(run_dir), "error": f"{type(e).__name__}: {e}"}
+    if raw.empty:
+        return {"run": str(run_dir), "error": "no samples"}
+    lo, hi = read_window(run_dir, window)
+    d = counter_deltas(raw)
+    d = d[_in_window(d["ts"], lo, hi)]
+
+    ts, rtt = read_client_rows(run_dir)
+    keep = np.ones(ts.size, dtype=bool)
+    if lo is not None:
+        keep &= ts > lo
+    if hi is not None:
+        keep &= ts <= hi
+    ts, rtt = ts[keep], rtt[keep]
+    delivered = int(np.count_nonzero(~np.isnan(rtt)))
+
+    summary = []
+    mem = d.groupby(["component", "ts"])["mem_bytes"].sum(min_count=1)
+    for comp, sub in d.groupby("component"):
+        cpu_s = sub["cpu_usec"].sum() / 1e6
+        net = sub["net_rx_bytes"].sum() + sub["net_tx_bytes"].sum()
+        m = mem.get(comp)
+        summary.append({
+            "run": str(run_dir), "component": comp, "targets": sub["name"].nunique(),
+            "delivered": delivered, "cpu_s": round(cpu_s, 6),
+            "cpu_ms_per_msg": round(1000.0 * cpu_s / delivered, 6) if delivered else None,
+            "throttled_s": round(sub["throttled_usec"].sum() / 1e6, 6),
+            "net_bytes": int(net), "bytes_per_msg": round(net / delivered, 3) if delivered else None,
+            "net_packets": int(sub["net_rx_packets"].sum() + sub["net_tx_packets"].sum()),
+            "io_bytes": int(sub["io_rbytes"].sum() + sub["io_wbytes"].sum()),
+            "mem_peak_mb": round(float(m.max()) / 2**20, 3) if m is not None and m.notna().any() else None,
+            "mem_mean_mb": round(float(m.mean()) / 2**20, 3) if m is not None and m.notna().any() else None,
+        })
+    summary.sort(key=lambda r: COMPONENT_ORDER.index(r["component"]) if r["component"] in COMPONENT_ORDER else 99)
+
+    # seria w binach: rdzenie CPU per komponent + p99/liczba odpowiedzi
+    d = d.assign(bin=np.floor(d["ts"] / bin_s).astype(np.int64))
+    cpu = d.pivot_table(index="bin", columns="component", values="cpu_usec", aggfunc="sum", fill_value=0.0)
+    cpu = cpu / (1e6 * bin_s)
+    cpu.columns = [f"cpu_{c}" for c in cpu.columns]
+    series = cpu
+    if ts.size:
+        lat = pd.DataFrame({"bin": np.floor(ts / bin_s).astype(np.int64), "rtt_ms": rtt})
+        g = lat.groupby("bin")["rtt_ms"]
+        lat_b = pd.DataFrame({"responses": g.count(), "errors": g.size() - g.count(),
+                              "p50_ms": g.quantile(0.5), "p99_ms": g.quantile(0.99)})
+        series = cpu.join(lat_b, how="outer")
+    series = series.sort_index()
+    t0 = lo if lo is not None else series.index.min() * bin_s
+    series.insert(0, "t_rel_s", np.round(series.index * bin_s - t0, 3))
+    series.insert(0, "ts_bin", series.index * bin_s)
+    series.insert(0, "run", str(run_dir))
+
+    corr, spikes = {}, []
+    if "p99_ms" in series.columns:
+        both = series.dropna(subset=["p99_ms"])
+        for c in [c for c in series.columns if c.startswith("cpu_")]:
+            if both[c].nunique() > 1 and both["p99_ms"].nunique() > 1:
+                corr[c[4:]] = round(float(both[c].rank().corr(both["p99_ms"].rank())), 3)
+        cpu_cols = [c for c in series.columns if c.startswith("cpu_")]
+        med = both[cpu_cols].median()
+        for b, row in both.nlargest(top, "p99_ms").iterrows():
+            spikes.append({"t_rel_s": float(row["t_rel_s"]), "p99_ms": float(row["p99_ms"]),
+                           "cpu": {c[4:]: (float(row[c]), float(med[c])) for c in cpu_cols if not math.isnan(row[c])}})
+    return {"run": str(run_dir), "summary": summary, "ts": series.reset_index(drop=True),
+            "corr": corr, "spikes": spikes, "error": None}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Per-component CPU/bytes per delivered message and resource/latency alignment.")
+    ap.add_argument("--root", required=True, help="Results root (searched recursively for resources_*.csv).")
+    ap.add_argument("--out", required=True, help="Summary CSV (run x component).")
+    ap.add_argument("--timeseries-out", help="Binned CPU per component + p50/p99 (.csv/.parquet/.feather).")
+    ap.add_argument("--bin", type=float, default=1.0, help="Bin width in seconds for the alignment.")
+    ap.add_argument("--window", choices=["traffic", "all"], default="traffic",
+                    help="traffic = traffic_start..traffic_stop from run_manifest.json (if present).")
+    ap.add_argument("--top", type=int, default=5, help="Latency spike bins to report per run.")
+    ap.add_argument("--jobs", type=int, default=1)
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args()
+
+    root = Path(os.path.expanduser(args.root)).resolve()
+    files = sorted(root.rglob("resources_*.csv"))
+    if not files:
+        print(f"ERROR: no resources_*.csv under {root}", file=sys.stderr)
+        sys.exit(1)
+
+    results = run_ordered(partial(analyse_run, window=args.window, bin_s=args.bin, top=args.top), files,
+                          jobs=args.jobs, label="res ", progress=not args.quiet)
+    rows, series = [], []
+    for r in results:
+        if r.get("error"):
+            print(f"WARN: {r['run']}: {r['error']}", file=sys.stderr)
+            continue
+        rows += r["summary"]
+        series.append(r["ts"])
+        if args.quiet:
+            continue
+        print(f"\n{r['run']}")
+        for s in r["summary"]:
+            per_msg = "" if s["cpu_ms_per_msg"] is None else \
+                f"  {s['cpu_ms_per_msg']:.3f} ms CPU/msg  {s['bytes_per_msg']:.0f} B/msg"
+            print(f"  {s['component']:<8} cpu={s['cpu_s']:.2f}s  net={s['net_bytes'] / 1e6:.2f}MB"
+                  f"  mem_peak={s['mem_peak_mb'] if s['mem_peak_mb'] is not None else '-'}MB{per_msg}")
+        if r["corr"]:
+            print("  spearman(cpu, p99): " + "  ".join(f"{k}={v:+.2f}" for k, v in r["corr"].items()))
+        for sp in r["spikes"]:
+            cpus = "  ".join(f"{k}={v:.2f}({m:.2f})" for k, (v, m) in sp["cpu"].items())
+            print(f"  spike t={sp['t_rel_s']:.0f}s p99={sp['p99_ms']:.1f}ms  cpu cores (median): {cpus}")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows).to_csv(out, index=False)
+    print(f"\nWrote {out}")
+    if args.timeseries_out and series:
+        write_table(pd.concat(series, ignore_index=True), Path(args.timeseries_out))
+        print(f"Wrote {args.timeseries_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of experiment runs: run_manifest.json + per-run aggregates.
+
+Zamiast zgadywać proto/mode/N/rep regexami z nazw katalogów, `index` zbiera
+manifesty pisane przez run_experiments.sh / run_local.py / run_series.sh
+(scripts/run_manifest.py) i liczy dla każdego przebiegu agregaty:
+
+- z metrics_*_id*.csv klientów (albo z *_rtt.log, jeśli CSV brak): liczba
+  próbek i błędów, RTT mean/median/p95/p99 i STD (ms, nearest-rank jak
+  percentile() w latency_summary.py, po tym samym filtrze --outlier-mult per
+  plik klienta, więc zgodne z plot_metris_scientific.py --lat; mnożnik i liczba
+  odrzuconych próbek w kolumnach outlier_mult / outliers), requests/s w oknie
+  [min ts, max ts] ze wszystkich próbek,
+- opcjonalnie (--pcap) z pcap: frames/bytes/bytes_per_sec na porcie protokołu
+  (pcap_metrics.compute_metrics_for_pcap, ten sam silnik native/tshark).
+
+Indeks jest przyrostowy: sygnatura (mtime/rozmiar manifestu, CSV, logów, pcap)
+per przebieg; niezmienione przebiegi są pomijane, usunięte znikają z bazy.
+Baza to cache pochodny - przy zmianie schematu jest przebudowywana.
+
+Stare wyniki bez manifestu: --legacy katalogi w układzie run_series.sh
+(<series>/<proto>/<mode>/N<n>/rep<r>) dostają wpis ze status=legacy.
+
+Uruchom:
+  python results_catalog.py index --root results --db results/catalog.sqlite [--pcap] [--jobs 4]
+  python results_catalog.py query --db results/catalog.sqlite --mode auth --proto coap --min-n 100 --since 7d
+  python results_catalog.py query --db results/catalog.sqlite --format csv --out runs.csv
+  python results_catalog.py query --db results/catalog.sqlite --sql "select proto, avg(rtt_p95_ms) from runs_full group by proto"
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from coordinated_omission import read_ts_rtt
+from job_pool import run_ordered
+from latency_summary import median
+from timeseries import client_csvs
+
+MANIFEST_NAME = "run_manifest.json"  # == scripts/run_manifest.py
+SCHEMA_VERSION = 2
+DEFAULT_OUTLIER_MULT = 10.0  # == latency_summary.py --outlier-mult
+DEFAULT_DB = "results/catalog.sqlite"
+PCAP_EXTS = (".pcap", ".pcapng")
+
+RE_LAYOUT = re.compile(
+    r"(?:^|/)(?P<series>[^/]+)/(?P<proto>http|mqtt|coap)/(?P<mode>open|auth)/N(?P<n>\d+)/rep(?P<rep>\d+)$",
+    re.I)
+
+SCHEMA = """
+CREATE TABLE runs (
+    dir TEXT PRIMARY KEY,
+    series TEXT, run_id TEXT, proto TEXT, mode TEXT, N INTEGER, rep INTEGER,
+    freq_s REAL, duration_s REAL, payload TEXT, harness TEXT, status TEXT,
+    started_at REAL, traffic_start REAL, traffic_stop REAL, finished_at REAL,
+    git_commit TEXT, manifest_json TEXT, signature TEXT, indexed_at REAL
+);
+CREATE INDEX runs_cell ON runs (proto, mode, N);
+CREATE INDEX runs_started ON runs (started_at);
+CREATE INDEX runs_series ON runs (series);
+CREATE TABLE aggregates (
+    dir TEXT PRIMARY KEY REFERENCES runs (dir) ON DELETE CASCADE,
+    source TEXT, clients INTEGER, samples INTEGER, errors INTEGER,
+    rtt_mean_ms REAL, rtt_median_ms REAL, rtt_p95_ms REAL, rtt_p99_ms REAL,
+    jitter_std_ms REAL, req_per_s REAL, outlier_mult REAL, outliers INTEGER,
+    pcap_frames INTEGER, pcap_bytes INTEGER, bytes_per_sec_proto REAL, pcap_error TEXT
+);
+CREATE VIEW runs_full AS SELECT r.*, a.source, a.clients, a.samples, a.errors,
+    a.rtt_mean_ms, a.rtt_median_ms, a.rtt_p95_ms, a.rtt_p99_ms, a.jitter_std_ms, a.req_per_s,
+    a.outlier_mult, a.outliers, a.pcap_frames, a.pcap_bytes, a.bytes_per_sec_proto, a.pcap_error
+    FROM runs r LEFT JOIN aggregates a ON a.dir = r.dir;
+"""
+
+RUN_COLUMNS = ["series", "run_id", "proto", "mode", "N", "rep", "freq_s", "duration_s", "payload",
+               "harness", "status", "started_at", "traffic_start", "traffic_stop", "finished_at",
+               "git_commit"]
+AGG_COLUMNS = ["source", "clients", "samples", "errors", "rtt_mean_ms", "rtt_median_ms", "rtt_p95_ms",
+               "rtt_p99_ms", "jitter_std_ms", "req_per_s", "outlier_mult", "outliers", "pcap_frames", "pcap_bytes",
+               "bytes_per_sec_proto", "pcap_error"]
+QUERY_COLUMNS = ["series", "run_id", "proto", "mode", "N", "rep", "freq_s", "duration_s", "status",
+                 "started", "samples", "errors", "rtt_median_ms", "rtt_p95_ms", "rtt_p99_ms",
+                 "jitter_std_ms", "req_per_s", "bytes_per_sec_proto", "dir"]
+
+
+# --- baza ---
+
+def connect(db: Path) -> sqlite3.Connection:
+    db.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(str(db))
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA foreign_keys = ON")
+    if con.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        con.executescript("DROP VIEW IF EXISTS runs_full; DROP TABLE IF EXISTS aggregates; "
+                          "DROP TABLE IF EXISTS runs;")
+        con.executescript(SCHEMA)
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        con.commit()
+    return con
+
+
+# --- odkrywanie przebiegów ---
+
+def _legacy_manifest(run_dir: Path, root: Path) -> Optional[Dict[str, object]]:
+    rel = run_dir.relative_to(root).as_posix() if run_dir != root else run_dir.name
+    m = RE_LAYOUT.search(rel)
+    if not m:
+        return None
+    return {
+        "run_id": f"{m['mode'].lower()}_{m['proto'].lower()}_N{m['n']}_rep{m['rep']}",
+        "series": m["series"], "proto": m["proto"].lower(), "mode": m["mode"].lower(),
+        "N": int(m["n"]), "rep": int(m["rep"]), "harness": "legacy", "status": "legacy",
+        "timings": {}, "versions": {},
+    }
+
+
+def find_runs(root: Path, legacy: bool = False) -> List[Tuple[Path, Dict[str, object]]]:
+    runs: Dict[Path, Dict[str, object]] = {}
+    for mf in sorted(root.rglob(MANIFEST_NAME)):
+        try:
+            runs[mf.parent] = json.loads(mf.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"WARN: {mf}: {e}", file=sys.stderr)
+    if legacy:
+        for d in sorted(p for p in root.rglob("rep*") if p.is_dir()):
+            if d not in runs:
+                man = _legacy_manifest(d, root)
+                if man is not None:
+                    runs[d] = man
+    return sorted(runs.items())
+
+
+def _run_files(run_dir: Path) -> Tuple[List[Path], List[Path], List[Path]]:
+    csvs = client_csvs(run_dir)
+    logs = sorted(run_dir.glob("*_rtt.log"))
+    pcaps = sorted(p for p in run_dir.iterdir() if p.is_file() and p.suffix.lower() in PCAP_EXTS)
+    return csvs, logs, pcaps
+
+
+def signature(run_dir: Path) -> str:
+    parts = []
+    mf = run_dir / MANIFEST_NAME
+    for p in [mf] + [f for group in _run_files(run_dir) for f in group]:
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        parts.append(f"{p.name}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+# --- agregaty ---
+
+def _nearest_rank(sorted_vals: np.ndarray, p: float) -> Optional[float]:
+    if not sorted_vals.size:
+        return None
+    return float(sorted_vals[int(round((sorted_vals.size - 1) * p))])
+
+
+def _r(v: Optional[float]) -> Optional[float]:
+    return round(v, 6) if v is not None and not math.isnan(v) else None
+
+
+def drop_outliers_ms(vals_ms: np.ndarray, outlier_mult: float) -> np.ndarray:
+    """Próbki jednego pliku bez > mult * mediana - ten sam filtr co latency_summary.drop_outliers."""
+    if not vals_ms.size or outlier_mult <= 0:
+        return vals_ms
+    med = median(vals_ms)
+    return vals_ms[vals_ms <= outlier_mult * med] if med > 0 else vals_ms
+
+
+def latency_aggregates(run_dir: Path, outlier_mult: float = DEFAULT_OUTLIER_MULT) -> Dict[str, object]:
+    csvs, logs, _ = _run_files(run_dir)
+    errors = 0
+    samples = 0
+    span = None
+    vals = []
+    if csvs:
+        t_lo, t_hi = math.inf, -math.inf
+        for f in csvs:
+            ts, rtt = read_ts_rtt(f)
+            if ts.size:
+                t_lo, t_hi = min(t_lo, float(ts.min())), max(t_hi, float(ts.max()))
+            errors += int(np.isnan(rtt).sum())
+            ms = rtt[~np.isnan(rtt)] * 1000.0
+            samples += ms.size
+            vals.append(drop_outliers_ms(ms, outlier_mult))
+        source, clients = "csv", len(csvs)
+        if t_hi > t_lo:
+            span = t_hi - t_lo
+    elif logs:
+        from latency_metrics import parse_latency_from_text
+        for f in logs:
+            lat_l, _, err, _ = parse_latency_from_text(f)
+            ms = np.asarray(lat_l, dtype=np.float64)
+            samples += ms.size
+            # log zbiera wszystkich klientów przebiegu, więc filtr liczony na całym pliku
+            vals.append(drop_outliers_ms(ms, outlier_mult))
+            errors += err
+        source, clients = "log", None
+    else:
+        return {"source": None}
+    lat = np.concatenate(vals) if vals else np.empty(0)
+    lat.sort()
+    return {
+        "source": source, "clients": clients, "samples": samples, "errors": errors,
+        "outlier_mult": outlier_mult, "outliers": samples - int(lat.size),
+        "rtt_mean_ms": _r(float(lat.mean())) if lat.size else None,
+        "rtt_median_ms": _r(_nearest_rank(lat, 0.5)),
+        "rtt_p95_ms": _r(_nearest_rank(lat, 0.95)),
+        "rtt_p99_ms": _r(_nearest_rank(lat, 0.99)),
+        "jitter_std_ms": _r(float(lat.std())) if lat.size >= 2 else (0.0 if lat.size else None),
+        "req_per_s": _r(samples / span) if span else None,
+    }
+
+
+def pcap_aggregates(run_dir: Path, proto: Optional[str], engine: str) -> Dict[str, object]:
+    from pcap_metrics import compute_metrics_for_pcap
+    _, _, pcaps = _run_files(run_dir)
+    if not pcaps:
+        return {"pcap_error": "no pcap"}
+    # przy kilku pcap wybierz ten z protokołem przebiegu w nazwie
+    pcap = next((p for p in pcaps if proto and proto in p.name.lower()), pcaps[0])
+    try:
+        m = compute_metrics_for_pcap(pcap, engine)
+    except Exception as e:
+        return {"pcap_error": str(e)[:200]}
+    return {"pcap_frames": m["frames_proto"], "pcap_bytes": m["bytes_proto"],
+            "bytes_per_sec_proto": m["bytes_per_sec_proto"], "pcap_error": None}
+
+
+def aggregate_job(job: Tuple[Path, Optional[str], bool, str, float]) -> Dict[str, object]:
+    """One pool job: aggregates of one run directory."""
+    run_dir, proto, with_pcap, engine, outlier_mult = job
+    try:
+        row = latency_aggregates(run_dir, outlier_mult)
+    except Exception as e:
+        print(f"WARN: {run_dir}: {e}", file=sys.stderr)
+        row = {"source": None}
+    if with_pcap:
+        row.update(pcap_aggregates(run_dir, proto, engine))
+    return row
+
+
+# --- indeksowanie ---
+
+def run_record(run_dir: Path, man: Dict[str, object]) -> Dict[str, object]:
+    timings = man.get("timings") or {}
+    versions = man.get("versions") or {}
+    started = timings.get("started") or man.get("written_at")
+    return {
+        "series": man.get("series"), "run_id": man.get("run_id"), "proto": man.get("proto"),
+        "mode": man.get("mode"), "N": man.get("N"), "rep": man.get("rep"),
+        "freq_s": man.get("freq_s"), "duration_s": man.get("duration_s"), "payload": man.get("payload"),
+        "harness": man.get("harness"), "status": man.get("status"),
+        "started_at": started, "traffic_start": timings.get("traffic_start"),
+        "traffic_stop": timings.get("traffic_stop"), "finished_at": timings.get("finished"),
+        "git_commit": versions.get("git_commit"),
+    }
+
+
+def index(con: sqlite3.Connection, root: Path, legacy: bool = False, with_pcap: bool = False,
+          engine: str = "auto", jobs: int = 1, force: bool = False, prune: bool = True,
+          progress: bool = True, outlier_mult: float = DEFAULT_OUTLIER_MULT) -> Dict[str, int]:
+    runs = find_runs(root, legacy)
+    known = {r["dir"]: (r["signature"], r["pcap_state"], r["outlier_mult"]) for r in con.execute(
+        "SELECT r.dir, r.signature, a.outlier_mult, "
+        "(a.pcap_bytes IS NOT NULL OR a.pcap_error IS NOT NULL) AS pcap_state "
+        "FROM runs r LEFT JOIN aggregates a ON a.dir = r.dir")}
+    todo: List[Tuple[Path, Dict[str, object], str]] = []
+    for run_dir, man in runs:
+        sig = signature(run_dir)
+        prev = known.get(str(run_dir))
+        if (not force and prev is not None and prev[0] == sig and (prev[1] or not with_pcap)
+                and prev[2] == outlier_mult):
+            continue
+        todo.append((run_dir, man, sig))
+
+    stats = {"runs": len(runs), "indexed": len(todo), "skipped": len(runs) - len(todo), "pruned": 0}
+    if todo:
+        aggs = run_ordered(aggregate_job,
+                           [(d, m.get("proto"), with_pcap, engine, outlier_mult) for d, m, _ in todo],
+                           jobs=jobs, label="catalog ", progress=progress)
+        now = time.time()
+        for (run_dir, man, sig), agg in zip(todo, aggs):
+            if not with_pcap and str(run_dir) in known:
+                # zachowaj wcześniej policzone kolumny pcap, jeśli tym razem ich nie liczymy
+                old = con.execute("SELECT pcap_frames, pcap_bytes, bytes_per_sec_proto, pcap_error "
+                                  "FROM aggregates WHERE dir = ?", (str(run_dir),)).fetchone()
+                if old is not None:
+                    agg = {**dict(old), **agg}
+            rec = run_record(run_dir, man)
+            cols = ["dir"] + RUN_COLUMNS + ["manifest_json", "signature", "indexed_at"]
+            vals = [str(run_dir)] + [rec[c] for c in RUN_COLUMNS] + [json.dumps(man, sort_keys=True), sig, now]
+            con.execute(f"INSERT OR REPLACE INTO runs ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                        vals)
+            acols = ["dir"] + AGG_COLUMNS
+            con.execute(f"INSERT OR REPLACE INTO aggregates ({', '.join(acols)}) "
+                        f"VALUES ({', '.join('?' * len(acols))})",
+                        [str(run_dir)] + [agg.get(c) for c in AGG_COLUMNS])
+
+    if prune:
+        prefix = str(root).rstrip(os.sep) + os.sep
+        present = {str(d) for d, _ in runs}
+        for d, harness in con.execute("SELECT dir, harness FROM runs").fetchall():
+            if not (d == str(root) or d.startswith(prefix)) or d in present:
+                continue
+            # wpisy legacy znikają dopiero z katalogiem, jeśli ten indeks był bez --legacy
+            if harness != "legacy" or legacy or not Path(d).is_dir():
+                con.execute("DELETE FROM runs WHERE dir = ?", (d,))
+                stats["pruned"] += 1
+    con.commit()
+    return stats
+
+
+# --- zapytania ---
+
+RE_AGE = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw])$", re.I)
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_since(value: str, now: Optional[float] = None) -> float:
+    """'7d' / '12h' / '2w' (relative) or an ISO date/datetime -> epoch seconds."""
+    m = RE_AGE.match(value.strip())
+    if m:
+        return (now if now is not None else time.time()) - float(m.group(1)) * AGE_UNITS[m.group(2).lower()]
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected e.g. 7d, 12h or 2024-06-01, got {value!r}")
+
+
+def select_runs(con: sqlite3.Connection, proto: Optional[Sequence[str]] = None,
+                mode: Optional[Sequence[str]] = None, series: Optional[Sequence[str]] = None,
+                n: Optional[Sequence[int]] = None, min_n: Optional[int] = None, max_n: Optional[int] = None,
+                since: Optional[float] = None, until: Optional[float] = None,
+                status: Optional[Sequence[str]] = None, exclude_failed: bool = True) -> List[Dict[str, object]]:
+    where: List[str] = []
+    params: List[object] = []
+
+    def any_of(col: str, vals):
+        where.append(f"{col} IN ({', '.join('?' * len(vals))})")
+        params.extend(vals)
+
+    if proto:
+        any_of("proto", [p.lower() for p in proto])
+    if mode:
+        any_of("mode", [m.lower() for m in mode])
+    if series:
+        any_of("series", list(series))
+    if n:
+        any_of("N", [int(x) for x in n])
+    if status:
+        any_of("status", list(status))
+    elif exclude_failed:
+        where.append("COALESCE(status, '') != 'failed'")
+    if min_n is not None:
+        where.append("N >= ?")
+        params.append(min_n)
+    if max_n is not None:
+        where.append("N <= ?")
+        params.append(max_n)
+    if since is not None:
+        where.append("started_at >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("started_at < ?")
+        params.append(until)
+    sql = "SELECT * FROM runs_full"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY series, proto, mode, N, rep, started_at"
+    return [dict(r) for r in con.execute(sql, params)]
+
+
+def load_catalog(db: Path, **filters) -> List[Dict[str, object]]:
+    """Runs + aggregates for plotting tools (same filters as `query`)."""
+    if not db.exists():
+        raise SystemExit(f"ERROR: catalog not found: {db} (run: results_catalog.py index)")
+    con = connect(db)
+    try:
+        return select_runs(con, **filters)
+    finally:
+        con.close()
+
+
+def _fmt_started(v: Optional[float]) -> str:
+    return datetime.fromtimestamp(v).strftime("%Y-%m-%d %H:%M:%S") if v else ""
+
+
+def _print_table(rows: List[Dict[str, object]], cols: List[str], out) -> None:
+    def cell(v):
+        if v is None:
+            return ""
+        if isinstance(v, float):
+            return f"{v:.3f}"
+        return str(v)
+    table = [[cell(r.get(c)) for c in cols] for r in rows]
+    widths = [max([len(c)] + [len(t[i]) for t in table]) for i, c in enumerate(cols)]
+    out.write("  ".join(c.ljust(w) for c, w in zip(cols, widths)).rstrip() + "\n")
+    for t in table:
+        out.write("  ".join(v.ljust(w) for v, w in zip(t, widths)).rstrip() + "\n")
+
+
+def cmd_index(args) -> int:
+    root = Path(os.path.expanduser(args.root)).resolve()
+    if not root.exists():
+        print(f"ERROR: root not found: {root}", file=sys.stderr)
+        return 1
+    con = connect(Path(os.path.expanduser(args.db)))
+    t0 = time.time()
+    try:
+        st = index(con, root, legacy=args.legacy, with_pcap=args.pcap, engine=args.engine,
+                   jobs=args.jobs or os.cpu_count() or 1, force=args.force, prune=not args.no_prune,
+                   progress=not args.quiet, outlier_mult=args.outlier_mult)
+    finally:
+        con.close()
+    print(f"Catalog: {args.db} | runs: {st['runs']} | indexed: {st['indexed']} | unchanged: {st['skipped']} "
+          f"| pruned: {st['pruned']} | {time.time() - t0:.2f}s")
+    if not st["runs"]:
+        print(f"WARN: no {MANIFEST_NAME} under {root}" + ("" if args.legacy else " (try --legacy)"),
+              file=sys.stderr)
+    return 0
+
+
+def cmd_query(args) -> int:
+    db = Path(os.path.expanduser(args.db))
+    if args.sql:
+        con = connect(db)
+        try:
+            cur = con.execute(args.sql)
+            cols = [d[0] for d in cur.description] if cur.description else []
+            rows = [dict(r) for r in cur]
+        finally:
+            con.close()
+    else:
+        rows = load_catalog(db, proto=args.proto, mode=args.mode, series=args.series, n=args.n,
+                            min_n=args.min_n, max_n=args.max_n,
+                            since=args.since, until=args.until,
+                            status=args.status, exclude_failed=not args.include_failed)
+        for r in rows:
+            r["started"] = _fmt_started(r.get("started_at"))
+        cols = QUERY_COLUMNS if args.format == "table" else QUERY_COLUMNS + [
+            c for c in RUN_COLUMNS + AGG_COLUMNS if c not in QUERY_COLUMNS]
+
+    out = Path(os.path.expanduser(args.out)).open("w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        if args.format == "json":
+            json.dump([{c: r.get(c) for c in cols} for r in rows], out, indent=2)
+            out.write("\n")
+        elif args.format == "csv":
+            w = csv.DictWriter(out, fieldnames=cols, extrasaction="ignore")
+            w.writeheader()
+            w.writerows(rows)
+        else:
+            _print_table(rows, cols, out)
+    finally:
+        if args.out:
+            out.close()
+    print(f"{len(rows)} runs", file=sys.stderr)
+    return 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="SQLite catalog of experiment runs (manifests + aggregates).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    i = sub.add_parser("index", help="Scan run_manifest.json files under --root into the catalog.")
+    i.add_argument("--root", default="results")
+    i.add_argument("--db", default=DEFAULT_DB)
+    i.add_argument("--legacy", action="store_true",
+                   help="Also index run_series.sh layout dirs without a manifest (status=legacy).")
+    i.add_argument("--pcap", action="store_true", help="Also compute per-run pcap aggregates (slower).")
+    i.add_argument("--engine", choices=["auto", "native", "tshark"], default="auto",
+                   help="pcap reader for --pcap (as in pcap_metrics.py).")
+    i.add_argument("--jobs", type=int, default=1, help="Parallel worker processes (0 = all CPUs).")
+    i.add_argument("--force", action="store_true", help="Re-aggregate unchanged runs too.")
+    i.add_argument("--outlier-mult", type=float, default=DEFAULT_OUTLIER_MULT,
+                   help="Drop RTT samples > mult * median per client before the percentiles, as "
+                        "latency_summary.py --outlier-mult (0 = keep all). Changing it re-aggregates.")
+    i.add_argument("--no-prune", action="store_true", help="Keep runs whose directory is gone.")
+    i.add_argument("--quiet", action="store_true", help="No progress output.")
+
+    q = sub.add_parser("query", help="List runs with aggregates.")
+    q.add_argument("--db", default=DEFAULT_DB)
+    q.add_argument("--proto", nargs="+", choices=["http", "mqtt", "coap"])
+    q.add_argument("--mode", nargs="+", choices=["open", "auth"])
+    q.add_argument("--series", nargs="+")
+    q.add_argument("--n", nargs="+", type=int, help="Exact N values.")
+    q.add_argument("--min-n", type=int)
+    q.add_argument("--max-n", type=int)
+    q.add_argument("--since", type=parse_since, help="Started at/after: 7d, 12h, 2w or ISO date.")
+    q.add_argument("--until", type=parse_since, help="Started before: same format as --since.")
+    q.add_argument("--status", nargs="+", help="Only these statuses (ok, no_pcap, failed, legacy).")
+    q.add_argument("--include-failed", action="store_true", help="Do not hide status=failed runs.")
+    q.add_argument("--sql", help="Raw SQL (tables: runs, aggregates; view: runs_full).")
+    q.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    q.add_argument("--out", help="Output file (default stdout).")
+
+    args = ap.parse_args()
+    sys.exit(cmd_index(args) if args.cmd == "index" else cmd_query(args))
+
+
+if __name__ == "__main__":
+    main()
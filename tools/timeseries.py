@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Fixed-width time series (e.g. 100 ms / 1 s bins) per run, instead of whole-run scalars.
+
+For every capture (and every directory with client CSVs but no capture) one
+"scenario" is emitted with rows per (proto, bin):
+
+- from the pcap (native reader, one streaming pass): packets, bytes,
+  packets_per_s, bytes_per_s on the lab ports,
+- from metrics_*_id*.csv next to / below the capture (read in chunks):
+  requests (rows), ok, errors, requests_per_s and per-bin RTT p50/p95/p99
+  (ms), mean and max.
+
+Bins are aligned on the absolute timestamp (floor(ts / bin)), so all clients
+and the capture share the same bin edges; `t_rel_s` is the bin start relative to
+the first bin of the scenario. Client samples are binned by `ts` (= response
+time). Per-bin percentiles come from sparse log buckets (gamma = 1.02, relative
+error <= 1 %); counts, mean and max are exact.
+
+The output format follows the file suffix: .parquet / .feather (pyarrow) or .csv.
+plot_metrics.py --timeseries FILE plots it directly.
+
+Uruchom:
+  python timeseries.py --root results/series_x --out timeseries.parquet --bin-ms 100
+"""
+import argparse
+import math
+import os
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import pcap_reader
+from job_pool import file_weight, run_ordered
+from pcap_metrics import PROTO_PORTS, find_pcaps, guess_meta_from_path
+
+RE_METRICS = re.compile(r"^metrics_.+_(http|mqtt|coap)_id[^_]+\.csv$", re.I)
+CHUNK_ROWS = 200_000
+MAX_FILL_BINS = 5_000_000  # ~6 days at 100 ms
+
+# log buckets for per-bin percentiles: bucket k covers (GAMMA^(k-1), GAMMA^k] ms
+GAMMA = 1.02
+LOG_GAMMA = math.log(GAMMA)
+BUCKET_OFFSET = 1024   # k >= -1024 -> ~1e-9 ms
+BUCKET_SPAN = 4096     # buckets per bin in the combined int64 key
+
+
+class LatencyBins:
+    """Streaming per-bin RTT accumulator (bounded by distinct bin x bucket pairs, not by samples)."""
+
+    def __init__(self, bin_s: float):
+        self.bin_s = bin_s
+        self.hist: List[pd.Series] = []    # combined key -> count
+        self.stats: List[pd.DataFrame] = []  # bin -> rows/ok/sum/max
+
+    def add(self, ts: np.ndarray, rtt_ms: np.ndarray) -> None:
+        keep = np.isfinite(ts)
+        ts, rtt_ms = ts[keep], rtt_ms[keep]
+        if not len(ts):
+            return
+        b = np.floor(ts / self.bin_s).astype(np.int64)
+        ok = np.isfinite(rtt_ms) & (rtt_ms >= 0)
+        df = pd.DataFrame({"bin": b, "ok": ok, "rtt": np.where(ok, rtt_ms, np.nan)})
+        self.stats.append(df.groupby("bin").agg(rows=("ok", "size"), ok=("ok", "sum"),
+                                                rtt_sum=("rtt", "sum"), rtt_max=("rtt", "max")))
+        if ok.any():
+            k = np.ceil(np.log(np.maximum(rtt_ms[ok], 1e-9)) / LOG_GAMMA).astype(np.int64)
+            k = np.clip(k + BUCKET_OFFSET, 0, BUCKET_SPAN - 1)
+            keys, counts = np.unique(b[ok] * BUCKET_SPAN + k, return_counts=True)
+            self.hist.append(pd.Series(counts, index=keys))
+        if len(self.stats) >= 64:
+            self._compact()
+
+    def _compact(self) -> None:
+        if self.stats:
+            s = pd.concat(self.stats)
+            self.stats = [s.groupby(level=0).agg({"rows": "sum", "ok": "sum", "rtt_sum": "sum", "rtt_max": "max"})]
+        if self.hist:
+            self.hist = [pd.concat(self.hist).groupby(level=0).sum()]
+
+    def frame(self, quantiles=(0.5, 0.95, 0.99)) -> pd.DataFrame:
+        """bin -> requests, ok, errors, lat_mean_ms, lat_max_ms, lat_pXX_ms."""
+        self._compact()
+        if not self.stats:
+            return pd.DataFrame()
+        out = self.stats[0].copy()
+        out["lat_mean_ms"] = out["rtt_sum"] / out["ok"].where(out["ok"] > 0)
+        out = out.rename(columns={"rows": "requests", "rtt_max": "lat_max_ms"}).drop(columns="rtt_sum")
+        out["errors"] = out["requests"] - out["ok"]
+        for q in quantiles:
+            out[f"lat_p{int(round(q * 100))}_ms"] = np.nan
+        if self.hist:
+            h = self.hist[0].sort_index()
+            keys = h.index.to_numpy()
+            counts = h.to_numpy()
+            bins = keys // BUCKET_SPAN
+            vals = 2.0 * GAMMA ** (keys % BUCKET_SPAN - BUCKET_OFFSET) / (GAMMA + 1.0)
+            starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+            ends = np.r_[starts[1:], len(keys)]
+            cum = np.cumsum(counts)
+            base = np.r_[0, cum[:-1]][starts]
+            totals = cum[ends - 1] - base
+            for q in quantiles:
+                # nearest-rank like the other tools: index round((n-1)*q)
+                rank = base + np.round((totals - 1) * q).astype(np.int64) + 1
+                idx = np.searchsorted(cum, rank, side="left")
+                out.loc[bins[starts], f"lat_p{int(round(q * 100))}_ms"] = vals[idx]
+        return out
+
+
+def client_csvs(directory: Path) -> List[Path]:
+    return sorted(p for p in directory.rglob("metrics_*_id*.csv") if RE_METRICS.match(p.name))
+
+
+def scan_client_csvs(files: List[Path], bin_s: float) -> Dict[str, pd.DataFrame]:
+    acc: Dict[str, LatencyBins] = {}
+    for f in files:
+        proto = RE_METRICS.match(f.name).group(1).lower()
+        bins = acc.setdefault(proto, LatencyBins(bin_s))
+        try:
+            reader = pd.read_csv(f, usecols=["ts", "rtt"], dtype={"ts": "float64", "rtt": "float64"},
+                                 chunksize=CHUNK_ROWS)
+            for chunk in reader:
+                bins.add(chunk["ts"].to_numpy(), chunk["rtt"].to_numpy() * 1000.0)
+        except (ValueError, pd.errors.EmptyDataError) as e:
+            print(f"WARN: {f}: {e}", file=sys.stderr)
+    return {p: b.frame() for p, b in acc.items()}
+
+
+def scan_pcap(pcap: Path, bin_s: float) -> Dict[str, pd.DataFrame]:
+    port_map = {(tr, port): p for p, (tr, port) in PROTO_PORTS.items()}
+    acc: Dict[Tuple[str, int], List[int]] = defaultdict(lambda: [0, 0])
+    for d in pcap_reader.iter_decoded(pcap, addresses=False):
+        if d.transport is None:
+            continue
+        proto = port_map.get((d.transport, d.dport)) or port_map.get((d.transport, d.sport))
+        if proto is None:
+            continue
+        a = acc[(proto, int(d.ts // bin_s))]
+        a[0] += 1
+        a[1] += d.wire_len
+    out: Dict[str, pd.DataFrame] = {}
+    for proto in PROTO_PORTS:
+        items = sorted((b, v) for (p, b), v in acc.items() if p == proto)
+        if items:
+            out[proto] = pd.DataFrame([v for _, v in items], columns=["packets", "bytes"],
+                                      index=pd.Index([b for b, _ in items], name="bin"))
+    return out
+
+
+def build_series(job: Tuple[str, Optional[Path], List[Path], str, float]) -> Tuple[Optional[pd.DataFrame], str]:
+    scenario, pcap, csvs, meta_path, bin_s = job
+    try:
+        net = scan_pcap(pcap, bin_s) if pcap is not None else {}
+        cli = scan_client_csvs(csvs, bin_s)
+    except Exception as e:
+        return None, str(e)[:200]
+    meta = guess_meta_from_path(Path(meta_path))
+    parts = []
+    for proto in sorted(set(net) | set(cli)):
+        df = pd.concat([net.get(proto, pd.DataFrame()), cli.get(proto, pd.DataFrame())], axis=1)
+        if df.empty:
+            continue
+        # fill empty bins, so plots show stalls as zeros instead of interpolating over them
+        span = df.index.max() - df.index.min() + 1
+        if span <= MAX_FILL_BINS:
+            df = df.reindex(np.arange(df.index.min(), df.index.max() + 1))
+        else:
+            print(f"WARN: {scenario}/{proto}: {span} bins between first and last sample "
+                  f"(capture and client clocks differ?) - empty bins not filled", file=sys.stderr)
+        df.index.name = "bin"
+        for cols, have in ((["packets", "bytes"], proto in net), (["requests", "ok", "errors"], proto in cli)):
+            for col in cols:
+                if col not in df.columns:
+                    df[col] = np.nan
+                elif have:  # empty bin = real zero; no source for this proto = unknown
+                    df[col] = df[col].fillna(0)
+        for col in LAT_COLUMNS:  # no client CSVs for this proto: latency unknown
+            if col not in df.columns:
+                df[col] = np.nan
+        df.insert(0, "proto", proto)
+        parts.append(df)
+    if not parts:
+        return None, ""
+    out = pd.concat(parts).reset_index()
+    out["bin_start"] = out["bin"] * bin_s
+    out["t_rel_s"] = (out["bin"] - out["bin"].min()) * bin_s
+    out["packets_per_s"] = out["packets"] / bin_s
+    out["bytes_per_s"] = out["bytes"] / bin_s
+    out["requests_per_s"] = out["requests"] / bin_s
+    out.insert(0, "scenario", scenario)
+    out.insert(1, "mode", meta["mode"])
+    out.insert(2, "N", meta["N"])
+    out["bin_s"] = bin_s
+    return out[COLUMNS], ""
+
+
+COLUMNS = [
+    "scenario", "mode", "N", "proto", "bin_s", "bin_start", "t_rel_s",
+    "packets", "bytes", "packets_per_s", "bytes_per_s",
+    "requests", "ok", "errors", "requests_per_s",
+    "lat_p50_ms", "lat_p95_ms", "lat_p99_ms", "lat_mean_ms", "lat_max_ms",
+]
+LAT_COLUMNS = [c for c in COLUMNS if c.startswith("lat_")]
+INT_COLUMNS = ["packets", "bytes", "requests", "ok", "errors"]
+
+
+def find_units(root: Path) -> List[Tuple[str, Optional[Path], List[Path], str]]:
+    """(scenario, pcap or None, client CSVs, path for metadata) per capture + per pcap-less CSV directory."""
+    units = []
+    covered = set()
+    for pcap in find_pcaps(root):
+        if not pcap_reader.is_supported(pcap):
+            continue
+        csvs = client_csvs(pcap.parent)
+        covered.update(csvs)
+        units.append((pcap.stem, pcap, csvs, str(pcap)))
+    rest: Dict[Path, List[Path]] = defaultdict(list)
+    for f in client_csvs(root):
+        if f not in covered:
+            rest[f.parent].append(f)
+    for d, csvs in sorted(rest.items()):
+        units.append((d.name, None, csvs, str(d)))
+    return units
+
+
+def write_table(df: pd.DataFrame, out: Path) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    suffix = out.suffix.lower()
+    if suffix == ".parquet":
+        df.to_parquet(out, index=False)
+    elif suffix == ".feather":
+        df.reset_index(drop=True).to_feather(out)
+    else:
+        df.to_csv(out, index=False)
+
+
+def read_table(path: Path) -> pd.DataFrame:
+    suffix = Path(path).suffix.lower()
+    if suffix == ".parquet":
+        return pd.read_parquet(path)
+    if suffix == ".feather":
+        return pd.read_feather(path)
+    return pd.read_csv(path)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Time-binned throughput/latency series from pcaps and client CSVs.")
+    ap.add_argument("--root", required=True, help="Root directory with results (recursive).")
+    ap.add_argument("--out", required=True, help="Output file: .parquet / .feather (needs pyarrow) or .csv.")
+    ap.add_argument("--bin-ms", type=float, default=1000.0, help="Bin width in ms (e.g. 100 or 1000).")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel worker processes (0 = all CPUs).")
+    ap.add_argument("--quiet", action="store_true", help="No per-file progress on stderr.")
+    args = ap.parse_args()
+
+    if args.bin_ms <= 0:
+        ap.error("--bin-ms must be > 0")
+    out = Path(os.path.expanduser(args.out)).resolve()
+    if out.suffix.lower() in (".parquet", ".feather"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("ERROR: .parquet/.feather output needs pyarrow (pip install pyarrow) - or use .csv", file=sys.stderr)
+            sys.exit(2)
+
+    root = Path(os.path.expanduser(args.root)).resolve()
+    units = find_units(root)
+    if not units:
+        print(f"ERROR: No pcaps or metrics_*.csv found under: {root}", file=sys.stderr)
+        sys.exit(1)
+
+    bin_s = args.bin_ms / 1000.0
+    weights = [(file_weight(p) if p else 0.0) + sum(file_weight(c) for c in csvs) for _, p, csvs, _ in units]
+    results = run_ordered(build_series, [u + (bin_s,) for u in units], jobs=args.jobs or os.cpu_count() or 1,
+                          weights=weights, label="series ", progress=not args.quiet)
+
+    frames = []
+    for (scenario, pcap, _, _), (df, err) in zip(units, results):
+        if err:
+            print(f"[FAIL] {pcap or scenario}: {err}", file=sys.stderr)
+        elif df is not None:
+            frames.append(df)
+    if not frames:
+        print("ERROR: no data binned", file=sys.stderr)
+        sys.exit(1)
+    table = pd.concat(frames, ignore_index=True)
+    for col in INT_COLUMNS:
+        table[col] = table[col].astype("Int64")
+    write_table(table, out)
+    print(f"Saved: {out} | rows: {len(table)} / scenarios: {len(frames)} | bin: {args.bin_ms:g} ms")
+
+
+if __name__ == "__main__":
+    main()
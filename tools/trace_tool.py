@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Ślady ruchu dla odtwarzania w client/trace_replay.py (REPLAY_TRACE): nagrywanie, konwersja, podgląd.
+
+Format (opis w client/trace_replay.py): CSV `ts,device,size`, posortowany po ts,
+opcjonalnie .gz. Wszystkie polecenia działają strumieniowo (poza convert --sort).
+
+- record: ślad z przebiegu - chwile wysłania ts - rtt z metrics_*_id*.csv klientów
+  (błędy bez rtt: ts), device = <proto>-<client_id>, size puste albo --size;
+  pliki klientów są scalane (heapq.merge), więc przebieg z tysiącami klientów
+  nie jest ładowany do pamięci,
+- convert: dowolny CSV (np. eksport z produkcji) -> format śladu; kolumny
+  --ts-col / --device-col / --size-col, czas w s / ms / us / ns albo ISO 8601,
+- info: wiersze, urządzenia, czas trwania, średnie i szczytowe wysyłki/s (okno
+  --window s), rozmiary; z --clients N i --map jak w REPLAY_MAP obciążenie
+  najbardziej zajętego klienta, a z --speed czas odtwarzania.
+
+Uruchom:
+  python trace_tool.py record --root ../results_exp/exp --out trace_exp.csv.gz
+  python trace_tool.py convert --in uploads.csv --out trace.csv --ts-col time --ts-format iso \\
+      --device-col device_id --size-col bytes
+  python trace_tool.py info trace.csv --clients 50 --speed 10
+"""
+import argparse
+import csv
+import gzip
+import heapq
+import math
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "client"))
+import trace_replay  # noqa: E402  (format śladu i mapowanie urządzeń)
+
+from timeseries import client_csvs  # noqa: E402
+
+RE_PROTO = re.compile(r"metrics_.+_(http|mqtt|coap)_id(\d+)\.csv$", re.IGNORECASE)
+TS_SCALE = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9}
+HEADER = ["ts", "device", "size"]
+
+Row = Tuple[float, str, Optional[int]]
+
+
+def write_trace(rows: Iterator[Row], out: Path) -> int:
+    """Zapis przez plik .tmp: błąd w połowie strumienia nie zostawia uciętego śladu."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".tmp")
+    n = 0
+    try:
+        if out.suffix == ".gz":
+            f = gzip.open(tmp, "wt", encoding="utf-8", newline="")
+        else:
+            f = open(tmp, "w", encoding="utf-8", newline="")
+        with f:
+            w = csv.writer(f, lineterminator="\n")
+            w.writerow(HEADER)
+            for ts, device, size in rows:
+                w.writerow([f"{ts:.6f}", device, "" if size is None else size])
+                n += 1
+        os.replace(tmp, out)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return n
+
+
+# ---------- record ----------
+
+def client_sends(path: Path, size: Optional[int]) -> Iterator[Row]:
+    """Wysyłki jednego klienta w kolejności (zamknięta pętla: wysyłka i+1 po odpowiedzi i)."""
+    m = RE_PROTO.search(path.name)
+    device = f"{m.group(1).lower()}-{m.group(2)}" if m else path.stem
+    with open(path, encoding="utf-8", newline="") as f:
+        for rec in csv.DictReader(f):
+            try:
+                ts = float(rec["ts"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            rtt = rec.get("rtt") or ""
+            try:
+                ts -= float(rtt) if rtt else 0.0
+            except ValueError:
+                pass
+            yield ts, device, size
+
+
+def cmd_record(args) -> int:
+    root = Path(os.path.expanduser(args.root)).resolve()
+    files = client_csvs(root)
+    if not files:
+        print(f"ERROR: no metrics_*.csv under {root}", file=sys.stderr)
+        return 1
+    rows = heapq.merge(*(client_sends(f, args.size) for f in files), key=lambda r: r[0])
+    n = write_trace(rows, Path(args.out))
+    print(f"Wrote {args.out}: {n} sends from {len(files)} clients")
+    return 0
+
+
+# ---------- convert ----------
+
+def parse_ts(value: str, fmt: str) -> float:
+    if fmt == "iso":
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    return float(value) * TS_SCALE[fmt]
+
+
+def read_source(args) -> Iterator[Row]:
+    with trace_replay.open_trace(args.input) as f:
+        reader = csv.DictReader(f, delimiter=args.delimiter)
+        for col in (args.ts_col, args.device_col, args.size_col):
+            if col and col not in (reader.fieldnames or []):
+                raise ValueError(f"{args.input}: no column {col!r} (have {reader.fieldnames})")
+        for rec in reader:
+            raw = rec.get(args.ts_col) or ""
+            if not raw.strip():
+                continue
+            size = rec.get(args.size_col) if args.size_col else None
+            device = (rec.get(args.device_col) or "").replace(",", "_") if args.device_col else "0"
+            yield parse_ts(raw, args.ts_format), device, int(float(size)) if size else None
+
+
+def checked_order(rows: Iterator[Row]) -> Iterator[Row]:
+    last = -math.inf
+    for i, r in enumerate(rows, 1):
+        if r[0] < last:
+            raise ValueError(f"row {i}: ts goes back ({r[0]} < {last}); use --sort")
+        last = r[0]
+        yield r
+
+
+def cmd_convert(args) -> int:
+    rows = read_source(args)
+    rows = iter(sorted(rows, key=lambda r: r[0])) if args.sort else checked_order(rows)
+    try:
+        n = write_trace(rows, Path(args.out))
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(f"Wrote {args.out}: {n} rows")
+    return 0
+
+
+# ---------- info ----------
+
+def cmd_info(args) -> int:
+    owner = trace_replay.device_owner(args.map, args.clients) if args.clients else None
+    per_client: Counter = Counter()
+    per_window: Counter = Counter()
+    client_window: Counter = Counter()
+    devices = set()
+    sizes: Counter = Counter()
+    n, ts0, ts1 = 0, None, None
+    try:
+        for ts, device, size in trace_replay.iter_trace(args.trace):
+            if ts0 is None:
+                ts0 = ts
+            ts1 = ts
+            n += 1
+            devices.add(device)
+            w = int((ts - ts0) // args.window)
+            per_window[w] += 1
+            if size is not None:
+                sizes[size] += 1
+            if owner:
+                c = owner(device)
+                per_client[c] += 1
+                client_window[(c, w)] += 1
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    if not n:
+        print("ERROR: empty trace", file=sys.stderr)
+        return 1
+    span = ts1 - ts0
+    print(f"rows={n} devices={len(devices)} duration={span:.3f}s"
+          + (f" replay={span / args.speed:.3f}s at x{args.speed:g}" if args.speed != 1 else ""))
+    if span > 0:
+        print(f"rate mean={n / span * args.speed:.2f}/s peak={max(per_window.values()) / args.window * args.speed:.2f}/s"
+              f" (window {args.window:g}s trace time)")
+    if sizes:
+        total, acc, p50 = sum(sizes.values()), 0, None
+        for v in sorted(sizes):
+            acc += sizes[v]
+            if p50 is None and acc * 2 >= total:
+                p50 = v
+        print(f"size min={min(sizes)} p50={p50} max={max(sizes)} (set on {total}/{n} rows)")
+    if owner:
+        busiest = max(per_client.values())
+        peak = max(client_window.values()) / args.window * args.speed
+        idle = args.clients - len(per_client)
+        print(f"clients={args.clients} map={args.map}: busiest client {busiest} rows, peak {peak:.2f}/s"
+              + (f", {idle} clients without rows" if idle else ""))
+    return 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Record, convert and inspect traffic traces for REPLAY_TRACE.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("record", help="Trace of send times from a run's client CSVs.")
+    r.add_argument("--root", required=True, help="Run directory (searched recursively for metrics_*_id*.csv).")
+    r.add_argument("--out", required=True, help="Trace file (.csv or .csv.gz).")
+    r.add_argument("--size", type=int, help="Payload size to put in every row (default: empty = client default).")
+
+    c = sub.add_parser("convert", help="Any CSV with timestamps -> trace format.")
+    c.add_argument("--in", dest="input", required=True, help="Source CSV (.gz ok).")
+    c.add_argument("--out", required=True, help="Trace file (.csv or .csv.gz).")
+    c.add_argument("--ts-col", required=True)
+    c.add_argument("--ts-format", choices=["s", "ms", "us", "ns", "iso"], default="s")
+    c.add_argument("--device-col", help="Device id column (default: one device).")
+    c.add_argument("--size-col", help="Payload size column in bytes.")
+    c.add_argument("--delimiter", default=",")
+    c.add_argument("--sort", action="store_true", help="Sort by ts in memory (source not in time order).")
+
+    i = sub.add_parser("info", help="Rows, devices, rates; per-client load for a given fleet size.")
+    i.add_argument("trace")
+    i.add_argument("--clients", type=int, help="Fleet size N (ARRIVAL_N) for the per-client load.")
+    i.add_argument("--map", choices=trace_replay.MAPS, default="order", help="As REPLAY_MAP.")
+    i.add_argument("--speed", type=float, default=1.0, help="As REPLAY_SPEED.")
+    i.add_argument("--window", type=float, default=1.0, help="Peak-rate window in seconds of trace time.")
+
+    args = ap.parse_args()
+    if args.cmd == "info" and (args.speed <= 0 or args.window <= 0):
+        ap.error("--speed and --window must be > 0")
+    sys.exit({"record": cmd_record, "convert": cmd_convert, "info": cmd_info}[args.cmd](args))
+
+
+if __name__ == "__main__":
+    main()
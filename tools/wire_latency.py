@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Per-message network-level latency from pcaps (request <-> response pairing).
+
+For every capture the packets on the lab ports are paired into application
+messages:
+- HTTP (TCP/5000): request (segment starting with a method) -> first
+  "HTTP/1.x" response on the same TCP stream,
+- CoAP (UDP/5683): request -> response with the same Message ID (piggybacked
+  ACK) or the same Token (separate response); a repeated MID counts as a
+  retransmission only within EXCHANGE_LIFETIME (247 s) of the first send, and
+  exchanges are forgotten once answered or older than that (16-bit MID wraps
+  on long runs),
+- MQTT (TCP/1883): client PUBLISH -> broker-forwarded PUBLISH with the same
+  topic+payload ("forward"), and QoS1 PUBLISH -> PUBACK with the same packet id
+  ("puback"). MQTT is reassembled per TCP direction, so several MQTT packets
+  per segment and packets split across segments are handled.
+
+Every frame of a flow is attributed to the message most recently opened on
+that flow (request, ACKs, response, ...), which gives true frames/bytes per
+application message; frames before the first message (handshake, CONNECT,
+SUBSCRIBE) are reported as flow overhead.
+
+The client-side `rtt` from metrics_*.csv next to the capture is summarised
+alongside, so `client_minus_wire_ms` shows how much of the reported RTT comes
+from the Python client stack.
+
+Uruchom:
+  python wire_latency.py --root results/series_x --out wire_latency.csv [--out-messages msgs.csv]
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from statistics import median
+from typing import Deque, Dict, List, Optional, Tuple
+
+import pcap_reader
+from job_pool import file_weight, run_ordered
+from pcap_metrics import PROTO_PORTS, find_pcaps, guess_meta_from_path
+
+HTTP_METHODS = (b"GET ", b"POST ", b"PUT ", b"DELETE ", b"PATCH ", b"HEAD ", b"OPTIONS ")
+MQTT_PUBLISH = 3
+MQTT_PUBACK = 4
+EXCHANGE_LIFETIME = 247.0  # s, RFC 7252 4.8.2: after this a MID / token may be reused for a new message
+
+Flow = Tuple[str, int]  # (client ip, client port)
+
+
+def percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    if p <= 0:
+        return float(sorted_vals[0])
+    if p >= 1:
+        return float(sorted_vals[-1])
+    idx = int(round((len(sorted_vals) - 1) * p))
+    return float(sorted_vals[idx])
+
+
+@dataclass
+class Message:
+    proto: str
+    kind: str
+    flow: Flow
+    msg_id: str
+    t_req: float
+    t_resp: Optional[float] = None
+    t_ack: Optional[float] = None  # MQTT QoS1 PUBACK
+    frames: int = 0
+    bytes: int = 0
+
+    @property
+    def latency_ms(self) -> Optional[float]:
+        return None if self.t_resp is None else (self.t_resp - self.t_req) * 1000.0
+
+    @property
+    def ack_ms(self) -> Optional[float]:
+        return None if self.t_ack is None else (self.t_ack - self.t_req) * 1000.0
+
+
+class Pairer:
+    """Common bookkeeping: per-flow current message + flow overhead counters."""
+    proto = ""
+
+    def __init__(self):
+        self.messages: List[Message] = []
+        self.current: Dict[Flow, Message] = {}
+        self.overhead_frames = 0
+        self.overhead_bytes = 0
+
+    def open(self, flow: Flow, kind: str, msg_id: str, t: float) -> Message:
+        m = Message(self.proto, kind, flow, msg_id, t)
+        self.messages.append(m)
+        self.current[flow] = m
+        return m
+
+    def attribute(self, flow: Flow, wire_len: int) -> None:
+        m = self.current.get(flow)
+        if m is None:
+            self.overhead_frames += 1
+            self.overhead_bytes += wire_len
+        else:
+            m.frames += 1
+            m.bytes += wire_len
+
+
+class HttpPairer(Pairer):
+    proto = "http"
+
+    def __init__(self):
+        super().__init__()
+        self.pending: Dict[Flow, Deque[Message]] = defaultdict(deque)
+        self.seq: Dict[Flow, int] = defaultdict(int)
+
+    def feed(self, d: pcap_reader.Decoded, flow: Flow, from_client: bool) -> None:
+        head = bytes(d.payload[:8])
+        if from_client and head.startswith(HTTP_METHODS):
+            self.seq[flow] += 1
+            self.pending[flow].append(self.open(flow, "request", str(self.seq[flow]), d.ts))
+        elif not from_client and head.startswith(b"HTTP/1.") and self.pending[flow]:
+            self.pending[flow].popleft().t_resp = d.ts
+        self.attribute(flow, d.wire_len)
+
+
+class CoapPairer(Pairer):
+    proto = "coap"
+
+    def __init__(self):
+        super().__init__()
+        # open exchanges only: (flow, mid) -> (token, msg), (flow, token) -> (mid, msg)
+        self.by_mid: Dict[Tuple[Flow, int], Tuple[bytes, Message]] = {}
+        self.by_token: Dict[Tuple[Flow, bytes], Tuple[int, Message]] = {}
+        self.next_prune = 0.0
+
+    def _forget(self, flow: Flow, mid: int, token: bytes, m: Message) -> None:
+        if self.by_mid.get((flow, mid), (None, None))[1] is m:
+            del self.by_mid[(flow, mid)]
+        if self.by_token.get((flow, token), (None, None))[1] is m:
+            del self.by_token[(flow, token)]
+
+    def _prune(self, now: float) -> None:
+        """Drop unanswered exchanges older than EXCHANGE_LIFETIME (bounded memory on long runs)."""
+        if now < self.next_prune:
+            return
+        self.next_prune = now + EXCHANGE_LIFETIME
+        cutoff = now - EXCHANGE_LIFETIME
+        self.by_mid = {k: v for k, v in self.by_mid.items() if v[1].t_req >= cutoff}
+        self.by_token = {k: v for k, v in self.by_token.items() if v[1].t_req >= cutoff}
+
+    def feed(self, d: pcap_reader.Decoded, flow: Flow, from_client: bool) -> None:
+        p = d.payload
+        if len(p) >= 4 and p[0] >> 6 == 1:
+            self._prune(d.ts)
+            tkl = p[0] & 0x0F
+            code = p[1]
+            mid = (p[2] << 8) | p[3]
+            token = bytes(p[4:4 + tkl])
+            cutoff = d.ts - EXCHANGE_LIFETIME
+            if from_client and 1 <= code <= 31:
+                hit = self.by_mid.get((flow, mid))
+                if hit is not None and hit[1].t_req >= cutoff:
+                    self.current[flow] = hit[1]  # retransmission keeps the first send time
+                else:  # new message (also a MID reused after the 16-bit wrap)
+                    m = self.open(flow, "request", f"{mid}/{token.hex()}", d.ts)
+                    self.by_mid[(flow, mid)] = (token, m)
+                    self.by_token[(flow, token)] = (mid, m)
+            elif not from_client and code >> 5 >= 2:
+                hit = self.by_mid.get((flow, mid))
+                if hit is not None:  # piggybacked ACK
+                    req_mid, (req_token, m) = mid, hit
+                else:  # separate response: new MID, same token
+                    tok_hit = self.by_token.get((flow, token))
+                    req_token = token
+                    req_mid, m = tok_hit if tok_hit is not None else (None, None)
+                if m is not None and m.t_req >= cutoff:
+                    m.t_resp = d.ts
+                    self._forget(flow, req_mid, req_token, m)
+        self.attribute(flow, d.wire_len)
+
+
+def mqtt_packets(buf: bytearray) -> List[Tuple[int, int, bytes]]:
+    """Pop every complete MQTT packet from buf -> [(type, flags, body)]."""
+    out = []
+    pos = 0
+    n = len(buf)
+    while pos + 2 <= n:
+        mult, length, i = 1, 0, pos + 1
+        while i < n:
+            b = buf[i]
+            length += (b & 0x7F) * mult
+            mult *= 128
+            i += 1
+            if not b & 0x80:
+                break
+        else:
+            break
+        if i + length > n:
+            break
+        out.append((buf[pos] >> 4, buf[pos] & 0x0F, bytes(buf[i:i + length])))
+        pos = i + length
+    del buf[:pos]
+    return out
+
+
+class MqttPairer(Pairer):
+    proto = "mqtt"
+
+    def __init__(self):
+        super().__init__()
+        self.tcp = pcap_reader.TcpStreams()
+        self.buffers: Dict[Tuple[Flow, bool], bytearray] = {}
+        self.by_content: Dict[Tuple[bytes, bytes], Deque[Message]] = defaultdict(deque)
+        self.by_pid: Dict[Tuple[Flow, int], Message] = {}
+
+    def _reassemble(self, d: pcap_reader.Decoded, key) -> List[Tuple[int, int, bytes]]:
+        data, reset = self.tcp.feed(key, d)
+        buf = self.buffers.setdefault(key, bytearray())
+        if reset:
+            buf.clear()
+        if not data:
+            return []
+        buf += data
+        return mqtt_packets(buf)
+
+    def feed(self, d: pcap_reader.Decoded, flow: Flow, from_client: bool) -> None:
+        for ptype, flags, body in self._reassemble(d, (flow, from_client)):
+            if ptype == MQTT_PUBLISH and len(body) >= 2:
+                tlen = (body[0] << 8) | body[1]
+                topic = body[2:2 + tlen]
+                pos = 2 + tlen
+                pid = None
+                if (flags >> 1) & 0x03:
+                    if len(body) < pos + 2:
+                        continue  # truncated (snaplen) or malformed PUBLISH
+                    pid = (body[pos] << 8) | body[pos + 1]
+                    pos += 2
+                key = (topic, body[pos:])
+                if from_client:
+                    m = self.open(flow, "publish", topic.decode(errors="replace"), d.ts)
+                    self.by_content[key].append(m)
+                    if pid is not None:
+                        self.by_pid[(flow, pid)] = m
+                elif self.by_content.get(key):
+                    self.by_content[key].popleft().t_resp = d.ts
+            elif ptype == MQTT_PUBACK and not from_client and len(body) >= 2:
+                m = self.by_pid.pop((flow, (body[0] << 8) | body[1]), None)
+                if m is not None:
+                    m.t_ack = d.ts
+        self.attribute(flow, d.wire_len)
+
+
+PAIRERS = {"http": HttpPairer, "coap": CoapPairer, "mqtt": MqttPairer}
+
+
+def pair_capture(pcap: Path) -> Dict[str, Pairer]:
+    pairers = {p: cls() for p, cls in PAIRERS.items()}
+    port_map = {(tr, port): p for p, (tr, port) in PROTO_PORTS.items()}
+    for d in pcap_reader.iter_decoded(pcap):
+        if d.transport is None:
+            continue
+        if (d.transport, d.dport) in port_map:
+            proto, flow, from_client = port_map[(d.transport, d.dport)], (d.src, d.sport), True
+        elif (d.transport, d.sport) in port_map:
+            proto, flow, from_client = port_map[(d.transport, d.sport)], (d.dst, d.dport), False
+        else:
+            continue
+        pairers[proto].feed(d, flow, from_client)
+    return pairers
+
+
+def client_rtts_ms(pcap: Path) -> List[float]:
+    """Client-side rtt (s -> ms) from metrics_*.csv stored next to / below the capture."""
+    out: List[float] = []
+    for f in sorted(pcap.parent.rglob("metrics_*_id*.csv")):
+        with f.open("r", encoding="utf-8", errors="ignore", newline="") as fh:
+            for row in csv.DictReader(fh):
+                try:
+                    out.append(float(row.get("rtt") or "") * 1000.0)
+                except ValueError:
+                    pass
+    return out
+
+
+def _r(v: Optional[float], nd: int = 6) -> Optional[float]:
+    return round(v, nd) if v is not None else None
+
+
+def summarize(pcap: Path, pairers: Dict[str, Pairer], client_ms: List[float]) -> List[Dict[str, object]]:
+    meta = guess_meta_from_path(pcap)
+    rows = []
+    cl_med = median(client_ms) if client_ms else None
+    for proto, pr in pairers.items():
+        if not pr.messages:
+            continue
+        frames = sum(m.frames for m in pr.messages)
+        byts = sum(m.bytes for m in pr.messages)
+        # MQTT: "forward" = PUBLISH -> broker PUBLISH, "puback" = QoS1 PUBLISH -> PUBACK
+        kinds = [("forward", "latency_ms"), ("puback", "ack_ms")] if proto == "mqtt" else [("request", "latency_ms")]
+        for kind, attr in kinds:
+            vals = [getattr(m, attr) for m in pr.messages]
+            lat = sorted(v for v in vals if v is not None)
+            if kind == "puback" and not lat:
+                continue
+            wire_med = median(lat) if lat else None
+            own = meta["proto"] in (None, proto)
+            rows.append({
+                "scenario": pcap.stem,
+                "pcap_path": str(pcap),
+                "mode": meta["mode"],
+                "proto": proto,
+                "N": meta["N"],
+                "kind": kind,
+                "messages": len(pr.messages),
+                "matched": len(lat),
+                "wire_median_ms": _r(wire_med),
+                "wire_p95_ms": _r(percentile(lat, 0.95)),
+                "wire_p99_ms": _r(percentile(lat, 0.99)),
+                "wire_max_ms": _r(lat[-1] if lat else None),
+                "frames_per_msg": _r(frames / len(pr.messages), 3),
+                "bytes_per_msg": _r(byts / len(pr.messages), 3),
+                "overhead_frames": pr.overhead_frames,
+                "overhead_bytes": pr.overhead_bytes,
+                "client_median_ms": _r(cl_med) if own else None,
+                "client_minus_wire_ms": _r(cl_med - wire_med)
+                if own and cl_med is not None and wire_med is not None else None,
+            })
+    return rows
+
+
+def analyze(job: Tuple[Path, bool]) -> Tuple[List[Dict[str, object]], List[Dict[str, object]], str]:
+    pcap, want_messages = job
+    try:
+        pairers = pair_capture(pcap)
+        rows = summarize(pcap, pairers, client_rtts_ms(pcap))
+    except Exception as e:
+        return [], [], str(e)[:200]
+    msgs = []
+    if want_messages:
+        for pr in pairers.values():
+            for m in pr.messages:
+                msgs.append({
+                    "scenario": pcap.stem, "proto": m.proto, "kind": m.kind,
+                    "client": f"{m.flow[0]}:{m.flow[1]}", "msg_id": m.msg_id,
+                    "t_req": f"{m.t_req:.6f}",
+                    "t_resp": f"{m.t_resp:.6f}" if m.t_resp is not None else "",
+                    "wire_latency_ms": _r(m.latency_ms),
+                    "ack_latency_ms": _r(m.ack_ms),
+                    "frames": m.frames,
+                    "bytes": m.bytes,
+                })
+    return rows, msgs, ""
+
+
+SUMMARY_FIELDS = [
+    "scenario", "pcap_path", "mode", "proto", "N", "kind", "messages", "matched",
+    "wire_median_ms", "wire_p95_ms", "wire_p99_ms", "wire_max_ms",
+    "frames_per_msg", "bytes_per_msg", "overhead_frames", "overhead_bytes",
+    "client_median_ms", "client_minus_wire_ms", "error",
+]
+MESSAGE_FIELDS = ["scenario", "proto", "kind", "client", "msg_id", "t_req", "t_resp",
+                  "wire_latency_ms", "ack_latency_ms", "frames", "bytes"]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Per-message wire latency and frames/bytes per message from pcaps.")
+    ap.add_argument("--root", required=True, help="Root directory with pcaps (recursive).")
+    ap.add_argument("--out", required=True, help="Output summary CSV (one row per capture/proto/kind).")
+    ap.add_argument("--out-messages", help="Optional per-message CSV.")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel worker processes (0 = all CPUs).")
+    ap.add_argument("--quiet", action="store_true", help="No per-file progress on stderr.")
+    args = ap.parse_args()
+
+    root = Path(os.path.expanduser(args.root)).resolve()
+    pcaps = [p for p in find_pcaps(root) if pcap_reader.is_supported(p)]
+    if not pcaps:
+        print(f"ERROR: No .pcap/.pcapng found under: {root}", file=sys.stderr)
+        sys.exit(1)
+
+    results = run_ordered(analyze, [(p, bool(args.out_messages)) for p in pcaps],
+                          jobs=args.jobs or os.cpu_count() or 1,
+                          weights=[file_weight(p) for p in pcaps], label="pcap ", progress=not args.quiet)
+
+    out_csv = Path(os.path.expanduser(args.out)).resolve()
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    n_rows = 0
+    with out_csv.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        w.writeheader()
+        for pcap, (rows, _, err) in zip(pcaps, results):
+            if err:
+                w.writerow({"scenario": pcap.stem, "pcap_path": str(pcap), "error": err})
+                print(f"[FAIL] {pcap}: {err}", file=sys.stderr)
+            for r in rows:
+                r["error"] = ""
+                w.writerow(r)
+            n_rows += len(rows)
+
+    if args.out_messages:
+        out_msgs = Path(os.path.expanduser(args.out_messages)).resolve()
+        out_msgs.parent.mkdir(parents=True, exist_ok=True)
+        with out_msgs.open("w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=MESSAGE_FIELDS)
+            w.writeheader()
+            for _, msgs, _ in results:
+                w.writerows(msgs)
+        print(f"Saved messages: {out_msgs}")
+
+    print(f"Saved CSV: {out_csv} | rows: {n_rows} / PCAPs: {len(pcaps)}")
+
+
+if __name__ == "__main__":
+    main()